@@ -47,6 +47,18 @@ parser.add_argument(
 parser.add_argument(
     "--download", help="Download images from server", action="store_true", default=False
 )
+parser.add_argument(
+    "--streaming",
+    help="Stream batches through consecutive processors, rather than "
+    "applying each processor to the whole dataset in turn",
+    action="store_true",
+    default=False,
+)
+parser.add_argument(
+    "--pixeldtype",
+    default=None,
+    help="Floating-point type used to store image pixels (float64 or float32)",
+)
 
 parser.add_argument("-m", "--monitor", action="store_true", default=False)
 parser.add_argument(
@@ -152,6 +164,8 @@ with tempfile.TemporaryDirectory(dir=TEMP_DIR) as temp_dir_path:
             args.pipeline,
             selected_configurations=CONFIG,
             night=night,
+            streaming=args.streaming,
+            pixel_dtype=args.pixeldtype,
         )
 
         batches, errorstack = pipe.reduce_images(catch_all_errors=True)
@@ -0,0 +1,259 @@
+"""
+Module for writing files asynchronously (write-behind).
+
+Final products, such as the images saved by
+:class:`~mirar.processors.utils.image_saver.ImageSaver`, are not needed by the
+processor which writes them. Their writes can be queued and run by a pool of
+writer threads, off the critical path. The number of pending writes is bounded,
+so a producer which gets ahead of the writers waits for a free slot, rather
+than holding an unbounded amount of data in memory.
+
+Each write returns a future. Any code which needs the file can wait for it:
+files are opened via :mod:`mirar.io`, which waits for a pending write of the
+same path, and all pending writes are completed before running an external
+tool (see :func:`~mirar.utils.execute_cmd.execute`). At the end of
+:func:`~mirar.pipelines.base_pipeline.Pipeline.reduce_images`, all writes are
+flushed, and failed writes are added to the error stack.
+
+Write-behind is used by default for ImageSaver when enabled via environment
+variables:
+
+.. code-block:: bash
+
+    export ASYNC_WRITES=true
+    export ASYNC_WRITE_THREADS=2
+    export ASYNC_WRITE_MAX_PENDING=8
+"""
+
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+ASYNC_WRITES: bool = os.getenv("ASYNC_WRITES", "false") in ["true", "True", True]
+ASYNC_WRITE_THREADS: int = int(os.getenv("ASYNC_WRITE_THREADS", "2"))
+ASYNC_WRITE_MAX_PENDING: int = int(os.getenv("ASYNC_WRITE_MAX_PENDING", "8"))
+
+
+class AsyncWriter:
+    """
+    Process-wide queue of asynchronous file writes, run by a pool of threads
+    """
+
+    def __init__(
+        self,
+        n_threads: int = ASYNC_WRITE_THREADS,
+        max_pending: int = ASYNC_WRITE_MAX_PENDING,
+    ):
+        """
+        :param n_threads: number of writer threads
+        :param max_pending: maximum number of writes queued or running at once
+        """
+        self.n_threads = max(n_threads, 1)
+        self.max_pending = max(max_pending, 1)
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending: dict[str, Future] = {}
+        self._failures: list[tuple[str, str, Exception]] = []
+        self._stats = self._get_empty_stats()
+
+    @staticmethod
+    def _get_empty_stats() -> dict:
+        """
+        Get the statistics of a writer with no writes yet
+
+        :return: dictionary of statistics
+        """
+        return {
+            "n_submitted": 0,
+            "n_completed": 0,
+            "n_failed": 0,
+            "max_pending": 0,
+            "bytes_written": 0,
+            "write_time_s": 0.0,
+            "blocked_time_s": 0.0,
+            "wait_time_s": 0.0,
+        }
+
+    def reset(self):
+        """
+        Forget all pending writes, e.g. in a new worker process, where the
+        writer threads of the parent do not exist
+
+        :return: None
+        """
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = {}
+        self._failures = []
+        self._stats = self._get_empty_stats()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """
+        Get the pool of writer threads, creating it if needed
+
+        :return: executor
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.n_threads, thread_name_prefix="mirar-writer"
+                )
+            return self._executor
+
+    def _write(self, path: str, write_f: Callable, args: tuple, kwargs: dict):
+        """
+        Run a write, recording its time and size
+
+        :param path: path written
+        :param write_f: function which writes the file
+        :param args: arguments of write_f
+        :param kwargs: keyword arguments of write_f
+        :return: None
+        """
+        start = time.perf_counter()
+        write_f(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        n_bytes = os.path.getsize(path) if os.path.exists(path) else 0
+        with self._lock:
+            self._stats["write_time_s"] += elapsed
+            self._stats["bytes_written"] += n_bytes
+
+    def _complete(self, path: str, owner: str, future: Future):
+        """
+        Callback for a finished write
+
+        :param path: path written
+        :param owner: name of the code which submitted the write
+        :param future: future of the write
+        :return: None
+        """
+        self._slots.release()
+        exc = future.exception()
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
+            self._stats["n_completed"] += 1
+            if exc is not None:
+                self._stats["n_failed"] += 1
+                self._failures.append((path, owner, exc))
+
+        if exc is not None:
+            logger.error(f"Asynchronous write of {path} failed: {exc}")
+
+    def submit(
+        self,
+        path: str | Path,
+        write_f: Callable,
+        *args,
+        owner: str = "AsyncWriter",
+        **kwargs,
+    ) -> Future:
+        """
+        Queue a write of a file. All data passed to write_f must not be
+        modified afterwards, so callers should pass copies.
+
+        :param path: path which will be written
+        :param write_f: function which writes the file
+        :param args: arguments of write_f
+        :param owner: name of the code submitting the write, for error reports
+        :param kwargs: keyword arguments of write_f
+        :return: future of the write
+        """
+        path = Path(path).as_posix()
+
+        # A new write of a path must follow any pending one
+        self.wait(path)
+
+        start = time.perf_counter()
+        self._slots.acquire()  # pylint: disable=consider-using-with
+        blocked = time.perf_counter() - start
+
+        executor = self._get_executor()
+        with self._lock:
+            future = executor.submit(self._write, path, write_f, args, kwargs)
+            self._pending[path] = future
+            self._stats["n_submitted"] += 1
+            self._stats["blocked_time_s"] += blocked
+            self._stats["max_pending"] = max(
+                self._stats["max_pending"], len(self._pending)
+            )
+
+        future.add_done_callback(partial(self._complete, path, owner))
+        return future
+
+    def is_pending(self, path: str | Path) -> bool:
+        """
+        Check whether a write of a path is queued or running
+
+        :param path: path
+        :return: boolean
+        """
+        with self._lock:
+            return Path(path).as_posix() in self._pending
+
+    def wait(self, path: str | Path):
+        """
+        Wait for any pending write of a path. Failed writes are not raised here,
+        but are returned by :meth:`flush`.
+
+        :param path: path
+        :return: None
+        """
+        with self._lock:
+            future = self._pending.get(Path(path).as_posix())
+
+        if future is not None:
+            start = time.perf_counter()
+            concurrent.futures.wait([future])
+            with self._lock:
+                self._stats["wait_time_s"] += time.perf_counter() - start
+
+    def wait_all(self):
+        """
+        Wait for all pending writes
+
+        :return: None
+        """
+        with self._lock:
+            futures = list(self._pending.values())
+
+        if len(futures) > 0:
+            start = time.perf_counter()
+            concurrent.futures.wait(futures)
+            with self._lock:
+                self._stats["wait_time_s"] += time.perf_counter() - start
+
+    def flush(self) -> list[tuple[str, str, Exception]]:
+        """
+        Wait for all pending writes, and return (and forget) any failures
+
+        :return: list of failed writes, as (path, owner, exception)
+        """
+        self.wait_all()
+        with self._lock:
+            failures = self._failures
+            self._failures = []
+        return failures
+
+    def get_stats(self) -> dict:
+        """
+        Get the statistics of writes so far, including the current backlog
+
+        :return: dictionary of statistics
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["n_pending"] = len(self._pending)
+        return stats
+
+
+async_writer = AsyncWriter()
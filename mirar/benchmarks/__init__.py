@@ -0,0 +1,5 @@
+"""
+Offline benchmarks of the processor chain, run on synthetic data
+"""
+
+from mirar.benchmarks.runner import compare_results, run_benchmarks
@@ -0,0 +1,89 @@
+"""
+Executable to run the benchmark suite. You can execute the code from the terminal
+like:
+
+.. codeblock:: bash
+    python -m mirar.benchmarks --output results.json --compare baseline.json
+"""
+
+import argparse
+import logging
+import sys
+
+from mirar.benchmarks.runner import (
+    DEFAULT_REGRESSION_THRESHOLD,
+    compare_results,
+    get_benchmark_names,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+
+logger = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(
+    description="Run benchmarks of the processor chain on synthetic data"
+)
+parser.add_argument(
+    "-b",
+    "--benchmarks",
+    nargs="+",
+    default=None,
+    help="Benchmarks to run, as class names or 'Class.time_method' "
+    "(default: all benchmarks)",
+)
+parser.add_argument(
+    "-s",
+    "--scale",
+    type=float,
+    default=0.25,
+    help="Scale factor for the image axes and number of sources",
+)
+parser.add_argument(
+    "-r", "--repeat", type=int, default=3, help="Number of timed runs per benchmark"
+)
+parser.add_argument("-o", "--output", default=None, help="Path to save results")
+parser.add_argument(
+    "-c", "--compare", default=None, help="Path of baseline results to compare to"
+)
+parser.add_argument(
+    "--threshold",
+    type=float,
+    default=DEFAULT_REGRESSION_THRESHOLD,
+    help="Ratio of new/baseline time above which a benchmark has regressed",
+)
+parser.add_argument(
+    "--list", action="store_true", default=False, help="List benchmarks and exit"
+)
+parser.add_argument("--level", default="INFO", help="Python logging level")
+
+args = parser.parse_args()
+
+log = logging.getLogger("mirar")
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter("%(name)s [l %(lineno)d] - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+log.addHandler(handler)
+log.setLevel(args.level)
+
+if args.list:
+    print("\n".join(get_benchmark_names()))
+    sys.exit(0)
+
+results = run_benchmarks(names=args.benchmarks, scale=args.scale, repeat=args.repeat)
+
+if args.output is not None:
+    save_results(results, args.output)
+
+if args.compare is not None:
+    comparisons = compare_results(
+        load_results(args.compare), results, threshold=args.threshold
+    )
+    for comparison in comparisons:
+        FLAG = "REGRESSION" if comparison["regression"] else ""
+        print(
+            f"{comparison['name']:45s} {comparison['old']:9.3f}s "
+            f"{comparison['new']:9.3f}s {comparison['ratio']:6.2f}x {FLAG}"
+        )
+    if any(x["regression"] for x in comparisons):
+        sys.exit(1)
@@ -0,0 +1,214 @@
+"""
+Module to run the benchmark suite, and compare results between commits.
+
+Each benchmark is timed several times, with a fresh setup before each run.
+Results are saved as JSON, together with the git commit and package versions,
+so that runs on different commits can be compared:
+
+.. code-block:: bash
+
+    python -m mirar.benchmarks --output baseline.json
+    git checkout my-branch
+    python -m mirar.benchmarks --output new.json --compare baseline.json
+"""
+
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from importlib import metadata
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from mirar.benchmarks.suite import BENCHMARKS
+from mirar.data.cache import cache
+from mirar.paths import PACKAGE_NAME
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGRESSION_THRESHOLD = 1.2
+
+
+def get_benchmark_names() -> list[str]:
+    """
+    Get the names of all benchmarks, in the form 'Class.time_method'
+
+    :return: list of names
+    """
+    return [
+        f"{bench_class.__name__}.{method}"
+        for bench_class in BENCHMARKS
+        for method in sorted(dir(bench_class))
+        if method.startswith("time_")
+    ]
+
+
+def get_metadata() -> dict:
+    """
+    Get a description of the code and machine used for a benchmark run
+
+    :return: dictionary of metadata
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    versions = {}
+    for package in [PACKAGE_NAME, "numpy", "astropy", "scipy", "pandas"]:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "n_cpu": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def run_benchmark(name: str, scale: float, repeat: int = 3) -> dict:
+    """
+    Time one benchmark
+
+    :param name: benchmark name, in the form 'Class.time_method'
+    :param scale: scale factor for the image axes and number of sources
+    :param repeat: number of timed runs
+    :return: dictionary of timings, in seconds
+    """
+    class_name, method_name = name.split(".")
+    bench_class = {x.__name__: x for x in BENCHMARKS}[class_name]
+
+    samples = []
+    for _ in range(repeat):
+        benchmark = bench_class()
+        benchmark.setup(scale)
+        try:
+            start = time.perf_counter()
+            getattr(benchmark, method_name)(scale)
+            samples.append(time.perf_counter() - start)
+        finally:
+            benchmark.teardown(scale)
+
+    logger.info(f"{name}: {np.min(samples):.3f}s (min of {repeat})")
+
+    return {
+        "min": float(np.min(samples)),
+        "median": float(np.median(samples)),
+        "samples": samples,
+    }
+
+
+def run_benchmarks(
+    names: Optional[list[str]] = None,
+    scale: float = 0.25,
+    repeat: int = 3,
+) -> dict:
+    """
+    Run benchmarks, using a temporary cache directory
+
+    :param names: benchmark names or class names (default, all benchmarks)
+    :param scale: scale factor for the image axes and number of sources
+    :param repeat: number of timed runs of each benchmark
+    :return: dictionary with the metadata and results of the run
+    """
+    all_names = get_benchmark_names()
+    if names is None:
+        selected = all_names
+    else:
+        selected = [x for x in all_names if (x in names) | (x.split(".")[0] in names)]
+
+    results = {}
+
+    old_cache_dir = cache.cache_dir
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache.set_cache_dir(cache_dir)
+        try:
+            for name in selected:
+                results[name] = run_benchmark(name, scale=scale, repeat=repeat)
+        finally:
+            if old_cache_dir is not None:
+                cache.set_cache_dir(old_cache_dir)
+            else:
+                cache.cache_dir = None
+
+    return {
+        "metadata": get_metadata(),
+        "scale": scale,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def save_results(results: dict, output_path: Path | str):
+    """
+    Save benchmark results to a JSON file
+
+    :param results: benchmark results
+    :param output_path: output path
+    :return: None
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as results_f:
+        json.dump(results, results_f, indent=2)
+
+
+def load_results(path: Path | str) -> dict:
+    """
+    Load benchmark results from a JSON file
+
+    :param path: path of results file
+    :return: benchmark results
+    """
+    with open(path, "r", encoding="utf-8") as results_f:
+        return json.load(results_f)
+
+
+def compare_results(
+    old: dict, new: dict, threshold: float = DEFAULT_REGRESSION_THRESHOLD
+) -> list[dict]:
+    """
+    Compare the minimum times of two benchmark runs
+
+    :param old: results of the baseline run
+    :param new: results of the new run
+    :param threshold: ratio of new/old time above which a benchmark has regressed
+    :return: list of comparisons, one per benchmark present in both runs
+    """
+    if old.get("scale") != new.get("scale"):
+        logger.warning(
+            f"Comparing benchmarks run at different scales "
+            f"({old.get('scale')} and {new.get('scale')})"
+        )
+
+    comparisons = []
+    for name, new_result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        ratio = new_result["min"] / old["results"][name]["min"]
+        comparisons.append(
+            {
+                "name": name,
+                "old": old["results"][name]["min"],
+                "new": new_result["min"],
+                "ratio": ratio,
+                "regression": ratio > threshold,
+            }
+        )
+    return comparisons
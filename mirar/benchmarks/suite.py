@@ -0,0 +1,359 @@
+"""
+Benchmarks of the main processing steps, run on synthetic data.
+
+Benchmarks follow the conventions of asv (airspeed velocity): each class has a
+:meth:`setup` method to prepare inputs, an optional :meth:`teardown`, and one
+or more methods named ``time_*`` which are timed. Every class takes a single
+``scale`` parameter, which scales each axis of the synthetic images
+(and the number of sources), so that the same suite can be run quickly in
+tests or at full size to compare commits.
+"""
+
+# pylint: disable=attribute-defined-outside-init
+
+import logging
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mirar.benchmarks.synthetic import (
+    SYNTHETIC_INSTRUMENTS,
+    make_psf,
+    make_star_field,
+    make_synthetic_header,
+    make_synthetic_image,
+    make_synthetic_night,
+    write_psf_file,
+    write_synthetic_images,
+)
+from mirar.catalog.base.base_xmatch_catalog import BaseXMatchCatalog
+from mirar.data import Image, ImageBatch, SourceBatch, SourceTable
+from mirar.data.utils import combine_images
+from mirar.io import open_raw_image, save_fits
+from mirar.paths import (
+    EXPTIME_KEY,
+    LATEST_SAVE_KEY,
+    NORM_PSFEX_KEY,
+    XPOS_KEY,
+    YPOS_KEY,
+    ZP_KEY,
+    ZP_STD_KEY,
+)
+from mirar.processors.photometry import AperturePhotometry, PSFPhotometry
+from mirar.processors.split import SplitImage
+from mirar.processors.utils.image_loader import load_from_dir
+from mirar.processors.xmatch import XMatch
+from mirar.processors.zogy.pyzogy import pyzogy
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_INSTRUMENT = "winter"
+
+
+class SyntheticXMatchCatalog(BaseXMatchCatalog):
+    """
+    Cross-match catalog returning deterministic fake matches, without any
+    network access
+    """
+
+    catalog_name = "synthetic"
+    abbreviation = "syn"
+    projection = {"_id": 1, "ra": 1, "dec": 1, "mag": 1}
+    column_names = {
+        "_id": f"{abbreviation}objid",
+        "ra": f"{abbreviation}ra",
+        "dec": f"{abbreviation}dec",
+        "mag": f"{abbreviation}mag",
+    }
+    column_dtypes = {
+        f"{abbreviation}objid": float,
+        f"{abbreviation}ra": float,
+        f"{abbreviation}dec": float,
+        f"{abbreviation}mag": float,
+    }
+    ra_column_name = f"{abbreviation}ra"
+    dec_column_name = f"{abbreviation}dec"
+
+    def query(self, coords: dict) -> dict:
+        results = {}
+        for ind, (name, (ra_deg, dec_deg)) in enumerate(coords.items()):
+            n_matches = ind % (self.num_sources + 1)
+            results[name] = [
+                {
+                    "_id": float(ind * self.num_sources + i),
+                    "ra": ra_deg + (i + 1) * 1.0e-4,
+                    "dec": dec_deg - (i + 1) * 1.0e-4,
+                    "mag": 15.0 + i,
+                }
+                for i in range(n_matches)
+            ]
+        return results
+
+
+class SyntheticBenchmark:
+    """
+    Base class for benchmarks, with a temporary working directory
+    """
+
+    params = [0.25]
+    param_names = ["scale"]
+
+    def setup(self, scale: float):  # pylint: disable=unused-argument
+        """
+        Prepare the inputs of the benchmark
+
+        :param scale: scale factor for the image axes and number of sources
+        :return: None
+        """
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.temp_dir.name)
+
+    def teardown(self, scale: float):  # pylint: disable=unused-argument
+        """
+        Clean up after the benchmark
+
+        :param scale: scale factor for the image axes and number of sources
+        :return: None
+        """
+        self.temp_dir.cleanup()
+
+
+class CalibrationCombine(SyntheticBenchmark):
+    """
+    Benchmark of combining calibration frames into a master
+    """
+
+    n_frames = 7
+
+    def setup(self, scale: float):
+        super().setup(scale)
+        self.images = ImageBatch(
+            [
+                make_synthetic_image(
+                    BENCHMARK_INSTRUMENT, obsclass="dark", index=i, scale=scale
+                )
+                for i in range(self.n_frames)
+            ]
+        )
+        self.scales = [1.0 / image[EXPTIME_KEY] for image in self.images]
+
+    def time_median(self, scale: float):  # pylint: disable=unused-argument
+        """Median combine of dark frames"""
+        combine_images(self.images, method="median", scales=self.scales)
+
+    def time_sigma_clipped_mean(self, scale: float):  # pylint: disable=unused-argument
+        """Sigma-clipped mean combine of dark frames"""
+        combine_images(self.images, method="sigma_clipped_mean", scales=self.scales)
+
+
+class SplitImages(SyntheticBenchmark):
+    """
+    Benchmark of splitting images into sub-images
+    """
+
+    def setup(self, scale: float):
+        super().setup(scale)
+        self.processor = SplitImage(buffer_pixels=10, n_x=2, n_y=1)
+        self.processor.set_night(self.output_dir.as_posix())
+        self.batch = make_synthetic_night(
+            BENCHMARK_INSTRUMENT,
+            n_bias=0,
+            n_dark=0,
+            n_flat=0,
+            n_science=4,
+            scale=scale,
+        )
+
+    def time_split(self, scale: float):  # pylint: disable=unused-argument
+        """Split science images in two"""
+        self.processor.apply(self.batch)
+
+
+class ZOGYSubtraction(SyntheticBenchmark):
+    """
+    Benchmark of ZOGY image subtraction
+    """
+
+    def setup(self, scale: float):
+        super().setup(scale)
+        fwhm = SYNTHETIC_INSTRUMENTS[BENCHMARK_INSTRUMENT]["fwhm_pix"]
+        new = make_synthetic_image(BENCHMARK_INSTRUMENT, index=0, scale=scale)
+        ref = make_synthetic_image(BENCHMARK_INSTRUMENT, index=1, scale=scale)
+        self.new_data = new.get_data() - np.nanmedian(new.get_data())
+        self.ref_data = ref.get_data() - np.nanmedian(ref.get_data())
+        self.new_psf = make_psf(fwhm)
+        self.ref_psf = make_psf(fwhm * 1.2)
+        self.new_sigma = np.sqrt(np.clip(new.get_data(), 1.0, None))
+        self.ref_sigma = np.sqrt(np.clip(ref.get_data(), 1.0, None))
+
+    def time_pyzogy(self, scale: float):  # pylint: disable=unused-argument
+        """Subtract a reference image from a science image"""
+        pyzogy(
+            new_data=self.new_data.copy(),
+            ref_data=self.ref_data.copy(),
+            new_psf=self.new_psf,
+            ref_psf=self.ref_psf,
+            new_sigma=self.new_sigma,
+            ref_sigma=self.ref_sigma,
+            new_avg_unc=float(np.median(self.new_sigma)),
+            ref_avg_unc=float(np.median(self.ref_sigma)),
+        )
+
+
+class Photometry(SyntheticBenchmark):
+    """
+    Benchmark of aperture and PSF photometry on a table of sources
+    """
+
+    n_sources = 200
+
+    def setup(self, scale: float):
+        super().setup(scale)
+        fwhm = SYNTHETIC_INSTRUMENTS[BENCHMARK_INSTRUMENT]["fwhm_pix"]
+        image = make_synthetic_image(BENCHMARK_INSTRUMENT, index=0, scale=scale)
+        image_path = self.output_dir.joinpath("science.fits")
+        save_fits(image, image_path)
+        psf_path = write_psf_file(self.output_dir.joinpath("science.psf"), fwhm)
+
+        shape = image.get_data().shape
+        _, stars = make_star_field(
+            shape,
+            n_stars=max(int(self.n_sources * scale), 10),
+            fwhm_pix=fwhm,
+            rng=np.random.default_rng(0),
+            edge=30,
+        )
+        self.metadata = dict(image.get_header())
+        self.metadata.update(
+            {
+                LATEST_SAVE_KEY: image_path.as_posix(),
+                NORM_PSFEX_KEY: psf_path.as_posix(),
+                ZP_KEY: 25.0,
+                ZP_STD_KEY: 0.05,
+            }
+        )
+        self.sources = stars[[XPOS_KEY, YPOS_KEY]]
+
+        self.aperture_photometry = AperturePhotometry(
+            aper_diameters=[5.0, 10.0],
+            bkg_in_diameters=[25.0, 25.0],
+            bkg_out_diameters=[40.0, 40.0],
+        )
+        self.psf_photometry = PSFPhotometry()
+        for processor in [self.aperture_photometry, self.psf_photometry]:
+            processor.set_night(self.output_dir.as_posix())
+
+    def get_batch(self) -> SourceBatch:
+        """
+        Get a new batch of the sources to measure
+
+        :return: source batch
+        """
+        return SourceBatch(
+            [SourceTable(self.sources.copy(), metadata=dict(self.metadata))]
+        )
+
+    def time_aperture_photometry(self, scale: float):  # pylint: disable=unused-argument
+        """Aperture photometry of sources"""
+        self.aperture_photometry.apply(self.get_batch())
+
+    def time_psf_photometry(self, scale: float):  # pylint: disable=unused-argument
+        """PSF photometry of sources"""
+        self.psf_photometry.apply(self.get_batch())
+
+
+class CrossMatch(SyntheticBenchmark):
+    """
+    Benchmark of assembling cross-match results into a source table
+    """
+
+    n_sources = 2000
+
+    def setup(self, scale: float):
+        super().setup(scale)
+        rng = np.random.default_rng(0)
+        n_sources = max(int(self.n_sources * scale), 10)
+        self.sources = pd.DataFrame(
+            {
+                "ra": rng.uniform(209.5, 210.5, n_sources),
+                "dec": rng.uniform(53.5, 54.5, n_sources),
+            }
+        )
+        self.metadata = dict(make_synthetic_header(BENCHMARK_INSTRUMENT))
+        self.processor = XMatch(
+            catalog=SyntheticXMatchCatalog(search_radius_arcmin=0.05, num_sources=3)
+        )
+
+    def time_xmatch(self, scale: float):  # pylint: disable=unused-argument
+        """Cross-match sources, with up to three matches each"""
+        self.processor.apply(
+            SourceBatch(
+                [SourceTable(self.sources.copy(), metadata=dict(self.metadata))]
+            )
+        )
+
+
+class LoadImages(SyntheticBenchmark):
+    """
+    Benchmark of loading a directory of raw images
+    """
+
+    n_images = 10
+
+    def setup(self, scale: float):
+        super().setup(scale)
+        images = make_synthetic_night(
+            BENCHMARK_INSTRUMENT,
+            n_bias=2,
+            n_dark=2,
+            n_flat=2,
+            n_science=self.n_images - 6,
+            scale=scale,
+            n_stars=50,
+        )
+        write_synthetic_images(images, self.output_dir)
+
+    def time_load_from_dir(self, scale: float):  # pylint: disable=unused-argument
+        """Load raw images, checking their headers"""
+        load_from_dir(self.output_dir, open_f=open_raw_image)
+
+
+class CacheIO(SyntheticBenchmark):
+    """
+    Benchmark of writing image data to, and reading it from, the cache
+    """
+
+    n_images = 10
+
+    def setup(self, scale: float):
+        super().setup(scale)
+        bias = make_synthetic_image(
+            BENCHMARK_INSTRUMENT, obsclass="bias", scale=scale
+        ).get_data()
+        self.data = [bias + i for i in range(self.n_images)]
+        self.header = make_synthetic_header(BENCHMARK_INSTRUMENT, shape=bias.shape)
+        self.images = [Image(data, self.header.copy()) for data in self.data]
+
+    def time_write(self, scale: float):  # pylint: disable=unused-argument
+        """Create images, writing their data to the cache"""
+        for data in self.data:
+            Image(data, self.header.copy())
+
+    def time_read(self, scale: float):  # pylint: disable=unused-argument
+        """Read and sum the data of existing images"""
+        for image in self.images:
+            np.sum(image.get_data())
+
+
+BENCHMARKS = [
+    CalibrationCombine,
+    SplitImages,
+    ZOGYSubtraction,
+    Photometry,
+    CrossMatch,
+    LoadImages,
+    CacheIO,
+]
@@ -0,0 +1,353 @@
+"""
+Module for generating synthetic images, with no network access needed.
+
+Images mimic the sizes, headers and content of WINTER and SUMMER data:
+a star field convolved with a PSF, on a sky background, multiplied by a flat
+field, with bias, dark current and noise added. Bias, dark and flat frames
+can be generated in the same way, so that whole nights of data can be
+reduced with the calibration processors.
+"""
+
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+from astropy.io.fits import Header
+from astropy.time import Time, TimeDelta
+from astropy.wcs import WCS
+
+from mirar.data import Image, ImageBatch
+from mirar.io import save_fits
+from mirar.paths import (
+    BASE_NAME_KEY,
+    COADD_KEY,
+    EXPTIME_KEY,
+    FILTER_KEY,
+    GAIN_KEY,
+    LATEST_SAVE_KEY,
+    OBSCLASS_KEY,
+    PROC_FAIL_KEY,
+    PROC_HISTORY_KEY,
+    RAW_IMG_KEY,
+    SATURATE_KEY,
+    TARGET_KEY,
+    TIME_KEY,
+    XPOS_KEY,
+    YPOS_KEY,
+    core_fields,
+)
+
+logger = logging.getLogger(__name__)
+
+# Approximate properties of the raw data of each instrument
+SYNTHETIC_INSTRUMENTS = {
+    "winter": {
+        "shape": (1096, 1984),
+        "pixel_scale_arcsec": 1.12,
+        "gain": 1.0,
+        "saturate": 40000.0,
+        "bias_level": 1000.0,
+        "dark_rate": 5.0,
+        "read_noise": 15.0,
+        "sky_rate": 50.0,
+        "fwhm_pix": 2.5,
+        "filters": ["J", "Hs"],
+        "extra_keys": {"BOARD_ID": 2, "INSTRUME": "WINTER"},
+    },
+    "summer": {
+        "shape": (2048, 2048),
+        "pixel_scale_arcsec": 0.466,
+        "gain": 1.0,
+        "saturate": 60000.0,
+        "bias_level": 2000.0,
+        "dark_rate": 0.05,
+        "read_noise": 8.0,
+        "sky_rate": 10.0,
+        "fwhm_pix": 4.0,
+        "filters": ["r", "g"],
+        "extra_keys": {"INSTRUME": "SUMMER"},
+    },
+}
+
+OBS_CLASSES = ["bias", "dark", "flat", "science"]
+
+
+def get_shape(instrument: str, scale: float = 1.0) -> tuple[int, int]:
+    """
+    Get the image shape of an instrument, scaled down (or up) in each axis.
+    Shapes are kept even, as required e.g. by ZOGY.
+
+    :param instrument: instrument name
+    :param scale: scale factor for each axis
+    :return: image shape
+    """
+    shape = SYNTHETIC_INSTRUMENTS[instrument]["shape"]
+    return tuple(max(2 * int(x * scale / 2), 2) for x in shape)
+
+
+def make_psf(fwhm_pix: float, size: int = 25) -> np.ndarray:
+    """
+    Make a normalised Gaussian PSF
+
+    :param fwhm_pix: full width at half maximum, in pixels
+    :param size: side length of the (odd-sized) PSF array
+    :return: PSF array
+    """
+    size = size + 1 - (size % 2)
+    sigma = fwhm_pix / (2.0 * np.sqrt(2.0 * np.log(2.0)))
+    coords = np.arange(size) - size // 2
+    psf_x, psf_y = np.meshgrid(coords, coords)
+    psf = np.exp(-(psf_x**2 + psf_y**2) / (2.0 * sigma**2))
+    return psf / np.sum(psf)
+
+
+def write_psf_file(path: Path | str, fwhm_pix: float, size: int = 25) -> Path:
+    """
+    Write a PSF model to a FITS file, as read by PSF photometry
+
+    :param path: output path
+    :param fwhm_pix: full width at half maximum, in pixels
+    :param size: side length of the PSF array
+    :return: output path
+    """
+    path = Path(path)
+    fits.PrimaryHDU(make_psf(fwhm_pix, size=size)).writeto(path, overwrite=True)
+    return path
+
+
+def make_star_field(
+    shape: tuple[int, int],
+    n_stars: int,
+    fwhm_pix: float,
+    rng: np.random.Generator,
+    min_flux: float = 1.0e3,
+    max_flux: float = 1.0e6,
+    edge: int = 25,
+) -> tuple[np.ndarray, pd.DataFrame]:
+    """
+    Make an image of Gaussian stars, with a power-law distribution of fluxes
+
+    :param shape: image shape
+    :param n_stars: number of stars
+    :param fwhm_pix: full width at half maximum, in pixels
+    :param rng: random number generator
+    :param min_flux: minimum total flux of a star
+    :param max_flux: maximum total flux of a star
+    :param edge: minimum distance of stars from the image edge
+    :return: image of stars, and table of star positions and fluxes
+    """
+    data = np.zeros(shape)
+
+    edge = min(edge, min(shape) // 4)
+    x_pos = rng.uniform(edge, shape[1] - edge, n_stars)
+    y_pos = rng.uniform(edge, shape[0] - edge, n_stars)
+    fluxes = min_flux * (max_flux / min_flux) ** rng.random(n_stars) ** 3
+
+    sigma = fwhm_pix / (2.0 * np.sqrt(2.0 * np.log(2.0)))
+    half_size = int(np.ceil(4 * sigma))
+    offsets = np.arange(-half_size, half_size + 1)
+
+    for x_cen, y_cen, flux in zip(x_pos, y_pos, fluxes):
+        x_0, y_0 = int(round(x_cen)), int(round(y_cen))
+        cols = np.clip(x_0 + offsets, 0, shape[1] - 1)
+        rows = np.clip(y_0 + offsets, 0, shape[0] - 1)
+        profile_x = np.exp(-((cols - x_cen) ** 2) / (2.0 * sigma**2))
+        profile_y = np.exp(-((rows - y_cen) ** 2) / (2.0 * sigma**2))
+        stamp = np.outer(profile_y, profile_x)
+        data[np.ix_(rows, cols)] += flux * stamp / (2.0 * np.pi * sigma**2)
+
+    stars = pd.DataFrame({XPOS_KEY: x_pos, YPOS_KEY: y_pos, "flux": fluxes})
+    return data, stars
+
+
+def make_flat_field(shape: tuple[int, int]) -> np.ndarray:
+    """
+    Make a smooth flat field, with vignetting towards the corners
+
+    :param shape: image shape
+    :return: flat field, normalised to 1 at the centre
+    """
+    rows = np.linspace(-1.0, 1.0, shape[0])[:, None]
+    cols = np.linspace(-1.0, 1.0, shape[1])[None, :]
+    return 1.0 - 0.1 * (rows**2 + cols**2) + 0.02 * cols
+
+
+def make_synthetic_header(
+    instrument: str = "winter",
+    obsclass: str = "science",
+    index: int = 0,
+    shape: Optional[tuple[int, int]] = None,
+    exptime: float = 60.0,
+    filter_name: Optional[str] = None,
+    date: str = "2023-06-01T04:00:00",
+    ra_deg: float = 210.0,
+    dec_deg: float = 54.0,
+) -> Header:
+    """
+    Make a header with the core fields expected by mirar, and a WCS
+
+    :param instrument: instrument name, a key of SYNTHETIC_INSTRUMENTS
+    :param obsclass: observation class, one of OBS_CLASSES
+    :param index: image number, used to make unique names and times
+    :param shape: image shape (default, the shape of the instrument)
+    :param exptime: exposure time in seconds
+    :param filter_name: filter (default, the first filter of the instrument)
+    :param date: observation time of the first image
+    :param ra_deg: right ascension of the image centre
+    :param dec_deg: declination of the image centre
+    :return: header
+    """
+    properties = SYNTHETIC_INSTRUMENTS[instrument]
+    shape = properties["shape"] if shape is None else shape
+    filter_name = properties["filters"][0] if filter_name is None else filter_name
+
+    wcs = WCS(naxis=2)
+    wcs.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    wcs.wcs.crpix = [shape[1] / 2.0, shape[0] / 2.0]
+    wcs.wcs.crval = [ra_deg, dec_deg]
+    wcs.wcs.cdelt = np.array([-1.0, 1.0]) * properties["pixel_scale_arcsec"] / 3600.0
+
+    header = wcs.to_header()
+
+    base_name = f"{instrument}_{obsclass}_{index:04d}.fits"
+    header[BASE_NAME_KEY] = base_name
+    header[RAW_IMG_KEY] = f"/synthetic/raw/{base_name}"
+    header[LATEST_SAVE_KEY] = header[RAW_IMG_KEY]
+    header[OBSCLASS_KEY] = obsclass
+    header[TARGET_KEY] = obsclass if obsclass != "science" else "field_1"
+    header[TIME_KEY] = (Time(date) + TimeDelta(index * exptime, format="sec")).isot
+    header[EXPTIME_KEY] = exptime
+    header[FILTER_KEY] = filter_name
+    header[COADD_KEY] = 1
+    header[GAIN_KEY] = properties["gain"]
+    header[SATURATE_KEY] = properties["saturate"]
+    header[PROC_HISTORY_KEY] = ""
+    header[PROC_FAIL_KEY] = ""
+    for key, value in properties["extra_keys"].items():
+        header[key] = value
+
+    for key in core_fields:
+        if key not in header:
+            header[key] = ""
+
+    return header
+
+
+def make_synthetic_image(
+    instrument: str = "winter",
+    obsclass: str = "science",
+    index: int = 0,
+    scale: float = 1.0,
+    n_stars: int = 500,
+    exptime: Optional[float] = None,
+    filter_name: Optional[str] = None,
+    seed: Optional[int] = None,
+) -> Image:
+    """
+    Make a synthetic raw image
+
+    :param instrument: instrument name, a key of SYNTHETIC_INSTRUMENTS
+    :param obsclass: observation class, one of OBS_CLASSES
+    :param index: image number, used to make unique names and times
+    :param scale: scale factor for each axis of the image shape
+    :param n_stars: number of stars (for science images)
+    :param exptime: exposure time (default 0 for biases, 60s otherwise)
+    :param filter_name: filter (default, the first filter of the instrument)
+    :param seed: seed for the random number generator (default, the index)
+    :return: image
+    """
+    properties = SYNTHETIC_INSTRUMENTS[instrument]
+    rng = np.random.default_rng(index if seed is None else seed)
+    shape = get_shape(instrument, scale=scale)
+
+    if exptime is None:
+        exptime = 0.0 if obsclass == "bias" else 60.0
+
+    signal = np.zeros(shape)
+    if obsclass == "science":
+        stars, _ = make_star_field(
+            shape, n_stars=n_stars, fwhm_pix=properties["fwhm_pix"], rng=rng
+        )
+        signal = (stars + properties["sky_rate"] * exptime) * make_flat_field(shape)
+    elif obsclass == "flat":
+        signal = 20000.0 * make_flat_field(shape)
+
+    electrons = rng.poisson(np.clip(signal, 0.0, None)).astype(float)
+    electrons += rng.poisson(properties["dark_rate"] * exptime, size=shape)
+    data = (
+        properties["bias_level"]
+        + electrons / properties["gain"]
+        + rng.normal(0.0, properties["read_noise"], size=shape)
+    )
+
+    header = make_synthetic_header(
+        instrument=instrument,
+        obsclass=obsclass,
+        index=index,
+        shape=shape,
+        exptime=exptime,
+        filter_name=filter_name,
+    )
+
+    return Image(data, header)
+
+
+def make_synthetic_night(
+    instrument: str = "winter",
+    n_bias: int = 5,
+    n_dark: int = 5,
+    n_flat: int = 5,
+    n_science: int = 5,
+    scale: float = 1.0,
+    n_stars: int = 500,
+) -> ImageBatch:
+    """
+    Make a batch of synthetic calibration and science images
+
+    :param instrument: instrument name, a key of SYNTHETIC_INSTRUMENTS
+    :param n_bias: number of bias frames
+    :param n_dark: number of dark frames
+    :param n_flat: number of flat frames
+    :param n_science: number of science frames
+    :param scale: scale factor for each axis of the image shape
+    :param n_stars: number of stars in each science image
+    :return: batch of images
+    """
+    batch = ImageBatch()
+    index = 0
+    for obsclass, n_images in zip(OBS_CLASSES, [n_bias, n_dark, n_flat, n_science]):
+        for _ in range(n_images):
+            batch.append(
+                make_synthetic_image(
+                    instrument=instrument,
+                    obsclass=obsclass,
+                    index=index,
+                    scale=scale,
+                    n_stars=n_stars,
+                )
+            )
+            index += 1
+    return batch
+
+
+def write_synthetic_images(images: ImageBatch, output_dir: Path | str) -> list[Path]:
+    """
+    Write images to FITS files, updating their save paths
+
+    :param images: images to write
+    :param output_dir: output directory
+    :return: list of paths
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for image in images:
+        path = output_dir.joinpath(image[BASE_NAME_KEY])
+        image[RAW_IMG_KEY] = path.as_posix()
+        save_fits(image, path)
+        paths.append(path)
+    return paths
@@ -5,10 +5,14 @@ Module for Catalog base class
 import logging
 from abc import ABC
 from pathlib import Path
-from typing import Type
+from typing import Optional, Type
 
 import astropy.table
 
+from mirar.catalog.base.catalog_cache import (
+    REF_CATALOG_CACHE_DIR,
+    get_catalog_tile_cache,
+)
 from mirar.catalog.base.errors import CatalogCacheError
 from mirar.data import Image
 from mirar.data.utils import get_image_center_wcs_coords
@@ -50,6 +54,9 @@ class BaseCatalog(ABCatalog, ABC):
         Users need to add this to the image header themselves. e.g. For winter,
         we use a CustomImageModifer to add this key to the header, as our catalogs are
         cached by field-id, subdet-id and filter.
+        tile_cache_dir: Directory of the sky-tiled cache of the catalog
+        (see :mod:`mirar.catalog.base.catalog_cache`), shared by every magnitude
+        range and filter, for backends which support it. None to disable.
     """
 
     def __init__(
@@ -60,6 +67,7 @@ class BaseCatalog(ABCatalog, ABC):
         filter_name: str,
         cache_catalog_locally: bool = False,
         catalog_cachepath_key: str = REF_CAT_PATH_KEY,
+        tile_cache_dir: Optional[Path | str] = REF_CATALOG_CACHE_DIR,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -68,6 +76,57 @@ class BaseCatalog(ABCatalog, ABC):
         self.filter_name = filter_name
         self.cache_catalog_locally = cache_catalog_locally
         self.catalog_cachepath_key = catalog_cachepath_key
+        self.tile_cache = (
+            get_catalog_tile_cache(tile_cache_dir)
+            if tile_cache_dir is not None
+            else None
+        )
+
+    def get_cache_key(self) -> dict:
+        """
+        Get the properties of the catalog which determine the sources returned by
+        query_region, used to key the tile cache. Magnitude and quality cuts
+        applied locally are not part of the key.
+
+        :return: dictionary
+        """
+        return {"catalog": type(self).__name__, "abbreviation": self.abbreviation}
+
+    def get_coordinate_keys(self) -> tuple[str, str]:
+        """
+        Get the keys of RA and Dec in the tables returned by query_region
+
+        :return: RA key, Dec key
+        """
+        raise NotImplementedError()
+
+    def query_region(
+        self, ra_deg: float, dec_deg: float, radius_deg: float
+    ) -> astropy.table.Table:
+        """
+        Query every source within a radius of ra/dec, without any magnitude
+        or quality cuts, to fill the tile cache
+
+        :param ra_deg: RA
+        :param dec_deg: Dec
+        :param radius_deg: Radius in degrees
+        :return: Catalog
+        """
+        raise NotImplementedError()
+
+    def get_region(self, ra_deg: float, dec_deg: float) -> astropy.table.Table:
+        """
+        Returns every source within the search radius of ra/dec, without any
+        magnitude or quality cuts, from the tile cache if enabled
+
+        :param ra_deg: RA
+        :param dec_deg: Dec
+        :return: Catalog
+        """
+        radius_deg = self.search_radius_arcmin / 60.0
+        if self.tile_cache is not None:
+            return self.tile_cache.get_region(self, ra_deg, dec_deg, radius_deg)
+        return self.query_region(ra_deg, dec_deg, radius_deg)
 
     def get_catalog(self, ra_deg: float, dec_deg: float) -> astropy.table.Table:
         """
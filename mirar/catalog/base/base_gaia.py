@@ -116,7 +116,9 @@ class BaseGaia2Mass(BaseCatalog, ABC):
                 logger.error(err)
                 raise ValueError(err)
 
-            image_catalog = get_table_from_ldac(self.image_catalog_path)
+            image_catalog = get_table_from_ldac(
+                self.image_catalog_path, columns=["ALPHAWIN_J2000", "DELTAWIN_J2000"]
+            )
             src_list = self.trim_catalog(src_list, image_catalog)
             logger.debug(f"Trimmed to {len(src_list)} sources in Gaia")
 
@@ -3,8 +3,11 @@ Base Catalog for crossmatching
 """
 
 from abc import ABC
+from pathlib import Path
+from typing import Optional
 
 from mirar.catalog.base.base_catalog import ABCatalog
+from mirar.catalog.base.xmatch_cache import XMATCH_CACHE_DIR, XMatchTileCache
 
 
 class BaseXMatchCatalog(ABCatalog, ABC):
@@ -54,10 +57,50 @@ class BaseXMatchCatalog(ABCatalog, ABC):
         """
         raise NotImplementedError
 
-    def __init__(self, *args, num_sources: int = 1, **kwargs):
+    def __init__(
+        self,
+        *args,
+        num_sources: int = 1,
+        tile_cache_dir: Optional[Path | str] = XMATCH_CACHE_DIR,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.search_radius_arcsec = self.search_radius_arcmin * 60.0
         self.num_sources = num_sources
+        self.tile_cache = (
+            XMatchTileCache(tile_cache_dir) if tile_cache_dir is not None else None
+        )
+
+    def get_cache_key(self) -> dict:
+        """
+        Get the properties of the catalog which determine the rows it returns,
+        used to key the tile cache
+
+        :return: dictionary
+        """
+        return {"catalog_name": self.catalog_name, "projection": self.projection}
+
+    def get_coordinate_keys(self) -> tuple[str, str]:
+        """
+        Get the keys of RA and Dec in the rows returned by the catalog
+
+        :return: RA key, Dec key
+        """
+        inverse_names = {v: k for k, v in self.column_names.items()}
+        return (
+            inverse_names[self.ra_column_name],
+            inverse_names[self.dec_column_name],
+        )
+
+    def query_tiles(self, coords: dict, radius_deg: float) -> dict:
+        """
+        Query every catalog row within a radius of coords, to fill the tile cache
+
+        :param coords: ra/dec
+        :param radius_deg: radius in degrees
+        :return: catalog rows
+        """
+        raise NotImplementedError
 
     def query(self, coords: dict) -> dict:
         """
@@ -0,0 +1,235 @@
+"""
+Module for a local, tiled cache of reference catalogs.
+
+Reference catalogs (e.g. Gaia/2MASS, PS1) are queried from Vizier or TAP for
+every image, by each of the processors which need them (Scamp, astrometry
+statistics, photometric calibration), although the same fields are observed
+night after night. The :class:`~mirar.catalog.base.catalog_cache.CatalogTileCache`
+instead stores every source of each sky tile on disk, without any magnitude or
+quality cuts, and builds the cone of any (ra, dec, radius) from the cached
+tiles. Catalogs then apply their cuts locally, so a single cache serves every
+magnitude range and filter. The remote catalog is only queried for tiles which
+are missing, or older than a time-to-live.
+
+Tiles are stored as FITS tables, in a directory for each catalog (and any
+server-side filters it applies), using the sky tiling of
+:class:`~mirar.catalog.base.tile_cache.SkyTiling`.
+Caches are shared between catalog objects using the same directory, so tiles
+loaded for one processor are reused by the next. The cache is enabled by
+setting a directory, which can be pre-warmed for the fields of a night with
+:func:`prewarm_catalog_tiles`:
+
+.. code-block:: bash
+
+    export REF_CATALOG_CACHE_DIR=/path/to/catalog/cache
+    export REF_CATALOG_CACHE_TILE_DEG=0.5
+    export REF_CATALOG_CACHE_TTL_DAYS=30
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from astropy.table import Table, vstack
+
+from mirar.catalog.base.errors import CatalogCacheError
+from mirar.catalog.base.tile_cache import BaseTileCache, radec_to_xyz
+
+logger = logging.getLogger(__name__)
+
+REF_CATALOG_CACHE_DIR: str | None = os.getenv("REF_CATALOG_CACHE_DIR")
+REF_CATALOG_CACHE_TILE_DEG: float = float(
+    os.getenv("REF_CATALOG_CACHE_TILE_DEG", "0.5")
+)
+REF_CATALOG_CACHE_TTL_DAYS: float = float(os.getenv("REF_CATALOG_CACHE_TTL_DAYS", "30"))
+
+
+def get_table_mask(condition: np.ndarray) -> np.ndarray:
+    """
+    Convert a (possibly masked) boolean condition on table columns to a mask,
+    treating masked values as failing the condition, as remote queries do
+
+    :param condition: boolean array
+    :return: boolean mask
+    """
+    return np.asarray(np.ma.filled(condition, False), dtype=bool)
+
+
+class CatalogTileCache(BaseTileCache):
+    """
+    Local cache of reference catalog tiles, used to build catalog cones.
+
+    Catalogs using the cache must provide ``get_cache_key``,
+    ``get_coordinate_keys`` and ``query_region`` (see
+    :class:`~mirar.catalog.base.base_catalog.BaseCatalog`).
+    """
+
+    tile_extension = ".fits"
+
+    def __init__(
+        self,
+        cache_dir: Path | str,
+        tile_size_deg: float = REF_CATALOG_CACHE_TILE_DEG,
+        ttl_days: float = REF_CATALOG_CACHE_TTL_DAYS,
+        max_loaded_tiles: int = 64,
+    ):
+        super().__init__(
+            cache_dir,
+            tile_size_deg=tile_size_deg,
+            ttl_days=ttl_days,
+            max_loaded_tiles=max_loaded_tiles,
+        )
+        self.n_regions = 0
+
+    @staticmethod
+    def get_catalog_name(catalog) -> str:
+        return catalog.abbreviation
+
+    @staticmethod
+    def read_tile(path: Path) -> Table:
+        return Table.read(path, format="fits")
+
+    @staticmethod
+    def save_tile(table: Table, path: Path):
+        """
+        Save a tile to a file, replacing any previous version atomically
+
+        :param table: sources of the tile
+        :param path: path of tile
+        :return: None
+        """
+        table = Table(table, copy=False)
+        table.meta = {}
+        for col in table.itercols():
+            if col.dtype.kind == "O":
+                table[col.name] = col.astype(str)
+
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp.fits")
+        table.write(temp_path, format="fits", overwrite=True)
+        os.replace(temp_path, path)
+
+    def update_tiles(self, catalog, tiles: set) -> int:
+        catalog_dir = self.get_catalog_dir(catalog)
+        missing = self.get_missing_tiles(catalog_dir, tiles)
+        ra_key, dec_key = catalog.get_coordinate_keys()
+
+        for tile in missing:
+            ra_deg, dec_deg, radius_deg = self.tiling.get_tile_cone(tile)
+            logger.debug(
+                f"Fetching tile {tile} of {catalog.abbreviation} from remote catalog"
+            )
+            table = catalog.query_region(ra_deg, dec_deg, radius_deg)
+
+            if len(table.colnames) == 0:
+                table = Table({ra_key: np.zeros(0), dec_key: np.zeros(0)})
+
+            # Keep only sources in this tile, as the cone covers neighbours too
+            in_tile = np.array(
+                [
+                    x == tile
+                    for x in self.tiling.get_tiles(
+                        np.asarray(table[ra_key], dtype=float),
+                        np.asarray(table[dec_key], dtype=float),
+                    )
+                ],
+                dtype=bool,
+            )
+            self.save_tile(table[in_tile], self.get_tile_path(catalog_dir, tile))
+            self.n_tiles_fetched += 1
+
+        return len(missing)
+
+    def get_region(
+        self, catalog, ra_deg: float, dec_deg: float, radius_deg: float
+    ) -> Table:
+        """
+        Get every source of a catalog within a radius of a position, as a remote
+        cone query without any magnitude or quality cuts would
+
+        :param catalog: reference catalog
+        :param ra_deg: RA of cone centre in degrees
+        :param dec_deg: Dec of cone centre in degrees
+        :param radius_deg: radius of cone in degrees
+        :return: table of sources (a new table, which can be modified freely)
+        """
+        tiles = self.tiling.get_disc_tiles(ra_deg, dec_deg, radius_deg)
+        loaded = self.load_tiles(catalog, tiles)
+        self.n_regions += 1
+
+        table = vstack(loaded, metadata_conflicts="silent")
+
+        ra_key, dec_key = catalog.get_coordinate_keys()
+        cos_dists = radec_to_xyz(
+            np.asarray(table[ra_key], dtype=float),
+            np.asarray(table[dec_key], dtype=float),
+        ).reshape(-1, 3) @ radec_to_xyz(ra_deg, dec_deg)
+        table = table[cos_dists >= np.cos(np.deg2rad(radius_deg))]
+
+        logger.debug(
+            f"Found {len(table)} sources of {catalog.abbreviation} "
+            f"in {len(tiles)} cached tiles"
+        )
+        return table
+
+    def get_stats(self) -> dict:
+        return {**super().get_stats(), "n_regions": self.n_regions}
+
+
+_tile_caches: dict[tuple, CatalogTileCache] = {}
+_tile_caches_lock = threading.Lock()
+
+
+def get_catalog_tile_cache(
+    cache_dir: Path | str,
+    tile_size_deg: float = REF_CATALOG_CACHE_TILE_DEG,
+    ttl_days: float = REF_CATALOG_CACHE_TTL_DAYS,
+) -> CatalogTileCache:
+    """
+    Get the tile cache for a directory, shared by every catalog using it,
+    so that tiles loaded for one processor are reused by the next
+
+    :param cache_dir: directory for tiles
+    :param tile_size_deg: size of tiles in degrees
+    :param ttl_days: days after which tiles are fetched again (0 to keep forever)
+    :return: tile cache
+    """
+    key = (Path(cache_dir).resolve(), tile_size_deg, ttl_days)
+    with _tile_caches_lock:
+        if key not in _tile_caches:
+            _tile_caches[key] = CatalogTileCache(
+                cache_dir, tile_size_deg=tile_size_deg, ttl_days=ttl_days
+            )
+        return _tile_caches[key]
+
+
+def prewarm_catalog_tiles(
+    catalogs: list,
+    ra_deg: list[float] | np.ndarray,
+    dec_deg: list[float] | np.ndarray,
+    radius_deg: float,
+) -> int:
+    """
+    Fetch the tiles of reference catalogs covering a list of fields,
+    e.g. those scheduled for the night, so that later processing
+    needs no remote queries
+
+    :param catalogs: reference catalogs, with a tile cache
+    :param ra_deg: RA of field centres in degrees
+    :param dec_deg: Dec of field centres in degrees
+    :param radius_deg: radius of fields in degrees
+    :return: number of tiles fetched
+    """
+    n_fetched = 0
+    for catalog in catalogs:
+        if catalog.tile_cache is None:
+            err = (
+                f"Catalog {catalog.abbreviation} has no tile cache, "
+                f"set REF_CATALOG_CACHE_DIR to use one."
+            )
+            logger.error(err)
+            raise CatalogCacheError(err)
+
+        n_fetched += catalog.tile_cache.prewarm(catalog, ra_deg, dec_deg, radius_deg)
+    return n_fetched
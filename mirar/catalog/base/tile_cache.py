@@ -0,0 +1,407 @@
+"""
+Module with the sky tiling and file handling shared by the local tile caches
+of catalogs (see :mod:`~mirar.catalog.base.catalog_cache` and
+:mod:`~mirar.catalog.base.xmatch_cache`).
+
+The sky is split into bands of declination, each divided into cells of right
+ascension of roughly equal area. Each cache stores the sources of a tile in
+one file, in a directory for each catalog (and any settings which change the
+sources returned by the remote catalog). Tiles older than a time-to-live are
+fetched again, and recently-used tiles are kept in memory.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from astropy.coordinates import SkyCoord
+
+from mirar.catalog.base.errors import CatalogCacheError
+
+logger = logging.getLogger(__name__)
+
+
+def radec_to_xyz(ra_deg: np.ndarray, dec_deg: np.ndarray) -> np.ndarray:
+    """
+    Convert coordinates to unit vectors
+
+    :param ra_deg: RA in degrees
+    :param dec_deg: Dec in degrees
+    :return: array of shape (n, 3)
+    """
+    ra_rad, dec_rad = np.deg2rad(ra_deg), np.deg2rad(dec_deg)
+    return np.stack(
+        [
+            np.cos(dec_rad) * np.cos(ra_rad),
+            np.cos(dec_rad) * np.sin(ra_rad),
+            np.sin(dec_rad),
+        ],
+        axis=-1,
+    )
+
+
+class SkyTiling:
+    """
+    Tiling of the sky in bands of declination, each divided into cells of
+    right ascension no wider than the tile size at the band edge nearest
+    the equator
+    """
+
+    def __init__(self, tile_size_deg: float):
+        """
+        :param tile_size_deg: height of each band of declination, in degrees
+        """
+        self.tile_size_deg = tile_size_deg
+        self.n_bands = int(np.ceil(180.0 / tile_size_deg))
+
+    def get_n_cells(self, band: np.ndarray | int) -> np.ndarray:
+        """
+        Get the number of cells of right ascension in bands
+
+        :param band: band index
+        :return: number of cells
+        """
+        dec_low = -90.0 + np.asarray(band) * self.tile_size_deg
+        dec_high = np.minimum(dec_low + self.tile_size_deg, 90.0)
+        min_abs_dec = np.where(
+            (dec_low < 0.0) & (dec_high > 0.0),
+            0.0,
+            np.minimum(np.abs(dec_low), np.abs(dec_high)),
+        )
+        n_cells = np.floor(360.0 * np.cos(np.deg2rad(min_abs_dec)) / self.tile_size_deg)
+        return np.maximum(n_cells, 1).astype(int)
+
+    def get_tiles(self, ra_deg: np.ndarray, dec_deg: np.ndarray) -> list[tuple]:
+        """
+        Get the tile containing each position
+
+        :param ra_deg: RA in degrees
+        :param dec_deg: Dec in degrees
+        :return: list of (band, cell) tuples
+        """
+        bands = np.clip(
+            np.floor((np.asarray(dec_deg) + 90.0) / self.tile_size_deg).astype(int),
+            0,
+            self.n_bands - 1,
+        )
+        n_cells = self.get_n_cells(bands)
+        cells = np.minimum(
+            np.floor(np.mod(ra_deg, 360.0) * n_cells / 360.0).astype(int), n_cells - 1
+        )
+        return list(zip(bands.tolist(), cells.tolist()))
+
+    def get_disc_tiles(self, ra_deg: float, dec_deg: float, radius_deg: float) -> set:
+        """
+        Get every tile which may overlap a disc
+
+        :param ra_deg: RA of disc centre in degrees
+        :param dec_deg: Dec of disc centre in degrees
+        :param radius_deg: radius of disc in degrees
+        :return: set of (band, cell) tuples
+        """
+        band_low, band_high = [
+            int(np.clip(np.floor((x + 90.0) / self.tile_size_deg), 0, self.n_bands - 1))
+            for x in [dec_deg - radius_deg, dec_deg + radius_deg]
+        ]
+
+        tiles = set()
+        for band in range(band_low, band_high + 1):
+            n_cells = int(self.get_n_cells(band))
+            if abs(dec_deg) + radius_deg >= 90.0:
+                cells = range(n_cells)
+            else:
+                half_width = np.rad2deg(
+                    np.arcsin(
+                        min(
+                            np.sin(np.deg2rad(radius_deg))
+                            / np.cos(np.deg2rad(dec_deg)),
+                            1.0,
+                        )
+                    )
+                )
+                cell_low, cell_high = [
+                    int(np.floor(x * n_cells / 360.0))
+                    for x in [ra_deg - half_width, ra_deg + half_width]
+                ]
+                cells = {x % n_cells for x in range(cell_low, cell_high + 1)}
+            tiles.update((band, cell) for cell in cells)
+        return tiles
+
+    def get_tile_cone(self, tile: tuple) -> tuple[float, float, float]:
+        """
+        Get a cone containing a tile
+
+        :param tile: (band, cell) tuple
+        :return: RA and Dec of the cone centre, and cone radius, in degrees
+        """
+        band, cell = tile
+        n_cells = int(self.get_n_cells(band))
+        dec_low = -90.0 + band * self.tile_size_deg
+        dec_high = min(dec_low + self.tile_size_deg, 90.0)
+        ra_low, ra_high = 360.0 * cell / n_cells, 360.0 * (cell + 1) / n_cells
+        ra_centre, dec_centre = 0.5 * (ra_low + ra_high), 0.5 * (dec_low + dec_high)
+
+        # The tile boundary is furthest from the centre
+        edge = np.linspace(0.0, 1.0, 17)
+        boundary_ras = np.concatenate(
+            [
+                ra_low + edge * (ra_high - ra_low),
+                ra_low + edge * (ra_high - ra_low),
+                np.full(len(edge), ra_low),
+                np.full(len(edge), ra_high),
+            ]
+        )
+        boundary_decs = np.concatenate(
+            [
+                np.full(len(edge), dec_low),
+                np.full(len(edge), dec_high),
+                dec_low + edge * (dec_high - dec_low),
+                dec_low + edge * (dec_high - dec_low),
+            ]
+        )
+        radius = (
+            SkyCoord(ra_centre, dec_centre, unit="deg")
+            .separation(SkyCoord(boundary_ras, boundary_decs, unit="deg"))
+            .deg.max()
+        )
+        return ra_centre, dec_centre, 1.01 * radius
+
+
+class BaseTileCache(ABC):
+    """
+    Base class for local caches of catalog tiles.
+
+    Catalogs using a cache must provide ``get_cache_key`` and
+    ``get_coordinate_keys``, as well as the remote query used by the subclass.
+    """
+
+    # Extension of tile files
+    tile_extension: str = None
+
+    def __init__(
+        self,
+        cache_dir: Path | str,
+        tile_size_deg: float,
+        ttl_days: float,
+        max_loaded_tiles: int = 64,
+    ):
+        """
+        :param cache_dir: directory for tiles
+        :param tile_size_deg: size of tiles in degrees
+        :param ttl_days: days after which tiles are fetched again (0 to keep forever)
+        :param max_loaded_tiles: maximum number of tiles kept in memory
+        """
+        self.cache_dir = Path(cache_dir)
+        self.tiling = SkyTiling(tile_size_deg)
+        self.ttl_days = ttl_days
+        self.max_loaded_tiles = max_loaded_tiles
+        self._lock = threading.Lock()
+        self._loaded: OrderedDict[Path, tuple] = OrderedDict()
+        self.n_tiles_fetched = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_loaded"] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    @abstractmethod
+    def get_catalog_name(catalog) -> str:
+        """
+        Get the name of a catalog, used for its directory of tiles
+
+        :param catalog: catalog
+        :return: name
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_tiles(self, catalog, tiles: set) -> int:
+        """
+        Fetch any missing or expired tiles from the remote catalog
+
+        :param catalog: catalog
+        :param tiles: set of (band, cell) tuples
+        :return: number of tiles fetched
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    @abstractmethod
+    def read_tile(path: Path):
+        """
+        Read a tile from a file
+
+        :param path: path of tile
+        :return: tile
+        """
+        raise NotImplementedError
+
+    def get_catalog_dir(self, catalog) -> Path:
+        """
+        Get the directory of tiles for a catalog, which depends on the cache key
+        of the catalog, and the tile size
+
+        :param catalog: catalog
+        :return: directory
+        """
+        key = dict(catalog.get_cache_key())
+        key["tile_size_deg"] = self.tiling.tile_size_deg
+        key_str = json.dumps(key, sort_keys=True, default=str)
+        digest = hashlib.blake2b(key_str.encode(), digest_size=8).hexdigest()
+
+        catalog_dir = self.cache_dir.joinpath(
+            f"{self.get_catalog_name(catalog)}_{digest}"
+        )
+        if not catalog_dir.exists():
+            catalog_dir.mkdir(parents=True, exist_ok=True)
+            catalog_dir.joinpath("key.json").write_text(key_str, encoding="utf8")
+        return catalog_dir
+
+    def get_tile_path(self, catalog_dir: Path, tile: tuple) -> Path:
+        """
+        Get the path of a tile
+
+        :param catalog_dir: directory of tiles for a catalog
+        :param tile: (band, cell) tuple
+        :return: path
+        """
+        band, cell = tile
+        return catalog_dir.joinpath(f"tile_{band}_{cell}{self.tile_extension}")
+
+    def is_valid(self, path: Path) -> bool:
+        """
+        Check whether a tile exists, and is not older than the time-to-live
+
+        :param path: path of tile
+        :return: boolean
+        """
+        if not path.exists():
+            return False
+        if self.ttl_days <= 0:
+            return True
+        return (time.time() - path.stat().st_mtime) < self.ttl_days * 86400.0
+
+    def get_missing_tiles(self, catalog_dir: Path, tiles: set) -> list[tuple]:
+        """
+        Get the tiles which are missing or expired
+
+        :param catalog_dir: directory of tiles for a catalog
+        :param tiles: set of (band, cell) tuples
+        :return: sorted list of (band, cell) tuples
+        """
+        return sorted(
+            x for x in tiles if not self.is_valid(self.get_tile_path(catalog_dir, x))
+        )
+
+    def load_tile(self, path: Path):
+        """
+        Load a tile, reusing tiles already in memory if unchanged
+
+        :param path: path of tile
+        :return: tile
+        """
+        mtime = path.stat().st_mtime_ns
+        with self._lock:
+            loaded = self._loaded.get(path)
+            if (loaded is not None) and (loaded[0] == mtime):
+                self._loaded.move_to_end(path)
+                return loaded[1]
+
+        tile = self.read_tile(path)
+        with self._lock:
+            self._loaded[path] = (mtime, tile)
+            self._loaded.move_to_end(path)
+            while len(self._loaded) > self.max_loaded_tiles:
+                self._loaded.popitem(last=False)
+        return tile
+
+    def load_tiles(self, catalog, tiles: set) -> list:
+        """
+        Fetch any missing or expired tiles, then load every tile
+
+        :param catalog: catalog
+        :param tiles: set of (band, cell) tuples
+        :return: list of tiles, in sorted order
+        """
+        self.update_tiles(catalog, tiles)
+
+        catalog_dir = self.get_catalog_dir(catalog)
+        loaded = []
+        for tile in sorted(tiles):
+            path = self.get_tile_path(catalog_dir, tile)
+            if not path.exists():
+                err = (
+                    f"Tile {path} of {self.get_catalog_name(catalog)} "
+                    f"is missing from cache"
+                )
+                logger.error(err)
+                raise CatalogCacheError(err)
+            loaded.append(self.load_tile(path))
+        return loaded
+
+    def prewarm(
+        self,
+        catalog,
+        ra_deg: list[float] | np.ndarray,
+        dec_deg: list[float] | np.ndarray,
+        radius_deg: float,
+    ) -> int:
+        """
+        Fetch the tiles of a catalog covering a list of fields
+
+        :param catalog: catalog
+        :param ra_deg: RA of field centres in degrees
+        :param dec_deg: Dec of field centres in degrees
+        :param radius_deg: radius of fields in degrees
+        :return: number of tiles fetched
+        """
+        tiles = set()
+        for field_ra, field_dec in zip(ra_deg, dec_deg):
+            tiles.update(self.tiling.get_disc_tiles(field_ra, field_dec, radius_deg))
+        n_fetched = self.update_tiles(catalog, tiles)
+        logger.info(
+            f"Pre-warmed {len(tiles)} tiles of {self.get_catalog_name(catalog)}, "
+            f"fetching {n_fetched} from the remote catalog"
+        )
+        return n_fetched
+
+    def clear(self, catalog=None):
+        """
+        Deletes the cached tiles of a catalog, or of every catalog
+
+        :param catalog: catalog (default, all catalogs)
+        :return: None
+        """
+        catalog_dirs = (
+            [self.get_catalog_dir(catalog)]
+            if catalog is not None
+            else [x for x in self.cache_dir.glob("*") if x.is_dir()]
+        )
+        for catalog_dir in catalog_dirs:
+            for path in catalog_dir.glob(f"tile_*{self.tile_extension}"):
+                path.unlink(missing_ok=True)
+        with self._lock:
+            self._loaded = OrderedDict()
+
+    def get_stats(self) -> dict:
+        """
+        Summarise usage of the cache
+
+        :return: dictionary of statistics
+        """
+        return {
+            "n_tiles_fetched": self.n_tiles_fetched,
+            "n_loaded_tiles": len(self._loaded),
+        }
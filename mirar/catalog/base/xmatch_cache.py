@@ -0,0 +1,241 @@
+"""
+Module for a local, tiled cache of cross-match catalogs.
+
+Cross-matching against a remote catalog (e.g. Kowalski) sends a query for every
+source table, although the same fields are observed night after night.
+The :class:`~mirar.catalog.base.xmatch_cache.XMatchTileCache` instead stores
+the catalog rows of each sky tile on disk, and answers cross-match queries with
+a local nearest-neighbour search. The remote catalog is only queried for tiles
+which are missing, or older than a time-to-live.
+
+Tiles use the sky tiling of :class:`~mirar.catalog.base.tile_cache.SkyTiling`,
+and are stored as NumPy files, in a directory for each combination of catalog,
+projection and filter. The cache is enabled by setting a directory, which can
+be pre-warmed for the fields of a night with :func:`prewarm_xmatch_tiles`:
+
+.. code-block:: bash
+
+    export XMATCH_CACHE_DIR=/path/to/xmatch/cache
+    export XMATCH_CACHE_TILE_DEG=0.5
+    export XMATCH_CACHE_TTL_DAYS=30
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from mirar.catalog.base.errors import CatalogCacheError
+from mirar.catalog.base.tile_cache import BaseTileCache, radec_to_xyz
+
+logger = logging.getLogger(__name__)
+
+XMATCH_CACHE_DIR: str | None = os.getenv("XMATCH_CACHE_DIR")
+XMATCH_CACHE_TILE_DEG: float = float(os.getenv("XMATCH_CACHE_TILE_DEG", "0.5"))
+XMATCH_CACHE_TTL_DAYS: float = float(os.getenv("XMATCH_CACHE_TTL_DAYS", "30"))
+
+# Maximum number of tiles requested from the remote catalog at once
+MAX_TILES_PER_QUERY = 16
+
+
+class XMatchTile:
+    """
+    Catalog rows of a single tile, with their coordinates
+    """
+
+    def __init__(self, ra_deg: np.ndarray, dec_deg: np.ndarray, rows: np.ndarray):
+        """
+        :param ra_deg: RA of each row in degrees
+        :param dec_deg: Dec of each row in degrees
+        :param rows: JSON-encoded rows, as bytes
+        """
+        self.ra_deg = ra_deg
+        self.dec_deg = dec_deg
+        self.rows = rows
+
+    @classmethod
+    def load(cls, path: Path) -> "XMatchTile":
+        """
+        Load a tile from a file
+
+        :param path: path of tile
+        :return: XMatchTile
+        """
+        with np.load(path) as tile_file:
+            return cls(tile_file["ra"], tile_file["dec"], tile_file["rows"])
+
+    def save(self, path: Path):
+        """
+        Save a tile to a file, replacing any previous version atomically
+
+        :param path: path of tile
+        :return: None
+        """
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp.npz")
+        np.savez(temp_path, ra=self.ra_deg, dec=self.dec_deg, rows=self.rows)
+        os.replace(temp_path, path)
+
+
+class XMatchTileCache(BaseTileCache):
+    """
+    Local cache of catalog tiles, used to answer cross-match queries.
+
+    Catalogs using the cache must provide ``get_cache_key``,
+    ``get_coordinate_keys`` and ``query_tiles`` (see
+    :class:`~mirar.catalog.base.base_xmatch_catalog.BaseXMatchCatalog`).
+    """
+
+    tile_extension = ".npz"
+
+    def __init__(
+        self,
+        cache_dir: Path | str,
+        tile_size_deg: float = XMATCH_CACHE_TILE_DEG,
+        ttl_days: float = XMATCH_CACHE_TTL_DAYS,
+        max_loaded_tiles: int = 64,
+    ):
+        super().__init__(
+            cache_dir,
+            tile_size_deg=tile_size_deg,
+            ttl_days=ttl_days,
+            max_loaded_tiles=max_loaded_tiles,
+        )
+        self.n_remote_queries = 0
+
+    @staticmethod
+    def get_catalog_name(catalog) -> str:
+        return catalog.catalog_name
+
+    @staticmethod
+    def read_tile(path: Path) -> XMatchTile:
+        return XMatchTile.load(path)
+
+    def update_tiles(self, catalog, tiles: set) -> int:
+        catalog_dir = self.get_catalog_dir(catalog)
+        missing = self.get_missing_tiles(catalog_dir, tiles)
+        ra_key, dec_key = catalog.get_coordinate_keys()
+
+        for start in range(0, len(missing), MAX_TILES_PER_QUERY):
+            chunk = missing[start : start + MAX_TILES_PER_QUERY]
+            cones = [self.tiling.get_tile_cone(x) for x in chunk]
+            coords = {f"t{x[0]}_{x[1]}": [y[0], y[1]] for x, y in zip(chunk, cones)}
+            logger.debug(
+                f"Fetching {len(chunk)} tiles of {catalog.catalog_name} "
+                f"from remote catalog"
+            )
+            data = catalog.query_tiles(coords, radius_deg=max(x[2] for x in cones))
+            self.n_remote_queries += 1
+
+            for tile, name in zip(chunk, coords):
+                rows = [
+                    x
+                    for x in data.get(name, [])
+                    if (x.get(ra_key) is not None) & (x.get(dec_key) is not None)
+                ]
+                ra_deg = np.array([x[ra_key] for x in rows], dtype=float)
+                dec_deg = np.array([x[dec_key] for x in rows], dtype=float)
+
+                # Keep only rows in this tile, as the cone covers neighbours too
+                in_tile = np.array(
+                    [x == tile for x in self.tiling.get_tiles(ra_deg, dec_deg)],
+                    dtype=bool,
+                )
+                encoded = np.array(
+                    [json.dumps(x).encode() for x, y in zip(rows, in_tile) if y],
+                    dtype=bytes,
+                )
+                XMatchTile(ra_deg[in_tile], dec_deg[in_tile], encoded).save(
+                    self.get_tile_path(catalog_dir, tile)
+                )
+                self.n_tiles_fetched += 1
+
+        return len(missing)
+
+    def query(self, catalog, coords: dict) -> dict:
+        """
+        Cross-match positions with a catalog, as a remote 'near' query would,
+        returning up to catalog.num_sources rows within the search radius of
+        each position, nearest first
+
+        :param catalog: cross-match catalog
+        :param coords: dictionary of query name to [ra, dec]
+        :return: dictionary of query name to list of catalog rows
+        """
+        names = list(coords.keys())
+        if len(names) == 0:
+            return {}
+
+        query_ras = np.array([coords[x][0] for x in names], dtype=float)
+        query_decs = np.array([coords[x][1] for x in names], dtype=float)
+        radius_deg = catalog.search_radius_arcsec / 3600.0
+
+        tiles = set()
+        for ra_deg, dec_deg in zip(query_ras, query_decs):
+            tiles.update(self.tiling.get_disc_tiles(ra_deg, dec_deg, radius_deg))
+        loaded = self.load_tiles(catalog, tiles)
+
+        cat_ras = np.concatenate([x.ra_deg for x in loaded])
+        cat_decs = np.concatenate([x.dec_deg for x in loaded])
+        cat_rows = np.concatenate([x.rows for x in loaded])
+
+        results = {x: [] for x in names}
+        if len(cat_rows) == 0:
+            return results
+
+        tree = cKDTree(radec_to_xyz(cat_ras, cat_decs))
+        max_chord = 2.0 * np.sin(np.deg2rad(radius_deg) / 2.0)
+        dists, inds = tree.query(
+            radec_to_xyz(query_ras, query_decs),
+            k=list(range(1, catalog.num_sources + 1)),
+            distance_upper_bound=max_chord * (1.0 + 1.0e-12),
+        )
+        for name, query_dists, query_inds in zip(names, dists, inds):
+            results[name] = [
+                json.loads(cat_rows[ind])
+                for dist, ind in zip(query_dists, query_inds)
+                if np.isfinite(dist)
+            ]
+        return results
+
+    def get_stats(self) -> dict:
+        return {**super().get_stats(), "n_remote_queries": self.n_remote_queries}
+
+
+def prewarm_xmatch_tiles(
+    catalogs: list,
+    ra_deg: list[float] | np.ndarray,
+    dec_deg: list[float] | np.ndarray,
+    radius_deg: float,
+) -> int:
+    """
+    Fetch the tiles of cross-match catalogs covering a list of fields,
+    e.g. those scheduled for the night, so that later cross-matching
+    needs no remote queries
+
+    :param catalogs: cross-match catalogs, with a tile cache
+    :param ra_deg: RA of field centres in degrees
+    :param dec_deg: Dec of field centres in degrees
+    :param radius_deg: radius of fields in degrees
+    :return: number of tiles fetched
+    """
+    n_fetched = 0
+    for catalog in catalogs:
+        if catalog.tile_cache is None:
+            err = (
+                f"Catalog {catalog.catalog_name} has no tile cache, "
+                f"set XMATCH_CACHE_DIR to use one."
+            )
+            logger.error(err)
+            raise CatalogCacheError(err)
+
+        # Cross-matches near the edge of a field need tiles beyond it
+        n_fetched += catalog.tile_cache.prewarm(
+            catalog,
+            ra_deg,
+            dec_deg,
+            radius_deg + catalog.search_radius_arcsec / 3600.0,
+        )
+    return n_fetched
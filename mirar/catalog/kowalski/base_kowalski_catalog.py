@@ -130,17 +130,65 @@ class BaseKowalskiXMatch(BaseXMatchCatalog, ABC):
 
         return data[self.catalog_name]
 
-    def query(self, coords) -> dict:
+    def cone_query_kowalski(self, coords: dict, radius_arcsec: float) -> dict:
         """
-        Uses a Kowalski object to query for sources around coords
+        Performs a Kowalski query for all sources within a radius of coords
 
         :param coords: ra/dec
-        :return: crossmatch sources
+        :param radius_arcsec: radius in arcsec
+        :return: dict of sources around each coordinate
         """
+        query = {
+            "query_type": "cone_search",
+            "query": {
+                "object_coordinates": {
+                    "cone_search_radius": radius_arcsec,
+                    "cone_search_unit": "arcsec",
+                    "radec": coords,
+                },
+                "catalogs": {
+                    f"{self.catalog_name}": {
+                        "filter": self.kowalski_filter,
+                        "projection": self.projection,
+                    }
+                },
+            },
+            "kwargs": {
+                "max_time_ms": self.max_time_ms,
+            },
+        }
+        response = self.kowalski.query(query=query)
+        data = response.get("default").get("data")
+
+        return data[self.catalog_name]
+
+    def get_cache_key(self) -> dict:
+        key = super().get_cache_key()
+        key["filter"] = self.kowalski_filter
+        return key
+
+    def query_tiles(self, coords: dict, radius_deg: float) -> dict:
         if self.kowalski is None:
             self.kowalski = get_kowalski()
-        logger.debug("Querying kowalski")
-        data = self.near_query_kowalski(coords)
+        logger.debug("Querying kowalski for catalog tiles")
+        return self.cone_query_kowalski(coords, radius_arcsec=radius_deg * 3600.0)
+
+    def query(self, coords) -> dict:
+        """
+        Uses a Kowalski object to query for sources around coords,
+        or the local tile cache if enabled
+
+        :param coords: ra/dec
+        :return: crossmatch sources
+        """
+        if self.tile_cache is not None:
+            logger.debug("Querying local tile cache")
+            data = self.tile_cache.query(self, coords)
+        else:
+            if self.kowalski is None:
+                self.kowalski = get_kowalski()
+            logger.debug("Querying kowalski")
+            data = self.near_query_kowalski(coords)
         data = self.update_data(data)
         return data
 
@@ -8,6 +8,7 @@ import astropy.table
 from astroquery.gaia import Gaia
 
 from mirar.catalog.base.base_gaia import BaseGaia2Mass
+from mirar.catalog.base.catalog_cache import get_table_mask
 
 logger = logging.getLogger(__name__)
 
@@ -20,17 +21,32 @@ class Gaia2MassTAP(BaseGaia2Mass):
     Crossmatched Gaia/2Mass catalog
     """
 
-    def get_source_table(
+    def get_coordinate_keys(self) -> tuple[str, str]:
+        return "ra", "dec"
+
+    def get_query(
         self,
         ra_deg: float,
         dec_deg: float,
-    ) -> astropy.table.Table:
-        logger.debug(
-            f"Querying 2MASS - Gaia cross-match around RA {ra_deg:.4f}, "
-            f"Dec {dec_deg:.4f} with a radius of {self.search_radius_arcmin:.4f} arcmin"
-        )
+        radius_deg: float,
+        apply_mag_cuts: bool = True,
+    ) -> str:
+        """
+        Get the ADQL query for Gaia/2MASS sources around a given position
 
-        cmd = (
+        :param ra_deg: Right ascension in degrees
+        :param dec_deg: Declination in degrees
+        :param radius_deg: Radius in degrees
+        :param apply_mag_cuts: Whether to only select sources in the magnitude range
+        :return: ADQL query
+        """
+        mag_cuts = (
+            f"AND tmass.{self.filter_name}_m > {self.min_mag:.2f} "
+            f"AND tmass.{self.filter_name}_m < {self.max_mag:.2f} "
+            if apply_mag_cuts
+            else ""
+        )
+        return (
             f"SELECT * FROM gaiadr2.gaia_source AS g, "
             f"gaiadr2.tmass_best_neighbour AS tbest, "
             f"gaiadr1.tmass_original_valid AS tmass "
@@ -38,15 +54,42 @@ class Gaia2MassTAP(BaseGaia2Mass):
             f"AND tbest.tmass_oid = tmass.tmass_oid "
             f"AND CONTAINS(POINT('ICRS', g.ra, g.dec), "
             f"CIRCLE('ICRS', {ra_deg:.4f}, {dec_deg:.4f}, "
-            f"{self.search_radius_arcmin / 60:.4f}))=1 "
-            f"AND tmass.{self.filter_name}_m > {self.min_mag:.2f} "
-            f"AND tmass.{self.filter_name}_m < {self.max_mag:.2f} "
+            f"{radius_deg:.4f}))=1 "
+            f"{mag_cuts}"
             f"AND tbest.number_of_mates=0 "
             f"AND tbest.number_of_neighbours=1;"
         )
 
+    def query_region(
+        self, ra_deg: float, dec_deg: float, radius_deg: float
+    ) -> astropy.table.Table:
+        cmd = self.get_query(ra_deg, dec_deg, radius_deg, apply_mag_cuts=False)
         job = Gaia.launch_job_async(cmd, dump_to_file=False)
-        src_list = job.get_results()
+        return job.get_results()
+
+    def get_source_table(
+        self,
+        ra_deg: float,
+        dec_deg: float,
+    ) -> astropy.table.Table:
+        logger.debug(
+            f"Querying 2MASS - Gaia cross-match around RA {ra_deg:.4f}, "
+            f"Dec {dec_deg:.4f} with a radius of {self.search_radius_arcmin:.4f} arcmin"
+        )
+
+        if self.tile_cache is not None:
+            src_list = self.get_region(ra_deg, dec_deg)
+            mags = src_list[f"{self.filter_name}_m"]
+            src_list = src_list[
+                get_table_mask(
+                    (mags > float(f"{self.min_mag:.2f}"))
+                    & (mags < float(f"{self.max_mag:.2f}"))
+                )
+            ]
+        else:
+            cmd = self.get_query(ra_deg, dec_deg, self.search_radius_arcmin / 60)
+            job = Gaia.launch_job_async(cmd, dump_to_file=False)
+            src_list = job.get_results()
 
         src_list = self.convert_to_ab_mag(src_list)
 
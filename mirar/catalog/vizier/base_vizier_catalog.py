@@ -12,6 +12,7 @@ from astropy.table import Table
 from astroquery.vizier import Vizier
 
 from mirar.catalog.base.base_catalog import BaseCatalog
+from mirar.catalog.base.catalog_cache import get_table_mask
 from mirar.errors import ProcessorError
 
 
@@ -81,38 +82,106 @@ class VizierCatalog(BaseCatalog, ABC):
         """
         return {}
 
-    def get_catalog(self, ra_deg: float, dec_deg: float) -> astropy.table.Table:
-        logger.debug(
-            f"Querying {self.abbreviation} catalog around RA {ra_deg:.4f}, "
-            f"Dec {dec_deg:.4f} with a radius of {self.search_radius_arcmin:.4f} arcmin"
-        )
+    def get_coordinate_keys(self) -> tuple[str, str]:
+        return self.ra_key, self.dec_key
+
+    def get_cache_key(self) -> dict:
+        key = super().get_cache_key()
+        key["catalog_vizier_code"] = self.catalog_vizier_code
+        key["column_filters"] = self.get_column_filters()
+        return key
+
+    def query_vizier(
+        self,
+        ra_deg: float,
+        dec_deg: float,
+        radius_deg: float,
+        column_filters: dict,
+    ) -> astropy.table.Table:
+        """
+        Query Vizier for sources within a radius of ra/dec
 
+        :param ra_deg: RA
+        :param dec_deg: Dec
+        :param radius_deg: Radius in degrees
+        :param column_filters: Column filters to be applied by Vizier
+        :return: Table (with no columns if there are no sources)
+        """
         viz_cat = Vizier(
             columns=["*"],
-            column_filters={
-                f"{self.get_mag_key()}": f"{self.min_mag} .. {self.max_mag}",
-                f"{self.get_mag_error_key()}": f"<{1.086 / self.snr_threshold:.3f}",
-                **self.get_column_filters(),
-            },
+            column_filters=column_filters,
             row_limit=-1,
         )
 
         # pylint: disable=no-member
         query = viz_cat.query_region(
             SkyCoord(ra=ra_deg, dec=dec_deg, unit=(u.deg, u.deg)),
-            radius=str(self.search_radius_arcmin) + "m",
+            radius=radius_deg * u.deg,
             catalog=self.catalog_vizier_code,
             cache=False,
         )
 
         if len(query) == 0:
+            return Table()
+
+        return self.join_query(query)
+
+    def query_region(
+        self, ra_deg: float, dec_deg: float, radius_deg: float
+    ) -> astropy.table.Table:
+        return self.query_vizier(
+            ra_deg, dec_deg, radius_deg, column_filters=self.get_column_filters()
+        )
+
+    def apply_column_filters(self, table: astropy.table.Table) -> astropy.table.Table:
+        """
+        Applies the magnitude and SNR cuts of the Vizier query locally, to
+        sources from the tile cache
+
+        :param table: Table of sources
+        :return: Filtered table
+        """
+        if self.get_mag_key() not in table.colnames:
+            return table
+
+        mags = table[self.get_mag_key()]
+        mag_errs = table[self.get_mag_error_key()]
+        mask = get_table_mask(
+            (mags >= self.min_mag)
+            & (mags <= self.max_mag)
+            & (mag_errs < float(f"{1.086 / self.snr_threshold:.3f}"))
+        )
+        return table[mask]
+
+    def get_catalog(self, ra_deg: float, dec_deg: float) -> astropy.table.Table:
+        logger.debug(
+            f"Querying {self.abbreviation} catalog around RA {ra_deg:.4f}, "
+            f"Dec {dec_deg:.4f} with a radius of {self.search_radius_arcmin:.4f} arcmin"
+        )
+
+        if self.tile_cache is not None:
+            table = self.apply_column_filters(self.get_region(ra_deg, dec_deg))
+            if len(table) == 0:
+                # Treat no sources passing the cuts as an empty Vizier query
+                table = Table()
+        else:
+            table = self.query_vizier(
+                ra_deg,
+                dec_deg,
+                self.search_radius_arcmin / 60.0,
+                column_filters={
+                    f"{self.get_mag_key()}": f"{self.min_mag} .. {self.max_mag}",
+                    f"{self.get_mag_error_key()}": f"<{1.086 / self.snr_threshold:.3f}",
+                    **self.get_column_filters(),
+                },
+            )
+
+        if (len(table) == 0) & (self.get_mag_key() not in table.colnames):
             err = f"No matches found in the given radius in {self.abbreviation}"
             logger.error(err)
             self.check_coverage(ra_deg, dec_deg)
             return Table()
 
-        table = self.join_query(query)
-
         logger.debug(f"Table columns are: {table.colnames}")
         if self.get_mag_key() not in table.colnames:
             err = (
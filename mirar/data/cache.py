@@ -1,29 +1,109 @@
 """
 Central module for handling the cache, currently used only for storing image data.
+
+In cache mode, image data lives in npy files in the cache directory.
+The :class:`~mirar.data.cache.Cache` tracks the size of each file, and how many
+objects share it, and deletes files as soon as they are no longer used.
+It can enforce a disk quota, after which new files go to a secondary
+spill directory:
+
+.. code-block:: bash
+
+    export MAX_CACHE_DISK_MB=100000
+    export CACHE_SPILL_DIR=/path/to/bigger/disk
+
+Without a spill directory, creating a new file fails as soon as the quota is
+reached. Producers can instead wait for other threads to free space, up to
+a timeout, by setting CACHE_BLOCK_TIMEOUT (in seconds). This only helps when
+several batches are processed at once, as a single producer can never
+free space while it waits.
+
+A process-wide :class:`~mirar.data.cache.HotDataCache` can additionally hold
+recently-used image data in RAM, up to a configurable byte budget. Updated
+data is only written to disk when it is evicted from RAM, or when it
+must be shared with another process. The budget is set via an
+environment variable, and defaults to 0 (no data held in RAM):
+
+.. code-block:: bash
+
+    export MAX_CACHE_RAM_MB=4000
 """
 
 import logging
 import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 import numpy as np
 
+from mirar.profiling import profiler
+
 logger = logging.getLogger(__name__)
 
 USE_CACHE: bool = os.getenv("USE_WINTER_CACHE", "true") in ["true", "True", True]
 
+MAX_CACHE_RAM_BYTES: int = int(float(os.getenv("MAX_CACHE_RAM_MB", "0")) * 1024**2)
+
+MAX_CACHE_DISK_BYTES: int = int(float(os.getenv("MAX_CACHE_DISK_MB", "0")) * 1024**2)
+CACHE_SPILL_DIR: str | None = os.getenv("CACHE_SPILL_DIR")
+CACHE_BLOCK_TIMEOUT: float = float(os.getenv("CACHE_BLOCK_TIMEOUT", "0"))
+
 
 class CacheError(Exception):
     """Error Relating to cache"""
 
 
+class CacheEntry:
+    """
+    Bookkeeping for a single cache file
+    """
+
+    def __init__(self, spilled: bool = False, borrowed: bool = False):
+        self.n_bytes = 0
+        self.refcount = 1
+        self.spilled = spilled
+        self.borrowed = borrowed
+
+
 class Cache:
     """
-    A cache object for storing temporary data
+    A cache object for storing temporary data.
+
+    The cache keeps track of every cache file: its size on disk, and how many
+    objects (e.g. copies of an image) share it. A file is deleted as soon as
+    the last object using it releases it.
+
+    An optional disk quota limits the bytes stored in the cache dir. Once the
+    quota is reached, new files are put in a secondary spill directory if one
+    is set. Otherwise, producers of new files fail with a CacheError, or, if
+    a block timeout is set, first wait up to that timeout for space to be freed.
+
+    In a worker process, files received from the parent process are borrowed:
+    they are never deleted or overwritten by the worker, as the parent
+    still uses them.
     """
 
     cache_dir: Path | None = None
 
+    def __init__(
+        self,
+        max_bytes: int = MAX_CACHE_DISK_BYTES,
+        spill_dir: Path | str | None = CACHE_SPILL_DIR,
+        block_timeout: float = CACHE_BLOCK_TIMEOUT,
+    ):
+        self.max_bytes = max_bytes
+        self.spill_dir = None if spill_dir is None else Path(spill_dir)
+        self.block_timeout = block_timeout
+        self._entries: dict[Path, CacheEntry] = {}
+        self._condition = threading.Condition()
+        self.borrow_unknown_files = False
+        self.n_bytes = 0
+        self.n_spill_bytes = 0
+        self.peak_bytes = 0
+        self.n_spilled_files = 0
+        self.n_blocked = 0
+
     def get_cache_dir(self) -> Path:
         """
         Returns the current cache dir
@@ -58,8 +138,437 @@ class Cache:
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
 
+    def set_spill_dir(self, spill_dir: Path | str | None):
+        """
+        Function to set the secondary directory used once the quota is reached
+
+        :param spill_dir: Spill dir to set (None to block producers instead)
+        :return: None
+        """
+        self.spill_dir = None if spill_dir is None else Path(spill_dir)
+
+    def set_borrowing(self, borrow: bool):
+        """
+        Function to set whether files not created by this cache are borrowed,
+        e.g. in a worker process, where they belong to the parent process
+
+        :param borrow: Whether unknown files are borrowed
+        :return: None
+        """
+        with self._condition:
+            self.borrow_unknown_files = borrow
+
+    def set_block_timeout(self, block_timeout: float):
+        """
+        Function to set how long producers wait for space once the quota is reached
+
+        :param block_timeout: Timeout in seconds (0 to fail immediately)
+        :return: None
+        """
+        self.block_timeout = block_timeout
+
+    def set_max_bytes(self, max_bytes: int):
+        """
+        Function to set the disk quota for the cache dir
+
+        :param max_bytes: Quota in bytes (0 for no quota)
+        :return: None
+        """
+        with self._condition:
+            self.max_bytes = max_bytes
+            self._condition.notify_all()
+
+    def _is_full(self) -> bool:
+        return (self.max_bytes > 0) & (self.n_bytes >= self.max_bytes)
+
+    def new_path(self, name: str) -> Path:
+        """
+        Registers a new cache file, and returns its path.
+        If the quota has been reached, the file is placed in the spill directory.
+        Otherwise, the call waits for space to be freed if a block timeout is set,
+        and raises a CacheError if there is still no space.
+
+        :param name: File name
+        :return: Path of new cache file
+        """
+        with self._condition:
+            spilled = False
+            if self._is_full():
+                if self.spill_dir is not None:
+                    spilled = True
+                else:
+                    if self.block_timeout > 0:
+                        self.n_blocked += 1
+                        logger.debug("Cache quota reached, waiting for space")
+                        self._condition.wait_for(
+                            lambda: not self._is_full(), timeout=self.block_timeout
+                        )
+                    if self._is_full():
+                        err = (
+                            f"Cache quota of {self.max_bytes} bytes reached, "
+                            f"with no space freed after {self.block_timeout} s. "
+                            f"Set CACHE_SPILL_DIR to put further files elsewhere, "
+                            f"or increase MAX_CACHE_DISK_MB."
+                        )
+                        logger.error(err)
+                        raise CacheError(err)
+
+            if spilled:
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+                path = self.spill_dir.joinpath(name)
+                self.n_spilled_files += 1
+            else:
+                path = self.get_cache_dir().joinpath(name)
+
+            self._entries[path] = CacheEntry(spilled=spilled)
+
+        return path
+
+    def add_reference(self, path: Path):
+        """
+        Registers another user of a cache file.
+        Unknown files (e.g. received from another process) are registered,
+        as borrowed files if borrowing is set.
+
+        :param path: Cache file path
+        :return: None
+        """
+        with self._condition:
+            if path in self._entries:
+                self._entries[path].refcount += 1
+            else:
+                entry = CacheEntry(
+                    spilled=path.parent != self.cache_dir,
+                    borrowed=self.borrow_unknown_files,
+                )
+                self._entries[path] = entry
+                # Borrowed files count towards the quota of their owner
+                if path.exists() & (not entry.borrowed):
+                    self._set_size(path, entry, path.stat().st_size)
+
+    def is_borrowed(self, path: Path) -> bool:
+        """
+        Returns whether a cache file is borrowed from another process,
+        in which case it must not be overwritten
+
+        :param path: Cache file path
+        :return: boolean
+        """
+        with self._condition:
+            return (path in self._entries) and self._entries[path].borrowed
+
+    def get_refcount(self, path: Path) -> int:
+        """
+        Returns the number of users of a cache file
+
+        :param path: Cache file path
+        :return: refcount
+        """
+        with self._condition:
+            if path not in self._entries:
+                return 0
+            return self._entries[path].refcount
+
+    def release(self, path: Path, delete: bool = True):
+        """
+        Releases one user of a cache file. The file is deleted once it has no users,
+        unless it is borrowed from another process.
+
+        :param path: Cache file path
+        :param delete: Whether to delete the file once unused. If False, the file
+            is only forgotten, e.g. because it has been handed to another process.
+        :return: None
+        """
+        with self._condition:
+            if path not in self._entries:
+                return
+            entry = self._entries[path]
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return
+            self._set_size(path, entry, 0)
+            del self._entries[path]
+            self._condition.notify_all()
+
+        if delete & (not entry.borrowed):
+            hot_cache.discard(path)
+            path.unlink(missing_ok=True)
+
+    def update_size(self, path: Path, n_bytes: int):
+        """
+        Records the size on disk of a cache file
+
+        :param path: Cache file path
+        :param n_bytes: size in bytes
+        :return: None
+        """
+        with self._condition:
+            if path in self._entries:
+                self._set_size(path, self._entries[path], n_bytes)
+
+    def _set_size(self, path: Path, entry: CacheEntry, n_bytes: int):
+        delta = n_bytes - entry.n_bytes
+        entry.n_bytes = n_bytes
+        if entry.spilled:
+            self.n_spill_bytes += delta
+        else:
+            self.n_bytes += delta
+            self.peak_bytes = max(self.peak_bytes, self.n_bytes)
+        if delta < 0:
+            self._condition.notify_all()
+        logger.debug(f"Cache file {path.name} is now {n_bytes} bytes")
+
+    def reset(self):
+        """
+        Forgets all cache files without deleting them, e.g. in a newly-forked
+        worker process whose inherited files belong to the parent process
+
+        :return: None
+        """
+        with self._condition:
+            self._entries = {}
+            self.n_bytes = 0
+            self.n_spill_bytes = 0
+
+    def clear(self):
+        """
+        Deletes every cache file still registered
+
+        :return: None
+        """
+        with self._condition:
+            paths = list(self._entries.keys())
+            self.reset()
+            self._condition.notify_all()
+
+        for path in paths:
+            hot_cache.discard(path)
+            path.unlink(missing_ok=True)
+
+    def get_usage(self) -> dict:
+        """
+        Summarise usage of the cache
+
+        :return: dictionary of usage metrics
+        """
+        with self._condition:
+            return {
+                "n_files": len(self._entries),
+                "n_shared_files": sum(x.refcount > 1 for x in self._entries.values()),
+                "n_borrowed_files": sum(x.borrowed for x in self._entries.values()),
+                "n_bytes": self.n_bytes,
+                "peak_bytes": self.peak_bytes,
+                "max_bytes": self.max_bytes,
+                "n_spill_bytes": self.n_spill_bytes,
+                "n_spilled_files": self.n_spilled_files,
+                "n_blocked": self.n_blocked,
+            }
+
     def __str__(self):
         return f"A cache, with path {self.cache_dir}"
 
 
 cache = Cache()
+
+
+def load_cache_array(path: Path, read_only: bool = False) -> np.ndarray:
+    """
+    Load an array from a npy cache file, as a memory-mapped view
+
+    :param path: Path of cache file
+    :param read_only: Return a read-only view, rather than a copy-on-write view
+    :return: array
+    """
+    mmap_mode = "r" if read_only else "c"
+    data = np.load(path.as_posix(), mmap_mode=mmap_mode, allow_pickle=False).view(
+        np.ndarray
+    )
+    profiler.add_cache_bytes_read(data.nbytes)
+    return data
+
+
+def save_cache_array(path: Path, data: np.ndarray):
+    """
+    Save an array to a npy cache file.
+    The data is written to a temporary file which then replaces the cache file,
+    so any existing memory-mapped views of the old file remain valid.
+
+    :param path: Path of cache file
+    :param data: array to save
+    :return: None
+    """
+    temp_path = path.with_suffix(".npy.tmp")
+    with open(temp_path, "wb") as cache_f:
+        np.save(cache_f, data, allow_pickle=False)
+        n_bytes = cache_f.tell()
+    os.replace(temp_path, path)
+    cache.update_size(path, n_bytes)
+    profiler.add_cache_bytes_written(n_bytes)
+
+
+class HotDataCache:
+    """
+    Process-wide least-recently-used store of image data in RAM,
+    sitting in front of the npy cache files.
+
+    Entries are either clean (identical to the file on disk) or dirty
+    (newer than the file on disk). Dirty entries are written back when evicted,
+    or when explicitly flushed.
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHE_RAM_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Path, tuple[np.ndarray, bool]] = OrderedDict()
+        self._lock = threading.RLock()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def is_enabled(self) -> bool:
+        """
+        Whether any data can be held in RAM
+
+        :return: boolean
+        """
+        return self.max_bytes > 0
+
+    def set_max_bytes(self, max_bytes: int):
+        """
+        Update the byte budget, evicting data if needed
+
+        :param max_bytes: new budget in bytes
+        :return: None
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, path: Path) -> np.ndarray | None:
+        """
+        Get data for a cache file, if held in RAM
+
+        :param path: Cache file path
+        :return: array, or None if not held in RAM
+        """
+        with self._lock:
+            if path not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return self._entries[path][0]
+
+    def put(self, path: Path, data: np.ndarray, dirty: bool):
+        """
+        Hold data for a cache file in RAM.
+        Data larger than the whole budget is written straight to disk if dirty.
+
+        :param path: Cache file path
+        :param data: array, which must not be modified afterwards
+        :param dirty: whether the data is newer than the file on disk
+        :return: None
+        """
+        with self._lock:
+            self._remove(path)
+
+            if data.nbytes > self.max_bytes:
+                if dirty:
+                    save_cache_array(path, data)
+                    self.writebacks += 1
+                return
+
+            self._entries[path] = (data, dirty)
+            self.n_bytes += data.nbytes
+            self._evict()
+
+    def discard(self, path: Path):
+        """
+        Drop any data for a cache file, without writing it to disk
+
+        :param path: Cache file path
+        :return: None
+        """
+        with self._lock:
+            self._remove(path)
+
+    def flush(self, path: Path | None = None):
+        """
+        Write dirty data to disk, keeping it in RAM as clean data
+
+        :param path: Cache file to flush. If None, all dirty data is flushed.
+        :return: None
+        """
+        with self._lock:
+            paths = list(self._entries.keys()) if path is None else [path]
+            for entry_path in paths:
+                if entry_path in self._entries:
+                    data, dirty = self._entries[entry_path]
+                    if dirty:
+                        save_cache_array(entry_path, data)
+                        self.writebacks += 1
+                        self._entries[entry_path] = (data, False)
+
+    def clear(self):
+        """
+        Write any dirty data to disk, then drop all data from RAM,
+        e.g. at the end of a run
+
+        :return: None
+        """
+        with self._lock:
+            self.flush()
+            self.reset()
+
+    def reset(self):
+        """
+        Drop all data without writing it, e.g. in a newly-forked worker process
+        whose copy of the data belongs to the parent process
+
+        :return: None
+        """
+        with self._lock:
+            self._entries = OrderedDict()
+            self.n_bytes = 0
+
+    def get_stats(self) -> dict:
+        """
+        Summarise usage of the cache
+
+        :return: dictionary of statistics
+        """
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "n_bytes": self.n_bytes,
+                "n_entries": len(self._entries),
+                "n_dirty": sum(x[1] for x in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "writebacks": self.writebacks,
+            }
+
+    def _remove(self, path: Path):
+        if path in self._entries:
+            data, _ = self._entries.pop(path)
+            self.n_bytes -= data.nbytes
+
+    def _evict(self):
+        while (self.n_bytes > self.max_bytes) and (len(self._entries) > 0):
+            path, (data, dirty) = self._entries.popitem(last=False)
+            self.n_bytes -= data.nbytes
+            self.evictions += 1
+            if dirty:
+                save_cache_array(path, data)
+                self.writebacks += 1
+
+    def __str__(self):
+        return (
+            f"An in-RAM image data cache, holding {self.n_bytes}/{self.max_bytes} "
+            f"bytes in {len(self._entries)} entries"
+        )
+
+
+hot_cache = HotDataCache()
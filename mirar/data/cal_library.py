@@ -0,0 +1,276 @@
+"""
+Module for a persistent library of master calibration images.
+
+Master calibration images (e.g. master flats) are normally saved in the
+calibration subdirectory of each night, and rebuilt every night. The
+:class:`~mirar.data.cal_library.CalibrationLibrary` instead keeps an SQLite index
+of every master which has been made, across all nights. Each master is recorded
+with its type, the instrument, board, filter and exposure time, the date range
+of the images used to make it, and a hash of those images.
+
+Processors with a cache (see
+:class:`~mirar.processors.base_processor.ProcessorWithCache`) can then reuse a
+master built from the same input images on another night, or the nearest
+master in time with matching properties, rather than making a new one.
+
+The library is enabled by setting the path of the index database:
+
+.. code-block:: bash
+
+    export CAL_LIBRARY_PATH=/path/to/cal_library.db
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from astropy.io.fits import Header
+from astropy.time import Time
+
+from mirar.paths import EXPTIME_KEY, FILTER_KEY, TIME_KEY
+
+logger = logging.getLogger(__name__)
+
+CAL_LIBRARY_PATH: str | None = os.getenv("CAL_LIBRARY_PATH")
+
+# Library fields, and the header key each one is read from
+CAL_LIBRARY_FIELDS = {
+    "instrument": "INSTRUME",
+    "board": "BOARD_ID",
+    "filter": FILTER_KEY,
+    "exptime": EXPTIME_KEY,
+}
+
+CREATE_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS masters (
+    path TEXT PRIMARY KEY,
+    cal_type TEXT NOT NULL,
+    instrument TEXT NOT NULL,
+    board TEXT NOT NULL,
+    filter TEXT NOT NULL,
+    exptime TEXT NOT NULL,
+    start_mjd REAL,
+    end_mjd REAL,
+    input_hash TEXT NOT NULL,
+    created TEXT NOT NULL
+)
+"""
+
+CREATE_INDEX_QUERIES = [
+    "CREATE INDEX IF NOT EXISTS idx_masters_hash ON masters (cal_type, input_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_masters_fields ON masters "
+    "(cal_type, instrument, board, filter, exptime)",
+]
+
+
+class CalibrationLibraryError(Exception):
+    """Error relating to the calibration library"""
+
+
+def get_mjd(header: Header) -> float | None:
+    """
+    Get the MJD of an image from its header
+
+    :param header: image header
+    :return: MJD, or None if the header has no valid observation time
+    """
+    try:
+        return float(Time(header[TIME_KEY]).mjd)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def get_library_fields(header: Header) -> dict[str, str]:
+    """
+    Get the calibration library fields of an image from its header.
+    Missing header keys are recorded as empty strings.
+
+    :param header: image header
+    :return: dictionary of field values
+    """
+    return {
+        field: str(header.get(key, "")) for field, key in CAL_LIBRARY_FIELDS.items()
+    }
+
+
+class CalibrationLibrary:
+    """
+    An SQLite index of master calibration images, shared across nights.
+
+    Each call opens its own database connection, so the library can be used
+    from multiple threads and processes. Entries pointing to files which no
+    longer exist are removed when they are looked up.
+    """
+
+    def __init__(self, db_path: Path | str | None = CAL_LIBRARY_PATH):
+        self.db_path = None
+        self.lock = threading.Lock()
+        self.set_db_path(db_path)
+
+    def is_enabled(self) -> bool:
+        """
+        Check whether the library has a database
+
+        :return: boolean
+        """
+        return self.db_path is not None
+
+    def set_db_path(self, db_path: Path | str | None):
+        """
+        Function to set the path of the library database, creating it if needed
+
+        :param db_path: path of the database, or None to disable the library
+        :return: None
+        """
+        with self.lock:
+            self.db_path = None if db_path is None else Path(db_path)
+
+            if self.db_path is not None:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                with self.connect() as conn:
+                    conn.execute(CREATE_TABLE_QUERY)
+                    for query in CREATE_INDEX_QUERIES:
+                        conn.execute(query)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a connection to the library database, committing any changes
+        and closing it afterwards
+
+        :return: sqlite3 connection
+        """
+        if self.db_path is None:
+            err = "No calibration library database has been set"
+            logger.error(err)
+            raise CalibrationLibraryError(err)
+
+        conn = sqlite3.connect(self.db_path, timeout=60.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def register(
+        self, cal_type: str, path: Path | str, headers: list[Header], input_hash: str
+    ):
+        """
+        Add a master calibration image to the library,
+        replacing any existing entry for the same path
+
+        :param cal_type: type of calibration (e.g. 'flat')
+        :param path: path of the master image
+        :param headers: headers of the images used to make the master
+        :param input_hash: hash of the images used to make the master
+        :return: None
+        """
+        fields = get_library_fields(headers[0])
+        mjds = [x for x in [get_mjd(header) for header in headers] if x is not None]
+
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO masters VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+                (
+                    str(Path(path).resolve()),
+                    cal_type,
+                    fields["instrument"],
+                    fields["board"],
+                    fields["filter"],
+                    fields["exptime"],
+                    min(mjds) if len(mjds) > 0 else None,
+                    max(mjds) if len(mjds) > 0 else None,
+                    input_hash,
+                ),
+            )
+
+        logger.debug(f"Registered {cal_type} master {path} in calibration library")
+
+    def _first_existing(self, conn: sqlite3.Connection, rows: list) -> Optional[Path]:
+        """
+        Return the first path in a list of rows which still exists,
+        and remove entries for paths which do not
+
+        :param conn: database connection
+        :param rows: rows, with the path as first column
+        :return: path, or None
+        """
+        for row in rows:
+            path = Path(row[0])
+            if path.exists():
+                return path
+            logger.debug(f"Removing missing master {path} from calibration library")
+            conn.execute("DELETE FROM masters WHERE path = ?", (row[0],))
+        return None
+
+    def find_by_hash(self, cal_type: str, input_hash: str) -> Optional[Path]:
+        """
+        Find a master made from exactly the same input images
+
+        :param cal_type: type of calibration
+        :param input_hash: hash of the input images
+        :return: path of the master, or None if there is none
+        """
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT path FROM masters WHERE cal_type = ? AND input_hash = ?",
+                (cal_type, input_hash),
+            ).fetchall()
+            return self._first_existing(conn, rows)
+
+    def find_nearest(
+        self,
+        cal_type: str,
+        header: Header,
+        match_fields: list[str],
+        max_age_days: float,
+    ) -> Optional[Path]:
+        """
+        Find the master closest in time to an image, with matching properties
+
+        :param cal_type: type of calibration
+        :param header: header of the image to be calibrated
+        :param match_fields: library fields which must match the image
+        :param max_age_days: maximum time between the image and the master
+        :return: path of the master, or None if there is none
+        """
+        for field in match_fields:
+            if field not in CAL_LIBRARY_FIELDS:
+                err = (
+                    f"Unknown calibration library field '{field}'. "
+                    f"Use one of {list(CAL_LIBRARY_FIELDS)}."
+                )
+                logger.error(err)
+                raise CalibrationLibraryError(err)
+
+        mjd = get_mjd(header)
+        if mjd is None:
+            return None
+
+        fields = get_library_fields(header)
+        conditions = " ".join([f"AND {field} = ?" for field in match_fields])
+
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT path, "
+                f"MAX(start_mjd - ?, ? - end_mjd, 0.0) AS age FROM masters "
+                f"WHERE cal_type = ? {conditions} AND start_mjd IS NOT NULL "
+                f"AND age <= ? ORDER BY age",
+                (
+                    mjd,
+                    mjd,
+                    cal_type,
+                    *[fields[field] for field in match_fields],
+                    max_age_days,
+                ),
+            ).fetchall()
+            return self._first_existing(conn, rows)
+
+
+cal_library = CalibrationLibrary()
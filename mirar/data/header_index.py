@@ -0,0 +1,312 @@
+"""
+Module for a persistent index of the image headers in a directory.
+
+Loading a directory normally means opening every file in it. When loading
+with a header function (see :func:`~mirar.processors.utils.image_loader.load_from_dir`),
+the headers of each file can instead be read from an SQLite index, kept for each
+directory. The index records the size and modification time of each file, and
+is updated incrementally: only new or changed files are opened, e.g. as files
+arrive during a night. Images can then be selected with an indexed query on
+common header values (e.g. target, filter, exposure time), so that searching
+earlier nights for calibration images only ever reads the frames which are
+needed.
+
+The index is enabled by setting the directory where index files are kept:
+
+.. code-block:: bash
+
+    export HEADER_INDEX_DIR=/path/to/header_indexes
+
+Index files are named after the directory they index. If the code which makes
+headers changes, the index files can simply be deleted, and will be rebuilt.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+from astropy.io.fits import Header
+
+from mirar.paths import EXPTIME_KEY, FILTER_KEY, OBSCLASS_KEY, TARGET_KEY
+
+logger = logging.getLogger(__name__)
+
+HEADER_INDEX_DIR: str | None = os.getenv("HEADER_INDEX_DIR")
+
+# Indexed fields, and the header key each one is read from
+HEADER_INDEX_FIELDS = {
+    "target": TARGET_KEY,
+    "obsclass": OBSCLASS_KEY,
+    "filter": FILTER_KEY,
+    "exptime": EXPTIME_KEY,
+    "board": "BOARD_ID",
+}
+
+# Increment to rebuild existing indexes if the schema changes
+HEADER_INDEX_VERSION = 1
+
+CREATE_FILES_QUERY = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    loader TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    n_images INTEGER NOT NULL,
+    PRIMARY KEY (path, loader)
+)
+"""
+
+CREATE_IMAGES_QUERY = f"""
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT NOT NULL,
+    loader TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    {", ".join([f"{field} TEXT NOT NULL" for field in HEADER_INDEX_FIELDS])},
+    header TEXT NOT NULL,
+    PRIMARY KEY (path, loader, idx)
+)
+"""
+
+CREATE_INDEX_QUERIES = [
+    "CREATE INDEX IF NOT EXISTS idx_images_target ON images (loader, target)",
+    "CREATE INDEX IF NOT EXISTS idx_images_obsclass ON images (loader, obsclass)",
+]
+
+
+def get_loader_name(header_f: Callable) -> str:
+    """
+    Get a name for the function used to make headers, so that headers made by
+    different functions are indexed separately
+
+    :param header_f: header function
+    :return: name, which is the same in every run
+    """
+    if isinstance(header_f, partial):
+        args = [get_argument_name(x) for x in header_f.args]
+        args += [
+            f"{key}={get_argument_name(value)}"
+            for key, value in sorted(header_f.keywords.items())
+        ]
+        return f"{get_loader_name(header_f.func)}({', '.join(args)})"
+
+    name = getattr(header_f, "__qualname__", None)
+    if name is None:
+        # e.g. an instance of a class with a __call__ method
+        name = type(header_f).__qualname__
+    return f"{header_f.__module__}.{name}"
+
+
+def get_argument_name(value) -> str:
+    """
+    Get a name for an argument bound to a header function. Functions are
+    named as in :func:`get_loader_name`, as their repr includes a memory address.
+
+    :param value: argument value
+    :return: name
+    """
+    if callable(value):
+        return get_loader_name(value)
+    return repr(value)
+
+
+def get_index_fields(header: Header) -> dict[str, str]:
+    """
+    Get the indexed fields of an image from its header.
+    Values are stored as strings, as compared when selecting images.
+
+    :param header: image header
+    :return: dictionary of field values
+    """
+    return {
+        field: str(header.get(key, "")) for field, key in HEADER_INDEX_FIELDS.items()
+    }
+
+
+class HeaderIndex:
+    """
+    An SQLite index of the image headers of the files in one directory.
+
+    Each call opens its own database connection, so the index can be used from
+    multiple threads and processes.
+    """
+
+    def __init__(self, db_path: Path | str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != HEADER_INDEX_VERSION:
+                conn.execute("DROP TABLE IF EXISTS files")
+                conn.execute("DROP TABLE IF EXISTS images")
+                conn.execute(f"PRAGMA user_version = {HEADER_INDEX_VERSION}")
+            conn.execute(CREATE_FILES_QUERY)
+            conn.execute(CREATE_IMAGES_QUERY)
+            for query in CREATE_INDEX_QUERIES:
+                conn.execute(query)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a connection to the index database, committing any changes
+        and closing it afterwards
+
+        :return: sqlite3 connection
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def update(
+        self,
+        paths: list[str],
+        header_f: Callable,
+        scan_f: Callable[[list[str]], list[Optional[list[Header]]]],
+    ):
+        """
+        Update the index for a list of files. Files which are new or have changed
+        are scanned, and files which are no longer present are removed.
+
+        :param paths: paths of all files in the directory
+        :param header_f: function used to make the headers of each file
+        :param scan_f: function returning the headers of each of a list of files,
+            or None for files which could not yet be read (e.g. incomplete files)
+        :return: None
+        """
+        loader = get_loader_name(header_f)
+
+        with self.connect() as conn:
+            indexed = {
+                row[0]: (row[1], row[2])
+                for row in conn.execute(
+                    "SELECT path, mtime, size FROM files WHERE loader = ?", (loader,)
+                )
+            }
+
+        stats = {}
+        for path in paths:
+            stat = os.stat(path)
+            stats[path] = (stat.st_mtime, stat.st_size)
+
+        new_paths = [x for x in paths if indexed.get(x) != stats[x]]
+        old_paths = [x for x in indexed if x not in stats]
+
+        if (len(new_paths) == 0) & (len(old_paths) == 0):
+            return
+
+        logger.debug(
+            f"Updating header index {self.db_path}: scanning {len(new_paths)} files, "
+            f"removing {len(old_paths)} files"
+        )
+
+        all_headers = scan_f(new_paths)
+
+        with self.connect() as conn:
+            for path in old_paths + new_paths:
+                conn.execute(
+                    "DELETE FROM files WHERE path = ? AND loader = ?", (path, loader)
+                )
+                conn.execute(
+                    "DELETE FROM images WHERE path = ? AND loader = ?", (path, loader)
+                )
+
+            for path, headers in zip(new_paths, all_headers):
+                if headers is None:
+                    continue
+                conn.execute(
+                    "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                    (path, loader, *stats[path], len(headers)),
+                )
+                for i, header in enumerate(headers):
+                    fields = get_index_fields(header)
+                    conn.execute(
+                        f"INSERT INTO images VALUES "
+                        f"(?, ?, ?, {', '.join(['?'] * len(fields))}, ?)",
+                        (path, loader, i, *fields.values(), header.tostring()),
+                    )
+
+    def get_headers(
+        self,
+        paths: list[str],
+        header_f: Callable,
+        selection: Optional[dict[str, str | list[str]]] = None,
+    ) -> list[tuple[str, list[tuple[int, Header]]]]:
+        """
+        Get the indexed headers of a list of files, optionally selecting images
+        by header values. Selections on indexed fields are made in the query,
+        and any others on the headers themselves.
+
+        :param paths: paths of files
+        :param header_f: function used to make the headers
+        :param selection: optional dictionary of header keys and accepted values
+        :return: list of paths, and the index in the file and header of each
+            selected image
+        """
+        loader = get_loader_name(header_f)
+        selection = {} if selection is None else selection
+
+        key_fields = {key: field for field, key in HEADER_INDEX_FIELDS.items()}
+
+        conditions, values, other_selection = [], [], {}
+        for key, target_values in selection.items():
+            if not isinstance(target_values, list):
+                target_values = [target_values]
+            target_values = [str(x) for x in target_values]
+            if key in key_fields:
+                conditions.append(
+                    f"AND images.{key_fields[key]} IN "
+                    f"({', '.join(['?'] * len(target_values))})"
+                )
+                values += target_values
+            else:
+                other_selection[key] = target_values
+
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT path, idx, header FROM images WHERE loader = ? "
+                f"{' '.join(conditions)} ORDER BY path, idx",
+                (loader, *values),
+            ).fetchall()
+
+        results = {path: [] for path in paths}
+        for path, idx, header_str in rows:
+            if path not in results:
+                continue
+            header = Header.fromstring(header_str)
+            if all(
+                str(header.get(key)) in target_values
+                for key, target_values in other_selection.items()
+            ):
+                results[path].append((idx, header))
+
+        return [(path, headers) for path, headers in results.items()]
+
+
+def get_header_index(
+    input_dir: str | Path, index_dir: Optional[str | Path] = None
+) -> Optional[HeaderIndex]:
+    """
+    Get the header index for a directory
+
+    :param input_dir: directory of images
+    :param index_dir: directory where index files are kept
+        (default, HEADER_INDEX_DIR)
+    :return: header index, or None if indexing is disabled
+    """
+    if index_dir is None:
+        index_dir = HEADER_INDEX_DIR
+    if index_dir is None:
+        return None
+
+    input_dir = Path(input_dir).resolve()
+    dir_hash = hashlib.sha1(input_dir.as_posix().encode()).hexdigest()[:12]
+    name = f"{input_dir.parent.name}_{input_dir.name}_{dir_hash}.db"
+    return HeaderIndex(Path(index_dir).joinpath(name))
@@ -18,6 +18,26 @@ When the data is updated, the npy file is changed.
 The path of the file is a unique hash, and includes the read time of the file,
 so multiple copies of an image can be read and modified independently.
 
+Cache files are read via memory-mapping. Processors which only read pixels
+can request a read-only view with `get_data(read_only=True)`, which never copies
+the file into memory. By default, `get_data()` returns a copy-on-write view,
+so modifying the array in place does not change the cache until
+`set_data()` is called. Updated data is written to a new file which then
+atomically replaces the old one, so views handed out earlier remain valid.
+Passing an unmodified read-only view back to `set_data()` does not write anything.
+Recently-used data can also be held in RAM, up to a configurable budget,
+by the :class:`~mirar.data.cache.HotDataCache` (see :module:`mirar.data.cache`).
+
+Images can also be created with deferred data, using
+:meth:`~mirar.data.image_data.Image.from_loader`. Only the header is held
+until the data is first requested, at which point it is loaded. Images
+rejected on their header alone (e.g. by an
+:class:`~mirar.processors.utils.image_selector.ImageSelector`) are never read.
+
+Copies of an image share its cache file until one of them updates its data.
+The :class:`~mirar.data.cache.Cache` counts the users of each cache file,
+and deletes the file once it is no longer used.
+
 In cache mode, all of the image data is temporarily stored in a cache,
 and this cache can therefore reach the size of 10s of Gb.
 The location of the cache is in the configurable
@@ -58,16 +78,24 @@ and setting the output data directory.
 import copy
 import hashlib
 import logging
+import os
 import threading
+import weakref
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 import numpy as np
 from astropy.io.fits import Header
 from astropy.time import Time
 
 from mirar.data.base_data import DataBatch, DataBlock
-from mirar.data.cache import USE_CACHE, cache
+from mirar.data.cache import (
+    USE_CACHE,
+    cache,
+    hot_cache,
+    load_cache_array,
+    save_cache_array,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -82,30 +110,83 @@ class Image(DataBlock):
     :class:`~mirar.processors.base_processor.BaseCandidateGenerator` processors.
     """
 
-    cache_files = []
+    # Function returning an image whose data this image adopts when first needed
+    _data_loader: Optional[Callable[[], "Image"]] = None
 
     def __init__(self, data: np.ndarray, header: Header):
         self._data = None
         self.header = header
+        self._owns_cache = True
+        self._clean_views = []
         super().__init__()
         if USE_CACHE:
             self.cache_path = self.get_cache_path()
-            self.cache_files.append(self.cache_path)
         else:
             self.cache_path = None
         self.set_data(data=data)
 
+    @classmethod
+    def from_loader(cls, header: Header, data_loader: Callable[[], "Image"]):
+        """
+        Make an image with deferred data. The data loader is only called
+        when the data is first needed, and this image then shares the data of
+        the image which it returns.
+
+        :param header: image header
+        :param data_loader: function returning an image with the same data
+        :return: new image
+        """
+        new = cls.__new__(cls)
+        new._data = None  # pylint: disable=protected-access
+        new.header = header
+        new._owns_cache = True  # pylint: disable=protected-access
+        new._clean_views = []  # pylint: disable=protected-access
+        DataBlock.__init__(new)
+        new.cache_path = None
+        new._data_loader = data_loader  # pylint: disable=protected-access
+        return new
+
+    def is_loaded(self) -> bool:
+        """
+        Check whether the image data has been loaded, or is still deferred
+
+        :return: boolean
+        """
+        return self._data_loader is None
+
+    def load_deferred_data(self):
+        """
+        Load deferred data, by sharing the data of the image returned
+        by the data loader
+
+        :return: None
+        """
+        source = self._data_loader()
+        self._data_loader = None
+        if USE_CACHE:
+            self.cache_path = source.cache_path
+            cache.add_reference(self.cache_path)
+        else:
+            self._data = np.array(source.get_data(read_only=True))
+
     def get_cache_path(self) -> Path:
         """
-        Get a unique cache path for the image (.npy file).
+        Get and register a unique cache path for the image (.npy file).
         This is hash, using name and time, so should be unique even
         when rerunning on the same image.
 
         :return: unique cache file path
         """
-        base = "".join([str(Time.now()), self.get_name(), str(threading.get_ident())])
+        base = "".join(
+            [
+                str(Time.now()),
+                self.get_name(),
+                str(os.getpid()),
+                str(threading.get_ident()),
+            ]
+        )
         name = f"{hashlib.sha1(base.encode()).hexdigest()}.npy"
-        return cache.get_cache_dir().joinpath(name)
+        return cache.new_path(name)
 
     def __str__(self):
         return f"<An {self.__class__.__name__} object, built from {self.get_name()}>"
@@ -117,19 +198,49 @@ class Image(DataBlock):
         :param data: Updated image data
         :return: None
         """
+        # Any deferred data is replaced without being read
+        self._data_loader = None
+
         if USE_CACHE:
+            if self.cache_path is None:
+                self.cache_path = self.get_cache_path()
             self.set_cache_data(data)
         else:
             self.set_ram_data(data)
 
     def set_cache_data(self, data: np.ndarray):
         """
-        Set the data with cache
+        Set the data with cache.
+
+        If the in-RAM cache is enabled, a copy of the data is held there and only
+        written to disk when evicted. Otherwise, the data is written to a
+        temporary file, which then replaces the cache file, so any existing
+        memory-mapped views of the old data remain valid.
+        If the data is an unmodified read-only view of the current data,
+        nothing is written. If the cache file is shared with copies of this
+        image, a new cache file is used.
 
         :param data: Updated image data
         :return: None
         """
-        np.save(self.cache_path.as_posix(), data, allow_pickle=False)
+        self._clean_views = [x for x in self._clean_views if x() is not None]
+        if any(x() is data for x in self._clean_views):
+            logger.debug(f"Data for {self.get_name()} is unchanged, skipping write")
+            return
+
+        if (cache.get_refcount(self.cache_path) > 1) | cache.is_borrowed(
+            self.cache_path
+        ):
+            # The file is shared with copies of this image, or belongs to
+            # another process, so write a new one
+            cache.release(self.cache_path)
+            self.cache_path = self.get_cache_path()
+
+        if hot_cache.is_enabled():
+            hot_cache.put(self.cache_path, np.array(data), dirty=True)
+        else:
+            save_cache_array(self.cache_path, data)
+        self._clean_views = []
 
     def set_ram_data(self, data: np.ndarray):
         """
@@ -140,16 +251,38 @@ class Image(DataBlock):
         """
         self._data = data
 
-    def get_data(self) -> np.ndarray:
+    def get_data(self, read_only: bool = False) -> np.ndarray:
         """
         Get the image data from cache
 
+        :param read_only: Return a read-only view of the data, rather than
+            a modifiable array. Use this if you only need to read the pixels.
         :return: image data (numpy array)
         """
+        if self._data_loader is not None:
+            self.load_deferred_data()
+
         if USE_CACHE:
-            return self.get_cache_data()
+            return self.get_cache_data(read_only=read_only)
+
+        return self.get_ram_data(read_only=read_only)
+
+    def get_mapped_data(self) -> np.ndarray:
+        """
+        Get a read-only view of the image data, to read only parts of it
+        (e.g. tile by tile). In cache mode, data which is not already held in
+        RAM is memory-mapped from the cache file, without being added to the
+        in-RAM cache.
 
-        return self.get_ram_data()
+        :return: image data (numpy array)
+        """
+        if self._data_loader is not None:
+            self.load_deferred_data()
+
+        if USE_CACHE and (hot_cache.get(self.cache_path) is None):
+            return load_cache_array(self.cache_path, read_only=True)
+
+        return self.get_data(read_only=True)
 
     def get_mask(self) -> np.ndarray:
         """
@@ -157,23 +290,46 @@ class Image(DataBlock):
 
         :return: mask data (numpy array)
         """
-        img_data = self.get_data()
+        img_data = self.get_data(read_only=True)
         return ~np.isnan(img_data)
 
-    def get_cache_data(self) -> np.ndarray:
+    def get_cache_data(self, read_only: bool = False) -> np.ndarray:
         """
-        Get the image data from cache
+        Get the image data from cache. Data is taken from the in-RAM cache if
+        present there, and otherwise from a memory-mapped view of the cache file.
 
+        :param read_only: Return a read-only view. Otherwise, a modifiable
+            array is returned, which can be changed without changing the cache.
         :return: image data (numpy array)
         """
-        return np.load(self.cache_path.as_posix(), allow_pickle=True)
+        data = hot_cache.get(self.cache_path)
+
+        if data is None:
+            data = load_cache_array(self.cache_path, read_only=read_only)
+            if read_only and hot_cache.is_enabled():
+                data = np.array(data)
+                hot_cache.put(self.cache_path, data, dirty=False)
+
+        if read_only:
+            data = data.view()
+            data.flags.writeable = False
+            self._clean_views.append(weakref.ref(data))
+        elif not isinstance(data.base, np.memmap):
+            data = data.copy()
 
-    def get_ram_data(self) -> np.ndarray:
+        return data
+
+    def get_ram_data(self, read_only: bool = False) -> np.ndarray:
         """
         Get the image data from RAM
 
+        :param read_only: Return a read-only view of the data
         :return: image data (numpy array)
         """
+        if read_only and (self._data is not None):
+            view = self._data.view()
+            view.flags.writeable = False
+            return view
         return self._data
 
     def get_header(self) -> Header:
@@ -207,18 +363,83 @@ class Image(DataBlock):
         """
         return self.header.keys()
 
-    def __del__(self):
+    def release_cache(self):
+        """
+        Stop this object from deleting its cache file when it is deleted.
+        Used when ownership of the cache file passes to another copy of the image,
+        e.g. one returned from a worker process.
+
+        :return: None
+        """
+        if self._owns_cache and self.cache_path is not None:
+            hot_cache.discard(self.cache_path)
+            cache.release(self.cache_path, delete=False)
+        self._owns_cache = False
+
+    def __getstate__(self):
+        # Another process can only see data which has been written to disk
         if self.cache_path is not None:
-            self.cache_path.unlink(missing_ok=True)
-            self.cache_files.remove(self.cache_path)
+            hot_cache.flush(self.cache_path)
+        state = self.__dict__.copy()
+        state["_clean_views"] = []
+        return state
+
+    def __setstate__(self, state):
+        # An unpickled image takes a reference to its cache file. In a worker
+        # process, the file is borrowed from the parent, so is never deleted here.
+        self.__dict__.update(state)
+        self._owns_cache = True
+        if self.cache_path is not None:
+            # Another process may have updated the file, so drop any stale RAM copy
+            hot_cache.discard(self.cache_path)
+            cache.add_reference(self.cache_path)
+
+    def __del__(self):
+        # The image may not have a cache path if __init__ failed
+        if getattr(self, "cache_path", None) is not None and self._owns_cache:
+            cache.release(self.cache_path)
+
+    def copy_sharing_cache(self, header: Header) -> "Image":
+        """
+        Make a copy of the image with a new header, which shares the cache file
+        of this image until either image updates its data
+
+        :param header: Header for the copy
+        :return: New image
+        """
+        new = type(self).__new__(type(self))
+        new._data = None  # pylint: disable=protected-access
+        new.header = header
+        new._owns_cache = True  # pylint: disable=protected-access
+        new._clean_views = []  # pylint: disable=protected-access
+        DataBlock.__init__(new)
+        new.cache_path = self.cache_path
+        cache.add_reference(self.cache_path)
+        return new
 
     def __deepcopy__(self, memo):
+        if self._data_loader is not None:
+            return type(self).from_loader(
+                copy.deepcopy(self.get_header()), self._data_loader
+            )
+
+        if USE_CACHE:
+            return self.copy_sharing_cache(copy.deepcopy(self.get_header()))
+
         new = type(self)(
             data=copy.deepcopy(self.get_data()), header=copy.deepcopy(self.get_header())
         )
         return new
 
     def __copy__(self):
+        if self._data_loader is not None:
+            return type(self).from_loader(
+                self.get_header().__copy__(), self._data_loader
+            )
+
+        if USE_CACHE:
+            return self.copy_sharing_cache(self.get_header().__copy__())
+
         new = type(self)(
             data=self.get_data().__copy__(), header=self.get_header().__copy__()
         )
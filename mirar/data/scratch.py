@@ -0,0 +1,338 @@
+"""
+Module for content-addressed scratch files, used to pass images to external tools.
+
+External tools (e.g. Sextractor, Swarp) need images as files on disk,
+so each processor historically wrote its own temporary copy of an image,
+and of its mask. The :class:`~mirar.data.scratch.ScratchFiles` manager instead
+keys each file by a hash of the image data and header. An image which has not
+changed is written once, and the same file is then used by every processor
+which needs it.
+
+Scratch files are reference-counted. Once a file is no longer used, it is
+either deleted, or retained up to a byte budget so that later processors can
+reuse it, with the least-recently used files deleted first. Scratch files can
+be kept on a RAM-backed filesystem (e.g. tmpfs), rather than the default of the
+cache directory:
+
+.. code-block:: bash
+
+    export SCRATCH_DIR=/dev/shm/mirar
+    export MAX_SCRATCH_RETAINED_MB=2000
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+from astropy.io.fits import Header
+
+from mirar.data.cache import cache
+from mirar.data.image_data import Image
+from mirar.paths import LATEST_SAVE_KEY, PROC_HISTORY_KEY
+
+logger = logging.getLogger(__name__)
+
+SCRATCH_DIR: str | None = os.getenv("SCRATCH_DIR")
+MAX_SCRATCH_RETAINED_BYTES: int = int(
+    float(os.getenv("MAX_SCRATCH_RETAINED_MB", "1000")) * 1024**2
+)
+
+# Header keys which are updated by every processor, or on saving,
+# without changing the image. Data shape and type are hashed separately.
+SCRATCH_VOLATILE_KEYS = [
+    LATEST_SAVE_KEY,
+    PROC_HISTORY_KEY,
+    "REDUCER",
+    "REDMACH",
+    "REDTIME",
+    "SIMPLE",
+    "BITPIX",
+    "EXTEND",
+]
+
+
+def get_content_key(data: np.ndarray, header: Header) -> str:
+    """
+    Get a hash of the content of an image, ignoring volatile header keys
+
+    :param data: image data
+    :param header: image header
+    :return: hex digest
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{data.dtype.str}{data.shape}".encode())
+    hasher.update(np.ascontiguousarray(data).view(np.uint8).data)
+    for card in header.cards:
+        if (card.keyword not in SCRATCH_VOLATILE_KEYS) & (
+            not card.keyword.startswith("NAXIS")
+        ):
+            hasher.update(card.image.encode())
+    return hasher.hexdigest()
+
+
+def get_image_key(image: Image) -> str:
+    """
+    Get a hash of the content of an Image
+
+    :param image: Image
+    :return: hex digest
+    """
+    return get_content_key(image.get_data(read_only=True), image.get_header())
+
+
+class ScratchEntry:
+    """
+    Record of a scratch file
+    """
+
+    def __init__(self):
+        self.refcount = 1
+        self.n_bytes = 0
+        self.ready = threading.Event()
+        self.error: Exception | None = None
+
+
+class ScratchFiles:
+    """
+    Process-wide manager of content-addressed scratch files.
+
+    Each file is at <scratch dir>/<process id>/<content key>/<name>, so files
+    made from the same content by different processors are shared if they
+    have the same name.
+    """
+
+    def __init__(
+        self,
+        scratch_dir: Path | str | None = SCRATCH_DIR,
+        max_retained_bytes: int = MAX_SCRATCH_RETAINED_BYTES,
+    ):
+        """
+        :param scratch_dir: root directory for scratch files
+            (default, a 'scratch' directory in the cache dir)
+        :param max_retained_bytes: maximum bytes of unused files kept for reuse
+        """
+        self.scratch_dir = None if scratch_dir is None else Path(scratch_dir)
+        self.max_retained_bytes = max_retained_bytes
+        self._lock = threading.Lock()
+        self._entries: dict[Path, ScratchEntry] = {}
+        self._retained: OrderedDict[Path, ScratchEntry] = OrderedDict()
+        self.retained_bytes = 0
+        self._stats = self._get_empty_stats()
+
+    @staticmethod
+    def _get_empty_stats() -> dict:
+        """
+        Get the statistics of a manager with no scratch files yet
+
+        :return: dictionary of statistics
+        """
+        return {
+            "n_written": 0,
+            "n_reused": 0,
+            "bytes_written": 0,
+            "bytes_reused": 0,
+            "n_evicted": 0,
+        }
+
+    def reset(self):
+        """
+        Forget all scratch files without deleting them, e.g. in a newly-forked
+        worker process whose inherited files belong to the parent process
+
+        :return: None
+        """
+        with self._lock:
+            self._entries = {}
+            self._retained = OrderedDict()
+            self.retained_bytes = 0
+            self._stats = self._get_empty_stats()
+
+    def set_scratch_dir(self, scratch_dir: Path | str | None):
+        """
+        Function to set the root directory for scratch files
+
+        :param scratch_dir: Scratch dir to set (None for the default)
+        :return: None
+        """
+        self.scratch_dir = None if scratch_dir is None else Path(scratch_dir)
+
+    def set_max_retained_bytes(self, max_bytes: int):
+        """
+        Function to set the budget for unused files kept for reuse
+
+        :param max_bytes: budget in bytes (0 to delete files as soon as unused)
+        :return: None
+        """
+        with self._lock:
+            self.max_retained_bytes = max_bytes
+            self._evict()
+
+    def get_scratch_dir(self) -> Path:
+        """
+        Returns the directory for the scratch files of this process
+
+        :return: Scratch dir
+        """
+        root = self.scratch_dir
+        if root is None:
+            if cache.cache_dir is not None:
+                root = Path(cache.cache_dir).joinpath("scratch")
+            else:
+                root = Path(tempfile.gettempdir()).joinpath("mirar_scratch")
+        return root.joinpath(str(os.getpid()))
+
+    def acquire(self, key: str, name: str, write_f: Callable[[Path], None]) -> Path:
+        """
+        Get the path of a scratch file, writing it only if the same file has not
+        already been written. Each call must be matched by a call to
+        :meth:`release`.
+
+        :param key: content key of the file (see :func:`get_content_key`)
+        :param name: file name
+        :param write_f: function writing the file to a given path
+        :return: path of scratch file
+        """
+        path = self.get_scratch_dir().joinpath(key, name)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            is_new = entry is None
+            if is_new:
+                entry = ScratchEntry()
+                self._entries[path] = entry
+            else:
+                entry.refcount += 1
+                if path in self._retained:
+                    del self._retained[path]
+                    self.retained_bytes -= entry.n_bytes
+
+        if not is_new:
+            entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+            with self._lock:
+                self._stats["n_reused"] += 1
+                self._stats["bytes_reused"] += entry.n_bytes
+            logger.debug(f"Reusing scratch file {path}")
+            return path
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_f(path)
+            entry.n_bytes = path.stat().st_size
+        except Exception as exc:
+            with self._lock:
+                del self._entries[path]
+                path.unlink(missing_ok=True)
+            entry.error = exc
+            entry.ready.set()
+            raise
+
+        entry.ready.set()
+        with self._lock:
+            self._stats["n_written"] += 1
+            self._stats["bytes_written"] += entry.n_bytes
+        logger.debug(f"Wrote scratch file {path}")
+        return path
+
+    def release(self, path: Path | str):
+        """
+        Releases one user of a scratch file. Unused files are retained for reuse
+        within the byte budget, and otherwise deleted.
+
+        :param path: path of scratch file
+        :return: None
+        """
+        path = Path(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return
+            self._retained[path] = entry
+            self.retained_bytes += entry.n_bytes
+            self._evict()
+
+    def _evict(self):
+        """
+        Delete the least-recently used unused files, until within budget.
+        Must be called with the lock held.
+
+        :return: None
+        """
+        to_delete = []
+        while (len(self._retained) > 0) & (
+            self.retained_bytes > self.max_retained_bytes
+        ):
+            path, entry = self._retained.popitem(last=False)
+            self.retained_bytes -= entry.n_bytes
+            self._stats["n_evicted"] += 1
+            to_delete.append(path)
+        self._delete(to_delete)
+
+    def _delete(self, paths: list[Path]):
+        """
+        Delete scratch files, and their content directories once no other files
+        are recorded there. Must be called with the lock held, so that a file
+        is never deleted after being written again.
+
+        :param paths: paths to delete
+        :return: None
+        """
+        for path in paths:
+            del self._entries[path]
+            path.unlink(missing_ok=True)
+
+        in_use = {x.parent for x in self._entries}
+        for content_dir in {x.parent for x in paths} - in_use:
+            try:
+                content_dir.rmdir()
+            except OSError:
+                pass
+
+    def clear_retained(self):
+        """
+        Deletes all unused files kept for reuse
+
+        :return: None
+        """
+        with self._lock:
+            paths = list(self._retained.keys())
+            self._retained = OrderedDict()
+            self.retained_bytes = 0
+            self._delete(paths)
+
+    def clear(self):
+        """
+        Deletes every scratch file of this process
+
+        :return: None
+        """
+        scratch_dir = self.get_scratch_dir()
+        self.reset()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def get_stats(self) -> dict:
+        """
+        Summarise usage of scratch files
+
+        :return: dictionary of statistics
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["n_files"] = len(self._entries)
+            stats["n_retained"] = len(self._retained)
+            stats["retained_bytes"] = self.retained_bytes
+        return stats
+
+
+scratch_files = ScratchFiles()
@@ -0,0 +1,194 @@
+"""
+Module for combining a stack of images (e.g. into a master calibration frame)
+without holding the full stack in memory.
+
+The stack is combined tile by tile, where each tile is a block of rows.
+Only the rows of each frame needed for a tile are read, which in cache mode
+means only those parts of each memory-mapped cache file are loaded. Tiles are
+combined in parallel, with the tile size chosen to keep the total memory
+used within a fixed budget. The budget can be set via an environment variable:
+
+.. code-block:: bash
+
+    export MAX_COMBINE_RAM_MB=2000
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+from astropy.stats import sigma_clipped_stats
+
+from mirar.data.image_data import Image
+from mirar.errors import ProcessorError
+from mirar.paths import max_n_cpu
+
+logger = logging.getLogger(__name__)
+
+MAX_COMBINE_RAM_BYTES: int = int(
+    float(os.getenv("MAX_COMBINE_RAM_MB", "2000")) * 1024**2
+)
+
+COMBINE_METHODS = ["median", "sigma_clipped_mean", "weighted_mean"]
+
+# Each tile needs the stack of frames, plus working copies made while combining
+TILE_OVERHEAD_FACTOR = 3
+
+
+class CombineError(ProcessorError):
+    """
+    Error raised when a stack of images cannot be combined
+    """
+
+
+def get_rows_per_tile(
+    shape: tuple[int, int], n_frames: int, max_bytes: int, n_threads: int
+) -> int:
+    """
+    Get the number of rows in each tile, so that all tiles being combined
+    at once fit within the memory budget
+
+    :param shape: shape of each frame
+    :param n_frames: number of frames
+    :param max_bytes: memory budget in bytes
+    :param n_threads: number of tiles combined at once
+    :return: number of rows per tile
+    """
+    bytes_per_row = shape[1] * n_frames * np.dtype(np.float64).itemsize
+    bytes_per_row *= TILE_OVERHEAD_FACTOR
+    rows = int(max_bytes / (bytes_per_row * n_threads))
+    return int(np.clip(rows, 1, shape[0]))
+
+
+def combine_tile(
+    tile: np.ndarray,
+    method: str = "median",
+    weights: Optional[np.ndarray] = None,
+    sigma: float = 3.0,
+    maxiters: int = 5,
+) -> np.ndarray:
+    """
+    Combine a tile of a stack along the first (frame) axis, ignoring NaNs
+
+    :param tile: array of shape (n_frames, n_rows, n_columns)
+    :param method: combine method, one of COMBINE_METHODS
+    :param weights: per-frame weights, used for 'weighted_mean'
+    :param sigma: clipping threshold, used for 'sigma_clipped_mean'
+    :param maxiters: maximum clipping iterations, used for 'sigma_clipped_mean'
+    :return: combined array of shape (n_rows, n_columns)
+    """
+    if method == "median":
+        return np.nanmedian(tile, axis=0)
+
+    if method == "sigma_clipped_mean":
+        mean, _, _ = sigma_clipped_stats(tile, axis=0, sigma=sigma, maxiters=maxiters)
+        return np.asarray(mean, dtype=np.float64)
+
+    if method == "weighted_mean":
+        frame_weights = np.broadcast_to(weights[:, None, None], tile.shape)
+        frame_weights = np.where(np.isnan(tile), 0.0, frame_weights)
+        total = np.sum(frame_weights, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            combined = np.nansum(tile * frame_weights, axis=0) / total
+        combined[total == 0.0] = np.nan
+        return combined
+
+    err = f"Combine method '{method}' not recognised. Use one of {COMBINE_METHODS}."
+    logger.error(err)
+    raise CombineError(err)
+
+
+def combine_images(
+    images: list[Image],
+    method: str = "median",
+    scales: Optional[list[float] | np.ndarray] = None,
+    masks: Optional[list[Optional[np.ndarray]]] = None,
+    weights: Optional[list[float] | np.ndarray] = None,
+    sigma: float = 3.0,
+    maxiters: int = 5,
+    max_bytes: int = MAX_COMBINE_RAM_BYTES,
+    n_threads: int = max_n_cpu,
+) -> np.ndarray:
+    """
+    Combine the data of a list of images, tile by tile, within a memory budget.
+
+    Each frame is multiplied by its scale factor, and has pixels masked
+    (set to NaN) where its mask is zero, before combining.
+    NaN pixels are ignored in the combine.
+
+    :param images: images to combine, all with the same shape
+    :param method: combine method, one of COMBINE_METHODS
+    :param scales: per-frame multiplicative scale factors (default 1)
+    :param masks: per-frame masks following the mirar convention
+        (0 is masked, non-zero is kept), or None for no mask
+    :param weights: per-frame weights, used for 'weighted_mean' (default 1)
+    :param sigma: clipping threshold, used for 'sigma_clipped_mean'
+    :param maxiters: maximum clipping iterations, used for 'sigma_clipped_mean'
+    :param max_bytes: memory budget in bytes
+    :param n_threads: number of tiles to combine in parallel
+    :return: combined array
+    """
+    n_frames = len(images)
+
+    if n_frames == 0:
+        err = "No images to combine"
+        logger.error(err)
+        raise CombineError(err)
+
+    if method not in COMBINE_METHODS:
+        err = f"Combine method '{method}' not recognised. Use one of {COMBINE_METHODS}."
+        logger.error(err)
+        raise CombineError(err)
+
+    # Memory-mapped, so only the rows of each tile are read into RAM
+    frames = [x.get_mapped_data() for x in images]
+
+    shape = frames[0].shape
+    for frame, image in zip(frames, images):
+        if frame.shape != shape:
+            err = (
+                f"Cannot combine images with different shapes: "
+                f"{image.get_name()} has shape {frame.shape}, expected {shape}"
+            )
+            logger.error(err)
+            raise CombineError(err)
+
+    scales = np.ones(n_frames) if scales is None else np.asarray(scales, dtype=float)
+    weights = np.ones(n_frames) if weights is None else np.asarray(weights, dtype=float)
+    if masks is None:
+        masks = [None] * n_frames
+
+    n_threads = max(int(n_threads), 1)
+    rows_per_tile = get_rows_per_tile(shape, n_frames, max_bytes, n_threads)
+    row_starts = list(range(0, shape[0], rows_per_tile))
+
+    logger.debug(
+        f"Combining {n_frames} frames of shape {shape} with method '{method}', "
+        f"using {len(row_starts)} tiles of {rows_per_tile} rows"
+    )
+
+    combined = np.empty(shape, dtype=np.float64)
+
+    def process_tile(row_start: int):
+        row_end = min(row_start + rows_per_tile, shape[0])
+        tile = np.empty((n_frames, row_end - row_start, shape[1]), dtype=np.float64)
+        for i, frame in enumerate(frames):
+            tile[i] = frame[row_start:row_end]
+            if scales[i] != 1.0:
+                tile[i] *= scales[i]
+            if masks[i] is not None:
+                tile[i][masks[i][row_start:row_end] == 0] = np.nan
+        combined[row_start:row_end] = combine_tile(
+            tile, method=method, weights=weights, sigma=sigma, maxiters=maxiters
+        )
+
+    if (n_threads > 1) & (len(row_starts) > 1):
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            list(executor.map(process_tile, row_starts))
+    else:
+        for row_start in row_starts:
+            process_tile(row_start)
+
+    return combined
@@ -29,6 +29,24 @@ class ErrorReport:
         self.t_error = datetime.now()
         self.known_error_bool = isinstance(self.error, BaseProcessorError)
         self.non_critical_bool = isinstance(self.error, NoncriticalProcessingError)
+        self._traceback_lines = None
+
+    def __getstate__(self):
+        # Tracebacks cannot be pickled, so freeze them as text before the report
+        # is sent between processes
+        state = self.__dict__.copy()
+        state["_traceback_lines"] = self.get_traceback_lines()
+        return state
+
+    def get_traceback_lines(self) -> list[str]:
+        """
+        Returns the formatted traceback of the error, one entry per frame
+
+        :return: list of traceback strings
+        """
+        if self._traceback_lines is not None:
+            return self._traceback_lines
+        return traceback.format_tb(self.error.__traceback__)
 
     def message_known_error(self) -> str:
         """
@@ -63,7 +81,7 @@ class ErrorReport:
         msg = (
             f"Error for processor {self.processor_name} at {self.t_error} "
             f"(local time): \n "
-            f"{''.join(traceback.format_tb(self.error.__traceback__))}"
+            f"{''.join(self.get_traceback_lines())}"
             f"{self.get_error_name()}: {self.error} \n  "
             f"This error affected the following files: {self.contents} \n"
             f"{self.message_known_error()} \n \n"
@@ -84,7 +102,7 @@ class ErrorReport:
 
         :return: String for single line
         """
-        return traceback.format_tb(self.error.__traceback__)[-1]
+        return self.get_traceback_lines()[-1]
 
     def get_error_line(self) -> str:
         """
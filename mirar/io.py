@@ -7,16 +7,26 @@ All opening/writing of fits files should run via this script.
 import copy
 import logging
 import warnings
+from concurrent.futures import Future
+from functools import partial
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Optional
 
 import numpy as np
 from astropy.io import fits
 from astropy.utils.exceptions import AstropyUserWarning, AstropyWarning
 
+from mirar.async_writer import async_writer
 from mirar.data import Image
 from mirar.errors.exceptions import ProcessorError
-from mirar.paths import BASE_NAME_KEY, LATEST_SAVE_KEY, RAW_IMG_KEY, core_fields
+from mirar.paths import (
+    BASE_NAME_KEY,
+    FITS_COMPRESSIONS,
+    LATEST_SAVE_KEY,
+    RAW_IMG_KEY,
+    core_fields,
+    default_pixel_dtype,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +39,17 @@ class ExtensionParsingError(ProcessorError):
     """Base class for mislabelled extension errors"""
 
 
+class FitsCompressionError(ProcessorError):
+    """Error for unknown FITS compression policies"""
+
+
+# Default quantization level for lossy compression, in units of the noise.
+# Higher values preserve more precision, but compress less.
+DEFAULT_QUANTIZE_LEVEL = 16.0
+
+FZ_SUFFIX = ".fz"
+
+
 def create_fits(data: np.ndarray, header: fits.Header | None) -> fits.PrimaryHDU:
     """
     Return an astropy PrimaryHDU object created with <data> and <header>
@@ -43,7 +64,49 @@ def create_fits(data: np.ndarray, header: fits.Header | None) -> fits.PrimaryHDU
     return proc_hdu
 
 
-def save_hdu_as_fits(hdu: fits.PrimaryHDU, path: str | Path, overwrite: bool = True):
+def create_compressed_fits(
+    data: np.ndarray,
+    header: fits.Header | None,
+    compression: str = "lossless",
+    quantize_level: float = DEFAULT_QUANTIZE_LEVEL,
+) -> fits.HDUList:
+    """
+    Return an astropy HDUList with <data> and <header> in a tile-compressed
+    image extension, as written by fpack.
+
+    Lossless compression uses GZIP without quantization, so data is unchanged.
+    Lossy compression quantizes floating-point data (with dithering, keeping
+    exact zeros) and uses RICE.
+
+    :param data: numpy ndarray containing image data
+    :param header: astropy Header object
+    :param compression: compression policy, "lossless" or "lossy"
+    :param quantize_level: quantization level for lossy compression
+    :return: astropy HDUList object
+    """
+    if compression == "lossless":
+        kwargs = {"compression_type": "GZIP_2", "quantize_level": 0.0}
+    elif compression == "lossy":
+        kwargs = {
+            "compression_type": "RICE_1",
+            "quantize_level": quantize_level,
+            "quantize_method": 2,
+        }
+    else:
+        err = (
+            f"Compression '{compression}' not recognised. "
+            f"Available options are {FITS_COMPRESSIONS}."
+        )
+        logger.error(err)
+        raise FitsCompressionError(err)
+
+    comp_hdu = fits.CompImageHDU(data, header=header, **kwargs)
+    return fits.HDUList([fits.PrimaryHDU(), comp_hdu])
+
+
+def save_hdu_as_fits(
+    hdu: fits.PrimaryHDU | fits.HDUList, path: str | Path, overwrite: bool = True
+):
     """
     Wrapper function to save an astropy hdu to file
 
@@ -61,6 +124,8 @@ def save_to_path(
     header: fits.Header | None,
     path: str | Path,
     overwrite: bool = True,
+    compression: str = "none",
+    quantize_level: float = DEFAULT_QUANTIZE_LEVEL,
 ):
     """
     Function to save an image with <data> and <header> to <path>.
@@ -70,9 +135,16 @@ def save_to_path(
     :param path: output path to save to
     :param overwrite: boolean variable opn whether to overwrite of an
         image exists at <path>. Defaults to True.
+    :param compression: tile compression policy, one of FITS_COMPRESSIONS
+    :param quantize_level: quantization level for lossy compression
     :return: None
     """
-    img = create_fits(data, header=header)
+    if compression == "none":
+        img = create_fits(data, header=header)
+    else:
+        img = create_compressed_fits(
+            data, header=header, compression=compression, quantize_level=quantize_level
+        )
     save_hdu_as_fits(hdu=img, path=path, overwrite=overwrite)
 
 
@@ -91,23 +163,64 @@ def save_mef_to_path(data_list, header_list, primary_header, path):
     hdulist.writeto(path, overwrite=True)
 
 
+def get_image_hdu(hdu_list: fits.HDUList) -> fits.PrimaryHDU | fits.CompImageHDU:
+    """
+    Function to get the image HDU of a single-image fits file. For
+    tile-compressed files, this is the compressed image after an empty primary HDU.
+
+    :param hdu_list: astropy HDUList object
+    :return: image HDU
+    """
+    # Iterate rather than index, as an HDUList indexed by a slice is an HDUList
+    hdus = list(hdu_list)
+    if hdus[0].header.get("NAXIS", 0) == 0:
+        if len(hdus) > 1 and isinstance(hdus[1], fits.CompImageHDU):
+            return hdus[1]
+    return hdus[0]
+
+
+def is_tile_compressed(path: str | Path) -> bool:
+    """
+    Function to check whether the image of a single-image fits file is
+    tile-compressed
+
+    :param path: path of fits file
+    :return: boolean
+    """
+    async_writer.wait(path)
+    with fits.open(path, memmap=False, ignore_missing_simple=True) as img:
+        return isinstance(get_image_hdu(img), fits.CompImageHDU)
+
+
+def get_base_name(path: Path) -> str:
+    """
+    Function to get the base name of an image file, without any fpack suffix
+
+    :param path: path of file
+    :return: base name
+    """
+    return path.name.removesuffix(FZ_SUFFIX)
+
+
 def open_fits(path: str | Path) -> tuple[np.ndarray, fits.Header]:
     """
-    Function to open a fits file saved to <path>
+    Function to open a fits file saved to <path>. Tile-compressed files
+    are decompressed in memory.
 
     :param path: path of fits file
     :return: tuple containing image data and image header
     """
     if isinstance(path, str):
         path = Path(path)
+    async_writer.wait(path)
     with fits.open(path, memmap=False, ignore_missing_simple=True) as img:
-        hdu = img.pop(0)
+        hdu = get_image_hdu(img)
         hdu.verify("silentfix+ignore")
         data = hdu.data
         header = hdu.header
 
     if BASE_NAME_KEY not in header:
-        header[BASE_NAME_KEY] = Path(path).name
+        header[BASE_NAME_KEY] = get_base_name(path)
 
     if RAW_IMG_KEY not in header.keys():
         header[RAW_IMG_KEY] = path.as_posix()
@@ -115,37 +228,107 @@ def open_fits(path: str | Path) -> tuple[np.ndarray, fits.Header]:
     return data, header
 
 
+def open_fits_header(path: str | Path) -> fits.Header:
+    """
+    Function to open the header of a fits file saved to <path>,
+    without reading the data. The header matches that from open_fits.
+
+    :param path: path of fits file
+    :return: image header
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    async_writer.wait(path)
+    with fits.open(path, memmap=False, ignore_missing_simple=True) as img:
+        hdu = get_image_hdu(img)
+        hdu.verify("silentfix+ignore")
+        header = hdu.header  # pylint: disable=no-member
+
+    if BASE_NAME_KEY not in header:
+        header[BASE_NAME_KEY] = get_base_name(path)
+
+    if RAW_IMG_KEY not in header.keys():
+        header[RAW_IMG_KEY] = path.as_posix()
+
+    return header
+
+
+def open_fits_section(path: str | Path, section: tuple[slice, ...]) -> np.ndarray:
+    """
+    Function to read only a section of the image in a fits file. For
+    tile-compressed files, only the tiles overlapping the section are
+    decompressed.
+
+    :param path: path of fits file
+    :param section: tuple of slices, e.g. (slice(0, 100), slice(50, 150))
+    :return: image data in the section
+    """
+    async_writer.wait(path)
+    with fits.open(path, memmap=False, ignore_missing_simple=True) as img:
+        data = get_image_hdu(img).section[section]  # pylint: disable=no-member
+
+    return data
+
+
 def save_fits(
     image: Image,
     path: str | Path,
-):
+    compression: str = "none",
+    quantize_level: float = DEFAULT_QUANTIZE_LEVEL,
+    asynchronous: bool = False,
+    owner: str = "save_fits",
+) -> Optional[Future]:
     """
     Save an Image to path
 
     :param image: Image to save
     :param path: path
-    :return: None
+    :param compression: tile compression policy, one of FITS_COMPRESSIONS
+    :param quantize_level: quantization level for lossy compression
+    :param asynchronous: whether to queue the write (see :mod:`mirar.async_writer`)
+        rather than writing immediately
+    :param owner: name of the code saving the image, for error reports
+    :return: future of the write if asynchronous, otherwise None
     """
     if isinstance(path, str):
         path = Path(path)
     check_image_has_core_fields(image)
-    data = image.get_data()
+    data = image.get_data(read_only=True)
     header = image.get_header()
     if header is not None:
         header[LATEST_SAVE_KEY] = path.as_posix()
     logger.debug(f"Saving to {path.as_posix()}")
-    save_to_path(data, header, path)
+
+    if asynchronous:
+        # The image may change before the write, so write a snapshot
+        return async_writer.submit(
+            path,
+            save_to_path,
+            np.array(data),
+            None if header is None else header.copy(),
+            path,
+            compression=compression,
+            quantize_level=quantize_level,
+            owner=owner,
+        )
+
+    save_to_path(
+        data, header, path, compression=compression, quantize_level=quantize_level
+    )
+    return None
 
 
 def open_raw_image(
     path: str | Path,
     open_f: Callable[[str | Path], tuple[np.ndarray, fits.Header]] = open_fits,
+    dtype: str = default_pixel_dtype,
 ) -> Image:
     """
     Function to open a raw image as an Image object
 
     :param path: path of raw image
     :param open_f: function to open the raw image
+    :param dtype: floating-point type of the image pixels
     :return: Image object
     """
     if isinstance(path, str):
@@ -153,30 +336,93 @@ def open_raw_image(
 
     data, header = open_f(path)
 
-    new_img = Image(data.astype(np.float64), header)
+    new_img = Image(data.astype(dtype), header)
 
     check_image_has_core_fields(new_img)
 
     return new_img
 
 
+def open_raw_header(path: str | Path) -> fits.Header:
+    """
+    Function to open the header of a raw image, matching the header of the
+    Image returned by open_raw_image
+
+    :param path: path of raw image
+    :return: image header
+    """
+    return open_fits_header(path)
+
+
+class DeferredExtension:
+    """
+    Class for the data of one extension of a MEF file, which is only read
+    when needed. The file is memory-mapped, so only this extension is read.
+    """
+
+    def __init__(self, path: str | Path, ext: int):
+        """
+        :param path: path of MEF file
+        :param ext: index of the extension in the file
+        """
+        self.path = Path(path)
+        self.ext = ext
+
+    def __repr__(self):
+        return f"<DeferredExtension {self.ext} of {self.path}>"
+
+    def read(self, dtype: str = default_pixel_dtype) -> np.ndarray:
+        """
+        Read the data of the extension
+
+        :param dtype: floating-point type of the image pixels
+        :return: image data
+        """
+        logger.debug(f"Reading extension {self.ext} of {self.path}")
+        async_writer.wait(self.path)
+        with fits.open(self.path, memmap=True) as hdu:
+            data = np.array(
+                hdu[self.ext].data, dtype=dtype
+            )  # pylint: disable=no-member
+        return data
+
+    def get_image(self, header: fits.Header, dtype: str = default_pixel_dtype) -> Image:
+        """
+        Read the data of the extension as an Image
+
+        :param header: image header
+        :param dtype: floating-point type of the image pixels
+        :return: Image object
+        """
+        return Image(data=self.read(dtype=dtype), header=header)
+
+
 def open_mef_fits(
     path: str | Path,
-) -> tuple[fits.Header, list[np.ndarray], list[fits.Header]]:
+    dtype: str = default_pixel_dtype,
+    lazy: bool = False,
+) -> tuple[fits.Header, list[np.ndarray | DeferredExtension], list[fits.Header]]:
     """
     Function to open a MEF fits file saved to <path>
 
     :param path: path of fits file
+    :param dtype: floating-point type of the image pixels
+    :param lazy: if True, only headers are read, and the data of each
+        extension is returned as a DeferredExtension to be read later
     :return: tuple containing image data and image header
     """
     split_data, split_headers = [], []
+    async_writer.wait(path)
     with fits.open(path, memmap=False) as hdu:
         primary_header = hdu[0].header  # pylint: disable=no-member
         num_ext = len(hdu)
         for ext in range(1, num_ext):
-            split_data.append(
-                hdu[ext].data.astype(np.float64)
-            )  # pylint: disable=no-member
+            if lazy:
+                split_data.append(DeferredExtension(path, ext))
+            else:
+                split_data.append(
+                    hdu[ext].data.astype(dtype)  # pylint: disable=no-member
+                )
             split_headers.append(hdu[ext].header)  # pylint: disable=no-member
 
     return primary_header, split_data, split_headers
@@ -262,17 +508,28 @@ def open_mef_image(
         [str | Path], tuple[fits.Header, list[np.ndarray], list[fits.Header]]
     ] = open_mef_fits,
     extension_key: str | None = None,
+    dtype: str = default_pixel_dtype,
+    lazy: bool = False,
 ) -> list[Image]:
     """
     Function to open a raw image as an Image object
 
     :param path: path of raw image
-    :param open_f: function to open the raw image
+    :param open_f: function to open the raw image. It must accept a 'dtype'
+        argument, as open_mef_fits, and return data of that type.
     :param extension_key: key to use to number the MEF frames
+    :param dtype: floating-point type of the image pixels
+    :param lazy: if True, each image has deferred data (see
+        :meth:`~mirar.data.image_data.Image.from_loader`), and only the
+        extension of an image is read when its data is first needed.
+        open_f must then accept a 'lazy' argument, as open_mef_fits.
     :return: Image object
     """
 
-    primary_header, ext_data_list, ext_header_list = open_f(path)
+    if lazy:
+        primary_header, ext_data_list, ext_header_list = open_f(path, lazy=True)
+    else:
+        primary_header, ext_data_list, ext_header_list = open_f(path, dtype=dtype)
 
     ext_header_list = tag_mef_extension_file_headers(
         primary_header=primary_header,
@@ -280,12 +537,17 @@ def open_mef_image(
         extension_key=extension_key,
     )
 
-    ext_data_list = [x.astype(np.float64) for x in ext_data_list]
     split_images_list = []
 
     for i, ext_data in enumerate(ext_data_list):
-        single_header = ext_header_list[i]
-        image = Image(data=copy.deepcopy(ext_data), header=copy.deepcopy(single_header))
+        single_header = copy.deepcopy(ext_header_list[i])
+        if isinstance(ext_data, DeferredExtension):
+            image = Image.from_loader(
+                single_header,
+                partial(ext_data.get_image, header=single_header, dtype=dtype),
+            )
+        else:
+            image = Image(data=ext_data, header=single_header)
         check_image_has_core_fields(image)
 
         split_images_list.append(image)
@@ -297,6 +559,33 @@ def open_mef_image(
     return split_images_list
 
 
+def open_mef_headers(
+    path: str | Path,
+    open_f: Callable[
+        [str | Path], tuple[fits.Header, list[np.ndarray], list[fits.Header]]
+    ] = open_mef_fits,
+    extension_key: str | None = None,
+) -> list[fits.Header]:
+    """
+    Function to open the headers of a MEF file without reading the data,
+    matching the headers of the Images returned by open_mef_image
+
+    :param path: path of MEF file
+    :param open_f: function to open the MEF file, as passed to open_mef_image.
+        It is called with lazy=True, so must accept a 'lazy' argument,
+        as open_mef_fits.
+    :param extension_key: key to use to number the MEF frames
+    :return: list of extension headers
+    """
+    primary_header, _, ext_headers = open_f(path, lazy=True)
+
+    return tag_mef_extension_file_headers(
+        primary_header=primary_header,
+        extension_headers=ext_headers,
+        extension_key=extension_key,
+    )
+
+
 def check_file_is_complete(path: str) -> bool:
     """
     Function to check whether a fits file is as large as expected.
@@ -313,6 +602,7 @@ def check_file_is_complete(path: str) -> bool:
     :return: boolean file complete
     """
     check = False
+    async_writer.wait(path)
     with warnings.catch_warnings():
         warnings.filterwarnings("ignore", category=AstropyUserWarning)
         try:
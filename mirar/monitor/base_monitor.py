@@ -195,6 +195,7 @@ class Monitor:
                     latest_dir=str(self.raw_image_directory),
                     night=night,
                     open_f=self.pipeline.unpack_raw_image,
+                    header_f=self.pipeline.get_raw_header_function(),
                     requirements=cal_requirements,
                 )
             except ImageNotFoundError as exc:
@@ -388,6 +389,7 @@ class Monitor:
             postprocess_config = [
                 ImageLoader(
                     load_image=self.pipeline.unpack_raw_image,
+                    load_header=self.pipeline.get_raw_header_function(),
                     input_sub_dir=self.sub_dir,
                     input_img_dir=str(Path(self.raw_image_directory)).split(
                         self.pipeline_name, maxsplit=1
@@ -33,6 +33,43 @@ else:
     default_n_cpu = max(int(_n_cpu / 2), 1)
 max_n_cpu: int = int(os.getenv("MAX_N_CPU", default_n_cpu))
 
+
+def get_env_choice(name: str, default: str, choices: list[str]) -> str:
+    """
+    Get the value of an environment variable which must be one of a set of choices
+
+    :param name: name of environment variable
+    :param default: default value, if the variable is not set
+    :param choices: allowed values
+    :return: value (lower case)
+    """
+    value = os.getenv(name, default).lower()
+    if value not in choices:
+        err = (
+            f"Environment variable {name} is set to '{value}', "
+            f"but must be one of {choices}."
+        )
+        logger.error(err)
+        raise ValueError(err)
+    return value
+
+
+# Backend used to run processors over batches, either "thread" or "process"
+EXECUTION_MODES = ["thread", "process"]
+default_execution_mode: str = get_env_choice(
+    "EXECUTION_MODE", "thread", EXECUTION_MODES
+)
+
+# Floating-point type used to store image pixels, either "float64" or "float32"
+PIXEL_DTYPES = ["float64", "float32"]
+default_pixel_dtype: str = get_env_choice("PIXEL_DTYPE", "float64", PIXEL_DTYPES)
+
+# Tile compression of saved images: "none", "lossless" or "lossy" (quantized)
+FITS_COMPRESSIONS = ["none", "lossless", "lossy"]
+default_fits_compression: str = get_env_choice(
+    "FITS_COMPRESSION", "none", FITS_COMPRESSIONS
+)
+
 # Set up default directories
 
 default_dir = Path.home()
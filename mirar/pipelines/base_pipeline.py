@@ -13,16 +13,26 @@ The pipeline will process data using a chosen list of these individual
 import copy
 import logging
 import os
+import threading
+from collections.abc import Callable
 from pathlib import Path
+from queue import Queue
+from threading import Thread
 from typing import Optional
 
 import numpy as np
+from astropy.io.fits import Header
 
+from mirar.async_writer import async_writer
 from mirar.data import Dataset, Image, ImageBatch
-from mirar.errors import ErrorStack
-from mirar.paths import get_output_path
-from mirar.processors.base_processor import BaseProcessor
+from mirar.data.cache import USE_CACHE, cache, hot_cache
+from mirar.data.scratch import scratch_files
+from mirar.errors import ErrorReport, ErrorStack
+from mirar.paths import default_pixel_dtype, get_output_path
+from mirar.processors.base_processor import BaseProcessor, check_pixel_dtype
+from mirar.processors.photometry.context import photometry_contexts
 from mirar.processors.utils.error_annotator import ErrorStackAnnotator
+from mirar.profiling import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +53,10 @@ class Pipeline:
 
     default_cal_requirements = None
 
+    # Floating-point type used to store image pixels. "float32" halves the
+    # memory and cache used by images, and can be overridden by processors
+    pixel_dtype: str = default_pixel_dtype
+
     @property
     def name(self):
         """
@@ -66,9 +80,15 @@ class Pipeline:
         self,
         selected_configurations: str | list[str] = "default",
         night: int | str = "",
+        streaming: bool = False,
+        pixel_dtype: Optional[str] = None,
     ):
         self.night_sub_dir = os.path.join(self.name, night)
         self.night = night
+        self.streaming = streaming
+        if pixel_dtype is not None:
+            check_pixel_dtype(pixel_dtype)
+            self.pixel_dtype = pixel_dtype
         if not isinstance(selected_configurations, list):
             selected_configurations = [selected_configurations]
         self.selected_configurations = selected_configurations
@@ -123,6 +143,20 @@ class Pipeline:
             raw_images = [raw_images]
         return ImageBatch(raw_images)
 
+    def get_raw_header_function(
+        self,
+    ) -> Optional[Callable[[str | Path], Header | list[Header]]]:
+        """
+        Function to get a function opening only the headers of raw images,
+        matching those of the images from
+        :func:`~mirar.pipelines.base_pipeline.Pipeline.unpack_raw_image`.
+        With one, raw data is only read once needed, and a header index can
+        be used (see :mod:`mirar.data.header_index`).
+
+        :return: header function, or None if the pipeline has none
+        """
+        return None
+
     def unpack_raw_image(self, path: str) -> Image | list[Image]:
         """
         Function to load in a raw image and ensure it has
@@ -178,6 +212,7 @@ class Pipeline:
         processors = self.configure_processors(processors, sub_dir=self.night_sub_dir)
         for i, processor in enumerate(processors):
             logger.debug(f"Initialising processor {processor.__class__}")
+            processor.set_pipeline_pixel_dtype(self.pixel_dtype)
             processor.set_preceding_steps(previous_steps=processors[:i])
             processor.check_prerequisites()
         logger.debug("Pipeline initialisation complete.")
@@ -193,6 +228,109 @@ class Pipeline:
         """
         raise NotImplementedError()
 
+    @staticmethod
+    def group_processors(
+        processors: list[BaseProcessor], streaming: bool = False
+    ) -> list[list[BaseProcessor]]:
+        """
+        Groups processors into steps for
+        :func:`~mirar.pipelines.base_pipeline.Pipeline.reduce_images`.
+
+        Without streaming, each processor is its own step. With streaming,
+        consecutive processors are grouped together so batches can flow through
+        them independently. Barrier processors (which need the whole dataset),
+        and processors using the 'process' execution mode, are always their own
+        step.
+
+        :param processors: Processors to group
+        :param streaming: Whether to group processors for streaming
+        :return: list of processor steps
+        """
+        if not streaming:
+            return [[x] for x in processors]
+
+        steps = []
+        stream = []
+
+        for processor in processors:
+            if processor.is_barrier | (processor.execution_mode == "process"):
+                if len(stream) > 0:
+                    steps.append(stream)
+                    stream = []
+                steps.append([processor])
+            else:
+                stream.append(processor)
+
+        if len(stream) > 0:
+            steps.append(stream)
+
+        return steps
+
+    @staticmethod
+    def stream_processors(
+        processors: list[BaseProcessor], dataset: Dataset
+    ) -> tuple[Dataset, ErrorStack]:
+        """
+        Applies a chain of processors to a dataset, with each batch flowing through
+        the chain on its own. Batch N can therefore be at step i+1 while batch N+1
+        is still at step i. Each processor runs on up to max_n_cpu batches at once,
+        as with :func:`~mirar.processors.base_processor.BaseProcessor.base_apply`.
+
+        None of the processors may be barriers.
+
+        :param processors: Processors to apply, in order
+        :param dataset: Input dataset
+        :return: Post-processing dataset and summary of errors caught
+        """
+        err_stack = ErrorStack()
+        lock = threading.Lock()
+        results = {}
+
+        queues = [Queue() for _ in range(len(processors) + 1)]
+
+        def stream_worker(step: int):
+            processor = processors[step]
+            while True:
+                item = queues[step].get()
+                if item is None:
+                    break
+                j, batch = item
+                new_batch, err = processor.apply_with_report(batch)
+                if err is not None:
+                    with lock:
+                        err_stack.add_report(err)
+                if new_batch is not None:
+                    queues[step + 1].put((j, new_batch))
+
+        all_workers = []
+        for step, processor in enumerate(processors):
+            n_cpu = max(min([processor.max_n_cpu, len(dataset)]), 1)
+            workers = [
+                Thread(target=stream_worker, args=(step,), daemon=True)
+                for _ in range(n_cpu)
+            ]
+            for worker in workers:
+                worker.start()
+            all_workers.append(workers)
+
+        for j, batch in enumerate(dataset):
+            queues[0].put((j, batch))
+
+        # Each step finishes once every worker of the step before it has finished
+        for step, workers in enumerate(all_workers):
+            for _ in workers:
+                queues[step].put(None)
+            for worker in workers:
+                worker.join()
+
+        while not queues[-1].empty():
+            j, batch = queues[-1].get()
+            results[j] = batch
+
+        new_dataset = Dataset([results[j] for j in sorted(results.keys())])
+
+        return new_dataset, err_stack
+
     def get_error_output_path(self) -> Path:
         """
         Generates a unique path for the error summary,
@@ -219,6 +357,7 @@ class Pipeline:
         output_error_path: Optional[str] = None,
         catch_all_errors: bool = True,
         selected_configurations: Optional[str | list[str]] = None,
+        streaming: Optional[bool] = None,
     ) -> tuple[Dataset, ErrorStack]:
         """
         Function to process a given dataset.
@@ -227,6 +366,9 @@ class Pipeline:
         :param output_error_path: optional path to write error summary
         :param catch_all_errors: Either catch errors, or just immediately raise them
         :param selected_configurations: Configuration to use
+        :param streaming: Whether to stream batches through consecutive processors
+            (see :func:`~mirar.pipelines.base_pipeline.Pipeline.stream_processors`).
+            Defaults to the pipeline setting.
         :return: Post-processing dataset and summary of errors caught
         """
 
@@ -238,45 +380,115 @@ class Pipeline:
 
         err_stack = ErrorStack()
 
+        profiler.clear()
+
         if selected_configurations is None:
             selected_configurations = self.selected_configurations
 
         if not isinstance(selected_configurations, list):
             selected_configurations = [selected_configurations]
 
-        for j, configuration in enumerate(selected_configurations):
-            logger.info(
-                f"Using pipeline configuration {configuration} "
-                f"({j+1}/{len(selected_configurations)})"
-            )
+        if streaming is None:
+            streaming = self.streaming
 
-            processors = self.set_configuration(configuration)
+        try:
+            for j, configuration in enumerate(selected_configurations):
+                logger.info(
+                    f"Using pipeline configuration {configuration} "
+                    f"({j+1}/{len(selected_configurations)})"
+                )
 
-            for i, processor in enumerate(processors):
+                processors = self.set_configuration(configuration)
+
+                steps = self.group_processors(processors, streaming=streaming)
+
+                n_done = 0
+
+                for step in steps:
+                    if len(step) == 1:
+                        processor = step[0]
+                        logger.info(
+                            f"Applying '{processor.__class__} to "
+                            f"{len(dataset)} batches "
+                            f"(Step {n_done + 1}/{len(processors)})"
+                        )
+                        logger.info(f"[{str(processor)}]")
+
+                        dataset, new_err_stack = processor.base_apply(dataset)
+                    else:
+                        logger.info(
+                            f"Streaming {len(dataset)} batches through "
+                            f"{[x.__class__.__name__ for x in step]} "
+                            f"(Steps {n_done + 1}-{n_done + len(step)}"
+                            f"/{len(processors)})"
+                        )
+                        for processor in step:
+                            logger.info(f"[{str(processor)}]")
+
+                        dataset, new_err_stack = self.stream_processors(step, dataset)
+
+                    err_stack += new_err_stack
+                    n_done += len(step)
+
+                    if np.logical_and(not catch_all_errors, len(err_stack.reports) > 0):
+                        raise err_stack.reports[0].error
+
+                    if len(dataset) == 0:
+                        logger.error(
+                            f"No images left in dataset. "
+                            f"Terminating early, after step {n_done}/{len(processors)} "
+                            f"({step[-1].__class__.__name__})."
+                        )
+                        break
+
+            write_failures = async_writer.flush()
+            for path, owner, err in write_failures:
+                err_stack.add_report(ErrorReport(err, owner, [path]))
+
+            if np.logical_and(not catch_all_errors, len(write_failures) > 0):
+                raise write_failures[0][2]
+
+        finally:
+            # Clean up even if a processor raised, as the process may be reused,
+            # e.g. by the monitor
+            if async_writer.get_stats()["n_submitted"] > 0:
+                logger.info(f"Asynchronous writes: {async_writer.get_stats()}")
+
+            if scratch_files.get_stats()["n_written"] > 0:
+                logger.info(f"Scratch file usage: {scratch_files.get_stats()}")
+            scratch_files.clear()
+
+            if photometry_contexts.get_stats()["n_misses"] > 0:
                 logger.info(
-                    f"Applying '{processor.__class__} to {len(dataset)} batches "
-                    f"(Step {i + 1}/{len(processors)})"
+                    f"Photometry context usage: {photometry_contexts.get_stats()}"
                 )
-                logger.info(f"[{str(processor)}]")
+            photometry_contexts.reset()
 
-                dataset, new_err_stack = processor.base_apply(dataset)
-                err_stack += new_err_stack
+            if USE_CACHE:
+                logger.info(f"Image cache usage: {cache.get_usage()}")
 
-                if np.logical_and(not catch_all_errors, len(err_stack.reports) > 0):
-                    raise err_stack.reports[0].error
-
-                if len(dataset) == 0:
-                    logger.error(
-                        f"No images left in dataset. "
-                        f"Terminating early, after step {i + 1}/{len(processors)} "
-                        f"({processor.__class__.__name__})."
-                    )
-                    break
+            if hot_cache.is_enabled():
+                logger.info(f"In-RAM image cache usage: {hot_cache.get_stats()}")
+            hot_cache.clear()
 
         err_stack.summarise_error_stack(output_path=output_error_path)
         err_stack.summarise_error_stack_tsv(
             output_path=output_error_path.with_suffix(".tsv")
         )
+
+        if profiler.is_enabled():
+            for summary in profiler.summarise()[:5]:
+                logger.info(
+                    f"Profile of {summary['processor']}: "
+                    f"{summary['wall_time_s']:.1f}s wall time, "
+                    f"{summary['cpu_time_s']:.1f}s CPU time, "
+                    f"{summary['subprocess_time_s']:.1f}s in external tools, "
+                    f"over {summary['n_batches']} batches"
+                )
+            profiler.write(
+                output_error_path.with_name(f"{output_error_path.stem}_profile")
+            )
+
         return dataset, err_stack
 
     def postprocess_configuration(
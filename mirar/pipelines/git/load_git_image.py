@@ -20,6 +20,7 @@ from mirar.paths import (
     SATURATE_KEY,
     TARGET_KEY,
     ZP_STD_KEY,
+    default_pixel_dtype,
 )
 
 git_filter_dict = {"g": 1, "r": 2, "i": 3, "z": 4, "y": 5}
@@ -147,21 +148,23 @@ def load_raw_lt_fits(path: str | Path) -> tuple[np.array, astropy.io.fits.Header
     return data, header
 
 
-def load_raw_git_image(path: str | Path) -> Image:
+def load_raw_git_image(path: str | Path, dtype: str = default_pixel_dtype) -> Image:
     """
     Function to load a raw GIT image
 
     :param path: Path to the raw image
+    :param dtype: floating-point type of the image pixels
     :return: Image object
     """
-    return open_raw_image(path, load_raw_git_fits)
+    return open_raw_image(path, load_raw_git_fits, dtype=dtype)
 
 
-def load_raw_lt_image(path: str | Path) -> Image:
+def load_raw_lt_image(path: str | Path, dtype: str = default_pixel_dtype) -> Image:
     """
     Function to load a raw LT image
 
     :param path: Path to the raw image
+    :param dtype: floating-point type of the image pixels
     :return: Image object
     """
-    return open_raw_image(path, load_raw_lt_fits)
+    return open_raw_image(path, load_raw_lt_fits, dtype=dtype)
@@ -11,7 +11,7 @@ from astropy.io import fits
 from astropy.time import Time
 
 from mirar.data import Image
-from mirar.io import open_mef_fits, open_mef_image
+from mirar.io import open_mef_fits, open_mef_headers, open_mef_image
 from mirar.paths import (
     BASE_NAME_KEY,
     EXPTIME_KEY,
@@ -23,6 +23,7 @@ from mirar.paths import (
     TARGET_KEY,
     TIME_KEY,
     __version__,
+    default_pixel_dtype,
 )
 from mirar.processors.skyportal.skyportal_source import SNCOSMO_KEY
 from mirar.processors.utils.image_loader import InvalidImage
@@ -209,9 +210,16 @@ def clean_cal_header(
 
 def load_raw_sedmv2_mef(
     path: str | Path,
+    dtype: str = default_pixel_dtype,
+    lazy: bool = False,
 ) -> tuple[fits.Header, list[np.array], list[fits.Header]]:
     """
     Load mef image
+
+    :param path: Path to image
+    :param dtype: floating-point type of the image pixels
+    :param lazy: Whether to defer reading the data of each extension
+    :return: Primary header, list of data arrays, list of headers
     """
 
     sedmv2_ignore_files = [
@@ -223,7 +231,7 @@ def load_raw_sedmv2_mef(
         logger.debug(f"Skipping unneeded SEDMv2 file {path}.")
         raise InvalidImage
 
-    header, split_data, split_headers = open_mef_fits(path)
+    header, split_data, split_headers = open_mef_fits(path, dtype=dtype, lazy=lazy)
 
     if "IMGTYPE" in header.keys():  # all modes except mode0
         check_header = header
@@ -257,13 +265,27 @@ def load_raw_sedmv2_mef(
 
 def load_sedmv2_mef_image(
     path: str | Path,
+    dtype: str = default_pixel_dtype,
+    lazy: bool = False,
 ) -> list[Image]:
     """
     Function to load sedmv2 mef images
     :param path: Path to image
+    :param dtype: floating-point type of the image pixels
+    :param lazy: Whether to only read the data of each extension when first needed
     :return: list of images
     """
-    return open_mef_image(path, load_raw_sedmv2_mef)
+    return open_mef_image(path, load_raw_sedmv2_mef, dtype=dtype, lazy=lazy)
+
+
+def load_sedmv2_mef_header(path: str | Path) -> list[fits.Header]:
+    """
+    Function to load only the headers of sedmv2 mef images, matching
+    the headers of the images returned by load_sedmv2_mef_image
+    :param path: Path to image
+    :return: list of headers
+    """
+    return open_mef_headers(path, load_raw_sedmv2_mef)
 
 
 def date_obs_to_mjd(t_raw: str) -> str:
@@ -23,7 +23,10 @@ from mirar.pipelines.sedmv2.blocks import (
     upload_fritz,
 )
 from mirar.pipelines.sedmv2.config import PIPELINE_NAME, sedmv2_cal_requirements
-from mirar.pipelines.sedmv2.load_sedmv2_image import load_raw_sedmv2_mef
+from mirar.pipelines.sedmv2.load_sedmv2_image import (
+    load_raw_sedmv2_mef,
+    load_sedmv2_mef_header,
+)
 
 sedmv2_flats_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)))
 
@@ -67,3 +70,6 @@ class SEDMv2Pipeline(Pipeline):
     #   return load_raw_sedmv2_image(path)
     def _load_raw_image(path: str | Path) -> Image | list[Image]:
         return open_mef_image(path, load_raw_sedmv2_mef)
+
+    def get_raw_header_function(self):
+        return load_sedmv2_mef_header
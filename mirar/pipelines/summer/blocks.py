@@ -30,6 +30,7 @@ from mirar.pipelines.summer.generator import (
 )
 from mirar.pipelines.summer.load_summer_image import (
     load_proc_summer_image,
+    load_raw_summer_header,
     load_raw_summer_image,
 )
 from mirar.pipelines.summer.models import Diff, Exposure, Proc, Raw
@@ -54,7 +55,7 @@ from mirar.processors.utils.simulate_realtime import RealtimeImageSimulator
 from mirar.processors.zogy.zogy import ZOGY, ZOGYPrepare
 
 load_raw = [
-    ImageLoader(load_image=load_raw_summer_image),
+    ImageLoader(load_image=load_raw_summer_image, load_header=load_raw_summer_header),
 ]
 
 load_test = [
@@ -121,7 +122,11 @@ export_raw = [
 ]
 
 cal_hunter = [
-    CalHunter(load_image=load_raw_summer_image, requirements=summer_cal_requirements),
+    CalHunter(
+        load_image=load_raw_summer_image,
+        load_header=load_raw_summer_header,
+        requirements=summer_cal_requirements,
+    ),
 ]
 
 test_cr = [
@@ -14,7 +14,7 @@ from astropy.time import Time
 from astropy.utils.exceptions import AstropyWarning
 
 from mirar.data import Image
-from mirar.io import open_fits, open_raw_image
+from mirar.io import open_fits, open_fits_header, open_raw_image
 from mirar.paths import (
     BASE_NAME_KEY,
     GAIN_KEY,
@@ -25,25 +25,23 @@ from mirar.paths import (
     RAW_IMG_KEY,
     TARGET_KEY,
     __version__,
+    default_pixel_dtype,
 )
 from mirar.pipelines.summer.models import DEFAULT_FIELD, SUMMER_NIGHT_FORMAT
 
 logger = logging.getLogger(__name__)
 
 
-def load_raw_summer_fits(path: str | Path) -> tuple[np.array, astropy.io.fits.Header]:
+def clean_raw_summer_header(
+    path: Path, header: astropy.io.fits.Header
+) -> astropy.io.fits.Header:
     """
-    Function to load a raw summer image and add/modify the required headers
-    Args:
-        path: Path to the raw image
-
-    Returns: [image data, image header]
+    Function to add/modify the required headers of a raw summer image
 
+    :param path: Path to the raw image
+    :param header: Raw header
+    :return: Updated header
     """
-    if isinstance(path, str):
-        path = Path(path)
-    data, header = open_fits(path)
-
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", AstropyWarning)
         header[OBSCLASS_KEY] = header["OBSTYPE"].lower()
@@ -90,8 +88,6 @@ def load_raw_summer_fits(path: str | Path) -> tuple[np.array, astropy.io.fits.He
         header[LATEST_SAVE_KEY] = path.as_posix()
         header[RAW_IMG_KEY] = path.as_posix()
 
-        data = data * 1.0  # pylint: disable=no-member
-
         if "other" in header["FILTERID"]:
             header["FILTERID"] = "r"
 
@@ -224,17 +220,48 @@ def load_raw_summer_fits(path: str | Path) -> tuple[np.array, astropy.io.fits.He
         if GAIN_KEY not in header.keys():
             header[GAIN_KEY] = 1.0
 
-    return data, header  # pylint: disable=no-member
+    return header
+
+
+def load_raw_summer_fits(path: str | Path) -> tuple[np.array, astropy.io.fits.Header]:
+    """
+    Function to load a raw summer image and add/modify the required headers
+    Args:
+        path: Path to the raw image
+
+    Returns: [image data, image header]
+
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    data, header = open_fits(path)
+    header = clean_raw_summer_header(path, header)
+    data = data * 1.0  # pylint: disable=no-member
+    return data, header
+
+
+def load_raw_summer_header(path: str | Path) -> astropy.io.fits.Header:
+    """
+    Function to load only the header of a raw summer image, matching the
+    header of the Image returned by load_raw_summer_image
+
+    :param path: Path to the raw image
+    :return: Image header
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    return clean_raw_summer_header(path, open_fits_header(path))
 
 
-def load_raw_summer_image(path: str | Path) -> Image:
+def load_raw_summer_image(path: str | Path, dtype: str = default_pixel_dtype) -> Image:
     """
     Function to load a raw summer image and add/modify the required headers
 
     :param path: Path to the raw image
+    :param dtype: floating-point type of the image pixels
     :return: Image object
     """
-    return open_raw_image(path, load_raw_summer_fits)
+    return open_raw_image(path, load_raw_summer_fits, dtype=dtype)
 
 
 def load_proc_summer_image(path: str) -> Image:
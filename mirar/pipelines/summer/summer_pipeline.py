@@ -25,7 +25,10 @@ from mirar.pipelines.summer.blocks import (
     test_cr,
 )
 from mirar.pipelines.summer.config import PIPELINE_NAME, summer_cal_requirements
-from mirar.pipelines.summer.load_summer_image import load_raw_summer_image
+from mirar.pipelines.summer.load_summer_image import (
+    load_raw_summer_header,
+    load_raw_summer_image,
+)
 
 summer_flats_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)))
 
@@ -68,3 +71,6 @@ class SummerPipeline(Pipeline):
     @staticmethod
     def _load_raw_image(path: str | Path) -> Image | list[Image]:
         return load_raw_summer_image(path)
+
+    def get_raw_header_function(self):
+        return load_raw_summer_header
@@ -72,6 +72,7 @@ from mirar.pipelines.winter.load_winter_image import (
     load_astrometried_winter_image,
     load_stacked_winter_image,
     load_test_winter_image,
+    load_winter_mef_header,
     load_winter_mef_image,
     load_winter_stack,
 )
@@ -335,7 +336,11 @@ load_and_export_unpacked = load_unpacked + export_unpacked
 
 #
 cal_hunter = [
-    CalHunter(load_image=load_winter_mef_image, requirements=winter_cal_requirements)
+    CalHunter(
+        load_image=load_winter_mef_image,
+        load_header=load_winter_mef_header,
+        requirements=winter_cal_requirements,
+    )
 ]
 # Detrend blocks
 
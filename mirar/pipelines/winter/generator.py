@@ -174,7 +174,7 @@ def check_winter_local_catalog_overlap(ref_cat_path: Path, image: Image) -> bool
     """
     # Check if there is enough overlap between the image and the
     # local reference catalog
-    local_ref_cat = get_table_from_ldac(ref_cat_path)
+    local_ref_cat = get_table_from_ldac(ref_cat_path, columns=["ra", "dec"])
 
     if len(local_ref_cat) == 0:
         logger.debug(f"Reference catalog {ref_cat_path} is empty.")
@@ -964,7 +964,7 @@ def mask_stamps_around_bright_stars(image: Image):
     """
 
     catalog_path = image[REF_CAT_PATH_KEY]
-    catalog = get_table_from_ldac(catalog_path)
+    catalog = get_table_from_ldac(catalog_path, columns=["magnitude", "ra", "dec"])
     bright_stars = catalog[(catalog["magnitude"] < 11)]
     logger.debug(f"Found {len(bright_stars)} bright stars in the image")
     stamp_half_size = 20
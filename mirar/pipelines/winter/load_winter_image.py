@@ -19,6 +19,7 @@ from mirar.io import (
     ExtensionParsingError,
     open_fits,
     open_mef_fits,
+    open_mef_headers,
     open_mef_image,
     open_raw_image,
     tag_mef_extension_file_headers,
@@ -34,6 +35,7 @@ from mirar.paths import (
     SATURATE_KEY,
     TARGET_KEY,
     core_fields,
+    default_pixel_dtype,
 )
 from mirar.pipelines.winter.constants import (
     all_winter_board_ids,
@@ -302,14 +304,16 @@ def load_stacked_winter_image(
 
 def load_test_winter_image(
     path: str | Path,
+    dtype: str = default_pixel_dtype,
 ) -> Image:
     """
     Load test WINTER image
 
     :param path: Path to image
+    :param dtype: floating-point type of the image pixels
     :return: Image object
     """
-    image = open_raw_image(path)
+    image = open_raw_image(path, dtype=dtype)
     header = clean_header(image.header)
 
     image.set_header(header)
@@ -318,14 +322,20 @@ def load_test_winter_image(
 
 def load_raw_winter_mef(
     path: str,
+    dtype: str = default_pixel_dtype,
+    lazy: bool = False,
 ) -> tuple[astropy.io.fits.Header, list[np.array], list[astropy.io.fits.Header]]:
     """
     Load mef image.
 
     :param path: Path to image
+    :param dtype: floating-point type of the image pixels
+    :param lazy: Whether to defer reading the data of each extension
     :return: Primary header, list of data arrays, list of headers
     """
-    primary_header, split_data, split_headers = open_mef_fits(path)
+    primary_header, split_data, split_headers = open_mef_fits(
+        path, dtype=dtype, lazy=lazy
+    )
 
     img_name = Path(path).name
     primary_header[BASE_NAME_KEY] = img_name
@@ -412,17 +422,34 @@ def load_raw_winter_mef(
 
 def load_winter_mef_image(
     path: str | Path,
+    dtype: str = default_pixel_dtype,
+    lazy: bool = False,
 ) -> list[Image]:
     """
     Function to load winter mef images
 
     :param path: Path to image
+    :param dtype: floating-point type of the image pixels
+    :param lazy: Whether to only read the data of each board when first needed
     :return: list of images
     """
-    images = open_mef_image(path, load_raw_winter_mef, extension_key="BOARD_ID")
+    images = open_mef_image(
+        path, load_raw_winter_mef, extension_key="BOARD_ID", dtype=dtype, lazy=lazy
+    )
     return images
 
 
+def load_winter_mef_header(path: str | Path) -> list[astropy.io.fits.Header]:
+    """
+    Function to load only the headers of winter mef images, matching
+    the headers of the images returned by load_winter_mef_image
+
+    :param path: Path to image
+    :return: list of headers
+    """
+    return open_mef_headers(path, load_raw_winter_mef, extension_key="BOARD_ID")
+
+
 def annotate_winter_subdet_headers(batch: ImageBatch) -> ImageBatch:
     """
     Annotate winter header with information on the subdetector
@@ -53,7 +53,10 @@ from mirar.pipelines.winter.blocks import (
     unpack_subset_no_calhunter,
 )
 from mirar.pipelines.winter.config import PIPELINE_NAME, winter_cal_requirements
-from mirar.pipelines.winter.load_winter_image import load_raw_winter_mef
+from mirar.pipelines.winter.load_winter_image import (
+    load_raw_winter_mef,
+    load_winter_mef_header,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -133,6 +136,9 @@ class WINTERPipeline(Pipeline):
     def _load_raw_image(path: str) -> Image | list[Image]:
         return open_mef_image(path, load_raw_winter_mef, extension_key="BOARD_ID")
 
+    def get_raw_header_function(self):
+        return load_winter_mef_header
+
     @staticmethod
     def download_raw_images_for_night(night: str):
         download_via_ssh(
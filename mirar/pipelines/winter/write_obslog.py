@@ -5,9 +5,9 @@ Module to write an observation log for a directory of images
 import argparse
 from glob import glob
 
-from astropy.io import fits
 from astropy.table import Table
 
+from mirar.io import open_fits_header
 from mirar.paths import OBSCLASS_KEY, TARGET_KEY, get_output_dir
 
 
@@ -29,7 +29,7 @@ def write_observation_log(image_dir):
 
     all_entries = []
     for filename in filelist:
-        header = fits.getheader(filename)
+        header = open_fits_header(filename)
         entries = [header[key] for key in keywords if key in header]
         found_keys = [key for key in keywords if key in header]
         all_entries.append(entries)
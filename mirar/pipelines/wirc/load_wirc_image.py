@@ -21,6 +21,7 @@ from mirar.paths import (
     TARGET_KEY,
     ZP_KEY,
     ZP_STD_KEY,
+    default_pixel_dtype,
 )
 from mirar.processors.skyportal import SNCOSMO_KEY
 
@@ -101,11 +102,12 @@ def load_raw_wirc_fits(path: str | Path) -> tuple[np.array, astropy.io.fits.Head
     return data, header
 
 
-def load_raw_wirc_image(path: str | Path) -> Image:
+def load_raw_wirc_image(path: str | Path, dtype: str = default_pixel_dtype) -> Image:
     """
     Function to load a raw WIRC image
 
     :param path: Path to the raw image
+    :param dtype: floating-point type of the image pixels
     :return: Image object
     """
-    return open_raw_image(path, load_raw_wirc_fits)
+    return open_raw_image(path, load_raw_wirc_fits, dtype=dtype)
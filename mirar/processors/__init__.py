@@ -7,6 +7,7 @@ from mirar.processors.base_processor import BaseImageProcessor
 from mirar.processors.bias import BiasCalibrator
 from mirar.processors.dark import DarkCalibrator
 from mirar.processors.flat import FlatCalibrator, SkyFlatCalibrator
+from mirar.processors.fused_calibration import FusedCalibrator
 from mirar.processors.mask import MaskPixelsFromPath
 from mirar.processors.utils.image_saver import ImageSaver
 
@@ -209,12 +209,18 @@ class Sextractor(BaseImageProcessor):
             if self.gain is None and "GAIN" in image.keys():
                 self.gain = image["GAIN"]
 
-            temp_path = get_temp_path(sextractor_out_dir, image[BASE_NAME_KEY])
-
-            if not os.path.exists(temp_path):
-                self.save_fits(image, temp_path)
+            # Temporary files are kept in the output dir when caching,
+            # and otherwise shared scratch files are used
+            scratch_files = []
+            if self.cache:
+                temp_path = get_temp_path(sextractor_out_dir, image[BASE_NAME_KEY])
+                if not os.path.exists(temp_path):
+                    self.save_fits(image, temp_path)
+            else:
+                temp_path = self.save_scratch_fits(image)
+                scratch_files.append(temp_path)
 
-            temp_files = [temp_path]
+            temp_files = []
 
             weight_path = None
 
@@ -231,8 +237,11 @@ class Sextractor(BaseImageProcessor):
                     temp_files.append(Path(weight_path))
 
             if weight_path is None:
-                weight_path = self.save_mask_image(image, temp_path)
-                temp_files.append(Path(weight_path))
+                if self.cache:
+                    weight_path = self.save_mask_image(image, temp_path)
+                else:
+                    weight_path = self.save_scratch_mask(image, temp_path)
+                    scratch_files.append(weight_path)
 
             if self.use_psfex:
                 if PSFEX_CAT_KEY in image.keys():
@@ -281,6 +290,7 @@ class Sextractor(BaseImageProcessor):
                 for temp_file in temp_files:
                     os.remove(temp_file)
                     logger.debug(f"Deleted temporary file {temp_file}")
+            self.release_scratch_files(scratch_files)
 
             if self.catalog_purifier is not None:
                 output_catalog = get_table_from_ldac(output_cat)
@@ -291,7 +301,9 @@ class Sextractor(BaseImageProcessor):
                     clean_hdulist.writeto(output_cat, overwrite=True)
 
             if self.write_regions:
-                output_catalog = get_table_from_ldac(output_cat)
+                output_catalog = get_table_from_ldac(
+                    output_cat, columns=["X_IMAGE", "Y_IMAGE"]
+                )
 
                 x_coords = output_catalog["X_IMAGE"]
                 y_coords = output_catalog["Y_IMAGE"]
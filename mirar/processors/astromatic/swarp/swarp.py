@@ -25,7 +25,6 @@ from mirar.paths import (
     SWARP_FLUX_SCALING_KEY,
     TIME_KEY,
     all_astrometric_keywords,
-    copy_temp_file,
     get_output_dir,
     get_temp_path,
 )
@@ -195,6 +194,8 @@ class Swarp(BaseImageProcessor):
         logger.debug(f"Writing file list to {swarp_image_list_path}")
 
         temp_files = [swarp_image_list_path, swarp_weight_list_path]
+        scratch_files, head_files = [], []
+        use_scratch = self.combine & (not self.cache)
 
         # If swarp is run with combine -N option,
         # it outputs an intermediate file called inpname+.resamp.fits. This name is not
@@ -275,12 +276,6 @@ class Swarp(BaseImageProcessor):
                     all_pixscales.append(pixscale)
                     all_imgpixsizes.append(imgpixsize)
 
-                if self.include_scamp:
-                    temp_head_path = copy_temp_file(
-                        output_dir=swarp_output_dir,
-                        file_path=Path(image[SCAMP_HEADER_KEY]),
-                    )
-
                 if np.logical_and(
                     SWARP_FLUX_SCALING_KEY in image.header.keys(),
                     self.flux_scaling_factor is not None,
@@ -297,19 +292,34 @@ class Swarp(BaseImageProcessor):
                     else:
                         image[SWARP_FLUX_SCALING_KEY] = self.flux_scaling_factor
 
-                temp_img_path = get_temp_path(swarp_output_dir, image[BASE_NAME_KEY])
+                # Unless keeping temporary files, or relying on Swarp naming
+                # its intermediate output after the input, use shared scratch files
+                if use_scratch:
+                    temp_img_path = self.save_scratch_fits(image)
+                    temp_mask_path = self.save_scratch_mask(image, temp_img_path)
+                    scratch_files += [temp_img_path, temp_mask_path]
+                else:
+                    temp_img_path = get_temp_path(
+                        swarp_output_dir, image[BASE_NAME_KEY]
+                    )
 
-                self.save_fits(image, temp_img_path)
+                    self.save_fits(image, temp_img_path)
 
-                logger.debug(f"Saving mask image for {temp_img_path}")
-                temp_mask_path = self.save_mask_image(image, temp_img_path)
+                    logger.debug(f"Saving mask image for {temp_img_path}")
+                    temp_mask_path = self.save_mask_image(image, temp_img_path)
+                    temp_files += [temp_img_path, temp_mask_path]
 
                 img_list.write(f"{temp_img_path}\n")
                 weight_list.write(f"{temp_mask_path}\n")
 
-                temp_files += [temp_img_path, temp_mask_path]
                 if self.include_scamp:
-                    temp_files += [temp_head_path]
+                    # Swarp reads the header next to each image
+                    temp_head_path = temp_img_path.with_suffix(".head")
+                    logger.debug(
+                        f"Copying from {image[SCAMP_HEADER_KEY]} to {temp_head_path}"
+                    )
+                    shutil.copyfile(image[SCAMP_HEADER_KEY], temp_head_path)
+                    head_files.append(temp_head_path)
 
         if pixscale_to_use is None:
             pixscale_to_use = np.max(all_pixscales)
@@ -447,6 +457,14 @@ class Swarp(BaseImageProcessor):
         except MissingCoreFieldError as err:
             raise SwarpError(err) from err
 
+        if use_scratch:
+            # Headers must not be left next to scratch files reused elsewhere
+            for head_file in head_files:
+                head_file.unlink()
+            self.release_scratch_files(scratch_files)
+        else:
+            temp_files += head_files
+
         if not self.cache:
             for temp_file in temp_files:
                 temp_file.unlink()
@@ -27,6 +27,7 @@ from typing import Optional
 import numpy as np
 from astropy.io import fits
 
+from mirar.io import is_tile_compressed
 from mirar.paths import base_output_dir
 from mirar.processors.astromatic.sextractor.settings import (
     write_config_file,
@@ -43,6 +44,7 @@ from mirar.processors.astrometry.autoastrometry.detect import (
     get_img_src_list,
 )
 from mirar.processors.astrometry.autoastrometry.errors import (
+    AstrometryCompressionError,
     AstrometryCrossmatchError,
     AstrometryReferenceError,
     AstrometrySourceError,
@@ -122,6 +124,16 @@ def autoastrometry(
 
     """
 
+    # Sextractor, and the header updates below, need an uncompressed image
+    if is_tile_compressed(filename):
+        err = (
+            f"Image {filename} is tile-compressed, but autoastrometry requires "
+            f"an uncompressed fits file. Save the image without compression "
+            f"(the AutoAstrometry processor always does so)."
+        )
+        logger.error(err)
+        raise AstrometryCompressionError(err)
+
     if temp_file is None:
         temp_file = f"temp_{os.path.basename(filename)}"
 
@@ -7,8 +7,7 @@ import os
 from pathlib import Path
 from typing import Optional
 
-from astropy.io import fits
-
+from mirar.io import open_fits_header
 from mirar.paths import SEXTRACTOR_HEADER_KEY
 from mirar.processors.astromatic.sextractor.settings import (
     default_config_path,
@@ -76,10 +75,8 @@ def get_img_src_list(
     except FileNotFoundError:
         pass
 
-    header = fits.getheader(img_path)
-    sextractor_catalog_path = None
-    if SEXTRACTOR_HEADER_KEY in header.keys():
-        sextractor_catalog_path = fits.getval(img_path, SEXTRACTOR_HEADER_KEY)
+    header = open_fits_header(img_path)
+    sextractor_catalog_path = header.get(SEXTRACTOR_HEADER_KEY)
 
     if sextractor_catalog_path is not None:
         logger.info("Using existing sextractor catalog")
@@ -23,3 +23,7 @@ class AstrometryReferenceError(AstrometryError):
 
 class AstrometryCrossmatchError(AstrometryError):
     """Error related to crossmatching astrometry source/reference catalogue"""
+
+
+class AstrometryCompressionError(AstrometryError):
+    """Error related to a tile-compressed input image"""
@@ -6,37 +6,50 @@ import datetime
 import getpass
 import hashlib
 import logging
+import multiprocessing
+import pickle
 import socket
 import threading
 from abc import ABC
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from queue import Queue
 from threading import Thread
-from typing import Callable
+from typing import Callable, Optional
 
 import numpy as np
 import pandas as pd
 from tqdm.auto import tqdm
 
 from mirar.data import DataBatch, Dataset, Image, ImageBatch, SourceBatch
+from mirar.data.cache import USE_CACHE
+from mirar.data.cal_library import cal_library
+from mirar.data.scratch import get_image_key, scratch_files
 from mirar.errors import (
     ErrorReport,
     ErrorStack,
     NoncriticalProcessingError,
     ProcessorError,
 )
-from mirar.io import open_fits, save_fits
+from mirar.io import DEFAULT_QUANTIZE_LEVEL, open_fits, save_fits
 from mirar.paths import (
     BASE_NAME_KEY,
     CAL_OUTPUT_SUB_DIR,
+    EXECUTION_MODES,
+    LATEST_SAVE_KEY,
     LATEST_WEIGHT_SAVE_KEY,
     PACKAGE_NAME,
+    PIXEL_DTYPES,
     PROC_HISTORY_KEY,
     RAW_IMG_KEY,
+    default_execution_mode,
+    default_pixel_dtype,
     get_mask_path,
     get_output_path,
     max_n_cpu,
 )
+from mirar.processors.process_worker import apply_in_process, init_process_worker
+from mirar.profiling import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +74,34 @@ class DuplicationError(ProcessorError):
     """
 
 
+class ExecutionModeError(ProcessorError):
+    """
+    An error raised if an unknown execution mode is requested for a processor
+    """
+
+
+class PixelDtypeError(ProcessorError):
+    """
+    An error raised if an unknown pixel type is requested for a processor
+    """
+
+
+def check_pixel_dtype(pixel_dtype: str):
+    """
+    Check that a pixel type is supported
+
+    :param pixel_dtype: pixel type, e.g. "float32"
+    :return: None
+    """
+    if pixel_dtype not in PIXEL_DTYPES:
+        err = (
+            f"Pixel dtype '{pixel_dtype}' not recognised. "
+            f"Available types are {PIXEL_DTYPES}."
+        )
+        logger.error(err)
+        raise PixelDtypeError(err)
+
+
 class BaseProcessor:
     """
     Base processor class, to be inherited from for all processors
@@ -77,6 +118,20 @@ class BaseProcessor:
 
     max_n_cpu: int = max_n_cpu
 
+    # Either "thread" (default) or "process". Processes avoid the GIL for
+    # CPU-bound python code, but any state a processor sets on itself
+    # while processing a batch is not returned to the parent process.
+    execution_mode: str = default_execution_mode
+
+    # Barriers need the whole dataset at once (e.g. to regroup batches in
+    # update_dataset), so cannot be streamed batch-by-batch by the pipeline
+    is_barrier: bool = False
+
+    # Floating-point type of output image pixels. None follows the pipeline
+    # setting, which defaults to the PIXEL_DTYPE environment variable
+    pixel_dtype: Optional[str] = None
+    pipeline_pixel_dtype: str = default_pixel_dtype
+
     subclasses = {}
 
     def __init__(self):
@@ -103,6 +158,64 @@ class BaseProcessor:
         """
         self.preceding_steps = previous_steps
 
+    def set_execution_mode(self, execution_mode: str):
+        """
+        Sets the backend used to apply the processor to batches
+
+        :param execution_mode: Either "thread" or "process"
+        :return: None
+        """
+        if execution_mode not in EXECUTION_MODES:
+            err = (
+                f"Execution mode '{execution_mode}' not recognised. "
+                f"Available modes are {EXECUTION_MODES}."
+            )
+            logger.error(err)
+            raise ExecutionModeError(err)
+        self.execution_mode = execution_mode
+
+    def set_pixel_dtype(self, pixel_dtype: Optional[str]):
+        """
+        Sets the floating-point type of the output image pixels,
+        overriding the pipeline setting
+
+        :param pixel_dtype: Either "float64" or "float32", or None to follow
+            the pipeline setting
+        :return: None
+        """
+        if pixel_dtype is not None:
+            check_pixel_dtype(pixel_dtype)
+        self.pixel_dtype = pixel_dtype
+
+    def set_pipeline_pixel_dtype(self, pixel_dtype: str):
+        """
+        Sets the pipeline-wide floating-point type of image pixels,
+        which is used unless the processor has its own setting
+
+        :param pixel_dtype: Either "float64" or "float32"
+        :return: None
+        """
+        check_pixel_dtype(pixel_dtype)
+        self.pipeline_pixel_dtype = pixel_dtype
+
+    def get_pixel_dtype(self) -> str:
+        """
+        Get the floating-point type of the output image pixels
+
+        :return: pixel type
+        """
+        if self.pixel_dtype is not None:
+            return self.pixel_dtype
+        return self.pipeline_pixel_dtype
+
+    def __getstate__(self):
+        # Per-call caches hold progress bars and results, which are neither
+        # picklable nor needed by a worker process
+        state = self.__dict__.copy()
+        for key in ["passed_batches", "err_stack", "progress"]:
+            state[key] = {}
+        return state
+
     def set_night(self, night_sub_dir: str | int = ""):
         """
         Sets the night subdirectory for the processor to read/write data
@@ -169,47 +282,151 @@ class BaseProcessor:
         if len(dataset) > 0:
             n_cpu = min([self.max_n_cpu, len(dataset)])
 
-            logger.info(f"Running {self.__class__.__name__} on {n_cpu} threads")
+            if (self.execution_mode == "process") & (n_cpu > 1):
+                self.apply_with_processes(dataset, cache_id=cache_id, n_cpu=n_cpu)
+            else:
+                self.apply_with_threads(dataset, cache_id=cache_id, n_cpu=n_cpu)
 
-            watchdog_queue = Queue()
+        new_dataset = []
 
-            workers = []
+        for key in sorted(self.passed_batches[cache_id].keys()):
+            new_dataset.append(self.passed_batches[cache_id][key])
 
-            for _ in range(n_cpu):
-                # Set up a worker thread to process database load
-                worker = Thread(
-                    target=self.apply_to_batch, args=(watchdog_queue, cache_id)
-                )
-                worker.daemon = True
-                worker.start()
+        dataset = self.update_dataset(Dataset(new_dataset))
+        err_stack = self.err_stack[cache_id]
 
-                workers.append(worker)
+        self.clean_cache(cache_id=cache_id)
 
-            with tqdm(total=len(dataset), position=0, leave=False) as progress:
-                # Set up progress bar
-                self.progress[cache_id] = progress
+        return dataset, err_stack
 
-                # Loop over batches to add to queue
-                for j, batch in enumerate(dataset):
-                    watchdog_queue.put(item=(j, batch))
+    def apply_with_threads(self, dataset: Dataset, cache_id: int, n_cpu: int):
+        """
+        Apply the processor to each batch of a dataset using a pool of threads.
 
-                # Wait for the queue to empty
-                watchdog_queue.join()
+        :param dataset: Input dataset
+        :param cache_id: key for cache
+        :param n_cpu: number of threads to use
+        :return: None
+        """
+        logger.info(f"Running {self.__class__.__name__} on {n_cpu} threads")
 
-                self.progress[cache_id].refresh()
-                self.progress[cache_id].close()
+        watchdog_queue = Queue()
 
-        new_dataset = []
+        workers = []
 
-        for key in sorted(self.passed_batches[cache_id].keys()):
-            new_dataset.append(self.passed_batches[cache_id][key])
+        for _ in range(n_cpu):
+            # Set up a worker thread to process database load
+            worker = Thread(target=self.apply_to_batch, args=(watchdog_queue, cache_id))
+            worker.daemon = True
+            worker.start()
 
-        dataset = self.update_dataset(Dataset(new_dataset))
-        err_stack = self.err_stack[cache_id]
+            workers.append(worker)
 
-        self.clean_cache(cache_id=cache_id)
+        with tqdm(total=len(dataset), position=0, leave=False) as progress:
+            # Set up progress bar
+            self.progress[cache_id] = progress
 
-        return dataset, err_stack
+            # Loop over batches to add to queue
+            for j, batch in enumerate(dataset):
+                watchdog_queue.put(item=(j, batch))
+
+            # Wait for the queue to empty
+            watchdog_queue.join()
+
+            self.progress[cache_id].refresh()
+            self.progress[cache_id].close()
+
+    def apply_with_processes(self, dataset: Dataset, cache_id: int, n_cpu: int):
+        """
+        Apply the processor to each batch of a dataset using a pool of processes.
+
+        Batches are pickled and sent to the workers. In cache mode, this means only
+        the image headers and cache paths cross the process boundary.
+        Results and errors are collected in the original batch order.
+
+        :param dataset: Input dataset
+        :param cache_id: key for cache
+        :param n_cpu: number of processes to use
+        :return: None
+        """
+        logger.info(f"Running {self.__class__.__name__} on {n_cpu} processes")
+
+        # Forked workers inherit the processor and cache settings without pickling
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+
+        with ProcessPoolExecutor(
+            max_workers=n_cpu,
+            mp_context=context,
+            initializer=init_process_worker,
+            initargs=(self,),
+        ) as executor:
+            futures = [executor.submit(apply_in_process, batch) for batch in dataset]
+
+            # Results are collected in submission order, so that error reports
+            # are added in batch order
+            with tqdm(total=len(dataset), position=0, leave=False) as progress:
+                for j, (batch, future) in enumerate(zip(dataset, futures)):
+                    try:
+                        new_batch, err, records = pickle.loads(future.result())
+                        profiler.add_records(records)
+                    except Exception as exc:  # pylint: disable=broad-except
+                        new_batch = None
+                        err = self.generate_error_report(exc, batch)
+                        logger.error(err.generate_log_message())
+
+                    if err is not None:
+                        self.err_stack[cache_id].add_report(err)
+
+                    if new_batch is not None:
+                        self.passed_batches[cache_id][j] = new_batch
+                        self.hand_over_cache_files(batch, new_batch)
+
+                    progress.update(1)
+
+    @staticmethod
+    def hand_over_cache_files(batch: DataBatch, new_batch: DataBatch):
+        """
+        Hand the cache files of input images over to the images returned for them
+        by a worker process. The returned images already hold a reference to any
+        file they share with an input image, so the input image can release its
+        own, leaving the returned image as sole owner (which can then update
+        the file in place).
+
+        :param batch: Input batch
+        :param new_batch: Batch returned by the worker process
+        :return: None
+        """
+        if not isinstance(batch, ImageBatch) or not isinstance(new_batch, ImageBatch):
+            return
+
+        new_paths = {x.cache_path for x in new_batch if x.cache_path is not None}
+        for image in batch:
+            if image.cache_path in new_paths:
+                image.release_cache()
+
+    def apply_with_report(
+        self, batch: DataBatch
+    ) -> tuple[DataBatch | None, ErrorReport | None]:
+        """
+        Function to run self.apply on a batch, and catch any errors
+
+        :param batch: Input data batch
+        :return: Updated batch (None if processing failed), and any error report
+        """
+        try:
+            with profiler.profile(self, n_blocks=len(batch)):
+                return self.apply(batch), None
+        except NoncriticalProcessingError as exc:
+            err = self.generate_error_report(exc, batch)
+            logger.error(err.generate_log_message())
+            return batch, err
+        except Exception as exc:  # pylint: disable=broad-except
+            err = self.generate_error_report(exc, batch)
+            logger.error(err.generate_log_message())
+            return None, err
 
     def apply_to_batch(self, queue, cache_id: int):
         """
@@ -222,19 +439,15 @@ class BaseProcessor:
         """
         while True:
             j, batch = queue.get()
-            try:
-                batch = self.apply(batch)
-                self.passed_batches[cache_id][j] = batch
-            except NoncriticalProcessingError as exc:
-                err = self.generate_error_report(exc, batch)
-                logger.error(err.generate_log_message())
-                self.err_stack[cache_id].add_report(err)
-                self.passed_batches[cache_id][j] = batch
-            except Exception as exc:  # pylint: disable=broad-except
-                err = self.generate_error_report(exc, batch)
-                logger.error(err.generate_log_message())
+
+            new_batch, err = self.apply_with_report(batch)
+
+            if err is not None:
                 self.err_stack[cache_id].add_report(err)
 
+            if new_batch is not None:
+                self.passed_batches[cache_id][j] = new_batch
+
             self.progress[cache_id].update(1)
             self.progress[cache_id].refresh()
 
@@ -303,6 +516,8 @@ class CleanupProcessor(BaseProcessor, ABC):
     Processor which 'cleans up' by deleting empty batches
     """
 
+    is_barrier = True
+
     def update_dataset(self, dataset: Dataset) -> Dataset:
         # Remove empty dataset
         new_dataset = Dataset([x for x in dataset.get_batches() if len(x) > 0])
@@ -330,42 +545,112 @@ class ImageHandler:
             header[BASE_NAME_KEY] = Path(path).name
         return Image(data=data, header=header)
 
-    @staticmethod
     def save_fits(
+        self,
         image: Image,
         path: str | Path,
+        compression: str = "none",
+        quantize_level: float = DEFAULT_QUANTIZE_LEVEL,
+        asynchronous: bool = False,
     ):
         """
         Save an Image to path
 
         :param image: Image to save
         :param path: path
+        :param compression: tile compression policy, one of FITS_COMPRESSIONS
+        :param quantize_level: quantization level for lossy compression
+        :param asynchronous: whether to queue the write rather than writing
+            immediately. Only use for files which are not needed straight away.
         :return: None
         """
-        save_fits(image, path)
+        save_fits(
+            image,
+            path,
+            compression=compression,
+            quantize_level=quantize_level,
+            asynchronous=asynchronous,
+            owner=self.__class__.__name__,
+        )
 
-    def save_mask_image(self, image: Image, img_path: Path) -> Path:
+    def get_mask_image(self, image: Image) -> Image:
         """
-        Saves a mask image, following the astromatic software convention of
+        Makes a mask image, following the astromatic software convention of
         masked value = 0. and non-masked value = 1.
 
         :param image: Science image
-        :param img_path: Path of parent image
-        :return: Path of mask image
+        :return: Mask image
         """
-        mask_path = get_mask_path(img_path)
         header = image.get_header()
 
         mask = image.get_mask()
         if LATEST_WEIGHT_SAVE_KEY in image.header:
-            weight_data = self.open_fits(
-                image.header[LATEST_WEIGHT_SAVE_KEY]
-            ).get_data()
+            weight_data = self.open_fits(image.header[LATEST_WEIGHT_SAVE_KEY]).get_data(
+                read_only=True
+            )
             mask = mask * weight_data
-        self.save_fits(Image(mask.astype(float), header), mask_path)
+        return Image(mask.astype(float), header)
+
+    def save_mask_image(self, image: Image, img_path: Path) -> Path:
+        """
+        Saves a mask image (see :meth:`get_mask_image`) next to its parent image
 
+        :param image: Science image
+        :param img_path: Path of parent image
+        :return: Path of mask image
+        """
+        mask_path = get_mask_path(img_path)
+        self.save_fits(self.get_mask_image(image), mask_path)
         return mask_path
 
+    def save_scratch_fits(
+        self, image: Image, name: Optional[str] = None, key: Optional[str] = None
+    ) -> Path:
+        """
+        Saves an Image as a scratch file (see :mod:`mirar.data.scratch`), e.g. for
+        an external tool. If the same image content has already been saved,
+        the existing file is reused. Release the file with
+        :meth:`release_scratch_files` once it is no longer needed.
+
+        :param image: Image to save
+        :param name: file name (default, the image base name)
+        :param key: content key of the image, if already known
+        :return: Path of scratch file
+        """
+        if key is None:
+            key = get_image_key(image)
+        if name is None:
+            name = image[BASE_NAME_KEY]
+        path = scratch_files.acquire(key, name, lambda x: self.save_fits(image, x))
+        image[LATEST_SAVE_KEY] = path.as_posix()
+        return path
+
+    def save_scratch_mask(self, image: Image, img_path: Path) -> Path:
+        """
+        Saves the mask image of an Image as a scratch file, next to the scratch
+        file of the image itself (see :meth:`save_scratch_fits`)
+
+        :param image: Science image
+        :param img_path: Path of scratch file of the image
+        :return: Path of scratch mask image
+        """
+        return scratch_files.acquire(
+            img_path.parent.name,
+            get_mask_path(img_path).name,
+            lambda x: self.save_fits(self.get_mask_image(image), x),
+        )
+
+    @staticmethod
+    def release_scratch_files(paths: list[Path]):
+        """
+        Releases scratch files which are no longer needed
+
+        :param paths: Paths of scratch files
+        :return: None
+        """
+        for path in paths:
+            scratch_files.release(path)
+
     @staticmethod
     def get_hash(image_batch: ImageBatch):
         """
@@ -386,7 +671,8 @@ class BaseImageProcessor(BaseProcessor, ImageHandler, ABC):
     """
 
     def _apply(self, batch: ImageBatch) -> ImageBatch:
-        return self._apply_to_images(batch)
+        batch = self._apply_to_images(batch)
+        return self.apply_pixel_dtype(batch)
 
     def _apply_to_images(
         self,
@@ -394,12 +680,48 @@ class BaseImageProcessor(BaseProcessor, ImageHandler, ABC):
     ) -> ImageBatch:
         raise NotImplementedError
 
+    def apply_pixel_dtype(self, batch: ImageBatch) -> ImageBatch:
+        """
+        Cast the floating-point pixels of each image to the pixel type of the
+        processor. Processors can compute in higher precision internally,
+        but their outputs are stored in this type.
+
+        With the default float64 policy, and no processor setting, images are
+        left unchanged.
+
+        :param batch: batch of images
+        :return: batch of images
+        """
+        if (self.pixel_dtype is None) & (self.pipeline_pixel_dtype == "float64"):
+            return batch
+
+        dtype = np.dtype(self.get_pixel_dtype())
+
+        for image in batch:
+            if not image.is_loaded():
+                # Deferred data is cast once it has been loaded and processed
+                continue
+            data = image.get_data(read_only=True)
+            if np.issubdtype(data.dtype, np.floating) & (data.dtype != dtype):
+                image.set_data(data.astype(dtype))
+
+        return batch
+
 
 class ProcessorWithCache(BaseImageProcessor, ABC):
     """
     Image processor with cached images associated to it, e.g a master flat
+
+    If the calibration library is enabled (see
+    :module:`mirar.data.cal_library`), masters are recorded there when made.
+    A master made on any night from the same input images is then reused.
+    If max_cal_age_days is set, the nearest master in time with matching
+    cal_library_match_fields is used instead of making a new one.
     """
 
+    # Calibration library fields which must match when reusing a master
+    cal_library_match_fields: list[str] = ["instrument", "board"]
+
     def __init__(
         self,
         try_load_cache: bool = True,
@@ -407,6 +729,8 @@ class ProcessorWithCache(BaseImageProcessor, ABC):
         overwrite: bool = True,
         cache_sub_dir: str = CAL_OUTPUT_SUB_DIR,
         cache_image_name_header_keys: str | list[str] | None = None,
+        use_cal_library: bool = True,
+        max_cal_age_days: float | None = None,
     ):
         super().__init__()
         self.try_load_cache = try_load_cache
@@ -414,6 +738,8 @@ class ProcessorWithCache(BaseImageProcessor, ABC):
         self.overwrite = overwrite
         self.cache_sub_dir = cache_sub_dir
         self.cache_image_name_header_keys = cache_image_name_header_keys
+        self.use_cal_library = use_cal_library
+        self.max_cal_age_days = max_cal_age_days
 
     def select_cache_images(self, images: ImageBatch) -> ImageBatch:
         """
@@ -472,22 +798,132 @@ class ProcessorWithCache(BaseImageProcessor, ABC):
         :return: cached image to use
         """
 
+        existing_path = self.find_existing_cache_file(images)
+
+        if existing_path is not None:
+            logger.debug(f"Loading cached file {existing_path}")
+            return self.open_fits(existing_path)
+
         path = self.get_cache_path(images)
 
         exists = path.exists()
 
-        if np.logical_and(self.try_load_cache, exists):
-            logger.debug(f"Loading cached file {path}")
-            return self.open_fits(path)
-
         image = self.make_image(images)
 
         if self.write_to_cache:
             if np.sum([not exists, self.overwrite]) > 0:
                 self.save_fits(image, path)
+                if self.use_cal_library & cal_library.is_enabled():
+                    self.register_cache_file(images, path)
 
         return image
 
+    def find_existing_cache_file(self, images: ImageBatch) -> Optional[Path]:
+        """
+        Find an existing cached image for the batch, without making one.
+        The cache path is checked first, then the calibration library.
+
+        :param images: images to process
+        :return: path of the cached image, or None if there is none
+        """
+        if not self.try_load_cache:
+            return None
+
+        use_library = self.use_cal_library & cal_library.is_enabled()
+
+        path = self.get_cache_path(images)
+
+        if path.exists():
+            return path
+
+        if use_library:
+            return self.find_library_file(images)
+
+        return None
+
+    def find_library_file(self, images: ImageBatch) -> Optional[Path]:
+        """
+        Find a master in the calibration library for the batch.
+        Masters made from the same input images are preferred,
+        otherwise the nearest matching master within max_cal_age_days is used.
+
+        :param images: images to process
+        :return: path of the master, or None if there is none
+        """
+        cache_images = self.select_cache_images(images)
+
+        if len(cache_images) > 0:
+            path = cal_library.find_by_hash(self.base_key, self.get_hash(cache_images))
+            if path is not None:
+                return path
+
+        if (self.max_cal_age_days is None) | (len(images) == 0):
+            return None
+
+        return cal_library.find_nearest(
+            self.base_key,
+            images[0].get_header(),
+            match_fields=self.cal_library_match_fields,
+            max_age_days=self.max_cal_age_days,
+        )
+
+    def register_cache_file(self, images: ImageBatch, path: Path):
+        """
+        Record a master in the calibration library
+
+        :param images: images to process
+        :param path: path of the master
+        :return: None
+        """
+        cache_images = self.select_cache_images(images)
+        if len(cache_images) > 0:
+            cal_library.register(
+                self.base_key,
+                path,
+                headers=[x.get_header() for x in cache_images],
+                input_hash=self.get_hash(cache_images),
+            )
+
+    @staticmethod
+    def get_calibration_data(image: Image, dtype: type = np.float64) -> np.ndarray:
+        """
+        Get a writable floating-point copy of the data of an image,
+        which can then be calibrated in place
+
+        :param image: image to calibrate
+        :param dtype: floating-point type for the data
+        :return: image data
+        """
+        if USE_CACHE:
+            # Modifiable cache data is already private to the caller
+            return image.get_data().astype(dtype, copy=False)
+        # In RAM, the data is the array of the image, which may be shared
+        return np.array(image.get_data(read_only=True), dtype=dtype)
+
+    def get_master_data(self, master: Image) -> np.ndarray:
+        """
+        Get the data of a master image (e.g master flat) to calibrate images with
+
+        :param master: master image
+        :return: master data
+        """
+        return master.get_data(read_only=True)
+
+    def calibrate_data(
+        self, image: Image, data: np.ndarray, master: Image, master_data: np.ndarray
+    ) -> np.ndarray:
+        """
+        Calibrate the data of an image with a master image, updating the image
+        header. The data may be modified in place.
+
+        :param image: image being calibrated
+        :param data: current data of the image
+        :param master: master image
+        :param master_data: master data, from get_master_data
+        :return: calibrated data
+        """
+        raise NotImplementedError
+
     def make_image(self, images: ImageBatch) -> Image:
         """
         Make a cached image (e.g master flat)
@@ -508,6 +944,7 @@ class ProcessorPremadeCache(ProcessorWithCache, ABC):
     ):
         super().__init__(*args, **kwargs)
         self.master_image_path_generator = master_image_path_generator
+        self.use_cal_library = False
 
     def get_cache_path(self, images: ImageBatch) -> Path:
         """
@@ -8,6 +8,7 @@ from collections.abc import Callable
 import numpy as np
 
 from mirar.data import Image, ImageBatch
+from mirar.data.utils import combine_images
 from mirar.errors import ImageNotFoundError
 from mirar.paths import BIAS_FRAME_KEY, LATEST_SAVE_KEY, SATURATE_KEY
 from mirar.processors.base_processor import ProcessorPremadeCache, ProcessorWithCache
@@ -39,10 +40,12 @@ class BiasCalibrator(ProcessorWithCache):
         self,
         *args,
         select_bias_images: Callable[[ImageBatch], ImageBatch] = default_select_bias,
+        combine_method: str = "median",
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.select_cache_images = select_bias_images
+        self.combine_method = combine_method
 
     def __str__(self) -> str:
         return "Creates a bias image, and subtracts this from the other images."
@@ -52,16 +55,24 @@ class BiasCalibrator(ProcessorWithCache):
         batch: ImageBatch,
     ) -> ImageBatch:
         master_bias = self.get_cache_file(batch)
+        master_data = self.get_master_data(master_bias)
 
         for image in batch:
-            data = image.get_data()
-            data = data - master_bias.get_data()
+            data = self.calibrate_data(
+                image, self.get_calibration_data(image), master_bias, master_data
+            )
             image.set_data(data)
-            image[BIAS_FRAME_KEY] = master_bias[LATEST_SAVE_KEY]
-            if SATURATE_KEY in image.header:
-                image[SATURATE_KEY] -= np.nanmedian(master_bias.get_data())
         return batch
 
+    def calibrate_data(
+        self, image: Image, data: np.ndarray, master: Image, master_data: np.ndarray
+    ) -> np.ndarray:
+        data -= master_data
+        image[BIAS_FRAME_KEY] = master[LATEST_SAVE_KEY]
+        if SATURATE_KEY in image.header:
+            image[SATURATE_KEY] -= np.nanmedian(master_data)
+        return data
+
     def make_image(
         self,
         images: ImageBatch,
@@ -75,15 +86,11 @@ class BiasCalibrator(ProcessorWithCache):
             logger.error(err)
             raise ImageNotFoundError(err)
 
-        nx, ny = images[0].get_data().shape
-
-        biases = np.zeros((nx, ny, n_frames))
-
-        for i, img in enumerate(images):
-            biases[:, :, i] = img.get_data()
-
-        logger.debug(f"Median combining {n_frames} biases")
-        master_bias = Image(np.nanmedian(biases, axis=2), header=images[0].get_header())
+        logger.debug(f"Combining {n_frames} biases with method {self.combine_method}")
+        master_bias = Image(
+            combine_images(images, method=self.combine_method),
+            header=images[0].get_header(),
+        )
 
         return master_bias
 
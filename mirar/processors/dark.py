@@ -9,6 +9,7 @@ from copy import copy
 import numpy as np
 
 from mirar.data import Image, ImageBatch
+from mirar.data.utils import combine_images
 from mirar.errors import ImageNotFoundError
 from mirar.paths import (
     BASE_NAME_KEY,
@@ -51,15 +52,18 @@ class DarkCalibrator(ProcessorWithCache):
 
     base_name = "master_dark"
     base_key = "dark"
+    cal_library_match_fields = ["instrument", "board", "exptime"]
 
     def __init__(
         self,
         *args,
         select_cache_images: Callable[[ImageBatch], ImageBatch] = default_select_dark,
+        combine_method: str = "median",
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.select_cache_images = select_cache_images
+        self.combine_method = combine_method
 
     def __str__(self) -> str:
         return (
@@ -72,19 +76,25 @@ class DarkCalibrator(ProcessorWithCache):
         batch: ImageBatch,
     ) -> ImageBatch:
         master_dark = self.get_cache_file(batch)
+        master_data = self.get_master_data(master_dark)
 
         for image in batch:
-            data = image.get_data()
-            data = data - (master_dark.get_data() * image[EXPTIME_KEY])
+            data = self.calibrate_data(
+                image, self.get_calibration_data(image), master_dark, master_data
+            )
             image.set_data(data)
-
-            if SATURATE_KEY in image.header:
-                image[SATURATE_KEY] -= (
-                    np.nanmedian(master_dark.get_data()) * image[EXPTIME_KEY]
-                )
-            image[DARK_FRAME_KEY] = master_dark[LATEST_SAVE_KEY]
         return batch
 
+    def calibrate_data(
+        self, image: Image, data: np.ndarray, master: Image, master_data: np.ndarray
+    ) -> np.ndarray:
+        data -= master_data * image[EXPTIME_KEY]
+
+        if SATURATE_KEY in image.header:
+            image[SATURATE_KEY] -= np.nanmedian(master_data) * image[EXPTIME_KEY]
+        image[DARK_FRAME_KEY] = master[LATEST_SAVE_KEY]
+        return data
+
     def make_image(
         self,
         images: ImageBatch,
@@ -101,24 +111,23 @@ class DarkCalibrator(ProcessorWithCache):
             logger.error(err)
             raise MissingDarkError(err)
 
-        nx, ny = dark_images[0].get_data().shape
-
-        darks = np.zeros((nx, ny, n_frames))
-
-        individual_dark_exptimes, imagenames_key = [], []
-        for i, img in enumerate(dark_images):
+        scales, individual_dark_exptimes, imagenames_key = [], [], []
+        for img in dark_images:
             dark_exptime = img[EXPTIME_KEY]
-            darks[:, :, i] = img.get_data() / dark_exptime
+            scales.append(1.0 / dark_exptime)
             individual_dark_exptimes.append(str(dark_exptime))
             imagenames_key.append(img[BASE_NAME_KEY])
 
-        logger.debug(f"Median combining {n_frames} darks")
+        logger.debug(f"Combining {n_frames} darks with method {self.combine_method}")
         master_dark_header = copy(dark_images[0].get_header())
         master_dark_header[EXPTIME_KEY] = 1.0
         master_dark_header[COADD_KEY] = n_frames
         master_dark_header["INDIVEXP"] = ",".join(individual_dark_exptimes)
         master_dark_header[STACKED_COMPONENT_IMAGES_KEY] = ",".join(imagenames_key)
-        master_dark = Image(np.nanmedian(darks, axis=2), header=master_dark_header)
+        master_dark = Image(
+            combine_images(dark_images, method=self.combine_method, scales=scales),
+            header=master_dark_header,
+        )
 
         return master_dark
 
@@ -11,6 +11,7 @@ from copy import copy
 import numpy as np
 
 from mirar.data import Image, ImageBatch
+from mirar.data.utils import combine_images
 from mirar.errors import ImageNotFoundError
 from mirar.paths import (
     BASE_NAME_KEY,
@@ -50,6 +51,7 @@ class FlatCalibrator(ProcessorWithCache):
     """
 
     base_key = "flat"
+    cal_library_match_fields = ["instrument", "board", "filter"]
 
     def __init__(
         self,
@@ -61,6 +63,7 @@ class FlatCalibrator(ProcessorWithCache):
         flat_nan_threshold: float = 0.0,
         select_flat_images: Callable[[ImageBatch], ImageBatch] = default_select_flat,
         flat_mask_key: str = None,
+        combine_method: str = "median",
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -71,6 +74,7 @@ class FlatCalibrator(ProcessorWithCache):
         self.flat_nan_threshold = flat_nan_threshold
         self.select_cache_images = select_flat_images
         self.flat_mask_key = flat_mask_key
+        self.combine_method = combine_method
 
     def __str__(self) -> str:
         return "Creates a flat image, divides other images by this image."
@@ -80,20 +84,39 @@ class FlatCalibrator(ProcessorWithCache):
         batch: ImageBatch,
     ) -> ImageBatch:
         master_flat = self.get_cache_file(batch)
-        master_flat_data = master_flat.get_data()
+        master_flat_data = self.get_master_data(master_flat)
+
+        for image in batch:
+            data = self.calibrate_data(
+                image, self.get_calibration_data(image), master_flat, master_flat_data
+            )
+            image.set_data(data)
+
+        return batch
+
+    def get_master_data(self, master: Image) -> np.ndarray:
+        """
+        Get the master flat data, with pixels at or below
+        flat_nan_threshold set to NaN
+
+        :param master: master flat
+        :return: master flat data
+        """
+        master_flat_data = master.get_data()
 
         mask = master_flat_data <= self.flat_nan_threshold
 
         if np.sum(mask) > 0:
             master_flat_data[mask] = np.nan
 
-        for image in batch:
-            data = image.get_data()
-            data = data / master_flat_data
-            image.set_data(data)
-            image[FLAT_FRAME_KEY] = master_flat[LATEST_SAVE_KEY]
+        return master_flat_data
 
-        return batch
+    def calibrate_data(
+        self, image: Image, data: np.ndarray, master: Image, master_data: np.ndarray
+    ) -> np.ndarray:
+        data /= master_data
+        image[FLAT_FRAME_KEY] = master[LATEST_SAVE_KEY]
+        return data
 
     def make_image(
         self,
@@ -109,13 +132,10 @@ class FlatCalibrator(ProcessorWithCache):
             logger.error(err)
             raise MissingFlatError(err)
 
-        nx, ny = images[0].get_data().shape
-
-        flats = np.zeros((nx, ny, n_frames))
-
-        flat_exptimes = []
-        for i, img in enumerate(images):
-            data = img.get_data()
+        scales, masks, flat_exptimes = [], [], []
+        for img in images:
+            data = img.get_data(read_only=True)
+            mask = None
 
             if self.flat_mask_key is not None:
                 if self.flat_mask_key not in img.header.keys():
@@ -134,23 +154,30 @@ class FlatCalibrator(ProcessorWithCache):
                     raise FileNotFoundError(err)
 
                 mask_img = self.open_fits(mask_file)
-                pixels_to_keep = mask_img.get_data().astype(bool)
-                mask = ~pixels_to_keep
+                mask = mask_img.get_data(read_only=True).astype(bool)
                 logger.debug(
-                    f"Masking {np.sum(mask)} pixels in flat {img[BASE_NAME_KEY]}"
+                    f"Masking {np.sum(~mask)} pixels in flat {img[BASE_NAME_KEY]}"
                 )
-                data[mask] = np.nan
 
             flat_exptimes.append(img[EXPTIME_KEY])
 
-            median = np.nanmedian(
-                data[self.x_min : self.x_max, self.y_min : self.y_max]
-            )
-            flats[:, :, i] = data / median
+            region = data[self.x_min : self.x_max, self.y_min : self.y_max]
+            if mask is not None:
+                region = np.where(
+                    mask[self.x_min : self.x_max, self.y_min : self.y_max],
+                    region,
+                    np.nan,
+                )
+            median = np.nanmedian(region)
 
-        logger.debug(f"Median combining {n_frames} flats")
+            scales.append(1.0 / median)
+            masks.append(mask)
 
-        master_flat = np.nanmedian(flats, axis=2)
+        logger.debug(f"Combining {n_frames} flats with method {self.combine_method}")
+
+        master_flat = combine_images(
+            images, method=self.combine_method, scales=scales, masks=masks
+        )
 
         master_flat_image = Image(master_flat, header=copy(images[0].get_header()))
         master_flat_image[COADD_KEY] = n_frames
@@ -12,6 +12,7 @@ from astropy.io import fits
 from astropy.wcs import WCS
 
 from mirar.data import Image, ImageBatch
+from mirar.io import get_image_hdu
 from mirar.paths import BASE_NAME_KEY, FITS_MASK_KEY, get_output_dir
 from mirar.processors.base_processor import BaseImageProcessor
 
@@ -25,6 +26,9 @@ class BaseMask(BaseImageProcessor):
     Base class for masking processors
     """
 
+    # Whether get_mask reads the image data, rather than just the header
+    mask_uses_data: bool = True
+
     def __init__(
         self,
         write_masked_pixels_to_file: bool = False,
@@ -48,35 +52,50 @@ class BaseMask(BaseImageProcessor):
     ) -> ImageBatch:
         for image in batch:
             data = image.get_data()
-            logger.debug(f"Masking {image[BASE_NAME_KEY]}")
-            pixels_to_mask = self.get_mask(image)
+            data = self.mask_data(image, data)
 
             if not self.only_write_mask:
-                data[pixels_to_mask] = MASK_VALUE
                 image.set_data(data)
 
-            logger.debug(
-                f"Masked {np.sum(pixels_to_mask)}/{pixels_to_mask.size} pixels "
-                f"in {image[BASE_NAME_KEY]}"
-            )
+        return batch
+
+    def mask_data(self, image: Image, data: np.ndarray) -> np.ndarray:
+        """
+        Mask the data of an image, and optionally write the mask to file.
+        The data is modified in place.
+
+        :param image: image being masked
+        :param data: current data of the image
+        :return: masked data
+        """
+        logger.debug(f"Masking {image[BASE_NAME_KEY]}")
+        pixels_to_mask = self.get_mask(image)
+
+        if not self.only_write_mask:
+            data[pixels_to_mask] = MASK_VALUE
+
+        logger.debug(
+            f"Masked {np.sum(pixels_to_mask)}/{pixels_to_mask.size} pixels "
+            f"in {image[BASE_NAME_KEY]}"
+        )
 
-            if self.write_masked_pixels_to_file:
-                mask_directory = get_output_dir(self.output_dir, self.night_sub_dir)
-                mask_directory.mkdir(parents=True, exist_ok=True)
+        if self.write_masked_pixels_to_file:
+            mask_directory = get_output_dir(self.output_dir, self.night_sub_dir)
+            mask_directory.mkdir(parents=True, exist_ok=True)
 
-                mask_file_path = mask_directory.joinpath(
-                    image[BASE_NAME_KEY]
-                ).with_suffix(".mask.fits")
+            mask_file_path = mask_directory.joinpath(image[BASE_NAME_KEY]).with_suffix(
+                ".mask.fits"
+            )
 
-                mask_data = np.ones_like(data)
-                mask_data[pixels_to_mask] = 0.0
+            mask_data = np.ones_like(data)
+            mask_data[pixels_to_mask] = 0.0
 
-                mask_image = Image(data=mask_data, header=image.get_header())
+            mask_image = Image(data=mask_data, header=image.get_header())
 
-                self.save_fits(mask_image, mask_file_path)
-                image[FITS_MASK_KEY] = mask_file_path.as_posix()
+            self.save_fits(mask_image, mask_file_path)
+            image[FITS_MASK_KEY] = mask_file_path.as_posix()
 
-        return batch
+        return data
 
 
 class MaskPixelsFromPath(BaseMask):
@@ -87,6 +106,7 @@ class MaskPixelsFromPath(BaseMask):
     """
 
     base_key = "maskfrompath"
+    mask_uses_data = False
 
     def __init__(
         self,
@@ -125,7 +145,7 @@ class MaskPixelsFromPath(BaseMask):
             mask_img = self.open_fits(image[self.mask_path_key])
         else:
             raise ValueError("Must specify either mask_path or mask_path_key")
-        pixels_to_keep = mask_img.get_data().astype(bool)
+        pixels_to_keep = mask_img.get_data(read_only=True).astype(bool)
 
         return ~pixels_to_keep
 
@@ -275,8 +295,9 @@ class MaskPixelsFromWCS(BaseMask):
         if self.mask_file_key is not None:
             mask_file_path = image.get_header()[self.mask_file_key]
             with fits.open(mask_file_path) as mask_image:
-                pixels_to_keep = mask_image[0].data  # pylint: disable=no-member
-                mask_wcs = WCS(mask_image[0].header)  # pylint: disable=no-member
+                mask_hdu = get_image_hdu(mask_image)
+                pixels_to_keep = mask_hdu.data
+                mask_wcs = WCS(mask_hdu.header)
 
             masked_pixel_x, masked_pixel_y = np.where(pixels_to_keep == 0.0)
 
@@ -13,7 +13,11 @@ from mirar.paths import (
     get_output_dir,
 )
 from mirar.processors.photometry.base_photometry import BasePhotometryProcessor
-from mirar.processors.photometry.utils import aper_photometry, get_mags_from_fluxes
+from mirar.processors.photometry.utils import (
+    aper_photometry,
+    aper_photometry_batch,
+    get_mags_from_fluxes,
+)
 
 
 class AperturePhotometry(BasePhotometryProcessor):
@@ -30,6 +34,7 @@ class AperturePhotometry(BasePhotometryProcessor):
         bkg_in_diameters: float | list[float] = 25.0,
         bkg_out_diameters: float | list[float] = 40.0,
         col_suffix_list: str | list[str] = None,
+        batch_mode: bool = True,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -49,6 +54,8 @@ class AperturePhotometry(BasePhotometryProcessor):
         if self.col_suffix_list is None:
             self.col_suffix_list = self.aper_diameters
 
+        self.batch_mode = batch_mode
+
     def perform_photometry(
         self, image_cutout: np.array, unc_image_cutout: np.array
     ) -> tuple[list[float], list[float]]:
@@ -65,6 +72,29 @@ class AperturePhotometry(BasePhotometryProcessor):
             fluxuncs.append(fluxunc)
         return fluxes, fluxuncs
 
+    def perform_batch_photometry(
+        self, image_cutouts: np.ndarray, unc_image_cutouts: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Function to perform aperture photometry on all cutouts at once
+
+        :param image_cutouts: image cutouts, of shape (n_sources, size, size)
+        :param unc_image_cutouts: uncertainty cutouts, of the same shape
+        :return: fluxes and flux uncertainties, of shape (n_apertures, n_sources)
+        """
+        fluxes, fluxuncs = [], []
+        for ind, aper_diam in enumerate(self.aper_diameters):
+            flux, fluxunc = aper_photometry_batch(
+                image_cutouts,
+                unc_image_cutouts,
+                aper_diam,
+                self.bkg_in_diameters[ind],
+                self.bkg_out_diameters[ind],
+            )
+            fluxes.append(flux)
+            fluxuncs.append(fluxunc)
+        return np.array(fluxes), np.array(fluxuncs)
+
     def _apply_to_sources(
         self,
         batch: SourceBatch,
@@ -74,25 +104,34 @@ class AperturePhotometry(BasePhotometryProcessor):
 
             metadata = source_table.get_metadata()
 
-            all_fluxes, all_fluxuncs = [], []
-            temp_imagename, temp_unc_imagename = self.save_temp_image_uncimage(metadata)
-
-            for cand_ind in range(len(candidate_table)):
-                row = candidate_table.iloc[cand_ind]
+            imagename, unc_imagename = self.get_image_uncimage(metadata)
 
-                image_cutout, unc_image_cutout = self.generate_cutouts(
-                    imagename=temp_imagename,
-                    unc_imagename=temp_unc_imagename,
-                    data_item=row,
-                )
+            image_cutouts, unc_image_cutouts = self.generate_cutout_stacks(
+                imagename=imagename,
+                unc_imagename=unc_imagename,
+                data=candidate_table,
+            )
 
-                fluxes, fluxuncs = self.perform_photometry(
-                    image_cutout=image_cutout, unc_image_cutout=unc_image_cutout
+            if self.batch_mode:
+                all_fluxes, all_fluxuncs = self.perform_batch_photometry(
+                    image_cutouts=image_cutouts, unc_image_cutouts=unc_image_cutouts
                 )
-                all_fluxes.append(fluxes)
-                all_fluxuncs.append(fluxuncs)
-
-                if self.save_cutouts:
+            else:
+                all_fluxes, all_fluxuncs = [], []
+                for cand_ind in range(len(candidate_table)):
+                    fluxes, fluxuncs = self.perform_photometry(
+                        image_cutout=image_cutouts[cand_ind],
+                        unc_image_cutout=unc_image_cutouts[cand_ind],
+                    )
+                    all_fluxes.append(fluxes)
+                    all_fluxuncs.append(fluxuncs)
+
+                all_fluxes = np.array(all_fluxes).T
+                all_fluxuncs = np.array(all_fluxuncs).T
+
+            if self.save_cutouts:
+                for cand_ind, image_cutout in enumerate(image_cutouts):
+                    unc_image_cutout = unc_image_cutouts[cand_ind]
                     image_cutout_path = get_output_dir(
                         self.temp_output_sub_dir, self.night_sub_dir
                     ).joinpath(f"image_cutout_{cand_ind}.dat")
@@ -102,9 +141,6 @@ class AperturePhotometry(BasePhotometryProcessor):
                     ).joinpath(f"unc_image_cutout_{cand_ind}.dat")
                     np.savetxt(X=unc_image_cutout, fname=unc_image_cutout_path)
 
-            all_fluxes = np.array(all_fluxes).T
-            all_fluxuncs = np.array(all_fluxuncs).T
-
             for ind, suffix in enumerate(self.col_suffix_list):
                 flux, fluxunc = all_fluxes[ind], all_fluxuncs[ind]
                 candidate_table[f"{APFLUX_PREFIX_KEY}{suffix}"] = flux
@@ -119,8 +155,7 @@ class AperturePhotometry(BasePhotometryProcessor):
                 candidate_table[f"{APMAG_PREFIX_KEY}{suffix}"] = magnitudes
                 candidate_table[f"{APMAGUNC_PREFIX_KEY}{suffix}"] = magnitudes_unc
 
-            temp_imagename.unlink()
-            temp_unc_imagename.unlink()
+            self.release_image_uncimage([imagename, unc_imagename])
             source_table.set_data(candidate_table)
 
         return batch
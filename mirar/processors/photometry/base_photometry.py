@@ -5,12 +5,14 @@ Module with classes to perform photometry on sources
 import logging
 from abc import ABC
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 import pandas as pd
-from astropy.io import fits
 
 from mirar.data import Image
+from mirar.data.scratch import get_image_key, scratch_files
+from mirar.io import open_fits
 from mirar.paths import (
     BASE_NAME_KEY,
     LATEST_SAVE_KEY,
@@ -20,10 +22,13 @@ from mirar.paths import (
     YPOS_KEY,
     ZP_KEY,
     ZP_STD_KEY,
-    get_output_dir,
 )
 from mirar.processors.base_processor import BaseSourceProcessor, ImageHandler
-from mirar.processors.photometry.utils import get_rms_image, make_cutouts
+from mirar.processors.photometry.context import photometry_contexts
+from mirar.processors.photometry.utils import (
+    get_rms_image,
+    make_cutout_stacks,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -58,81 +63,109 @@ class BasePhotometryProcessor(BaseSourceProcessor, ABC, ImageHandler):
         self.ypos_key = y_colname
         self.save_cutouts = save_cutouts
 
-    def save_temp_image(self, image) -> Path:
+    def save_temp_image(self, image, key: Optional[str] = None) -> Path:
         """
-        Save a temporary image and return its path
+        Save a temporary image as a shared scratch file, and return its path
 
         :param image: Image object
+        :param key: content key of the image, if already known
         :return: Path to the temporary image
         """
-        photometry_out_temp_dir = get_output_dir(
-            self.temp_output_sub_dir, self.night_sub_dir
-        )
-        image_basename = image.header[BASE_NAME_KEY]
-        temp_imagepath = photometry_out_temp_dir.joinpath(image_basename)
-        temp_imagepath.parent.mkdir(parents=True, exist_ok=True)
-        self.save_fits(image, temp_imagepath)
-        return temp_imagepath
+        return self.save_scratch_fits(image, key=key)
 
-    def save_uncertainty_image(self, image: Image) -> Path:
+    def save_uncertainty_image(self, image: Image, key: Optional[str] = None) -> Path:
         """
-        Create an uncertainty image from the image and return the filenames of the
-        image and uncertainty image
+        Create an uncertainty image from the image, save it as a shared scratch
+        file next to the image, and return its path
 
         :param image: Image object
+        :param key: content key of the image, if already known
         :return: Path to the uncertainty image
         """
-        photometry_out_temp_dir = get_output_dir(
-            self.temp_output_sub_dir, self.night_sub_dir
+        if key is None:
+            key = get_image_key(image)
+        unc_filename = scratch_files.acquire(
+            key,
+            image[BASE_NAME_KEY].replace(".fits", ".unc.fits"),
+            lambda x: self.save_fits(get_rms_image(image), path=x),
         )
-        unc_filename = Path(image[BASE_NAME_KEY].replace(".fits", ".unc.fits"))
-        rms_image = get_rms_image(image)
-        unc_filename = photometry_out_temp_dir.joinpath(unc_filename)
-        unc_filename.parent.mkdir(parents=True, exist_ok=True)
-        self.save_fits(rms_image, path=unc_filename)
         logger.debug(f"Saved unc file to {unc_filename}")
 
         return unc_filename
 
-    def generate_cutouts(
-        self, imagename: Path, unc_imagename: Path, data_item: Image | pd.Series
+    def generate_cutout_stacks(
+        self,
+        imagename: Path | np.ndarray,
+        unc_imagename: Path | np.ndarray,
+        data: pd.DataFrame,
     ) -> tuple[np.ndarray, np.ndarray]:
         """
-        Generate image and uncertainty image cutouts. This function first saves the
-        image and uncertainty image to temporary files, then generates the cutouts,
-        then deletes the temporary files.
-        :param imagename: Path to the image
-        :param unc_imagename: Path to the uncertainty image
-        :param data_item: pandas DataFrame Series or astropy fits Header
-
-        :returns tuple: 2D numpy arrays of the image cutout and uncertainty image cutout
+        Generate image and uncertainty image cutouts for every source in a table,
+        reading each image only once. The position of each source is given by
+        :meth:`get_physical_coordinates`
+
+        :param imagename: Path to the image, or image data
+        :param unc_imagename: Path to the uncertainty image, or uncertainty data
+        :param data: pandas DataFrame of sources
+        :returns tuple: arrays of image cutouts and uncertainty image cutouts,
+            each with shape (n_sources, size, size)
         """
-
-        x, y = self.get_physical_coordinates(data_item)
-        image_cutout, unc_image_cutout = make_cutouts(
-            image_paths=[imagename, unc_imagename],
-            position=(x, y),
+        positions = [self.get_physical_coordinates(row) for _, row in data.iterrows()]
+        x_positions, y_positions = np.array(positions, dtype=int).reshape(-1, 2).T
+        image_cutouts, unc_image_cutouts = make_cutout_stacks(
+            images=[imagename, unc_imagename],
+            x_positions=x_positions,
+            y_positions=y_positions,
             half_size=self.phot_cutout_half_size,
         )
-
-        return image_cutout, unc_image_cutout
+        return image_cutouts, unc_image_cutouts
 
     def save_temp_image_uncimage(self, metadata: dict) -> tuple[Path, Path]:
         """
-        Function to save the image and uncertainty image to temporary files
+        Function to save the image and uncertainty image to temporary files.
+        Release the files with :meth:`release_scratch_files` once done.
 
         :param metadata: Metadata dictionary
         :return: Tuple of image and uncertainty image filenames
         """
-        imagename = metadata[self.image_key]
-
-        image = Image(header=fits.getheader(imagename), data=fits.getdata(imagename))
+        data, header = open_fits(metadata[self.image_key])
+        image = Image(header=header, data=data)
 
-        image_filename = self.save_temp_image(image)
-        unc_filename = self.save_uncertainty_image(image)
+        key = get_image_key(image)
+        image_filename = self.save_temp_image(image, key=key)
+        unc_filename = self.save_uncertainty_image(image, key=key)
 
         return image_filename, unc_filename
 
+    def get_image_uncimage(
+        self, metadata: dict
+    ) -> tuple[Path | np.ndarray, Path | np.ndarray]:
+        """
+        Function to get the image and uncertainty image to make cutouts from.
+        These are the in-memory arrays of the photometry context of the image,
+        shared with other photometry processors, or temporary files if
+        cutouts are being saved for debugging. Release them with
+        :meth:`release_image_uncimage` once done.
+
+        :param metadata: Metadata dictionary
+        :return: Tuple of image and uncertainty image (data or filenames)
+        """
+        if self.save_cutouts:
+            return self.save_temp_image_uncimage(metadata)
+
+        context = photometry_contexts.get(metadata[self.image_key])
+        return context.data, context.rms_data
+
+    def release_image_uncimage(self, images: list[Path | np.ndarray]):
+        """
+        Function to release the image and uncertainty image from
+        :meth:`get_image_uncimage`
+
+        :param images: images to release
+        :return: None
+        """
+        self.release_scratch_files([x for x in images if isinstance(x, Path)])
+
     def get_physical_coordinates(self, data_item: pd.Series) -> tuple[int, int]:
         """
         Get the physical coordinates of the source from the data item
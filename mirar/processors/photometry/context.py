@@ -0,0 +1,226 @@
+"""
+Module with a shared, in-memory photometry context for each image.
+
+Photometry processors need the science data of an image and its RMS map.
+Rather than each processor reading the image, computing the RMS map, and
+writing both to temporary files, a :class:`PhotometryContext` holding both
+arrays is made once per image file, and shared by every photometry processor
+(and every source table) which uses that image. Contexts are kept in RAM
+up to a byte budget, with the least-recently used contexts dropped first:
+
+.. code-block:: bash
+
+    export MAX_PHOTOMETRY_CONTEXT_MB=2000
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from astropy.io import fits
+
+from mirar.async_writer import async_writer
+from mirar.io import open_fits
+from mirar.paths import GAIN_KEY
+from mirar.processors.photometry.utils import get_rms_map
+
+logger = logging.getLogger(__name__)
+
+MAX_PHOTOMETRY_CONTEXT_BYTES: int = int(
+    float(os.getenv("MAX_PHOTOMETRY_CONTEXT_MB", "1000")) * 1024**2
+)
+
+
+class PhotometryContext:
+    """
+    Read-only science data, header and RMS map of an image
+    """
+
+    def __init__(self, data: np.ndarray, rms_data: np.ndarray, header: fits.Header):
+        self.data = data
+        self.rms_data = rms_data
+        self.header = header
+        for array in [self.data, self.rms_data]:
+            array.flags.writeable = False
+
+    @property
+    def n_bytes(self) -> int:
+        """
+        Size of the arrays of the context
+
+        :return: number of bytes
+        """
+        return self.data.nbytes + self.rms_data.nbytes
+
+    @classmethod
+    def from_file(cls, image_path: Path | str) -> "PhotometryContext":
+        """
+        Make a photometry context from an image file
+
+        :param image_path: path of image
+        :return: PhotometryContext
+        """
+        data, header = open_fits(image_path)
+        rms_data = get_rms_map(data, gain=header[GAIN_KEY])
+        return cls(data=data, rms_data=rms_data, header=header)
+
+
+class PhotometryContextEntry:
+    """
+    Record of a photometry context, which may still be being made
+    """
+
+    def __init__(self):
+        self.context: PhotometryContext | None = None
+        self.ready = threading.Event()
+        self.error: Exception | None = None
+
+
+class PhotometryContextCache:
+    """
+    Process-wide cache of photometry contexts, keyed by image file.
+
+    The key includes the inode, size and modification time of the file,
+    so a context is made again if the image is saved again.
+    """
+
+    def __init__(self, max_bytes: int = MAX_PHOTOMETRY_CONTEXT_BYTES):
+        """
+        :param max_bytes: maximum bytes of contexts kept (0 to keep none)
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all photometry contexts
+
+        :return: None
+        """
+        with self._lock:
+            self._entries: OrderedDict[tuple, PhotometryContextEntry] = OrderedDict()
+            self.n_bytes = 0
+            self.n_hits = 0
+            self.n_misses = 0
+
+    def set_max_bytes(self, max_bytes: int):
+        """
+        Function to set the budget for photometry contexts
+
+        :param max_bytes: budget in bytes
+        :return: None
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, image_path: Path | str) -> PhotometryContext:
+        """
+        Get the photometry context of an image file, making it only if there
+        is not already one for the current version of the file
+
+        :param image_path: path of image
+        :return: PhotometryContext
+        """
+        image_path = Path(image_path)
+        # The image may have been saved asynchronously, e.g. by ImageSaver
+        async_writer.wait(image_path)
+        stat = image_path.stat()
+        key = (image_path.as_posix(), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            is_new = entry is None
+            if is_new:
+                self.n_misses += 1
+                # Contexts of older versions of the file are no longer needed
+                for old_key in [x for x in self._entries if x[0] == key[0]]:
+                    self._drop(old_key)
+                entry = PhotometryContextEntry()
+                self._entries[key] = entry
+            else:
+                self.n_hits += 1
+                self._entries.move_to_end(key)
+
+        if not is_new:
+            entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+            return entry.context
+
+        try:
+            context = PhotometryContext.from_file(image_path)
+        except Exception as exc:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry.error = exc
+            entry.ready.set()
+            raise
+
+        entry.context = context
+        entry.ready.set()
+        logger.debug(f"Made photometry context for {image_path}")
+
+        with self._lock:
+            if self._entries.get(key) is entry:
+                self.n_bytes += context.n_bytes
+                self._evict()
+
+        return context
+
+    def _drop(self, key: tuple):
+        """
+        Drop a context. Must be called with the lock held.
+
+        :param key: key of context
+        :return: None
+        """
+        entry = self._entries.pop(key)
+        if entry.context is not None:
+            self.n_bytes -= entry.context.n_bytes
+
+    def _evict(self):
+        """
+        Drop the least-recently used contexts, until within budget.
+        Must be called with the lock held.
+
+        :return: None
+        """
+        for key in list(self._entries.keys()):
+            if self.n_bytes <= self.max_bytes:
+                break
+            if self._entries[key].context is not None:
+                self._drop(key)
+
+    def clear(self):
+        """
+        Drops all photometry contexts
+
+        :return: None
+        """
+        with self._lock:
+            for key in list(self._entries.keys()):
+                if self._entries[key].context is not None:
+                    self._drop(key)
+
+    def get_stats(self) -> dict:
+        """
+        Summarise usage of photometry contexts
+
+        :return: dictionary of statistics
+        """
+        with self._lock:
+            return {
+                "n_contexts": len(self._entries),
+                "n_bytes": self.n_bytes,
+                "n_hits": self.n_hits,
+                "n_misses": self.n_misses,
+            }
+
+
+photometry_contexts = PhotometryContextCache()
@@ -19,8 +19,9 @@ from mirar.processors.base_processor import PrerequisiteError
 from mirar.processors.photometry.base_photometry import BasePhotometryProcessor
 from mirar.processors.photometry.utils import (
     get_mags_from_fluxes,
-    make_psf_shifted_array,
+    get_psf_shifted_array,
     psf_photometry,
+    psf_photometry_batch,
 )
 
 logger = logging.getLogger(__name__)
@@ -33,6 +34,10 @@ class PSFPhotometry(BasePhotometryProcessor):
 
     base_key = "PSFPHOT"
 
+    def __init__(self, *args, batch_mode: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_mode = batch_mode
+
     def perform_photometry(
         self,
         image_cutout: np.ndarray,
@@ -48,8 +53,8 @@ class PSFPhotometry(BasePhotometryProcessor):
         """
         if not isinstance(psf_filename, Path):
             psf_filename = Path(psf_filename)
-        psfmodels = make_psf_shifted_array(
-            psf_filename=psf_filename.as_posix(),
+        psfmodels = get_psf_shifted_array(
+            psf_filename=psf_filename,
             cutout_size_psf_phot=int(image_cutout.shape[0] / 2),
         )
 
@@ -60,6 +65,29 @@ class PSFPhotometry(BasePhotometryProcessor):
         )
         return flux, fluxunc, minchi2, xshift, yshift
 
+    def perform_batch_photometry(
+        self,
+        image_cutouts: np.ndarray,
+        unc_image_cutouts: np.ndarray,
+        psf_filename: str | Path,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, list, list]:
+        """
+        Function to perform PSF photometry on all cutouts at once
+        :param image_cutouts: cutouts of image, of shape (n_sources, size, size)
+        :param unc_image_cutouts: cutouts of uncertainty image, of the same shape
+        :param psf_filename: filename of psf file
+        :return: fluxes, fluxuncs, minchi2s, xshifts, yshifts
+        """
+        psfmodels = get_psf_shifted_array(
+            psf_filename=psf_filename,
+            cutout_size_psf_phot=int(image_cutouts.shape[1] / 2),
+        )
+        return psf_photometry_batch(
+            image_cutouts=image_cutouts,
+            image_unc_cutouts=unc_image_cutouts,
+            psfmodels=psfmodels,
+        )
+
     def get_psf_filename(self, row):
         """
         Function to get the name of psf file
@@ -81,8 +109,6 @@ class PSFPhotometry(BasePhotometryProcessor):
 
             metadata = source_table.get_metadata()
 
-            fluxes, fluxuncs, minchi2s, xshifts, yshifts = [], [], [], [], []
-
             if self.psf_file_key not in metadata:
                 raise PrerequisiteError(
                     f"PSF file key {self.psf_file_key} not in source table."
@@ -90,25 +116,48 @@ class PSFPhotometry(BasePhotometryProcessor):
                     f" the psf file name?"
                 )
             psf_filename = source_table[self.psf_file_key]
-            temp_imagename, temp_unc_imagename = self.save_temp_image_uncimage(metadata)
+            imagename, unc_imagename = self.get_image_uncimage(metadata)
 
-            for ind, row in candidate_table.iterrows():
-                image_cutout, unc_image_cutout = self.generate_cutouts(
-                    imagename=temp_imagename,
-                    unc_imagename=temp_unc_imagename,
-                    data_item=row,
-                )
+            image_cutouts, unc_image_cutouts = self.generate_cutout_stacks(
+                imagename=imagename,
+                unc_imagename=unc_imagename,
+                data=candidate_table,
+            )
+
+            if self.batch_mode:
                 (
-                    flux,
-                    fluxunc,
-                    minchi2,
-                    xshift,
-                    yshift,
-                ) = self.perform_photometry(
-                    image_cutout, unc_image_cutout, psf_filename=psf_filename
+                    fluxes,
+                    fluxuncs,
+                    minchi2s,
+                    xshifts,
+                    yshifts,
+                ) = self.perform_batch_photometry(
+                    image_cutouts, unc_image_cutouts, psf_filename=psf_filename
                 )
-
-                if self.save_cutouts:
+            else:
+                fluxes, fluxuncs, minchi2s, xshifts, yshifts = [], [], [], [], []
+                for image_cutout, unc_image_cutout in zip(
+                    image_cutouts, unc_image_cutouts
+                ):
+                    (
+                        flux,
+                        fluxunc,
+                        minchi2,
+                        xshift,
+                        yshift,
+                    ) = self.perform_photometry(
+                        image_cutout, unc_image_cutout, psf_filename=psf_filename
+                    )
+                    fluxes.append(flux)
+                    fluxuncs.append(fluxunc)
+                    minchi2s.append(minchi2)
+                    xshifts.append(xshift)
+                    yshifts.append(yshift)
+
+            if self.save_cutouts:
+                for i, ind in enumerate(candidate_table.index):
+                    image_cutout = image_cutouts[i]
+                    unc_image_cutout = unc_image_cutouts[i]
                     image_cutout_path = get_output_dir(
                         self.temp_output_sub_dir, self.night_sub_dir
                     ).joinpath(f"image_cutout_{ind}.dat")
@@ -120,12 +169,6 @@ class PSFPhotometry(BasePhotometryProcessor):
                     logger.debug(f"Writing cutout to {unc_image_cutout_path}")
                     np.savetxt(X=unc_image_cutout, fname=unc_image_cutout_path)
 
-                fluxes.append(flux)
-                fluxuncs.append(fluxunc)
-                minchi2s.append(minchi2)
-                xshifts.append(xshift)
-                yshifts.append(yshift)
-
             candidate_table[PSF_FLUX_KEY] = fluxes
             candidate_table[PSF_FLUXUNC_KEY] = fluxuncs
             candidate_table["chipsf"] = minchi2s
@@ -142,8 +185,7 @@ class PSFPhotometry(BasePhotometryProcessor):
             candidate_table[MAG_PSF_KEY] = magnitudes
             candidate_table[MAGERR_PSF_KEY] = magnitudes_unc
 
-            temp_imagename.unlink()
-            temp_unc_imagename.unlink()
+            self.release_image_uncimage([imagename, unc_imagename])
 
             source_table.set_data(candidate_table)
 
@@ -3,6 +3,7 @@ Module with utis for photometry
 """
 
 import logging
+from functools import lru_cache
 from pathlib import Path
 
 import matplotlib.pyplot as plt
@@ -25,6 +26,91 @@ class CutoutError(ProcessorError):
     """
 
 
+def load_cutout_image(image: str | Path | np.ndarray) -> np.ndarray:
+    """
+    Get the data of an image to make cutouts from. Files are memory-mapped where
+    possible, so that only the pixels of the cutouts are read.
+
+    :param image: path of image, or image data
+    :return: 2D numpy array
+    """
+    if isinstance(image, np.ndarray):
+        return image
+    return fits.getdata(image)
+
+
+def make_cutout_stack(
+    image: str | Path | np.ndarray,
+    x_positions: np.ndarray | list[int],
+    y_positions: np.ndarray | list[int],
+    half_size: int,
+) -> np.ndarray:
+    """
+    Function to make cutouts at many positions of one image, in a single
+    vectorized gather. Cutouts extending beyond the image are padded with zeros.
+
+    :param image: path of image, or image data
+    :param x_positions: x coordinates of the centers of the cutouts
+    :param y_positions: y coordinates of the centers of the cutouts
+    :param half_size: half_size of the square cutouts
+    :return: array of cutouts, with shape (n_positions, size, size)
+    """
+    data = load_cutout_image(image)
+    y_image_size, x_image_size = np.shape(data)
+    x_positions = np.asarray(x_positions).astype(int)
+    y_positions = np.asarray(y_positions).astype(int)
+
+    outside = (
+        (x_positions < 0)
+        | (x_positions > x_image_size)
+        | (y_positions < 0)
+        | (y_positions > y_image_size)
+    )
+    if np.any(outside):
+        name = "data" if isinstance(image, np.ndarray) else image
+        x, y = x_positions[outside][0], y_positions[outside][0]
+        err = f"Cutout position {x},{y} is outside the image {name}"
+        logger.error(err)
+        raise CutoutError(err)
+
+    offsets = np.arange(-half_size, half_size + 1)
+    rows = y_positions[:, None] + offsets
+    cols = x_positions[:, None] + offsets
+
+    cutouts = data[
+        np.clip(rows, 0, y_image_size - 1)[:, :, None],
+        np.clip(cols, 0, x_image_size - 1)[:, None, :],
+    ]
+    in_image = ((rows >= 0) & (rows < y_image_size))[:, :, None] & (
+        (cols >= 0) & (cols < x_image_size)
+    )[:, None, :]
+    cutouts[~in_image] = 0
+
+    return cutouts
+
+
+def make_cutout_stacks(
+    images: list[str | Path | np.ndarray],
+    x_positions: np.ndarray | list[int],
+    y_positions: np.ndarray | list[int],
+    half_size: int,
+) -> list[np.ndarray]:
+    """
+    Function to make cutouts at many positions of several images, opening each
+    image only once
+
+    :param images: paths of images, or image data
+    :param x_positions: x coordinates of the centers of the cutouts
+    :param y_positions: y coordinates of the centers of the cutouts
+    :param half_size: half_size of the square cutouts
+    :return: list of arrays of cutouts, each with shape (n_positions, size, size)
+    """
+    return [
+        make_cutout_stack(image, x_positions, y_positions, half_size)
+        for image in images
+    ]
+
+
 def make_cutouts(
     image_paths: Path | list[Path], position: tuple, half_size: int
 ) -> list[np.array]:
@@ -41,48 +127,8 @@ def make_cutouts(
     if not isinstance(image_paths, list):
         image_paths = [image_paths]
 
-    cutout_list = []
-    for image_path in image_paths:
-        data = fits.getdata(image_path)
-        y_image_size, x_image_size = np.shape(data)
-        x, y = position
-
-        if x < 0 or x > x_image_size or y < 0 or y > y_image_size:
-            raise CutoutError(
-                f"Cutout position {x},{y} is outside the image {image_path}"
-            )
-
-        if x < half_size:
-            xmin, xmax = 0, x + half_size + 1
-            x_pad_width = (half_size - x, 0)
-
-        elif x + half_size + 1 > x_image_size:
-            xmin, xmax = x - half_size, x_image_size
-            x_pad_width = (0, (half_size + x + 1) - x_image_size)
-        else:
-            xmin, xmax = x - half_size, x + half_size + 1
-            x_pad_width = (0, 0)
-
-        if y < half_size:
-            ymin, ymax = 0, y + half_size + 1
-            y_pad_width = (half_size - y, 0)
-
-        elif y + half_size + 1 > y_image_size:
-            ymin, ymax = y - half_size, y_image_size
-            y_pad_width = (0, (half_size + y + 1) - y_image_size)
-        else:
-            ymin, ymax = y - half_size, y + half_size + 1
-            y_pad_width = (0, 0)
-
-        cutout = data[ymin:ymax, xmin:xmax]
-        cutout = np.pad(cutout, (y_pad_width, x_pad_width), "constant")
-        cutout_list.append(cutout)
-
-        assert cutout.shape == (2 * half_size + 1, 2 * half_size + 1), (
-            f"Cutout shape is not correct for x={x} and y={y} and "
-            f"half_size={half_size}. Shape is {cutout.shape} Data shape is {data.shape}"
-        )
-    return cutout_list
+    x, y = position
+    return [stack[0] for stack in make_cutout_stacks(image_paths, [x], [y], half_size)]
 
 
 def psf_photometry(
@@ -195,6 +241,153 @@ def make_psf_shifted_array(
     return psfmodels
 
 
+@lru_cache(maxsize=16)
+def _load_psf_shifted_array(
+    psf_filename: str,
+    file_stamp: tuple[int, int, int],  # pylint: disable=unused-argument
+    cutout_size_psf_phot: int,
+    pad_psf_size: int,
+) -> np.ndarray:
+    """
+    Cached version of :func:`make_psf_shifted_array`, with the file stamp as part
+    of the key so that a changed PSF file is read again
+
+    :param psf_filename: PSF file
+    :param file_stamp: inode, size and modification time of the PSF file
+    :param cutout_size_psf_phot: half size of cutouts
+    :param pad_psf_size: size of padded PSF
+    :return: read-only array of shifted PSF models
+    """
+    psfmodels = make_psf_shifted_array(
+        psf_filename=psf_filename,
+        cutout_size_psf_phot=cutout_size_psf_phot,
+        pad_psf_size=pad_psf_size,
+    )
+    psfmodels.flags.writeable = False
+    return psfmodels
+
+
+def get_psf_shifted_array(
+    psf_filename: str | Path, cutout_size_psf_phot: int = 20, pad_psf_size: int = 60
+) -> np.ndarray:
+    """
+    Function to get the array of shifted models of a PSF, which is made
+    only once for each PSF file and cutout size
+
+    :param psf_filename: PSF file
+    :param cutout_size_psf_phot: half size of cutouts
+    :param pad_psf_size: size of padded PSF
+    :return: read-only array of shifted PSF models, of shape (size, size, n_models)
+    """
+    stat = Path(psf_filename).stat()
+    return _load_psf_shifted_array(
+        Path(psf_filename).as_posix(),
+        (stat.st_ino, stat.st_size, stat.st_mtime_ns),
+        int(cutout_size_psf_phot),
+        int(pad_psf_size),
+    )
+
+
+def get_psf_model_shifts(psfmodels: np.ndarray) -> tuple[list, list]:
+    """
+    Function to get the shifts of each PSF model, relative to the unshifted model,
+    as reported by :func:`psf_photometry`
+
+    :param psfmodels: 3D numpy array of the PSF models
+    :return: list of xshifts and list of yshifts, one per model
+    """
+    numpsfmodels = psfmodels.shape[2]
+    unshifted_psf = psfmodels[:, :, numpsfmodels // 2 + 1]
+    y_cen, x_cen = np.where(unshifted_psf == np.max(unshifted_psf))
+
+    xshifts, yshifts = [], []
+    for ind in range(numpsfmodels):
+        psfmodel = psfmodels[:, :, ind]
+        ys_cen, xs_cen = np.where(psfmodel == np.max(psfmodel))
+        xshifts.append(xs_cen[0] - x_cen)
+        yshifts.append(ys_cen[0] - y_cen)
+    return xshifts, yshifts
+
+
+def psf_photometry_batch(
+    image_cutouts: np.ndarray,
+    image_unc_cutouts: np.ndarray,
+    psfmodels: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, list, list]:
+    """
+    Perform PSF photometry on a stack of cutouts at once, with the same results
+    as running :func:`psf_photometry` on each cutout.
+
+    The fluxes and chi2 values of every PSF model for every source are found
+    with matrix products of the (n_sources, n_pixels) cutouts and the
+    (n_models, n_pixels) PSF models, rather than looping over models.
+
+    :param image_cutouts: array of image cutouts, shape (n_sources, size, size)
+    :param image_unc_cutouts: array of uncertainty cutouts, of the same shape
+    :param psfmodels: 3D numpy array of the PSF models, shape (size, size, n_models)
+    :return: arrays of PSF fluxes, PSF flux uncertainties and chi2 values,
+        and lists of xshifts and yshifts
+    """
+    n_sources = image_cutouts.shape[0]
+    n_pixels = int(np.prod(psfmodels.shape[:2]))
+    deg_freedom = n_pixels - 1
+
+    models = psfmodels.reshape(n_pixels, -1).T.astype(float)
+    sq_models = np.square(models)
+    sq_model_sums = np.nansum(sq_models, axis=1)
+
+    data = image_cutouts.reshape(n_sources, n_pixels).astype(float)
+    unc = image_unc_cutouts.reshape(n_sources, n_pixels).astype(float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        data_0 = np.where(np.isnan(data), 0.0, data)
+        sq_unc_0 = np.where(np.isnan(unc), 0.0, np.square(unc))
+        fluxes = (data_0 @ models.T) / sq_model_sums
+
+        # chi2 = sum(w * (data - flux * model)^2), expanded in matrix products
+        regular = np.isfinite(data) & ~np.isnan(unc) & (unc != 0)
+        weights = np.where(regular, 1.0 / np.square(np.where(regular, unc, 1.0)), 0.0)
+        weighted_data = weights * np.where(regular, data, 0.0)
+        chi2s = (
+            np.sum(weighted_data * np.where(regular, data, 0.0), axis=1)[:, None]
+            - 2.0 * fluxes * (weighted_data @ models.T)
+            + np.square(fluxes) * (weights @ sq_models.T)
+        ) / deg_freedom
+
+        # Pixels with zero uncertainty give an infinite chi2, unless fit exactly
+        zero_unc = np.isfinite(data) & (unc == 0)
+        for ind in np.flatnonzero(np.any(zero_unc, axis=1)):
+            pixels = zero_unc[ind]
+            residuals = data[ind, pixels] - models[:, pixels] * fluxes[ind][:, None]
+            chi2s[ind, np.any(residuals != 0, axis=1)] = np.inf
+
+        minchi2_inds = np.argmin(chi2s, axis=1)
+
+        # Recompute the values of the best-fit model directly
+        best_models = models[minchi2_inds]
+        best_sq_models = sq_models[minchi2_inds]
+        best_fit_psf_fluxes = np.nansum(best_models * data, axis=1) / np.nansum(
+            best_sq_models, axis=1
+        )
+        best_fit_psf_fluxuncs = np.sqrt(
+            np.nansum(best_sq_models * sq_unc_0, axis=1)
+        ) / np.nansum(best_sq_models, axis=1)
+        minchi2s = (
+            np.nansum(
+                np.square(data - best_models * best_fit_psf_fluxes[:, None])
+                / np.square(unc),
+                axis=1,
+            )
+            / deg_freedom
+        )
+
+    model_xshifts, model_yshifts = get_psf_model_shifts(psfmodels)
+    xshifts = [model_xshifts[ind] for ind in minchi2_inds]
+    yshifts = [model_yshifts[ind] for ind in minchi2_inds]
+
+    return best_fit_psf_fluxes, best_fit_psf_fluxuncs, minchi2s, xshifts, yshifts
+
+
 def aper_photometry(
     image_cutout: np.ndarray,
     image_unc_cutout: np.ndarray,
@@ -276,6 +469,68 @@ def aper_photometry(
     return counts, counts_err
 
 
+def aper_photometry_batch(
+    image_cutouts: np.ndarray,
+    image_unc_cutouts: np.ndarray,
+    aper_diameter: float,
+    bkg_in_diameter: float,
+    bkg_out_diameter: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Perform aperture photometry on a stack of cutouts at once, with the same
+    results as running :func:`aper_photometry` on each cutout.
+
+    All cutouts share one geometry, so the aperture and annulus masks are made
+    once and applied to the whole stack, and the background of every cutout is
+    found in one vectorized sigma-clipping.
+
+    :param image_cutouts: array of image cutouts, shape (n_sources, size, size)
+    :param image_unc_cutouts: array of uncertainty cutouts, of the same shape
+    :param aper_diameter: aperture diameter in pixels
+    :param bkg_in_diameter: inner background annulus diameter in pixels
+    :param bkg_out_diameter: outer background annulus diameter in pixels
+    :return: arrays of aperture fluxes and aperture flux uncertainties
+    """
+    n_sources = image_cutouts.shape[0]
+    shape = image_cutouts.shape[1:]
+    x_crd, y_crd = int(shape[0] / 2), int(shape[1] / 2)
+
+    aperture = CircularAperture((x_crd, y_crd), r=aper_diameter / 2)
+    annulus_aperture = CircularAnnulus(
+        (x_crd, y_crd), r_in=bkg_in_diameter / 2, r_out=bkg_out_diameter / 2
+    )
+
+    # Annulus pixels beyond the edge of the cutouts count as zeros
+    annulus_mask = annulus_aperture.to_mask(method="center")
+    annulus_in_cutout = annulus_mask.to_image(shape) > 0
+    n_outside = int(np.sum(annulus_mask.data > 0) - np.sum(annulus_in_cutout))
+    annulus_data = np.concatenate(
+        [
+            image_cutouts[:, annulus_in_cutout].astype(float),
+            np.zeros((n_sources, n_outside)),
+        ],
+        axis=1,
+    )
+    _, bkg_median, _ = sigma_clipped_stats(
+        annulus_data, sigma=2, mask_value=np.nan, axis=1
+    )
+    bkg_median = np.asarray(bkg_median, dtype=float).reshape(n_sources)
+
+    aperture_in_cutout = aperture.to_mask(method="center").to_image(shape) > 0
+    errors = np.sqrt(
+        np.nansum(image_unc_cutouts[:, aperture_in_cutout].astype(float) ** 2, axis=1)
+    )
+
+    weights = aperture.to_mask(method="exact").to_image(shape)
+    in_aperture = weights > 0
+    aperture_data = image_cutouts[:, in_aperture].astype(float)
+    bkg_sub_data = aperture_data - bkg_median[:, None]
+    bkg_sub_data[np.isnan(aperture_data)] = 0.0
+    counts = np.sum(bkg_sub_data * weights[in_aperture], axis=1)
+
+    return counts, errors
+
+
 def get_rms_image(image: Image) -> Image:
     """Get an RMS image from a regular image
 
@@ -283,17 +538,28 @@ def get_rms_image(image: Image) -> Image:
     :param rms: rms of the image
     :return: An RMS :class:`~mirar.data.image_data.Image`
     """
-    image_data = image.get_data()
-    image_data = image_data[np.invert(np.isnan(image_data))]
+    rms_image = Image(
+        data=get_rms_map(image.get_data(), gain=image[GAIN_KEY]),
+        header=image.get_header(),
+    )
+    return rms_image
+
+
+def get_rms_map(data: np.ndarray, gain: float) -> np.ndarray:
+    """Get an RMS map from image data, as used by :func:`get_rms_image`
+
+    :param data: image data
+    :param gain: gain of the image
+    :return: RMS map
+    """
+    image_data = data[np.invert(np.isnan(data))]
     rms = 0.5 * (
         np.percentile(image_data[image_data != 0.0], 84.13)
         - np.percentile(image_data[image_data != 0.0], 15.86)
     )
-    gain = image[GAIN_KEY]
-    poisson_noise = np.copy(image.get_data()) / gain
+    poisson_noise = np.copy(data) / gain
     poisson_noise[poisson_noise < 0] = 0
-    rms_image = Image(data=np.sqrt(poisson_noise + rms**2), header=image.get_header())
-    return rms_image
+    return np.sqrt(poisson_noise + rms**2)
 
 
 def get_mags_from_fluxes(
@@ -0,0 +1,80 @@
+"""
+Module containing the worker functions used by
+:class:`~mirar.processors.base_processor.BaseProcessor` in 'process' execution mode
+"""
+
+import pickle
+from typing import TYPE_CHECKING, Optional
+
+from mirar.async_writer import async_writer
+from mirar.data import DataBatch, ImageBatch
+from mirar.data.cache import cache, hot_cache
+from mirar.data.scratch import scratch_files
+from mirar.errors import ProcessorError
+from mirar.profiling import profiler
+
+if TYPE_CHECKING:
+    from mirar.processors.base_processor import BaseProcessor
+
+# Processor copy used by each worker process in 'process' execution mode
+_worker_processor: Optional["BaseProcessor"] = None
+
+
+def init_process_worker(processor: "BaseProcessor"):
+    """
+    Initialise a worker process with the processor it should apply
+
+    :param processor: Processor to apply in this worker process
+    :return: None
+    """
+    global _worker_processor  # pylint: disable=global-statement
+    _worker_processor = processor
+    # Any cache files or in-RAM data inherited from the parent process
+    # belong to the parent, as do the cache files of images it sends
+    cache.reset()
+    cache.set_borrowing(True)
+    hot_cache.reset()
+    profiler.clear()
+    async_writer.reset()
+    scratch_files.reset()
+
+
+def apply_in_process(batch: DataBatch) -> bytes:
+    """
+    Apply the worker processor to a batch, inside a worker process.
+
+    The result is pickled here rather than by the executor, so that the worker
+    copies of any images can hand ownership of their cache files back to the
+    parent process before being garbage collected.
+
+    :param batch: Batch to process
+    :return: Pickled tuple of (new batch or None, error report or None,
+        profiling records)
+    """
+    new_batch, err = _worker_processor.apply_with_report(batch)
+
+    # Asynchronous writes must finish before the worker hands back the batch
+    failures = async_writer.flush()
+    if (len(failures) > 0) & (err is None):
+        err = _worker_processor.generate_error_report(failures[0][2], batch)
+        new_batch = None
+
+    # Scratch files kept for reuse would outlive the worker process
+    scratch_files.clear_retained()
+
+    records = profiler.pop_records()
+    try:
+        payload = pickle.dumps((new_batch, err, records))
+    except (pickle.PicklingError, TypeError, AttributeError) as exc:
+        err = _worker_processor.generate_error_report(
+            ProcessorError(f"Could not return result from worker process: {exc}"),
+            batch,
+        )
+        new_batch = None
+        payload = pickle.dumps((new_batch, err, records))
+
+    if isinstance(new_batch, ImageBatch):
+        for image in new_batch:
+            image.release_cache()
+
+    return payload
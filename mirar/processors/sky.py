@@ -6,7 +6,7 @@ import logging
 
 import numpy as np
 
-from mirar.data import ImageBatch
+from mirar.data import Image, ImageBatch
 from mirar.paths import SATURATE_KEY
 from mirar.processors.base_processor import ProcessorPremadeCache
 from mirar.processors.flat import SkyFlatCalibrator
@@ -26,33 +26,34 @@ class NightSkyMedianCalibrator(SkyFlatCalibrator):
         batch: ImageBatch,
     ) -> ImageBatch:
         master_sky = self.get_cache_file(batch)
-
-        mask = master_sky.get_data() <= self.flat_nan_threshold
-
-        if np.sum(mask) > 0:
-            data = master_sky.get_data()
-            data[mask] = np.nan
-            master_sky.set_data(data)
+        master_data = self.get_master_data(master_sky)
 
         for image in batch:
-            data = image.get_data()
-            header = image.get_header()
-
-            subtract_median = np.nanmedian(data)
-            data = data - subtract_median * master_sky.get_data()
-
-            header.append(
-                ("SKMEDSUB", subtract_median, "Median sky level subtracted"), end=True
+            data = self.calibrate_data(
+                image, self.get_calibration_data(image), master_sky, master_data
             )
-            if SATURATE_KEY in image.header:
-                # image[SATURATE_KEY] -= subtract_median
-                image[SATURATE_KEY] = 25000
-
             image.set_data(data)
-            image.set_header(header)
 
         return batch
 
+    def calibrate_data(
+        self, image: Image, data: np.ndarray, master: Image, master_data: np.ndarray
+    ) -> np.ndarray:
+        header = image.get_header()
+
+        subtract_median = np.nanmedian(data)
+        data -= subtract_median * master_data
+
+        header.append(
+            ("SKMEDSUB", subtract_median, "Median sky level subtracted"), end=True
+        )
+        if SATURATE_KEY in image.header:
+            # image[SATURATE_KEY] -= subtract_median
+            image[SATURATE_KEY] = 25000
+
+        image.set_header(header)
+        return data
+
     def __str__(self) -> str:
         return (
             "Processor to create a median sky background map,"
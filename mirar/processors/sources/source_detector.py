@@ -29,7 +29,7 @@ from mirar.paths import (
 )
 from mirar.processors.astromatic.sextractor.sourceextractor import run_sextractor_dual
 from mirar.processors.base_processor import BaseSourceGenerator, PrerequisiteError
-from mirar.processors.photometry.utils import make_cutouts
+from mirar.processors.photometry.utils import make_cutout_stacks
 from mirar.processors.zogy.zogy import ZOGY
 from mirar.utils.ldac_tools import get_table_from_ldac
 
@@ -119,31 +119,17 @@ def generate_candidates_table(
 
     cutout_size_display = 40
 
-    display_sci_ims = []
-    display_ref_ims = []
-    display_diff_ims = []
-
-    # Cutouts
-    for _, row in det_srcs.iterrows():
-        xpeak, ypeak = int(row["xpeak"]), int(row["ypeak"])
-
-        display_sci_cutout, display_ref_cutout, display_diff_cutout = make_cutouts(
-            [sci_resamp_image_path, ref_resamp_image_path, diff_path],
-            (xpeak, ypeak),
-            cutout_size_display,
-        )
-
-        display_sci_bit = encode_img(display_sci_cutout)
-        display_ref_bit = encode_img(display_ref_cutout)
-        display_diff_bit = encode_img(display_diff_cutout)
-
-        display_sci_ims.append(display_sci_bit)
-        display_ref_ims.append(display_ref_bit)
-        display_diff_ims.append(display_diff_bit)
+    # Cutouts, reading each image once
+    display_sci_cutouts, display_ref_cutouts, display_diff_cutouts = make_cutout_stacks(
+        [sci_resamp_image_path, ref_resamp_image_path, diff_path],
+        np.asarray(det_srcs["xpeak"]),
+        np.asarray(det_srcs["ypeak"]),
+        cutout_size_display,
+    )
 
-    det_srcs["cutout_science"] = display_sci_ims
-    det_srcs["cutout_template"] = display_ref_ims
-    det_srcs["cutout_difference"] = display_diff_ims
+    det_srcs["cutout_science"] = [encode_img(x) for x in display_sci_cutouts]
+    det_srcs["cutout_template"] = [encode_img(x) for x in display_ref_cutouts]
+    det_srcs["cutout_difference"] = [encode_img(x) for x in display_diff_cutouts]
 
     det_srcs["isdiffpos"] = isdiffpos
 
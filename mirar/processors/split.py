@@ -32,6 +32,7 @@ class SplitImage(BaseImageProcessor):
     """
 
     base_key = "split"
+    is_barrier = True
 
     def __init__(self, buffer_pixels: int = 0, n_x: int = 1, n_y: int = 1):
         super().__init__()
@@ -7,8 +7,10 @@ import logging
 import os
 from collections.abc import Callable
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
+from astropy.io.fits import Header
 
 from mirar.data import Image, ImageBatch
 from mirar.errors import ImageNotFoundError
@@ -97,6 +99,7 @@ def find_required_cals(
     open_f: Callable[[str], Image] = open_raw_image,
     images: ImageBatch = ImageBatch(),
     skip_latest_night: bool = False,
+    header_f: Optional[Callable[[str], Header | list[Header]]] = None,
 ) -> ImageBatch:
     """
     Broad function to search for missing calibration files in previous nights
@@ -107,6 +110,9 @@ def find_required_cals(
     :param open_f: Function to open raw images
     :param images: Current image list (default: empty)
     :param skip_latest_night: Boolean to skip the directory of night being processed
+    :param header_f: Optional function to open raw image headers, matching open_f,
+        so that only the data of the selected calibration images is read
+        (and, with a header index, only new files are opened)
     :return: Updated image batch
     """
 
@@ -159,7 +165,16 @@ def find_required_cals(
         ordered_nights = ordered_nights[1:]
 
         try:
-            new_images = load_from_dir(str(dir_to_load), open_f=open_f)
+            # Only load images which could meet a missing requirement
+            selection = {
+                TARGET_KEY: [req.target_name for req in requirements if not req.success]
+            }
+            new_images = load_from_dir(
+                str(dir_to_load),
+                open_f=open_f,
+                header_f=header_f,
+                selection=selection,
+            )
             requirements = update_requirements(requirements, new_images)
 
         except ImageNotFoundError:
@@ -219,13 +234,16 @@ class CalHunter(ImageLoader):
             self.input_img_dir, os.path.join(self.night_sub_dir, self.input_sub_dir)
         )
 
+        open_f, header_f = self.get_load_functions()
+
         updated_batch = find_required_cals(
             latest_dir=latest_dir,
             night=self.night,
             requirements=requirements,
-            open_f=self.load_image,
+            open_f=open_f,
             images=batch,
             skip_latest_night=True,
+            header_f=header_f,
         )
 
         return updated_batch
@@ -1,29 +1,79 @@
 """
-Module for loading images
+Module for loading images.
+
+Directories are loaded in two passes. First, every file is checked and opened
+in parallel, with a bounded thread pool. If a header function is available
+(as for the default loaders), only headers are read in this pass, and each
+image is created with deferred data (see
+:meth:`~mirar.data.image_data.Image.from_loader`). The pixels of a file are then
+only read when a later processor first needs them, so files rejected on their
+headers (e.g. by an :class:`~mirar.processors.utils.image_selector.ImageSelector`)
+are never read. Otherwise, each file is opened in full.
+
+Header-first loading is used with the default open functions of
+:class:`ImageLoader` and :class:`MEFLoader`, and with any custom load_image
+given together with a matching load_header. A custom load_image without one
+is always opened in full, so that any check it makes on the data still skips
+the file at load time.
+
+Files which are incomplete, invalid or cannot be parsed are skipped when
+scanned. As the data of a deferred file is only read later, a file which then
+fails to open (e.g. with corrupt pixel data, or a load_image raising
+:class:`InvalidImage`) instead raises a :class:`BadImageError` in the first
+processor needing its data, so that the batch is reported in the error stack.
+
+If a header index is enabled (see :mod:`mirar.data.header_index`), the headers
+are read from an index of the directory instead, which is updated
+incrementally, so that only new or changed files are opened. Images can also
+be selected by their header values, e.g. to only ever read the required
+calibration images from previous nights.
 """
 
+import inspect
 import logging
 import os
+import threading
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from glob import glob
 from pathlib import Path
+from typing import Optional
 
+from astropy.io.fits import Header
 from tqdm import tqdm
 
+from mirar.async_writer import async_writer
 from mirar.data import Image, ImageBatch
+from mirar.data.header_index import get_header_index
 from mirar.errors import ImageNotFoundError, NoncriticalProcessingError, ProcessorError
 from mirar.io import (
     MissingCoreFieldError,
     check_file_is_complete,
     check_image_has_core_fields,
+    open_mef_headers,
     open_mef_image,
+    open_raw_header,
     open_raw_image,
 )
-from mirar.paths import RAW_IMG_KEY, RAW_IMG_SUB_DIR, base_raw_dir
+from mirar.paths import (
+    BASE_NAME_KEY,
+    RAW_IMG_KEY,
+    RAW_IMG_SUB_DIR,
+    base_raw_dir,
+    max_n_cpu,
+)
 from mirar.processors.base_processor import BaseImageProcessor
 
 logger = logging.getLogger(__name__)
 
+# Whether MEFLoader reads each extension only when needed, unless set per loader
+LAZY_MEF_LOADING: bool = os.getenv("LAZY_MEF_LOADING", "false") in [
+    "true",
+    "True",
+    True,
+]
+
 
 class BadImageError(ProcessorError):
     """Exception for bad images"""
@@ -33,71 +83,273 @@ class InvalidImage(NoncriticalProcessingError):
     """Image should be skipped"""
 
 
-def unzip(zipped_list: list[str]) -> list[str]:
+class DeferredFile:
+    """
+    Class to open the images of a file once, when the data of any of them is
+    first needed. Images with deferred data (see
+    :meth:`~mirar.data.image_data.Image.from_loader`) then share this data.
     """
-    Function to unzip a list of files?
 
-    :param zipped_list: List of zipped files
-    :return: List of renamed files
+    def __init__(
+        self,
+        path: str | Path,
+        open_f: Callable[[str | Path], Image | list[Image]],
+        names: dict[int, str],
+    ):
+        """
+        :param path: path of file
+        :param open_f: function to open images
+        :param names: expected base names of images in the file, by index
+        """
+        self.path = path
+        self.open_f = open_f
+        self.names = names
+        self.images = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Opened images are not sent to other processes, which reopen the file
+        state = self.__dict__.copy()
+        state["images"] = None
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def get_image(self, index: int) -> Image:
+        """
+        Get one of the images in the file, opening the file if needed
+
+        :param index: index of the image in the file
+        :return: Image
+        """
+        with self.lock:
+            if self.error is not None:
+                raise BadImageError(self.error)
+
+            if self.images is None:
+                logger.debug(f"Loading deferred data from {self.path}")
+                try:
+                    images = self.open_f(self.path)
+                except (InvalidImage, BadImageError, OSError, ValueError) as exc:
+                    self.error = (
+                        f"Image {self.path} is invalid or cannot be parsed, "
+                        f"but this was only found once its data was needed: "
+                        f"{exc!r}"
+                    )
+                    logger.error(self.error)
+                    raise BadImageError(self.error) from exc
+
+                if not isinstance(images, list):
+                    images = [images]
+
+                names = {
+                    i: images[i][BASE_NAME_KEY] if i < len(images) else None
+                    for i in self.names
+                }
+                if names != self.names:
+                    err = (
+                        f"Images opened from {self.path} ({names}) do not match "
+                        f"those found from the headers ({self.names})"
+                    )
+                    self.error = err
+                    logger.error(err)
+                    raise BadImageError(err)
+
+                self.images = images
+
+        return self.images[index]
+
+
+def make_deferred_images(
+    path: str | Path,
+    open_f: Callable[[str | Path], Image | list[Image]],
+    headers: list[tuple[int, Header]],
+) -> list[Image]:
     """
-    unzipped_list = [file.split(".fz")[0] for file in zipped_list]
-    for i, file in enumerate(zipped_list):
-        os.rename(file, unzipped_list[i])
+    Function to make images with deferred data from the headers of a file
+
+    :param path: Path of file
+    :param open_f: Function to open images
+    :param headers: List of the index of each image in the file, and its header
+    :return: list of images
+    """
+    deferred_file = DeferredFile(
+        path, open_f, names={i: header[BASE_NAME_KEY] for i, header in headers}
+    )
+    return [
+        Image.from_loader(header, partial(deferred_file.get_image, i))
+        for i, header in headers
+    ]
 
-    return unzipped_list
+
+def scan_file(
+    path: str,
+    open_f: Callable[[str | Path], Image | list[Image]],
+    header_f: Optional[Callable[[str | Path], Header | list[Header]]] = None,
+) -> Optional[list[Image]]:
+    """
+    Function to check a file and open its images. If a header function is
+    given, only the headers are read, and the images have deferred data.
+    Files which are invalid or cannot be parsed are skipped, as are incomplete
+    files (for which None is returned, as they may be complete later).
+
+    :param path: Path of file
+    :param open_f: Function to open images
+    :param header_f: Optional function to open image headers, matching open_f
+    :return: list of images, or None if the file is incomplete
+    """
+    if not check_file_is_complete(path):
+        logger.warning(f"File {path} is not complete. Skipping!")
+        return None
+
+    try:
+        if header_f is None:
+            image_list = open_f(path)
+            if not isinstance(image_list, list):
+                image_list = [image_list]
+        else:
+            headers = header_f(path)
+            if not isinstance(headers, list):
+                headers = [headers]
+            image_list = make_deferred_images(path, open_f, list(enumerate(headers)))
+
+        for image in image_list:
+            try:
+                check_image_has_core_fields(image)
+            except MissingCoreFieldError as err:
+                raise BadImageError(err) from err
+
+    except InvalidImage:
+        logger.warning(f"Image {path} is invalid. Skipping!")
+        return []
+    except BadImageError:
+        logger.error(f"Image {path} cannot be parsed. Skipping!")
+        return []
+
+    return image_list
+
+
+def select_by_header(
+    images: list[Image], selection: Optional[dict[str, str | list[str]]] = None
+) -> list[Image]:
+    """
+    Function to select images with given header values
+
+    :param images: list of images
+    :param selection: optional dictionary of header keys and accepted values
+    :return: selected images
+    """
+    if selection is None:
+        return images
+
+    for key, target_values in selection.items():
+        if not isinstance(target_values, list):
+            target_values = [target_values]
+        target_values = [str(x) for x in target_values]
+        images = [x for x in images if str(x.header.get(key)) in target_values]
+
+    return images
 
 
 def load_from_dir(
     input_dir: str | Path,
     open_f: Callable[[str | Path], Image | list[Image]],
+    header_f: Optional[Callable[[str | Path], Header | list[Header]]] = None,
+    n_threads: int = max_n_cpu,
+    selection: Optional[dict[str, str | list[str]]] = None,
 ) -> ImageBatch:
     """
-    Function to load all images in a directory
+    Function to load all images in a directory, with files opened in parallel.
+    If a header function is given, only headers are read, and the data of each
+    image is deferred until first needed. If a header index is enabled,
+    these headers are read from the index, and only new or changed files
+    are opened.
 
     :param input_dir: Input directory
     :param open_f: Function to open images
+    :param header_f: Optional function to open image headers, matching open_f
+    :param n_threads: Maximum number of files to open at once
+    :param selection: Optional dictionary of header keys and accepted values,
+        to only load a subset of images
     :return: ImageBatch object
     """
+    # Images saved asynchronously earlier in the run must be complete before listing
+    async_writer.wait_all()
+
     img_list = sorted(glob(f"{input_dir}/*.fits"))
 
-    # check for zipped files too
-    zipped_list = sorted(glob(f"{input_dir}/*.fz"))
-    if len(zipped_list) > 0:
-        unzipped_list = unzip(zipped_list)
-        for file in unzipped_list:
-            img_list.append(file)
+    # Tile-compressed (fpack) files are read directly, and decompressed in memory
+    img_list += sorted(glob(f"{input_dir}/*.fz"))
 
     if len(img_list) < 1:
         err = f"No images found in {input_dir}. Please check path is correct!"
         logger.error(err)
         raise ImageNotFoundError(err)
 
+    header_index = None
+    if header_f is not None:
+        header_index = get_header_index(input_dir)
+
     images = ImageBatch()
 
-    for path in tqdm(img_list):
-        if check_file_is_complete(path):
-            try:
-                image_list = open_f(path)
+    with ThreadPoolExecutor(max_workers=max(n_threads, 1)) as executor:
+        scan_f = partial(scan_file, open_f=open_f, header_f=header_f)
+
+        if header_index is not None:
 
-                if not isinstance(image_list, list):
-                    image_list = [image_list]
+            def scan_headers(paths: list[str]) -> list[Optional[list[Header]]]:
+                return [
+                    None if x is None else [image.header for image in x]
+                    for x in tqdm(executor.map(scan_f, paths), total=len(paths))
+                ]
 
-                for image in image_list:
-                    try:
-                        check_image_has_core_fields(image)
-                    except MissingCoreFieldError as err:
-                        raise BadImageError(err) from err
+            header_index.update(img_list, header_f=header_f, scan_f=scan_headers)
+            for path, headers in header_index.get_headers(
+                img_list, header_f=header_f, selection=selection
+            ):
+                for image in make_deferred_images(path, open_f, headers):
                     images.append(image)
-            except InvalidImage:
-                logger.warning(f"Image {path} is invalid. Skipping!")
-            except BadImageError:
-                logger.error(f"Image {path} cannot be parsed. Skipping!")
+
         else:
-            logger.warning(f"File {path} is not complete. Skipping!")
+            for image_list in tqdm(executor.map(scan_f, img_list), total=len(img_list)):
+                for image in select_by_header(image_list or [], selection):
+                    images.append(image)
 
     return images
 
 
+def accepts_argument(func: Callable, name: str) -> bool:
+    """
+    Check whether a function has an explicit argument of a given name
+
+    :param func: function (or partial)
+    :param name: name of the argument
+    :return: boolean
+    """
+    try:
+        return name in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def with_pixel_dtype(func: Callable, dtype: str) -> Callable:
+    """
+    Pass a pixel dtype to a function opening images, if the function accepts one,
+    so that image data is read in that type rather than cast afterwards
+
+    :param func: function to open images
+    :param dtype: floating-point type of the image pixels
+    :return: function to open images
+    """
+    if accepts_argument(func, "dtype"):
+        return partial(func, dtype=dtype)
+    return func
+
+
 class ImageLoader(BaseImageProcessor):
     """Processor to load raw images."""
 
@@ -105,19 +357,34 @@ class ImageLoader(BaseImageProcessor):
 
     image_type = Image
     default_load_image = staticmethod(open_raw_image)
+    default_load_header = staticmethod(open_raw_header)
 
     def __init__(
         self,
         input_sub_dir: str = RAW_IMG_SUB_DIR,
         input_img_dir: str | Path = base_raw_dir,
         load_image: Callable[[str], Image | list[Image]] = None,
+        load_header: Callable[[str], Header | list[Header]] = None,
     ):
+        """
+        :param input_sub_dir: Sub-directory of each night to load images from
+        :param input_img_dir: Base directory to load images from
+        :param load_image: Function to open images
+        :param load_header: Function to open only the headers of images, matching
+            those from load_image. If given, image data is only read once needed.
+            Defaults to the header function of the default load_image. A custom
+            load_image without load_header opens each file in full, as
+            load_image may reject files on their data.
+        """
         super().__init__()
         self.input_sub_dir = input_sub_dir
         self.input_img_dir = Path(input_img_dir)
         if load_image is None:
             load_image = self.default_load_image
+            if load_header is None:
+                load_header = self.default_load_header
         self.load_image = load_image
+        self.load_header = load_header
 
     def __str__(self):
         return (
@@ -125,14 +392,37 @@ class ImageLoader(BaseImageProcessor):
             f"using the '{self.load_image.__name__}' function"
         )
 
+    def get_load_functions(
+        self,
+    ) -> tuple[Callable[[str], Image | list[Image]], Optional[Callable]]:
+        """
+        Get the functions used to open images, and to open only their headers
+
+        :return: image function, and optional header function
+        """
+        return self.get_open_function(), self.load_header
+
+    def get_open_function(self) -> Callable[[str], Image | list[Image]]:
+        """
+        Get the function used to open images, reading pixels in the pixel
+        dtype of the processor where load_image accepts a 'dtype' argument
+
+        :return: image function
+        """
+        return with_pixel_dtype(self.load_image, self.get_pixel_dtype())
+
     def _apply_to_images(self, batch: ImageBatch) -> ImageBatch:
         input_dir = self.input_img_dir.joinpath(
             os.path.join(self.night_sub_dir, self.input_sub_dir)
         )
 
+        open_f, header_f = self.get_load_functions()
+
         return load_from_dir(
             input_dir,
-            open_f=self.load_image,
+            open_f=open_f,
+            header_f=header_f,
+            n_threads=self.max_n_cpu,
         )
 
 
@@ -164,9 +454,10 @@ class LoadImageFromHeader(BaseImageProcessor):
         batch: ImageBatch,
     ) -> ImageBatch:
         new_batch = ImageBatch()
+        open_f = with_pixel_dtype(self.load_image, self.get_pixel_dtype())
         for image in batch:
             new_image_file = image.header[self.header_key]
-            new_image = self.load_image(new_image_file)
+            new_image = open_f(new_image_file)
             if self.copy_header_keys is not None:
                 for key in self.copy_header_keys:
                     new_image.header[key] = image.header[key]
@@ -182,7 +473,34 @@ class LoadImageFromHeader(BaseImageProcessor):
 
 
 class MEFLoader(ImageLoader):
-    """Processor to load MEF images."""
+    """
+    Processor to load MEF images.
+
+    With lazy loading, each extension is only read (from the memory-mapped file)
+    when its image data is first needed. Each image is then independent, so
+    processors working on images in parallel read their own extension, and at
+    most one extension per image is held in memory before processing.
+    """
 
     base_key = "load_mef"
     default_load_image = staticmethod(open_mef_image)
+    default_load_header = staticmethod(open_mef_headers)
+
+    def __init__(self, *args, lazy: Optional[bool] = None, **kwargs):
+        """
+        :param lazy: Whether to read each extension only when its data is first
+            needed. The load_image function must accept a 'lazy' argument,
+            as :func:`~mirar.io.open_mef_image`. Defaults to the
+            LAZY_MEF_LOADING environment variable (false if not set).
+        """
+        super().__init__(*args, **kwargs)
+        if lazy is None:
+            lazy = LAZY_MEF_LOADING
+        self.lazy = lazy
+
+    def get_load_functions(
+        self,
+    ) -> tuple[Callable[[str], Image | list[Image]], Optional[Callable]]:
+        if self.lazy:
+            return partial(self.get_open_function(), lazy=True), None
+        return super().get_load_functions()
@@ -7,8 +7,17 @@ from pathlib import Path
 
 from astropy.time import Time
 
+from mirar.async_writer import ASYNC_WRITES
 from mirar.data import ImageBatch
-from mirar.paths import BASE_NAME_KEY, LATEST_SAVE_KEY, base_output_dir, get_output_dir
+from mirar.io import DEFAULT_QUANTIZE_LEVEL, FitsCompressionError
+from mirar.paths import (
+    BASE_NAME_KEY,
+    FITS_COMPRESSIONS,
+    LATEST_SAVE_KEY,
+    base_output_dir,
+    default_fits_compression,
+    get_output_dir,
+)
 from mirar.processors.base_processor import BaseImageProcessor
 
 logger = logging.getLogger(__name__)
@@ -26,12 +35,37 @@ class ImageSaver(BaseImageProcessor):
         output_dir_name: str,
         write_mask: bool = False,
         output_dir: str | Path = base_output_dir,
+        compression: str = default_fits_compression,
+        quantize_level: float = DEFAULT_QUANTIZE_LEVEL,
+        asynchronous: bool = ASYNC_WRITES,
     ):
+        """
+        :param output_dir_name: Name of the output sub-directory
+        :param write_mask: Whether to also save a mask image
+        :param output_dir: Base output directory
+        :param compression: Tile compression of saved images, one of
+            FITS_COMPRESSIONS (default from the FITS_COMPRESSION environment variable)
+        :param quantize_level: Quantization level for lossy compression
+        :param asynchronous: Whether to queue writes to run in the background
+            (default from the ASYNC_WRITES environment variable)
+        """
         super().__init__()
         self.output_dir_name = output_dir_name
         self.write_mask = write_mask
         self.output_dir = Path(output_dir)
 
+        if compression not in FITS_COMPRESSIONS:
+            err = (
+                f"Compression '{compression}' not recognised. "
+                f"Available options are {FITS_COMPRESSIONS}."
+            )
+            logger.error(err)
+            raise FitsCompressionError(err)
+
+        self.compression = compression
+        self.quantize_level = quantize_level
+        self.asynchronous = asynchronous
+
     def __str__(self):
         return f"Processor to save images to the '{self.output_dir_name}' subdirectory"
 
@@ -55,6 +89,12 @@ class ImageSaver(BaseImageProcessor):
             if self.write_mask:
                 self.save_mask_image(image, img_path=path)
 
-            self.save_fits(image, path)
+            self.save_fits(
+                image,
+                path,
+                compression=self.compression,
+                quantize_level=self.quantize_level,
+                asynchronous=self.asynchronous,
+            )
 
         return batch
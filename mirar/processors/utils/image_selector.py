@@ -143,6 +143,7 @@ class ImageBatcher(BaseImageProcessor):
     """
 
     base_key = "batch"
+    is_barrier = True
 
     def __init__(self, split_key: str | list[str]):
         super().__init__()
@@ -184,6 +185,7 @@ class ImageDebatcher(BaseImageProcessor):
     """
 
     base_key = "debatch"
+    is_barrier = True
 
     def _apply_to_images(
         self,
@@ -14,7 +14,7 @@ from tqdm import tqdm
 
 from mirar.data import Image, ImageBatch
 from mirar.errors import ImageNotFoundError
-from mirar.io import open_fits
+from mirar.io import get_base_name, open_fits
 from mirar.paths import (
     RAW_IMG_SUB_DIR,
     base_output_dir,
@@ -23,7 +23,6 @@ from mirar.paths import (
     get_output_path,
 )
 from mirar.processors.base_processor import BaseImageProcessor
-from mirar.processors.utils.image_loader import unzip
 
 logger = logging.getLogger(__name__)
 
@@ -124,7 +123,7 @@ class MultiExtParser(BaseImageProcessor):
 
                 # save to new file with 1 extension
                 splitfile_basename = (
-                    f"{os.path.basename(path).split('.fits')[0]}_"
+                    f"{get_base_name(Path(path)).split('.fits')[0]}_"
                     f"{extension_num_str}.fits"
                 )
 
@@ -168,12 +167,8 @@ def load_from_dir(
 
     img_list = sorted(glob(f"{input_dir}/*.fits"))
 
-    # check for zipped files too
-    zipped_list = sorted(glob(f"{input_dir}/*.fz"))
-    if len(zipped_list) > 0:
-        unzipped_list = unzip(zipped_list)
-        for file in unzipped_list:
-            img_list.append(file)
+    # Tile-compressed (fpack) files are read directly, and decompressed in memory
+    img_list += sorted(glob(f"{input_dir}/*.fz"))
 
     logger.info(f"Loading from {input_dir}, with {len(img_list)} images")
 
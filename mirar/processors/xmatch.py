@@ -3,9 +3,12 @@ Module to cross-match a candidate_table with different catalogs
 """
 
 import logging
+import time
+from numbers import Real
 
 import astropy.units as u
 import numpy as np
+import pandas as pd
 from astropy.coordinates import SkyCoord
 
 from mirar.catalog.base.base_xmatch_catalog import BaseXMatchCatalog
@@ -15,9 +18,24 @@ from mirar.processors.base_processor import BaseSourceProcessor
 logger = logging.getLogger(__name__)
 
 
+def is_float_value(value) -> bool:
+    """
+    Check whether a value can be stored in a float column without changing its type
+
+    :param value: value
+    :return: boolean
+    """
+    return (value is None) or (
+        isinstance(value, Real) and not isinstance(value, (bool, np.bool_))
+    )
+
+
 class XMatch(BaseSourceProcessor):
     """
-    Class to cross-match a candidate_table to a catalog
+    Class to cross-match a candidate_table to a catalog.
+
+    All source tables in a batch are cross-matched with a single catalog query,
+    and the results are added to each table as whole columns.
     """
 
     base_key = "XMATCH"
@@ -35,70 +53,142 @@ class XMatch(BaseSourceProcessor):
             f"'{self.catalog.catalog_name}' catalog."
         )
 
+    def get_result_columns(self, results: list[list[dict]]) -> dict[str, np.ndarray]:
+        """
+        Convert the cross-match results of a table into columns, with one column
+        for each catalog column and match number, and one with the number of
+        matches
+
+        :param results: list of matches for each source
+        :return: dictionary of columns
+        """
+        catalog = self.catalog
+        n_rows = len(results)
+
+        # Fill values of unmatched sources, by column
+        fill_values = {}
+        for key in [k for k, v in catalog.projection.items() if v == 1]:
+            colname = catalog.column_names[key]
+            fill_value = np.array(np.nan, dtype=catalog.column_dtypes[colname])
+            for num in range(catalog.num_sources):
+                fill_values[colname + f"{num + 1}"] = fill_value
+
+        nmatch_colname = f"nmtch{catalog.abbreviation}"
+
+        values = {colname: {} for colname in fill_values}
+        nmatches = np.zeros(n_rows, dtype=int)
+        for query_ind, query_results in enumerate(results):
+            nmatches[query_ind] = len(query_results)
+            for result_ind, result in enumerate(query_results):
+                for key, value in result.items():
+                    colname = catalog.column_names[key] + f"{result_ind + 1}"
+                    values.setdefault(colname, {})[query_ind] = value
+
+        columns = {}
+        for colname, col_values in values.items():
+            fill_value = fill_values.get(colname, np.array(np.nan))
+            if (fill_value.dtype.kind == "f") & all(
+                is_float_value(x) for x in col_values.values()
+            ):
+                column = np.full(n_rows, np.nan)
+                if len(col_values) > 0:
+                    column[list(col_values.keys())] = [
+                        np.nan if x is None else x for x in col_values.values()
+                    ]
+            else:
+                column = np.full(n_rows, fill_value.item(), dtype=object)
+                for query_ind, value in col_values.items():
+                    column[query_ind] = value
+            columns[colname] = column
+
+        # The number of matches follows the columns of the catalog projection
+        ordered_columns = {x: columns.pop(x) for x in fill_values}
+        ordered_columns[nmatch_colname] = nmatches
+        ordered_columns.update(columns)
+        return ordered_columns
+
+    def get_separations(
+        self, crds: SkyCoord, columns: dict[str, np.ndarray]
+    ) -> dict[str, np.ndarray]:
+        """
+        Calculate the separation between each source and its matches
+
+        :param crds: coordinates of sources
+        :param columns: cross-match result columns
+        :return: dictionary of separation columns, in arcsec
+        """
+        dist_columns = {}
+        for num in range(self.catalog.num_sources):
+            result_ras = np.asarray(
+                columns[self.catalog.ra_column_name + f"{num + 1}"], dtype=float
+            )
+            result_decs = np.asarray(
+                columns[self.catalog.dec_column_name + f"{num + 1}"], dtype=float
+            )
+            dists = np.full(len(result_ras), np.nan)
+            crd_nanmask = np.invert(np.isnan(result_ras))
+            result_crds = SkyCoord(
+                ra=result_ras[crd_nanmask], dec=result_decs[crd_nanmask], unit=u.deg
+            )
+            dists[crd_nanmask] = crds[crd_nanmask].separation(result_crds).arcsec
+            dist_columns[f"dist{self.catalog.abbreviation}nr{num + 1}"] = dists
+        return dist_columns
+
     def _apply_to_sources(
         self,
         batch: SourceBatch,
     ) -> SourceBatch:
+        catalog = self.catalog
+
+        # Query the catalog once, for the sources of every table
+        query_coords = {}
+        query_names = []
         for source_list in batch:
             candidate_table = source_list.get_data()
-
-            ras = candidate_table["ra"]
-            decs = candidate_table["dec"]
-            crds = SkyCoord(ras, decs, unit=u.deg)
-            query_names = np.array([f"q{x}" for x in np.arange(len(ras))])
-
-            catalog = self.catalog
-            logger.debug(f"Querying {catalog.catalog_name} for {len(ras)} sources.")
-            query_coords = {
-                f"{query_names[ind]}": [ras[ind], decs[ind]] for ind in range(len(ras))
-            }
+            ras = np.asarray(candidate_table["ra"])
+            decs = np.asarray(candidate_table["dec"])
+            names = [f"q{len(query_coords) + x}" for x in range(len(ras))]
+            query_coords.update(
+                {name: [ras[ind], decs[ind]] for ind, name in enumerate(names)}
+            )
+            query_names.append(names)
+
+        start = time.perf_counter()
+        query_results = {}
+        if len(query_coords) > 0:
+            logger.debug(
+                f"Querying {catalog.catalog_name} for {len(query_coords)} sources."
+            )
             query_results = catalog.query(query_coords)
+        query_time = time.perf_counter() - start
 
-            available_projection_keys = []
-            for k in catalog.projection.keys():
-                if catalog.projection[k] == 1:
-                    available_projection_keys += [k]
-
-            # Add placeholder columns for each catalog column
-            for key in available_projection_keys:
-                for num in range(self.catalog.num_sources):
-                    colname = catalog.column_names[key]
-                    candidate_table[colname + f"{num + 1}"] = np.array(
-                        np.nan,
-                        dtype=catalog.column_dtypes[colname],
-                    )
-
-            # Add column for number of matches
-            nmatch_colname = f"nmtch{self.catalog.abbreviation}"
-            candidate_table[nmatch_colname] = 0
-
-            for query_ind, query_name in enumerate(query_names):
-                results = query_results[query_name]
-                for result_ind, result in enumerate(results):
-                    for key in result.keys():
-                        colname = catalog.column_names[key] + f"{result_ind + 1}"
-                        candidate_table.at[query_ind, colname] = result[key]
-
-                candidate_table.at[query_ind, nmatch_colname] = len(results)
-
-            # Calculate distances between query and result and add to table
-            for num in range(self.catalog.num_sources):
-                result_ra_colname = self.catalog.ra_column_name + f"{num + 1}"
-                result_dec_colname = self.catalog.dec_column_name + f"{num + 1}"
-                dist_colname = f"dist{self.catalog.abbreviation}nr{num + 1}"
-                candidate_table[dist_colname] = np.array(np.nan, dtype=float)
-                crd_nanmask = np.invert(np.isnan(candidate_table[result_ra_colname]))
-                result_crds = SkyCoord(
-                    ra=candidate_table[result_ra_colname][crd_nanmask],
-                    dec=candidate_table[result_dec_colname][crd_nanmask],
-                    unit=u.deg,
-                )
-                candidate_table.loc[crd_nanmask, [dist_colname]] = (
-                    crds[crd_nanmask].separation(result_crds).arcsec
-                )
+        start = time.perf_counter()
+        for source_list, names in zip(batch, query_names):
+            candidate_table = source_list.get_data()
+
+            crds = SkyCoord(
+                np.asarray(candidate_table["ra"]),
+                np.asarray(candidate_table["dec"]),
+                unit=u.deg,
+            )
+            columns = self.get_result_columns([query_results[x] for x in names])
+            columns.update(self.get_separations(crds, columns))
+
+            new_columns = pd.DataFrame(columns, index=candidate_table.index)
+            existing = [x for x in new_columns.columns if x in candidate_table.columns]
+            for colname in existing:
+                candidate_table[colname] = new_columns.pop(colname)
+            if len(new_columns.columns) > 0:
+                candidate_table = pd.concat([candidate_table, new_columns], axis=1)
 
             candidate_table = candidate_table.replace({np.nan: None})
 
             source_list.set_data(candidate_table)
 
+        logger.info(
+            f"Cross-matched {len(query_coords)} sources with "
+            f"'{catalog.catalog_name}': query took {query_time:.2f} s, "
+            f"assembly took {time.perf_counter() - start:.2f} s."
+        )
+
         return batch
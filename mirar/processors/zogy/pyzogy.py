@@ -66,6 +66,12 @@ def pyzogy(
     assert ref_data.shape[0] % 2 == 0, "Ref image has odd number of rows"
     assert ref_data.shape[1] % 2 == 0, "Ref image has odd number of columns"
 
+    # Work in double precision, even if the images are stored as float32
+    new_data = np.asarray(new_data, dtype=np.float64)
+    ref_data = np.asarray(ref_data, dtype=np.float64)
+    new_sigma = np.asarray(new_sigma, dtype=np.float64)
+    ref_sigma = np.asarray(ref_sigma, dtype=np.float64)
+
     # Set nans to zero in new and ref images
     new_nanmask = np.isnan(new_data)
     ref_nanmask = np.isnan(ref_data)
@@ -0,0 +1,324 @@
+"""
+Module for profiling processors.
+
+When profiling is enabled, every time a processor is applied to a batch,
+a record is made of:
+
+- the wall time and CPU time taken
+- the bytes read from and written to the image cache
+- the increase in the peak memory (RSS) of the process
+- the time spent running external tools (e.g. sextractor) in subprocesses
+
+:func:`~mirar.pipelines.base_pipeline.Pipeline.reduce_images` writes these
+records in JSON and CSV format, next to the error stack, and
+optionally as a trace file which can be opened in Chrome (chrome://tracing)
+or Perfetto. Profiling is enabled via environment variables:
+
+.. code-block:: bash
+
+    export PROFILE_PROCESSORS=true
+    export PROFILE_CHROME_TRACE=true
+"""
+
+import csv
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PROCESSORS: bool = os.getenv("PROFILE_PROCESSORS", "false") in [
+    "true",
+    "True",
+    True,
+]
+PROFILE_CHROME_TRACE: bool = os.getenv("PROFILE_CHROME_TRACE", "false") in [
+    "true",
+    "True",
+    True,
+]
+
+PROFILE_COLUMNS = [
+    "processor",
+    "base_key",
+    "pid",
+    "thread",
+    "n_blocks",
+    "success",
+    "start_time",
+    "wall_time_s",
+    "cpu_time_s",
+    "cache_bytes_read",
+    "cache_bytes_written",
+    "peak_rss_delta_bytes",
+    "subprocess_time_s",
+]
+
+COUNTER_KEYS = ["cache_bytes_read", "cache_bytes_written", "subprocess_time_s"]
+
+# ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+RSS_UNIT_BYTES = 1 if sys.platform == "darwin" else 1024
+
+
+def get_peak_rss() -> int:
+    """
+    Get the peak resident memory of this process so far
+
+    :return: peak RSS in bytes
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT_BYTES
+
+
+class Profiler:
+    """
+    Process-wide collection of processor profiling records.
+
+    Cache and subprocess activity is counted per thread, so each record only
+    includes the activity of the thread which applied the processor.
+    """
+
+    def __init__(self, enabled: bool = PROFILE_PROCESSORS):
+        self.enabled = enabled
+        self.records: list[dict] = []
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def is_enabled(self) -> bool:
+        """
+        Check whether profiling is enabled
+
+        :return: boolean
+        """
+        return self.enabled
+
+    def set_enabled(self, enabled: bool):
+        """
+        Function to enable or disable profiling
+
+        :param enabled: Whether to enable profiling
+        :return: None
+        """
+        self.enabled = enabled
+
+    def _get_counters(self) -> dict:
+        """
+        Get the activity counters of the current thread
+
+        :return: dictionary of counters
+        """
+        if not hasattr(self._local, "counters"):
+            self._local.counters = {key: 0 for key in COUNTER_KEYS}
+        return self._local.counters
+
+    def add_cache_bytes_read(self, n_bytes: int):
+        """
+        Count bytes read from the image cache by the current thread
+
+        :param n_bytes: number of bytes
+        :return: None
+        """
+        if self.enabled:
+            self._get_counters()["cache_bytes_read"] += n_bytes
+
+    def add_cache_bytes_written(self, n_bytes: int):
+        """
+        Count bytes written to the image cache by the current thread
+
+        :param n_bytes: number of bytes
+        :return: None
+        """
+        if self.enabled:
+            self._get_counters()["cache_bytes_written"] += n_bytes
+
+    def add_subprocess_time(self, seconds: float):
+        """
+        Count time spent by the current thread running external tools
+
+        :param seconds: time in seconds
+        :return: None
+        """
+        if self.enabled:
+            self._get_counters()["subprocess_time_s"] += seconds
+
+    @contextmanager
+    def profile(self, processor, n_blocks: int):
+        """
+        Context manager to record a processor being applied to a batch
+
+        :param processor: processor being applied
+        :param n_blocks: number of data blocks in the batch
+        :return: None
+        """
+        if not self.enabled:
+            yield
+            return
+
+        counters = self._get_counters()
+        start_counters = dict(counters)
+        start_rss = get_peak_rss()
+        start_time = time.time()
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+
+        success = False
+        try:
+            yield
+            success = True
+        finally:
+            record = {
+                "processor": processor.__class__.__name__,
+                "base_key": str(processor.base_key),
+                "pid": os.getpid(),
+                "thread": threading.get_ident(),
+                "n_blocks": n_blocks,
+                "success": success,
+                "start_time": start_time,
+                "wall_time_s": time.perf_counter() - start_wall,
+                "cpu_time_s": time.thread_time() - start_cpu,
+                "peak_rss_delta_bytes": get_peak_rss() - start_rss,
+            }
+            for key in COUNTER_KEYS:
+                record[key] = counters[key] - start_counters[key]
+
+            self.add_records([record])
+
+    def add_records(self, records: list[dict]):
+        """
+        Add records, e.g. those made in a worker process
+
+        :param records: list of records
+        :return: None
+        """
+        with self.lock:
+            self.records += records
+
+    def get_records(self) -> list[dict]:
+        """
+        Get a copy of all records
+
+        :return: list of records
+        """
+        with self.lock:
+            return list(self.records)
+
+    def pop_records(self) -> list[dict]:
+        """
+        Remove and return all records
+
+        :return: list of records
+        """
+        with self.lock:
+            records = self.records
+            self.records = []
+        return records
+
+    def clear(self):
+        """
+        Remove all records
+
+        :return: None
+        """
+        self.pop_records()
+
+    def summarise(self) -> list[dict]:
+        """
+        Summarise the records for each processor, slowest first
+
+        :return: list of summaries, one per processor
+        """
+        summaries = {}
+        with self.lock:
+            for record in self.records:
+                key = (record["processor"], record["base_key"])
+                if key not in summaries:
+                    summaries[key] = {
+                        "processor": record["processor"],
+                        "base_key": record["base_key"],
+                        "n_batches": 0,
+                        "n_failed": 0,
+                        "wall_time_s": 0.0,
+                        "cpu_time_s": 0.0,
+                        "cache_bytes_read": 0,
+                        "cache_bytes_written": 0,
+                        "peak_rss_delta_bytes": 0,
+                        "subprocess_time_s": 0.0,
+                    }
+                summary = summaries[key]
+                summary["n_batches"] += 1
+                summary["n_failed"] += int(not record["success"])
+                for field in [
+                    "wall_time_s",
+                    "cpu_time_s",
+                    "cache_bytes_read",
+                    "cache_bytes_written",
+                    "subprocess_time_s",
+                ]:
+                    summary[field] += record[field]
+                summary["peak_rss_delta_bytes"] = max(
+                    summary["peak_rss_delta_bytes"], record["peak_rss_delta_bytes"]
+                )
+
+        return sorted(summaries.values(), key=lambda x: x["wall_time_s"], reverse=True)
+
+    def get_chrome_trace(self) -> dict:
+        """
+        Convert the records to the Chrome trace event format
+
+        :return: trace dictionary
+        """
+        with self.lock:
+            events = [
+                {
+                    "name": record["processor"],
+                    "cat": record["base_key"],
+                    "ph": "X",
+                    "ts": record["start_time"] * 1e6,
+                    "dur": record["wall_time_s"] * 1e6,
+                    "pid": record["pid"],
+                    "tid": record["thread"],
+                    "args": {
+                        key: record[key]
+                        for key in PROFILE_COLUMNS
+                        if key not in ["processor", "base_key", "pid", "thread"]
+                    },
+                }
+                for record in self.records
+            ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, output_path: Path | str, chrome_trace: bool = PROFILE_CHROME_TRACE):
+        """
+        Write the records to JSON and CSV files, and optionally a Chrome trace.
+        The suffix of output_path is replaced for each file.
+
+        :param output_path: base path for the output files
+        :param chrome_trace: Whether to also write a Chrome trace file
+        :return: None
+        """
+        output_path = Path(output_path)
+
+        records = self.get_records()
+
+        json_path = output_path.with_suffix(".json")
+        logger.info(f"Saving processor profile to {json_path}")
+        with open(json_path, "w", encoding="utf-8") as json_f:
+            json.dump({"summary": self.summarise(), "records": records}, json_f)
+
+        with open(output_path.with_suffix(".csv"), "w", encoding="utf-8") as csv_f:
+            writer = csv.DictWriter(csv_f, fieldnames=PROFILE_COLUMNS)
+            writer.writeheader()
+            writer.writerows(records)
+
+        if chrome_trace:
+            trace_path = output_path.with_name(f"{output_path.stem}_trace.json")
+            with open(trace_path, "w", encoding="utf-8") as trace_f:
+                json.dump(self.get_chrome_trace(), trace_f)
+
+
+profiler = Profiler()
@@ -10,6 +10,7 @@ from astropy.io import fits
 
 from mirar.data import Image
 from mirar.database.base_model import BaseDB
+from mirar.io import get_image_hdu
 from mirar.paths import LATEST_WEIGHT_SAVE_KEY
 from mirar.references.base_reference_generator import BaseReferenceGenerator
 
@@ -48,18 +49,21 @@ class RefFromPath(BaseReferenceGenerator):
     def _get_reference(self, image: Image) -> (fits.PrimaryHDU, fits.PrimaryHDU):
         ref_weight_hdu = None
         with fits.open(self.path) as hdul:
-            ref_hdu = hdul[0].copy()
+            # The reference may be a tile-compressed pipeline product
+            image_hdu = get_image_hdu(hdul)
+            ref_hdu = fits.PrimaryHDU(data=image_hdu.data, header=image_hdu.header)
             if self.weight_path is not None:
                 ref_hdu.header[LATEST_WEIGHT_SAVE_KEY] = (  # pylint: disable=no-member
                     self.weight_path
                 )
-            if LATEST_WEIGHT_SAVE_KEY in hdul[0].header:  # pylint: disable=no-member
-                weight_path = Path(
-                    hdul[0].header[LATEST_WEIGHT_SAVE_KEY]  # pylint: disable=no-member
-                )
+            if LATEST_WEIGHT_SAVE_KEY in image_hdu.header:
+                weight_path = Path(image_hdu.header[LATEST_WEIGHT_SAVE_KEY])
 
                 if weight_path.exists():
                     with fits.open(weight_path) as wght_hdul:
-                        ref_weight_hdu = wght_hdul[0].copy()
+                        weight_hdu = get_image_hdu(wght_hdul)
+                        ref_weight_hdu = fits.PrimaryHDU(
+                            data=weight_hdu.data, header=weight_hdu.header
+                        )
 
         return ref_hdu, ref_weight_hdu
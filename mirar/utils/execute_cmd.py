@@ -5,11 +5,14 @@ Module for executing bash commands
 import logging
 import os
 import subprocess
+import time
 from pathlib import Path
 from subprocess import TimeoutExpired
 
 import docker
 
+from mirar.async_writer import async_writer
+from mirar.profiling import profiler
 from mirar.utils.dockerutil import (
     docker_batch_put,
     docker_get_new_files,
@@ -263,7 +266,13 @@ def execute(
     logger.debug(
         f"Using '{['docker', 'local'][local]}' " f" installation to run `{cmd}`"
     )
-    if local:
-        run_local(cmd, timeout=timeout)
-    else:
-        run_docker(cmd, output_dir=output_dir)
+    # External tools may read any file, so finish all pending writes first
+    async_writer.wait_all()
+    start = time.perf_counter()
+    try:
+        if local:
+            run_local(cmd, timeout=timeout)
+        else:
+            run_docker(cmd, output_dir=output_dir)
+    finally:
+        profiler.add_subprocess_time(time.perf_counter() - start)
@@ -3,17 +3,33 @@
 """
 Functions to convert FITS files or astropy Tables to FITS_LDAC files and
 vice versa.
+
+LDAC files are built in memory, and read via memory-mapping, so that only the
+requested columns and rows are loaded. Recently-read catalogs are cached in
+memory, with the number of catalogs set via an environment variable
+(0 to disable caching):
+
+.. code-block:: bash
+
+    export LDAC_CACHE_SIZE=16
 """
-import tempfile
+import copy
+import os
+import threading
 import warnings
+from collections import OrderedDict
 from pathlib import Path
+from typing import Optional
 
 import astropy.io
 import numpy as np
 from astropy.io import fits
-from astropy.table import Table
+from astropy.table import MaskedColumn, Table
 from astropy.utils.exceptions import AstropyWarning
 
+# Number of catalogs kept in memory, 0 to disable caching
+LDAC_CACHE_SIZE: int = int(os.getenv("LDAC_CACHE_SIZE", "16"))
+
 
 def convert_hdu_to_ldac(
     hdu: astropy.io.fits.BinTableHDU | astropy.io.fits.TableHDU,
@@ -63,14 +79,8 @@ def convert_table_to_ldac(tbl: astropy.table.Table) -> astropy.io.fits.HDUList:
     table.remove_columns(del_list)
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", AstropyWarning)
-        with tempfile.NamedTemporaryFile(suffix=".fits", mode="rb+") as temp_file:
-            table.write(temp_file, format="fits")
-            temp_file.seek(0)
-            with fits.open(temp_file, mode="update") as hdulist:
-                tbl1, tbl2 = convert_hdu_to_ldac(hdulist[1].copy())
-                new_hdulist = [hdulist[0].copy(), tbl1, tbl2]
-                new_hdulist = fits.HDUList(new_hdulist)
-    return new_hdulist
+        tbl1, tbl2 = convert_hdu_to_ldac(fits.table_to_hdu(table))
+    return fits.HDUList([fits.PrimaryHDU(), tbl1, tbl2])
 
 
 def save_table_as_ldac(tbl: astropy.table.Table, file_path: str | Path, **kwargs):
@@ -90,22 +100,196 @@ def save_table_as_ldac(tbl: astropy.table.Table, file_path: str | Path, **kwargs
     hdulist.writeto(file_path, overwrite=True, **kwargs)
 
 
-def get_table_from_ldac(file_path: str | Path, frame: int = 1) -> astropy.table.Table:
+class LDACCacheEntry:
+    """
+    Cached columns of one fits_ldac table
+    """
+
+    def __init__(self, stamp: tuple, colnames: list[str]):
+        self.stamp = stamp
+        self.colnames = colnames
+        self.table: Table | None = None
+
+
+class LDACCache:
+    """
+    A cache of the tables read from fits_ldac files, so that a catalog read by
+    several processors in a row (e.g. a Sextractor catalog) is only parsed once.
+
+    Entries are keyed by path and frame, and are only used while the file inode,
+    size and modification time are unchanged. Each entry holds the columns read so
+    far. The least-recently used entries are dropped beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = LDAC_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, int], LDACCacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def get_table(
+        self,
+        file_path: Path,
+        hdu: int,
+        columns: Optional[list[str]] = None,
+    ) -> Table:
+        """
+        Get a copy of selected columns of a fits table, reading only the columns
+        which are not already cached
+
+        :param file_path: path of file
+        :param hdu: HDU of table
+        :param columns: names of columns (default, all)
+        :return: table
+        """
+        key = (Path(file_path).resolve().as_posix(), hdu)
+        stat = os.stat(file_path)
+        stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None) and (entry.stamp != stamp):
+                entry = None
+
+        if entry is None:
+            header = fits.getheader(file_path, ext=hdu)
+            colnames = [header[f"TTYPE{i + 1}"] for i in range(header["TFIELDS"])]
+            entry = LDACCacheEntry(stamp, colnames)
+            self.n_misses += 1
+        else:
+            self.n_hits += 1
+
+        if columns is None:
+            columns = entry.colnames
+
+        with self._lock:
+            cached = [] if entry.table is None else entry.table.colnames
+        missing = [x for x in columns if x not in cached]
+
+        if len(missing) > 0:
+            new_table = read_ldac_columns(file_path, hdu, columns=missing)
+
+        with self._lock:
+            if len(missing) > 0:
+                if entry.table is None:
+                    entry.table = new_table
+                else:
+                    entry.table.add_columns(
+                        [new_table[x] for x in missing if x not in entry.table.colnames]
+                    )
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            # Selecting columns copies them, so only the metadata needs copying
+            tbl = entry.table[columns]
+            tbl.meta = copy.deepcopy(entry.table.meta)
+            return tbl
+
+    def clear(self):
+        """
+        Forget all cached tables
+
+        :return: None
+        """
+        with self._lock:
+            self._entries = OrderedDict()
+
+
+ldac_cache = LDACCache()
+
+
+def mask_invalid_values(tbl: Table):
+    """
+    Mask NaN values and empty strings in a table, as when reading a fits table
+    without memory-mapping
+
+    :param tbl: table to update in place
+    :return: None
+    """
+    for name in tbl.colnames:
+        col = tbl[name]
+        if isinstance(col, MaskedColumn):
+            continue
+        coltype = col.dtype.subdtype[0].type if col.dtype.subdtype else col.dtype.type
+        if issubclass(coltype, np.inexact):
+            mask, fill_value = np.isnan(col), np.nan
+        elif issubclass(coltype, np.character):
+            mask, fill_value = col == b"", b""
+        else:
+            continue
+        if np.any(mask):
+            tbl[name] = MaskedColumn(
+                col, name=name, mask=mask, fill_value=fill_value, copy=False
+            )
+
+
+def read_ldac_columns(
+    file_path: str | Path,
+    hdu: int,
+    columns: Optional[list[str]] = None,
+    rows: Optional[slice | np.ndarray] = None,
+) -> Table:
+    """
+    Read selected columns and rows of a fits table. The file is memory-mapped,
+    so only the selected data is copied into memory.
+
+    :param file_path: path of file
+    :param hdu: HDU of table
+    :param columns: names of columns to read (default, all)
+    :param rows: slice, indices or boolean mask of rows to read (default, all)
+    :return: table
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", AstropyWarning)
+        mapped = Table.read(file_path, hdu=hdu, memmap=True)
+
+    if columns is None:
+        columns = mapped.colnames
+
+    tbl = Table(
+        [mapped[x] if rows is None else mapped[x][rows] for x in columns],
+        meta=mapped.meta,
+        copy=True,
+    )
+    mask_invalid_values(tbl)
+    return tbl
+
+
+def get_table_from_ldac(
+    file_path: str | Path,
+    frame: int = 1,
+    columns: Optional[list[str]] = None,
+    rows: Optional[slice | np.ndarray] = None,
+) -> astropy.table.Table:
     """
     Load an astropy table from a fits_ldac by frame (Since the ldac format has column
     info for odd tables, giving it twce as many tables as a regular fits BinTableHDU,
     match the frame of a table to its corresponding frame in the ldac file).
 
+    Only the requested columns are read. Unless the cache is disabled
+    (LDAC_CACHE_SIZE=0), tables are cached (see :class:`LDACCache`). The returned
+    table is always a copy, which the caller may modify.
+
     Parameters
     ----------
     file_path: str
         Name of the file to open
     frame: int
         Number of the frame in a regular fits file
+    columns: list
+        Names of columns to read (default, all)
+    rows: slice or array
+        Rows to return (default, all)
     """
     if frame > 0:
         frame = frame * 2
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", AstropyWarning)
-        tbl = Table.read(file_path, hdu=frame)
+
+    if ldac_cache.max_entries < 1:
+        return read_ldac_columns(file_path, frame, columns=columns, rows=rows)
+
+    tbl = ldac_cache.get_table(Path(file_path), frame, columns=columns)
+    if rows is not None:
+        tbl = tbl[rows]
     return tbl
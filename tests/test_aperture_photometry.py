@@ -0,0 +1,49 @@
+"""
+Tests for batched aperture photometry in
+..module::mirar.processors.photometry.utils
+"""
+
+import logging
+
+import numpy as np
+
+from mirar.processors.photometry.utils import (
+    aper_photometry,
+    aper_photometry_batch,
+    make_cutout_stacks,
+)
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestAperturePhotometry(BaseTestCase):
+    """Class for testing batched aperture photometry"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.data = rng.normal(10.0, 2.0, size=(100, 120))
+        self.data[20:25, 30:40] = np.nan
+        self.data[60:90, 60:90] = np.nan
+        self.unc = np.abs(rng.normal(1.0, 0.1, size=self.data.shape))
+        self.unc[0:3, :] = np.nan
+        self.x_positions = np.concatenate([rng.integers(0, 120, 40), [0, 119, 35, 75]])
+        self.y_positions = np.concatenate([rng.integers(0, 100, 40), [0, 99, 22, 75]])
+
+    def test_batch_matches_single(self):
+        """Test that batched photometry matches photometry of single cutouts"""
+        for half_size, diameters in [(20, (10.0, 25.0, 40.0)), (5, (4.5, 8.0, 30.0))]:
+            image_cutouts, unc_cutouts = make_cutout_stacks(
+                [self.data, self.unc], self.x_positions, self.y_positions, half_size
+            )
+            fluxes, fluxuncs = aper_photometry_batch(
+                image_cutouts, unc_cutouts, *diameters
+            )
+            expected = np.array(
+                [
+                    aper_photometry(image_cutout, unc_cutout, *diameters)
+                    for image_cutout, unc_cutout in zip(image_cutouts, unc_cutouts)
+                ]
+            )
+            np.testing.assert_allclose(fluxes, expected[:, 0], rtol=1e-10, atol=1e-10)
+            np.testing.assert_allclose(fluxuncs, expected[:, 1], rtol=1e-10, atol=1e-10)
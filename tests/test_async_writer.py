@@ -0,0 +1,118 @@
+"""
+Tests for asynchronous writes in
+..module::mirar.async_writer
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from mirar.async_writer import AsyncWriter, async_writer
+from mirar.benchmarks.synthetic import make_synthetic_night
+from mirar.data import Dataset, ImageBatch
+from mirar.io import open_raw_image, save_to_path
+from mirar.paths import LATEST_SAVE_KEY
+from mirar.processors.utils.image_loader import ImageLoader
+from mirar.processors.utils.image_saver import ImageSaver
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestAsyncWriter(BaseTestCase):
+    """Class for testing asynchronous writes"""
+
+    def test_bounded_queue(self):
+        """Test that writes are bounded, and that failures are reported"""
+        writer = AsyncWriter(n_threads=2, max_pending=2)
+        release = threading.Event()
+        output_dir = Path(self.temp_dir.name)
+
+        def slow_write(path: Path):
+            release.wait()
+            path.write_text("done", encoding="utf8")
+
+        def bad_write(path: Path):
+            raise OSError(f"Cannot write {path}")
+
+        for i in range(2):
+            path = output_dir.joinpath(f"file_{i}.txt")
+            writer.submit(path, slow_write, path)
+
+        self.assertEqual(writer.get_stats()["n_pending"], 2)
+        self.assertTrue(writer.is_pending(output_dir.joinpath("file_0.txt")))
+
+        # A third write must wait for a free slot
+        threading.Timer(0.2, release.set).start()
+        writer.submit(output_dir.joinpath("bad.txt"), bad_write, "bad.txt")
+        self.assertGreater(writer.get_stats()["blocked_time_s"], 0.1)
+
+        writer.wait(output_dir.joinpath("file_1.txt"))
+        self.assertEqual(
+            output_dir.joinpath("file_1.txt").read_text(encoding="utf8"), "done"
+        )
+
+        failures = writer.flush()
+        self.assertEqual(len(failures), 1)
+        self.assertIsInstance(failures[0][2], OSError)
+        self.assertEqual(writer.flush(), [])
+
+        stats = writer.get_stats()
+        self.assertEqual(stats["n_completed"], 3)
+        self.assertEqual(stats["n_failed"], 1)
+        self.assertEqual(stats["n_pending"], 0)
+        self.assertEqual(stats["max_pending"], 2)
+
+    def test_image_saver(self):
+        """Test that images saved asynchronously match the image when saved"""
+        batch = make_synthetic_night(
+            "winter", n_bias=0, n_dark=0, n_flat=0, n_science=2, scale=0.02
+        )
+        expected = [x.get_data().copy() for x in batch]
+
+        saver = ImageSaver(
+            output_dir_name="async", output_dir=self.temp_dir.name, asynchronous=True
+        )
+        saver.set_night("")
+        batch = saver.apply(ImageBatch(list(batch)))
+
+        # Changing the images afterwards does not change the saved files
+        for image in batch:
+            image.set_data(image.get_data() + 1.0)
+
+        for image, data in zip(batch, expected):
+            saved = open_raw_image(image[LATEST_SAVE_KEY])
+            np.testing.assert_array_equal(saved.get_data(), data)
+
+        self.assertEqual(async_writer.flush(), [])
+        self.assertGreaterEqual(async_writer.get_stats()["n_completed"], 2)
+
+    def test_save_then_load(self):
+        """Test that a loader later in the run finds images still being written"""
+
+        def slow_save(*args, **kwargs):
+            time.sleep(0.2)
+            save_to_path(*args, **kwargs)
+
+        batch = make_synthetic_night(
+            "winter", n_bias=0, n_dark=0, n_flat=0, n_science=2, scale=0.02
+        )
+
+        saver = ImageSaver(
+            output_dir_name="saved", output_dir=self.temp_dir.name, asynchronous=True
+        )
+        loader = ImageLoader(input_sub_dir="saved", input_img_dir=self.temp_dir.name)
+        for processor in [saver, loader]:
+            processor.set_night("")
+
+        with mock.patch("mirar.io.save_to_path", slow_save):
+            dataset, _ = saver.base_apply(Dataset([ImageBatch(list(batch))]))
+            dataset, err_stack = loader.base_apply(dataset)
+
+        self.assertEqual(len(err_stack.reports), 0)
+        self.assertEqual(len(dataset[0]), 2)
+        self.assertEqual(async_writer.flush(), [])
@@ -0,0 +1,59 @@
+"""
+Tests for the synthetic benchmark suite in ..module::mirar.benchmarks
+"""
+
+import logging
+
+from mirar.benchmarks import compare_results, run_benchmarks
+from mirar.benchmarks.runner import get_benchmark_names
+from mirar.benchmarks.synthetic import get_shape, make_synthetic_night
+from mirar.io import check_image_has_core_fields
+from mirar.paths import OBSCLASS_KEY
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestBenchmarks(BaseTestCase):
+    """Class for testing the benchmark suite"""
+
+    def test_synthetic_night(self):
+        """
+        Test that synthetic images have the expected shapes and headers
+
+        :return: None
+        """
+        batch = make_synthetic_night(
+            "summer", n_bias=1, n_dark=1, n_flat=1, n_science=2, scale=0.05
+        )
+        self.assertEqual(len(batch), 5)
+        self.assertEqual(
+            [image[OBSCLASS_KEY] for image in batch],
+            ["bias", "dark", "flat", "science", "science"],
+        )
+        for image in batch:
+            check_image_has_core_fields(image)
+            self.assertEqual(image.get_data().shape, get_shape("summer", scale=0.05))
+
+    def test_run_and_compare(self):
+        """
+        Test running every benchmark at a small scale, and comparing runs
+
+        :return: None
+        """
+        results = run_benchmarks(scale=0.05, repeat=1)
+
+        self.assertEqual(list(results["results"]), get_benchmark_names())
+        self.assertIn("commit", results["metadata"])
+
+        slower = {
+            "scale": 0.05,
+            "results": {
+                name: {"min": 2.0 * result["min"]}
+                for name, result in results["results"].items()
+            },
+        }
+        comparisons = compare_results(results, slower, threshold=1.5)
+        self.assertEqual(len(comparisons), len(results["results"]))
+        self.assertTrue(all(x["regression"] for x in comparisons))
+        self.assertFalse(any(x["regression"] for x in compare_results(slower, results)))
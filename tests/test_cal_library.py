@@ -0,0 +1,125 @@
+"""
+Tests for the calibration library in ..module::mirar.data.cal_library
+"""
+
+import logging
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from astropy.io.fits import Header
+
+from mirar.data import Image, ImageBatch
+from mirar.data.cal_library import CalibrationLibrary, cal_library
+from mirar.paths import (
+    BASE_NAME_KEY,
+    EXPTIME_KEY,
+    FILTER_KEY,
+    LATEST_SAVE_KEY,
+    OBSCLASS_KEY,
+    PROC_HISTORY_KEY,
+    RAW_IMG_KEY,
+    TARGET_KEY,
+    TIME_KEY,
+    core_fields,
+)
+from mirar.processors.bias import BiasCalibrator
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+def make_header(date: str, filter_name: str = "J") -> Header:
+    """
+    Make a header for a test calibration image
+
+    :param date: observation time
+    :param filter_name: filter
+    :return: header
+    """
+    header = Header()
+    header["INSTRUME"] = "WINTER"
+    header["BOARD_ID"] = 2
+    header[FILTER_KEY] = filter_name
+    header[EXPTIME_KEY] = 60.0
+    header[TIME_KEY] = date
+    return header
+
+
+class TestCalLibrary(BaseTestCase):
+    """Class for testing the calibration library"""
+
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def test_cal_library(self):
+        """Test registering and finding masters"""
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(temp_dir.cleanup)
+
+        library = CalibrationLibrary(Path(temp_dir.name).joinpath("cal.db"))
+        self.assertTrue(library.is_enabled())
+
+        master_path = Path(temp_dir.name).joinpath("flat_master.fits")
+        master_path.touch()
+
+        headers = [
+            make_header("2023-06-01T03:00:00"),
+            make_header("2023-06-01T04:00:00"),
+        ]
+        library.register("flat", master_path, headers=headers, input_hash="abc")
+
+        self.assertEqual(library.find_by_hash("flat", "abc"), master_path.resolve())
+        self.assertIsNone(library.find_by_hash("flat", "def"))
+        self.assertIsNone(library.find_by_hash("dark", "abc"))
+
+        fields = ["instrument", "board", "filter"]
+        later = make_header("2023-06-03T03:00:00")
+        self.assertEqual(
+            library.find_nearest("flat", later, fields, max_age_days=3.0),
+            master_path.resolve(),
+        )
+        self.assertIsNone(library.find_nearest("flat", later, fields, max_age_days=1.0))
+        self.assertIsNone(
+            library.find_nearest(
+                "flat", make_header("2023-06-01T05:00:00", "H"), fields, 3.0
+            )
+        )
+
+        # Entries for deleted masters are removed
+        master_path.unlink()
+        self.assertIsNone(library.find_by_hash("flat", "abc"))
+
+    def test_register_once(self):
+        """Test that masters are registered when made, not when found again"""
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(temp_dir.cleanup)
+        self.addCleanup(cal_library.set_db_path, cal_library.db_path)
+        cal_library.set_db_path(Path(temp_dir.name).joinpath("cal.db"))
+
+        batch = ImageBatch()
+        for i in range(2):
+            header = make_header(f"2023-06-01T0{i + 3}:00:00")
+            header[BASE_NAME_KEY] = f"bias_{i}.fits"
+            header[RAW_IMG_KEY] = f"/raw/bias_{i}.fits"
+            header[LATEST_SAVE_KEY] = header[RAW_IMG_KEY]
+            header[PROC_HISTORY_KEY] = ""
+            header[OBSCLASS_KEY] = "bias"
+            header[TARGET_KEY] = "bias"
+            for key in core_fields:
+                if key not in header:
+                    header[key] = ""
+            batch.append(Image(np.full((4, 5), 10.0 + i), header))
+
+        processor = BiasCalibrator(cache_sub_dir="cal")
+        processor.set_night(temp_dir.name)
+
+        with mock.patch.object(
+            cal_library, "register", wraps=cal_library.register
+        ) as register:
+            processor.get_cache_file(batch)
+            self.assertEqual(register.call_count, 1)
+            processor.get_cache_file(batch)
+            self.assertEqual(register.call_count, 1)
@@ -0,0 +1,227 @@
+"""
+Tests for the local tile cache of reference catalogs in
+..module::mirar.catalog.base.catalog_cache
+"""
+
+import logging
+import os
+from pathlib import Path
+from unittest import mock
+
+import astropy.table
+import numpy as np
+from astropy.coordinates import SkyCoord
+from astropy.table import MaskedColumn, Table
+
+from mirar.catalog.base.base_catalog import BaseCatalog
+from mirar.catalog.base.catalog_cache import get_table_mask, prewarm_catalog_tiles
+from mirar.catalog.base.errors import CatalogCacheError
+from mirar.catalog.vizier import PS1
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+def make_source_table(n_sources: int, seed: int = 0) -> Table:
+    """
+    Make a table of random sources around RA=0, Dec=0
+
+    :param n_sources: number of sources
+    :param seed: random seed
+    :return: table
+    """
+    rng = np.random.default_rng(seed)
+    mag_errs = MaskedColumn(rng.uniform(0.0, 0.5, n_sources))
+    mag_errs.mask = rng.uniform(size=n_sources) < 0.1
+    return Table(
+        {
+            "objID": np.arange(n_sources),
+            "RAJ2000": rng.uniform(-0.3, 0.3, n_sources) % 360.0,
+            "DEJ2000": rng.uniform(-0.3, 0.3, n_sources),
+            "gmag": rng.uniform(10.0, 22.0, n_sources),
+            "e_gmag": mag_errs,
+            "gFlags": rng.choice([0, 4096, 8], n_sources),
+        }
+    )
+
+
+def get_cone(table: Table, ra_deg: float, dec_deg: float, radius_deg: float) -> Table:
+    """
+    Get the sources of a table within a radius of a position
+
+    :param table: table of sources
+    :param ra_deg: RA in degrees
+    :param dec_deg: Dec in degrees
+    :param radius_deg: radius in degrees
+    :return: table
+    """
+    seps = SkyCoord(ra_deg, dec_deg, unit="deg").separation(
+        SkyCoord(table["RAJ2000"], table["DEJ2000"], unit="deg")
+    )
+    return table[seps.deg <= radius_deg]
+
+
+class FakeRemoteCatalog(BaseCatalog):
+    """
+    Reference catalog of random sources, queried by brute force
+    """
+
+    abbreviation = "fake"
+
+    def __init__(self, *args, table: Table, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.table = table
+        self.n_region_queries = 0
+
+    def get_coordinate_keys(self) -> tuple[str, str]:
+        return "RAJ2000", "DEJ2000"
+
+    def query_region(
+        self, ra_deg: float, dec_deg: float, radius_deg: float
+    ) -> astropy.table.Table:
+        self.n_region_queries += 1
+        return get_cone(self.table, ra_deg, dec_deg, radius_deg)
+
+    def get_catalog(self, ra_deg: float, dec_deg: float) -> astropy.table.Table:
+        table = self.get_region(ra_deg, dec_deg)
+        mags = table["gmag"]
+        return table[get_table_mask((mags > self.min_mag) & (mags < self.max_mag))]
+
+
+class FakeVizier:
+    """
+    Vizier query, applying column filters to a table of sources
+    """
+
+    table = None
+
+    def __init__(self, column_filters: dict, **_kwargs):
+        self.column_filters = column_filters
+
+    def query_region(self, coords, radius, **_kwargs):
+        """Query a cone of the table"""
+        table = get_cone(
+            self.table, coords.ra.deg, coords.dec.deg, radius.to("deg").value
+        )
+        mask = np.ones(len(table), dtype=bool)
+        for key, value in self.column_filters.items():
+            if ".." in value:
+                low, high = [float(x) for x in value.split("..")]
+                mask &= get_table_mask((table[key] >= low) & (table[key] <= high))
+            else:
+                mask &= get_table_mask(table[key] < float(value.strip("<")))
+        table = table[mask]
+        return [table] if len(table) > 0 else []
+
+
+class TestCatalogCache(BaseTestCase):
+    """Class for testing the reference catalog tile cache"""
+
+    def setUp(self):
+        self.table = make_source_table(3000)
+        self.cache_dir = Path(self.temp_dir.name).joinpath("catalog_cache")
+
+    def get_catalog(self, **kwargs) -> FakeRemoteCatalog:
+        """
+        Get a catalog
+
+        :return: catalog
+        """
+        kwargs = {"min_mag": 12.0, "max_mag": 18.0, **kwargs}
+        return FakeRemoteCatalog(
+            search_radius_arcmin=6.0, filter_name="g", table=self.table, **kwargs
+        )
+
+    def test_cached_region(self):
+        """Test that cones from the cache match those of remote queries"""
+        remote = self.get_catalog(tile_cache_dir=None)
+        catalog = self.get_catalog(tile_cache_dir=self.cache_dir)
+
+        for ra_deg, dec_deg in [(0.0, 0.0), (359.95, 0.1), (0.1, -0.2)]:
+            expected = remote.get_catalog(ra_deg, dec_deg)
+            result = catalog.get_catalog(ra_deg, dec_deg)
+            self.assertGreater(len(expected), 10)
+            result.sort("objID")
+            self.assertEqual(list(result["objID"]), list(expected["objID"]))
+            np.testing.assert_array_equal(
+                np.ma.getmaskarray(result["e_gmag"]),
+                np.ma.getmaskarray(expected["e_gmag"]),
+            )
+
+        # Another catalog, with different cuts, shares the same tiles
+        n_region_queries = catalog.n_region_queries
+        other = self.get_catalog(
+            min_mag=10.0, max_mag=22.0, tile_cache_dir=self.cache_dir
+        )
+        self.assertIs(other.tile_cache, catalog.tile_cache)
+        result = other.get_catalog(0.0, 0.0)
+        self.assertEqual(len(result), len(get_cone(self.table, 0.0, 0.0, 0.1)))
+        self.assertEqual(other.n_region_queries, 0)
+        self.assertEqual(catalog.n_region_queries, n_region_queries)
+
+        # Expired tiles are fetched again
+        catalog_dir = catalog.tile_cache.get_catalog_dir(catalog)
+        for path in catalog_dir.glob("tile_*.fits"):
+            os.utime(path, (0, 0))
+        catalog.get_catalog(0.0, 0.0)
+        self.assertGreater(catalog.n_region_queries, n_region_queries)
+
+        catalog.tile_cache.clear(catalog)
+        self.assertEqual(len(list(catalog_dir.glob("tile_*.fits"))), 0)
+
+    def test_prewarm(self):
+        """Test pre-warming tiles for a list of fields"""
+        catalog = self.get_catalog(tile_cache_dir=self.cache_dir)
+        n_fetched = prewarm_catalog_tiles([catalog], [0.0], [0.0], radius_deg=0.2)
+        self.assertGreater(n_fetched, 0)
+        self.assertEqual(prewarm_catalog_tiles([catalog], [0.0], [0.0], 0.2), 0)
+
+        n_region_queries = catalog.n_region_queries
+        catalog.get_catalog(0.05, 0.05)
+        self.assertEqual(catalog.n_region_queries, n_region_queries)
+
+        with self.assertRaises(CatalogCacheError):
+            prewarm_catalog_tiles(
+                [self.get_catalog(tile_cache_dir=None)], [0.0], [0.0], 0.2
+            )
+
+    def test_vizier(self):
+        """Test that cached Vizier catalogs apply the cuts of remote queries"""
+        with mock.patch(
+            "mirar.catalog.vizier.base_vizier_catalog.Vizier", FakeVizier
+        ), mock.patch.object(FakeVizier, "table", self.table):
+            for min_mag, max_mag in [(12.0, 18.0), (14.0, 20.0)]:
+                kwargs = {
+                    "min_mag": min_mag,
+                    "max_mag": max_mag,
+                    "filter_name": "g",
+                    "search_radius_arcmin": 10.0,
+                }
+                expected = PS1(tile_cache_dir=None, **kwargs).get_catalog(0.0, 0.0)
+                result = PS1(tile_cache_dir=self.cache_dir, **kwargs).get_catalog(
+                    0.0, 0.0
+                )
+                self.assertGreater(len(expected), 10)
+                result.sort("objID")
+                self.assertEqual(list(result["objID"]), list(expected["objID"]))
+                self.assertTrue(np.all(result["magnitude"] >= min_mag))
+                self.assertTrue(np.all(result["gFlags"] != 4096))
+
+    def test_vizier_no_matches(self):
+        """Test that cached Vizier catalogs check coverage when nothing matches"""
+        with mock.patch(
+            "mirar.catalog.vizier.base_vizier_catalog.Vizier", FakeVizier
+        ), mock.patch.object(FakeVizier, "table", self.table):
+            kwargs = {
+                "min_mag": 25.0,
+                "max_mag": 26.0,
+                "filter_name": "g",
+                "search_radius_arcmin": 10.0,
+            }
+            for tile_cache_dir in [None, self.cache_dir]:
+                with mock.patch.object(PS1, "check_coverage") as check_coverage:
+                    result = PS1(tile_cache_dir=tile_cache_dir, **kwargs).get_catalog(
+                        0.0, 0.0
+                    )
+                self.assertEqual(len(result), 0)
+                check_coverage.assert_called_once_with(0.0, 0.0)
@@ -0,0 +1,94 @@
+"""
+Tests for tiled image combination in ..module::mirar.data.utils.combine
+"""
+
+import logging
+
+import numpy as np
+from astropy.io.fits import Header
+
+from mirar.data import Image
+from mirar.data.cache import USE_CACHE, hot_cache
+from mirar.data.utils import CombineError, combine_images
+from mirar.paths import BASE_NAME_KEY, RAW_IMG_KEY
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+def make_stack(n_frames: int = 7, shape: tuple[int, int] = (37, 23)) -> list[Image]:
+    """
+    Make a stack of random test images, with some NaN pixels
+
+    :param n_frames: number of images
+    :param shape: shape of each image
+    :return: list of images
+    """
+    rng = np.random.default_rng(42)
+    images = []
+    for i in range(n_frames):
+        data = rng.normal(100.0, 5.0, size=shape)
+        data[rng.random(shape) < 0.05] = np.nan
+        header = Header()
+        header[BASE_NAME_KEY] = f"image_{i}.fits"
+        header[RAW_IMG_KEY] = f"/raw/image_{i}.fits"
+        images.append(Image(data, header))
+    return images
+
+
+class TestCombine(BaseTestCase):
+    """Class for testing the tiled combine engine"""
+
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def test_combine(self):
+        """Test tiled combines against combining the full stack at once"""
+        images = make_stack()
+        cube = np.array([x.get_data() for x in images])
+        scales = np.linspace(0.5, 1.5, len(images))
+        masks = [None] * len(images)
+        masks[0] = np.zeros(cube.shape[1:], dtype=bool)
+
+        # A small budget forces single-row tiles
+        median = combine_images(
+            images, scales=scales, masks=masks, max_bytes=1, n_threads=3
+        )
+        expected = np.nanmedian(cube[1:] * scales[1:, None, None], axis=0)
+        np.testing.assert_allclose(median, expected)
+
+        weights = np.arange(1.0, len(images) + 1)
+        weighted = combine_images(
+            images, method="weighted_mean", weights=weights, max_bytes=5000
+        )
+        valid = ~np.isnan(cube)
+        expected = np.nansum(cube * weights[:, None, None], axis=0) / np.sum(
+            valid * weights[:, None, None], axis=0
+        )
+        np.testing.assert_allclose(weighted, expected)
+
+        clipped = combine_images(images, method="sigma_clipped_mean")
+        self.assertEqual(clipped.shape, cube.shape[1:])
+        self.assertLess(np.nanmax(np.abs(clipped - 100.0)), 10.0)
+
+        with self.assertRaises(CombineError):
+            combine_images(images, method="mode")
+
+    def test_combine_bypasses_hot_cache(self):
+        """Test that combining reads frames from disk, not via the in-RAM cache"""
+        if not USE_CACHE:
+            return
+
+        self.addCleanup(hot_cache.set_max_bytes, hot_cache.max_bytes)
+        hot_cache.set_max_bytes(10 * 1024**2)
+
+        images = make_stack()
+        cube = np.array([x.get_data() for x in images])
+        hot_cache.clear()
+
+        median = combine_images(images, max_bytes=1, n_threads=1)
+        np.testing.assert_allclose(median, np.nanmedian(cube, axis=0))
+        stats = hot_cache.get_stats()
+        self.assertEqual(stats["n_entries"], 0)
+        self.assertEqual(stats["n_bytes"], 0)
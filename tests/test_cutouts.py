@@ -0,0 +1,86 @@
+"""
+Tests for making cutouts in
+..module::mirar.processors.photometry.utils
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+
+from mirar.processors.photometry import AperturePhotometry
+from mirar.processors.photometry.utils import (
+    CutoutError,
+    make_cutout_stacks,
+    make_cutouts,
+)
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestCutouts(BaseTestCase):
+    """Class for testing cutouts"""
+
+    def setUp(self):
+        self.data = np.arange(30 * 40, dtype=float).reshape(30, 40)
+        self.path = Path(self.temp_dir.name).joinpath("image.fits")
+        fits.writeto(self.path, self.data)
+
+    def test_cutout_stacks(self):
+        """Test cutouts inside and at the edges of images"""
+        half_size = 3
+        x_positions = [10, 0, 39, 40, 20]
+        y_positions = [10, 0, 29, 30, 1]
+
+        stacks = make_cutout_stacks(
+            [self.path, -self.data], x_positions, y_positions, half_size
+        )
+        self.assertEqual(len(stacks), 2)
+        self.assertEqual(stacks[0].shape, (5, 7, 7))
+        np.testing.assert_array_equal(stacks[1], -stacks[0])
+
+        # Cutouts match slices of a zero-padded image
+        padded = np.pad(self.data, half_size + 1)
+        for cutout, x, y in zip(stacks[0], x_positions, y_positions):
+            expected = padded[
+                y + 1 : y + 2 * half_size + 2, x + 1 : x + 2 * half_size + 2
+            ]
+            np.testing.assert_array_equal(cutout, expected)
+            np.testing.assert_array_equal(
+                make_cutouts(self.path, (x, y), half_size)[0], expected
+            )
+
+        empty = make_cutout_stacks([self.path], [], [], half_size)[0]
+        self.assertEqual(empty.shape, (0, 7, 7))
+
+        with self.assertRaises(CutoutError):
+            make_cutout_stacks([self.path], [10, 41], [10, 10], half_size)
+
+    def test_processor_coordinates(self):
+        """Test that processors place cutouts with get_physical_coordinates"""
+
+        class ShiftedPhotometry(AperturePhotometry):
+            """Aperture photometry with shifted source positions"""
+
+            def get_physical_coordinates(self, data_item: pd.Series) -> tuple[int, int]:
+                x, y = super().get_physical_coordinates(data_item)
+                return x + 1, y - 1
+
+        half_size = 2
+        sources = pd.DataFrame({"xpos": [10.7, 20.2], "ypos": [5.1, 15.9]})
+        processor = ShiftedPhotometry(
+            phot_cutout_half_size=half_size, x_colname="xpos", y_colname="ypos"
+        )
+        image_cutouts, unc_cutouts = processor.generate_cutout_stacks(
+            self.data, -self.data, sources
+        )
+        self.assertEqual(image_cutouts.shape, (2, 5, 5))
+        np.testing.assert_array_equal(unc_cutouts, -image_cutouts)
+        for cutout, (x, y) in zip(image_cutouts, [(11, 4), (21, 14)]):
+            expected = self.data[
+                y - half_size : y + half_size + 1, x - half_size : x + half_size + 1
+            ]
+            np.testing.assert_array_equal(cutout, expected)
@@ -0,0 +1,257 @@
+"""
+Tests for the thread and process execution backends of
+..module::mirar.processors.base_processor, and for streaming in
+..module::mirar.pipelines.base_pipeline
+"""
+
+import copy
+import gc
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from astropy.io.fits import Header
+
+from mirar.data import Dataset, Image, ImageBatch
+from mirar.data.cache import USE_CACHE, cache
+from mirar.errors import ProcessorError
+from mirar.paths import (
+    BASE_NAME_KEY,
+    EXECUTION_MODES,
+    PROC_HISTORY_KEY,
+    RAW_IMG_KEY,
+    get_env_choice,
+)
+from mirar.pipelines.base_pipeline import Pipeline
+from mirar.processors.base_processor import BaseImageProcessor
+from mirar.processors.utils import ImageDebatcher
+from mirar.profiling import profiler
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class DoublingProcessor(BaseImageProcessor):
+    """Processor to double image data, failing on images with negative data"""
+
+    base_key = "test_double"
+    max_n_cpu = 2
+
+    def _apply_to_images(self, batch: ImageBatch) -> ImageBatch:
+        for image in batch:
+            data = image.get_data()
+            if np.any(data < 0):
+                raise ProcessorError(f"Negative data in {image.get_name()}")
+            image.set_data(data * 2.0)
+        return batch
+
+
+class CopyingProcessor(BaseImageProcessor):
+    """Processor returning copies of images, rather than the images themselves"""
+
+    base_key = "test_copy"
+    max_n_cpu = 2
+
+    def _apply_to_images(self, batch: ImageBatch) -> ImageBatch:
+        return ImageBatch([copy.deepcopy(x) for x in batch])
+
+
+class DroppingProcessor(BaseImageProcessor):
+    """Processor dropping every image"""
+
+    base_key = "test_drop"
+    max_n_cpu = 2
+
+    def _apply_to_images(self, batch: ImageBatch) -> ImageBatch:
+        return ImageBatch()
+
+
+def make_dataset(values: list[float]) -> Dataset:
+    """
+    Make a dataset with one single-image batch per value
+
+    :param values: constant value for each image
+    :return: dataset
+    """
+    batches = []
+    for i, value in enumerate(values):
+        header = Header()
+        header[BASE_NAME_KEY] = f"image_{i}.fits"
+        header[RAW_IMG_KEY] = f"/raw/image_{i}.fits"
+        header[PROC_HISTORY_KEY] = ""
+        batches.append(ImageBatch(Image(np.full((4, 4), value), header)))
+    return Dataset(batches)
+
+
+class TestExecutionModes(BaseTestCase):
+    """Class for testing the execution backends of base_apply"""
+
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def check_mode(self, execution_mode: str):
+        """
+        Apply the test processor in a given mode and check the output
+
+        :param execution_mode: execution mode to test
+        :return: None
+        """
+        processor = DoublingProcessor()
+        processor.set_execution_mode(execution_mode)
+
+        values = [1.0, 2.0, -1.0, 3.0]
+        dataset, err_stack = processor.base_apply(make_dataset(values))
+
+        self.assertEqual(len(dataset), 3)
+        self.assertEqual(len(err_stack.reports), 1)
+        self.assertEqual(err_stack.failed_images, ["image_2.fits"])
+        self.assertIn("ProcessorError", err_stack.summarise_error_stack())
+
+        for batch, value in zip(dataset, [1.0, 2.0, 3.0]):
+            image = batch[0]
+            np.testing.assert_allclose(image.get_data(), 2.0 * value)
+            self.assertEqual(image[PROC_HISTORY_KEY], "test_double,")
+
+    def test_thread_mode(self):
+        """Test the default thread backend"""
+        self.check_mode("thread")
+
+    def test_process_mode(self):
+        """Test the process pool backend"""
+        self.check_mode("process")
+
+    def test_process_mode_ownership(self):
+        """
+        Test that worker processes never delete the cache files of the parent,
+        whether processors return copies of images or drop them
+        """
+        if not USE_CACHE:
+            return
+
+        values = [1.0, 2.0, 3.0]
+
+        processor = CopyingProcessor()
+        processor.set_execution_mode("process")
+        inputs = make_dataset(values)
+        outputs, err_stack = processor.base_apply(inputs)
+        self.assertEqual(len(err_stack.reports), 0)
+        # Index the batches, so that no loop variable keeps a reference to them
+        for i, value in enumerate(values):
+            np.testing.assert_allclose(inputs[i][0].get_data(), value)
+            np.testing.assert_allclose(outputs[i][0].get_data(), value)
+            # The copies now own the cache files of the inputs
+            self.assertEqual(cache.get_refcount(outputs[i][0].cache_path), 1)
+
+        # The outputs keep their data once the inputs are gone
+        cache_paths = [x[0].cache_path for x in outputs]
+        del inputs
+        gc.collect()
+        for i, value in enumerate(values):
+            np.testing.assert_allclose(outputs[i][0].get_data(), value)
+
+        # Updating the outputs in a worker leaves the previous files intact
+        processor = DoublingProcessor()
+        processor.set_execution_mode("process")
+        doubled, _ = processor.base_apply(outputs)
+        for i, value in enumerate(values):
+            np.testing.assert_allclose(outputs[i][0].get_data(), value)
+            np.testing.assert_allclose(doubled[i][0].get_data(), 2.0 * value)
+
+        del outputs, doubled
+        gc.collect()
+        self.assertFalse(any(x.exists() for x in cache_paths))
+
+        processor = DroppingProcessor()
+        processor.set_execution_mode("process")
+        inputs = make_dataset(values)
+        outputs, _ = processor.base_apply(inputs)
+        self.assertEqual(sum(len(x) for x in outputs), 0)
+        for input_batch, value in zip(inputs, values):
+            np.testing.assert_allclose(input_batch[0].get_data(), value)
+
+    def test_error_order(self):
+        """Test that error reports from worker processes are in batch order"""
+        processor = DoublingProcessor()
+        processor.set_execution_mode("process")
+        dataset, err_stack = processor.base_apply(
+            make_dataset([-3.0, 1.0, -2.0, -1.0, 2.0, -4.0])
+        )
+        self.assertEqual(len(dataset), 2)
+        self.assertEqual(
+            [x.contents for x in err_stack.reports],
+            [[f"image_{i}.fits"] for i in [0, 2, 3, 5]],
+        )
+
+    def test_invalid_mode(self):
+        """Test that unknown modes are rejected"""
+        with self.assertRaises(ProcessorError):
+            DoublingProcessor().set_execution_mode("gpu")
+
+        with mock.patch.dict(os.environ, {"EXECUTION_MODE": "Process"}):
+            self.assertEqual(
+                get_env_choice("EXECUTION_MODE", "thread", EXECUTION_MODES),
+                "process",
+            )
+        with mock.patch.dict(os.environ, {"EXECUTION_MODE": "gpu"}):
+            with self.assertRaises(ValueError):
+                get_env_choice("EXECUTION_MODE", "thread", EXECUTION_MODES)
+
+    def test_streaming(self):
+        """Test streaming batches through a chain of processors"""
+        processors = [DoublingProcessor(), DoublingProcessor(), ImageDebatcher()]
+
+        steps = Pipeline.group_processors(processors, streaming=True)
+        self.assertEqual([len(x) for x in steps], [2, 1])
+        self.assertEqual(len(Pipeline.group_processors(processors)), 3)
+
+        dataset, err_stack = Pipeline.stream_processors(
+            steps[0], make_dataset([1.0, -1.0, 2.0, 3.0])
+        )
+
+        self.assertEqual(len(err_stack.reports), 1)
+        self.assertEqual(
+            [x[0].get_name() for x in dataset],
+            ["image_0.fits", "image_2.fits", "image_3.fits"],
+        )
+        for batch, value in zip(dataset, [1.0, 2.0, 3.0]):
+            np.testing.assert_allclose(batch[0].get_data(), 4.0 * value)
+            self.assertEqual(batch[0][PROC_HISTORY_KEY], "test_double,test_double,")
+
+    def test_profiling(self):
+        """Test that each batch is profiled in both execution modes"""
+        self.addCleanup(profiler.clear)
+        self.addCleanup(profiler.set_enabled, profiler.is_enabled())
+        profiler.set_enabled(True)
+        profiler.clear()
+
+        for execution_mode in ["thread", "process"]:
+            processor = DoublingProcessor()
+            processor.set_execution_mode(execution_mode)
+            processor.base_apply(make_dataset([1.0, -1.0, 2.0]))
+
+        records = profiler.get_records()
+        self.assertEqual(len(records), 6)
+        self.assertEqual(sum(not x["success"] for x in records), 2)
+        # Records made in worker processes are returned to the parent
+        self.assertEqual(sum(x["pid"] != os.getpid() for x in records), 3)
+
+        summary = profiler.summarise()
+        self.assertEqual(summary[0]["processor"], "DoublingProcessor")
+        self.assertEqual(summary[0]["n_batches"], 6)
+
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(temp_dir.cleanup)
+        output_path = Path(temp_dir.name).joinpath("night_profile")
+        profiler.write(output_path, chrome_trace=True)
+
+        with open(output_path.with_suffix(".json"), encoding="utf-8") as json_f:
+            self.assertEqual(len(json.load(json_f)["records"]), 6)
+        self.assertTrue(output_path.with_suffix(".csv").exists())
+        self.assertTrue(
+            Path(temp_dir.name).joinpath("night_profile_trace.json").exists()
+        )
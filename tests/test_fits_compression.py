@@ -0,0 +1,141 @@
+"""
+Tests for reading and writing tile-compressed images in
+..module::mirar.io
+"""
+
+import logging
+import os
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from astropy.io import fits
+
+from mirar.benchmarks.synthetic import make_synthetic_night
+from mirar.data import ImageBatch
+from mirar.io import (
+    FitsCompressionError,
+    open_fits,
+    open_fits_section,
+    open_raw_header,
+    open_raw_image,
+    save_fits,
+)
+from mirar.paths import (
+    BASE_NAME_KEY,
+    FITS_COMPRESSIONS,
+    LATEST_SAVE_KEY,
+    get_env_choice,
+)
+from mirar.processors.utils.image_loader import load_from_dir
+from mirar.processors.utils.image_saver import ImageSaver
+from mirar.processors.utils.multi_ext_parser import MultiExtParser
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestFitsCompression(BaseTestCase):
+    """Class for testing tile-compressed fits files"""
+
+    def setUp(self):
+        self.output_dir = Path(self.temp_dir.name)
+        self.batch = make_synthetic_night(
+            "winter", n_bias=0, n_dark=0, n_flat=0, n_science=2, scale=0.05
+        )
+
+    def test_round_trip(self):
+        """Test saving and opening compressed images"""
+        image = self.batch[0]
+        data = image.get_data()
+
+        raw_path = self.output_dir.joinpath("raw.fits")
+        save_fits(image, raw_path)
+
+        lossless_path = self.output_dir.joinpath("lossless.fits")
+        save_fits(image, lossless_path, compression="lossless")
+        lossless = open_raw_image(lossless_path)
+        np.testing.assert_array_equal(lossless.get_data(), data)
+        self.assertEqual(lossless[BASE_NAME_KEY], image[BASE_NAME_KEY])
+
+        lossy_path = self.output_dir.joinpath("lossy.fits")
+        save_fits(image, lossy_path, compression="lossy")
+        lossy = open_raw_image(lossy_path)
+        np.testing.assert_allclose(lossy.get_data(), data, atol=np.std(data))
+        self.assertLess(lossy_path.stat().st_size, raw_path.stat().st_size / 2)
+
+        with fits.open(lossy_path) as hdu_list:
+            self.assertIsInstance(hdu_list[1], fits.CompImageHDU)
+
+        section = (slice(5, 15), slice(20, 40))
+        np.testing.assert_array_equal(
+            open_fits_section(lossless_path, section), data[section]
+        )
+
+    def test_invalid_compression(self):
+        """Test that unknown compression policies are rejected"""
+        with self.assertRaises(FitsCompressionError):
+            ImageSaver(output_dir_name="saved", compression="gzip")
+
+        with mock.patch.dict(os.environ, {"FITS_COMPRESSION": "Lossy"}):
+            self.assertEqual(
+                get_env_choice("FITS_COMPRESSION", "none", FITS_COMPRESSIONS), "lossy"
+            )
+        with mock.patch.dict(os.environ, {"FITS_COMPRESSION": "gzip"}):
+            with self.assertRaises(ValueError):
+                get_env_choice("FITS_COMPRESSION", "none", FITS_COMPRESSIONS)
+
+    def test_load_fz(self):
+        """Test loading fpack files in place"""
+        input_dir = self.output_dir.joinpath("raw")
+        saver = ImageSaver(
+            output_dir_name="raw",
+            output_dir=self.output_dir,
+            compression="lossless",
+            asynchronous=False,
+        )
+        saver.set_night("")
+        saver.apply(ImageBatch(list(self.batch)))
+
+        for image in self.batch:
+            path = Path(image[LATEST_SAVE_KEY])
+            path.rename(path.with_name(path.name + ".fz"))
+
+        for header_f in [None, open_raw_header]:
+            batch = load_from_dir(input_dir, open_f=open_raw_image, header_f=header_f)
+            self.assertEqual(
+                [x[BASE_NAME_KEY] for x in batch],
+                [x[BASE_NAME_KEY] for x in self.batch],
+            )
+            for image, expected in zip(batch, self.batch):
+                np.testing.assert_array_equal(image.get_data(), expected.get_data())
+
+        self.assertEqual(len(list(input_dir.glob("*.fz"))), 2)
+
+    def test_parse_fz_mef(self):
+        """Test splitting fpack MEF files in place"""
+        input_dir = self.output_dir.joinpath("raw")
+        input_dir.mkdir()
+        hdus = [fits.PrimaryHDU(header=fits.Header({"TELESCOP": "test"}))] + [
+            fits.CompImageHDU(
+                image.get_data(), compression_type="GZIP_2", quantize_level=0.0
+            )
+            for image in self.batch
+        ]
+        fits.HDUList(hdus).writeto(input_dir.joinpath("mef.fits.fz"))
+
+        parser = MultiExtParser(
+            input_sub_dir="raw",
+            input_img_dir=self.output_dir,
+            output_img_dir=self.output_dir,
+        )
+        parser.set_night("")
+        parser.apply(ImageBatch())
+
+        self.assertTrue(input_dir.joinpath("mef.fits.fz").exists())
+        for i, image in enumerate(self.batch):
+            data, header = open_fits(
+                self.output_dir.joinpath(f"raw_split/mef_{i + 1}.fits")
+            )
+            np.testing.assert_array_equal(data, image.get_data())
+            self.assertEqual(header["TELESCOP"], "test")
@@ -0,0 +1,150 @@
+"""
+Tests for the fused calibration processor in
+..module::mirar.processors.fused_calibration
+"""
+
+import copy
+import logging
+import tempfile
+from unittest import mock
+
+import numpy as np
+from astropy.io.fits import Header
+
+from mirar.data import Image, ImageBatch
+from mirar.paths import (
+    BASE_NAME_KEY,
+    COADD_KEY,
+    EXPTIME_KEY,
+    GAIN_KEY,
+    LATEST_SAVE_KEY,
+    OBSCLASS_KEY,
+    PROC_HISTORY_KEY,
+    RAW_IMG_KEY,
+    TARGET_KEY,
+    TIME_KEY,
+    core_fields,
+)
+from mirar.processors.base_processor import ProcessorWithCache
+from mirar.processors.bias import BiasCalibrator
+from mirar.processors.dark import DarkCalibrator
+from mirar.processors.flat import FlatCalibrator
+from mirar.processors.fused_calibration import FusedCalibrator
+from mirar.processors.mask import MaskPixelsFromFunction
+from mirar.processors.sky import NightSkyMedianCalibrator
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+def mask_corner(image: Image) -> np.ndarray:
+    """
+    Mask the corner pixel of an image
+
+    :param image: image to mask
+    :return: boolean mask
+    """
+    mask = np.zeros(image.get_data(read_only=True).shape, dtype=bool)
+    mask[0, 0] = True
+    return mask
+
+
+def make_batch() -> ImageBatch:
+    """
+    Make a batch of random dark, flat and science images
+
+    :return: image batch
+    """
+    rng = np.random.default_rng(0)
+    batch = ImageBatch()
+    for i, obsclass in enumerate(["dark"] * 2 + ["flat"] * 3 + ["science"] * 3):
+        header = Header()
+        header[BASE_NAME_KEY] = f"image_{i}.fits"
+        header[RAW_IMG_KEY] = f"/raw/image_{i}.fits"
+        header[PROC_HISTORY_KEY] = ""
+        header[OBSCLASS_KEY] = obsclass
+        header[TARGET_KEY] = obsclass
+        header[TIME_KEY] = "2023-06-01T03:00:00"
+        header[EXPTIME_KEY] = 10.0
+        header[COADD_KEY] = 1
+        header[GAIN_KEY] = 1.0
+        header[LATEST_SAVE_KEY] = header[RAW_IMG_KEY]
+        for key in core_fields:
+            if key not in header:
+                header[key] = ""
+        level = {"dark": 5.0, "flat": 1000.0, "science": 200.0}[obsclass]
+        batch.append(Image(rng.normal(level, 2.0, size=(12, 10)), header))
+    return batch
+
+
+def make_steps() -> list:
+    """
+    Make a chain of calibration processors
+
+    :return: list of processors
+    """
+    return [
+        MaskPixelsFromFunction(mask_function=mask_corner),
+        DarkCalibrator(cache_sub_dir="cal"),
+        FlatCalibrator(cache_sub_dir="cal"),
+        NightSkyMedianCalibrator(cache_sub_dir="cal"),
+    ]
+
+
+class TestFusedCalibration(BaseTestCase):
+    """Class for testing the fused calibration processor"""
+
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def test_fused_calibration(self):
+        """Test that the fused processor matches the separate processors"""
+        batch = make_batch()
+
+        sequential = copy.deepcopy(batch)
+        sequential_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(sequential_dir.cleanup)
+        for step in make_steps():
+            step.set_night(sequential_dir.name)
+            sequential = step.apply(sequential)
+
+        fused_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(fused_dir.cleanup)
+        fused_processor = FusedCalibrator(make_steps())
+        fused_processor.set_night(fused_dir.name)
+        fused = fused_processor.apply(batch)
+
+        ignore_keys = ["REDTIME", "DARKNAME", "FLATNAME"]
+        for expected, image in zip(sequential, fused):
+            np.testing.assert_allclose(image.get_data(), expected.get_data())
+            self.assertEqual(
+                [x for x in image.header.keys() if x not in ignore_keys],
+                [x for x in expected.header.keys() if x not in ignore_keys],
+            )
+            for key in image.header.keys():
+                if key not in ignore_keys:
+                    self.assertEqual(image[key], expected[key])
+
+            self.assertEqual(image[PROC_HISTORY_KEY], "maskfromfunction,dark,flat,sky,")
+
+    def test_calibration_copies_ram_data(self):
+        """Test that calibrating images in RAM leaves the source arrays unchanged"""
+        with mock.patch("mirar.data.image_data.USE_CACHE", False), mock.patch(
+            "mirar.processors.base_processor.USE_CACHE", False
+        ):
+            batch = make_batch()
+            image, master = batch[5], batch[0]
+            source = image.get_data()
+            expected = source.copy()
+            shared = copy.copy(image)
+
+            data = ProcessorWithCache.get_calibration_data(image)
+            self.assertFalse(np.shares_memory(data, source))
+
+            data = BiasCalibrator().calibrate_data(
+                image, data, master, master.get_data(read_only=True)
+            )
+            np.testing.assert_allclose(data, expected - master.get_data())
+            np.testing.assert_array_equal(source, expected)
+            np.testing.assert_array_equal(shared.get_data(), expected)
@@ -0,0 +1,183 @@
+"""
+Tests for the persistent header index in
+..module::mirar.data.header_index
+"""
+
+import logging
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from mirar.benchmarks.synthetic import (
+    make_synthetic_image,
+    make_synthetic_night,
+    write_synthetic_images,
+)
+from mirar.data import ImageBatch
+from mirar.data.header_index import get_loader_name
+from mirar.io import open_raw_header, open_raw_image
+from mirar.paths import BASE_NAME_KEY, FILTER_KEY, TARGET_KEY
+from mirar.processors.utils.cal_hunter import CalRequirement, find_required_cals
+from mirar.processors.utils.image_loader import load_from_dir
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestHeaderIndex(BaseTestCase):
+    """Class for testing the header index"""
+
+    def setUp(self):
+        self.night_dir = Path(self.temp_dir.name).joinpath("20230601")
+        self.input_dir = self.night_dir.joinpath("raw")
+        self.batch = make_synthetic_night(
+            "winter", n_bias=2, n_dark=0, n_flat=2, n_science=1, scale=0.02
+        )
+        write_synthetic_images(self.batch, self.input_dir)
+
+        self.opened = []
+        self.headers_read = []
+
+        index_dir = Path(self.temp_dir.name).joinpath("index").as_posix()
+        patcher = mock.patch("mirar.data.header_index.HEADER_INDEX_DIR", index_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open_and_count(self, path):
+        """
+        Open a raw image, recording the path
+
+        :param path: path of image
+        :return: Image
+        """
+        self.opened.append(Path(path).name)
+        return open_raw_image(path)
+
+    def read_header_and_count(self, path):
+        """
+        Open a raw image header, recording the path
+
+        :param path: path of image
+        :return: Header
+        """
+        self.headers_read.append(Path(path).name)
+        return open_raw_header(path)
+
+    def load(self, **kwargs) -> ImageBatch:
+        """
+        Load the input directory with the counting functions
+
+        :return: ImageBatch
+        """
+        return load_from_dir(
+            self.input_dir,
+            open_f=self.open_and_count,
+            header_f=self.read_header_and_count,
+            n_threads=2,
+            **kwargs,
+        )
+
+    def test_incremental_index(self):
+        """Test that the index is reused, and updated with new files"""
+        batch = self.load()
+        self.assertEqual(len(batch), 5)
+        self.assertEqual(len(self.headers_read), 5)
+
+        self.headers_read = []
+        reloaded = self.load()
+        self.assertEqual(self.headers_read, [])
+        self.assertEqual(self.opened, [])
+
+        for image, expected in zip(reloaded, batch):
+            self.assertEqual(list(image.keys()), list(expected.keys()))
+            self.assertEqual(image[BASE_NAME_KEY], expected[BASE_NAME_KEY])
+            np.testing.assert_array_equal(image.get_data(), expected.get_data())
+
+        new_image = make_synthetic_image("winter", index=10, scale=0.02)
+        write_synthetic_images(ImageBatch([new_image]), self.input_dir)
+        self.input_dir.joinpath(self.batch[0][BASE_NAME_KEY]).unlink()
+
+        updated = self.load()
+        self.assertEqual(self.headers_read, [new_image[BASE_NAME_KEY]])
+        self.assertEqual(len(updated), 5)
+        self.assertNotIn(
+            self.batch[0][BASE_NAME_KEY], [x[BASE_NAME_KEY] for x in updated]
+        )
+
+    def test_partial_loader(self):
+        """Test that the index is reused for header functions made with partial"""
+        self.assertEqual(
+            get_loader_name(partial(open_raw_header)),
+            get_loader_name(partial(open_raw_header)),
+        )
+        self.assertNotEqual(
+            get_loader_name(partial(load_from_dir, open_f=open_raw_image)),
+            get_loader_name(partial(load_from_dir, open_f=open_raw_header)),
+        )
+
+        def load_with_partial():
+            return load_from_dir(
+                self.input_dir,
+                open_f=self.open_and_count,
+                header_f=partial(self.read_header_and_count),
+                n_threads=2,
+            )
+
+        self.assertEqual(len(load_with_partial()), 5)
+        self.assertEqual(len(self.headers_read), 5)
+
+        self.headers_read = []
+        self.assertEqual(len(load_with_partial()), 5)
+        self.assertEqual(self.headers_read, [])
+
+    def test_selection(self):
+        """Test selecting images on indexed and other header values"""
+        self.load()
+        self.headers_read = []
+
+        flats = self.load(selection={TARGET_KEY: "flat"})
+        self.assertEqual(len(flats), 2)
+        self.assertTrue(all(x[TARGET_KEY] == "flat" for x in flats))
+
+        name = self.batch[0][BASE_NAME_KEY]
+        filtered = self.load(
+            selection={TARGET_KEY: ["flat", "bias"], BASE_NAME_KEY: name}
+        )
+        self.assertEqual([x[BASE_NAME_KEY] for x in filtered], [name])
+        self.assertEqual(self.headers_read, [])
+
+    def test_cal_hunting(self):
+        """Test that searching previous nights only reads the required images"""
+        latest_dir = Path(self.temp_dir.name).joinpath("20230602/raw")
+        write_synthetic_images(
+            make_synthetic_night(
+                "winter", n_bias=0, n_dark=0, n_flat=0, n_science=1, scale=0.02
+            ),
+            latest_dir,
+        )
+
+        requirements = [
+            CalRequirement(
+                target_name="flat",
+                required_field=FILTER_KEY,
+                required_values=[self.batch[2][FILTER_KEY]],
+            )
+        ]
+        images = find_required_cals(
+            latest_dir=latest_dir.as_posix(),
+            night="20230602",
+            requirements=requirements,
+            open_f=self.open_and_count,
+            images=ImageBatch(),
+            skip_latest_night=True,
+            header_f=self.read_header_and_count,
+        )
+
+        self.assertEqual(len(images), 2)
+        self.assertTrue(all(x[TARGET_KEY] == "flat" for x in images))
+
+        for image in images:
+            image.get_data()
+        self.assertEqual(sorted(self.opened), sorted(x[BASE_NAME_KEY] for x in images))
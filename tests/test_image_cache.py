@@ -0,0 +1,206 @@
+"""
+Tests for cache-mode image data handling in ..module::mirar.data.image_data
+"""
+
+import copy
+import logging
+import tempfile
+
+import numpy as np
+from astropy.io.fits import Header
+
+from mirar.data import Image
+from mirar.data.cache import USE_CACHE, CacheError, cache, hot_cache
+from mirar.paths import BASE_NAME_KEY, RAW_IMG_KEY
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+def make_image(value: float = 1.0, name: str = "image.fits") -> Image:
+    """
+    Make a small test image with constant data
+
+    :param value: pixel value
+    :param name: image name
+    :return: Image
+    """
+    header = Header()
+    header[BASE_NAME_KEY] = name
+    header[RAW_IMG_KEY] = f"/raw/{name}"
+    return Image(np.full((8, 8), value), header)
+
+
+class TestImageCache(BaseTestCase):
+    """Class for testing cache-mode image data"""
+
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def test_views(self):
+        """Test read-only and copy-on-write views of image data"""
+        image = make_image(1.0)
+
+        view = image.get_data(read_only=True)
+        self.assertFalse(view.flags.writeable)
+
+        if not USE_CACHE:
+            return
+
+        data = image.get_data()
+        data[0, 0] = 5.0
+        self.assertEqual(image.get_data(read_only=True)[0, 0], 1.0)
+
+        image.set_data(data)
+        self.assertEqual(image.get_data(read_only=True)[0, 0], 5.0)
+
+        # Views handed out before an update remain valid
+        self.assertEqual(view[0, 0], 1.0)
+
+    def test_clean_write_skipped(self):
+        """Test that unmodified read-only views are not written back"""
+        if not USE_CACHE:
+            return
+
+        self.addCleanup(hot_cache.set_max_bytes, hot_cache.max_bytes)
+        hot_cache.set_max_bytes(0)
+
+        image = make_image(2.0)
+        inode = image.cache_path.stat().st_ino
+
+        image.set_data(image.get_data(read_only=True))
+        self.assertEqual(image.cache_path.stat().st_ino, inode)
+
+        image.set_data(image.get_data() * 2.0)
+        self.assertNotEqual(image.cache_path.stat().st_ino, inode)
+        np.testing.assert_allclose(image.get_data(), 4.0)
+
+    def test_hot_cache(self):
+        """Test the in-RAM LRU cache with write-back"""
+        if not USE_CACHE:
+            return
+
+        original_budget = hot_cache.max_bytes
+        self.addCleanup(hot_cache.set_max_bytes, original_budget)
+
+        # Room for two 8x8 float64 images
+        hot_cache.set_max_bytes(1100)
+        start = hot_cache.get_stats()
+
+        images = [make_image(float(i), name=f"image_{i}.fits") for i in range(3)]
+
+        # The first image was evicted and written back, the others are only in RAM
+        stats = hot_cache.get_stats()
+        self.assertEqual(stats["evictions"] - start["evictions"], 1)
+        self.assertEqual(stats["writebacks"] - start["writebacks"], 1)
+        self.assertTrue(images[0].cache_path.exists())
+        self.assertFalse(images[2].cache_path.exists())
+
+        for i, image in enumerate(images):
+            np.testing.assert_allclose(image.get_data(read_only=True), float(i))
+
+        hits = hot_cache.get_stats()["hits"]
+        images[2].get_mask()
+        self.assertEqual(hot_cache.get_stats()["hits"], hits + 1)
+
+        # Modifying a copy does not change the cached data
+        data = images[2].get_data()
+        data[0, 0] = 100.0
+        self.assertEqual(images[2].get_data(read_only=True)[0, 0], 2.0)
+
+        hot_cache.flush()
+        self.assertEqual(hot_cache.get_stats()["n_dirty"], 0)
+        self.assertTrue(images[2].cache_path.exists())
+
+        # Clearing at the end of a run keeps the data on disk only
+        images[1].set_data(images[1].get_data() + 10.0)
+        hot_cache.clear()
+        self.assertEqual(hot_cache.get_stats()["n_entries"], 0)
+        np.testing.assert_allclose(images[1].get_data(read_only=True), 11.0)
+
+    def test_shared_cache_files(self):
+        """Test that copies share cache files until modified"""
+        if not USE_CACHE:
+            return
+
+        image = make_image(3.0)
+        path = image.cache_path
+
+        image_copy = copy.deepcopy(image)
+        self.assertEqual(image_copy.cache_path, path)
+        self.assertEqual(cache.get_refcount(path), 2)
+
+        image_copy["NEWKEY"] = 1
+        self.assertNotIn("NEWKEY", image.header)
+
+        image_copy.set_data(image_copy.get_data() + 1.0)
+        self.assertNotEqual(image_copy.cache_path, path)
+        self.assertEqual(cache.get_refcount(path), 1)
+        np.testing.assert_allclose(image.get_data(), 3.0)
+        np.testing.assert_allclose(image_copy.get_data(), 4.0)
+
+        other = copy.copy(image)
+        del image
+        self.assertEqual(cache.get_refcount(path), 1)
+        del other
+        self.assertEqual(cache.get_refcount(path), 0)
+        self.assertFalse(path.exists())
+
+    def test_quota_spill(self):
+        """Test that new cache files spill to a secondary directory at the quota"""
+        if not USE_CACHE:
+            return
+
+        self.addCleanup(hot_cache.set_max_bytes, hot_cache.max_bytes)
+        hot_cache.set_max_bytes(0)
+
+        spill_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(spill_dir.cleanup)
+        self.addCleanup(cache.set_spill_dir, cache.spill_dir)
+        self.addCleanup(cache.set_max_bytes, cache.max_bytes)
+
+        usage = cache.get_usage()
+        cache.set_spill_dir(spill_dir.name)
+        cache.set_max_bytes(usage["n_bytes"] + 1)
+
+        first = make_image(1.0, name="first.fits")
+        second = make_image(2.0, name="second.fits")
+
+        self.assertEqual(first.cache_path.parent, cache.get_cache_dir())
+        self.assertEqual(str(second.cache_path.parent), spill_dir.name)
+        self.assertEqual(
+            cache.get_usage()["n_spilled_files"], usage["n_spilled_files"] + 1
+        )
+        self.assertGreater(cache.get_usage()["n_spill_bytes"], 0)
+        np.testing.assert_allclose(second.get_data(), 2.0)
+
+    def test_quota_full(self):
+        """Test that new cache files fail at the quota without a spill directory"""
+        if not USE_CACHE:
+            return
+
+        self.addCleanup(hot_cache.set_max_bytes, hot_cache.max_bytes)
+        hot_cache.set_max_bytes(0)
+        self.addCleanup(cache.set_spill_dir, cache.spill_dir)
+        self.addCleanup(cache.set_max_bytes, cache.max_bytes)
+        self.addCleanup(cache.set_block_timeout, cache.block_timeout)
+
+        usage = cache.get_usage()
+        cache.set_spill_dir(None)
+        cache.set_max_bytes(usage["n_bytes"] + 1)
+
+        first = make_image(1.0, name="first.fits")
+        with self.assertRaises(CacheError):
+            make_image(2.0, name="second.fits")
+        self.assertEqual(cache.get_usage()["n_blocked"], usage["n_blocked"])
+
+        # Waiting producers fail once the timeout passes without space
+        cache.set_block_timeout(0.1)
+        with self.assertRaises(CacheError):
+            make_image(2.0, name="second.fits")
+        self.assertEqual(cache.get_usage()["n_blocked"], usage["n_blocked"] + 1)
+
+        # Space freed by other images is reused
+        del first
+        np.testing.assert_allclose(make_image(2.0, name="second.fits").get_data(), 2.0)
@@ -0,0 +1,263 @@
+"""
+Tests for parallel, header-first loading in
+..module::mirar.processors.utils.image_loader
+"""
+
+import copy
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from astropy.io import fits
+
+from mirar.benchmarks.synthetic import make_synthetic_night, write_synthetic_images
+from mirar.data import Dataset, ImageBatch
+from mirar.io import (
+    open_mef_fits,
+    open_mef_headers,
+    open_mef_image,
+    open_raw_header,
+    open_raw_image,
+)
+from mirar.paths import BASE_NAME_KEY, OBSCLASS_KEY, PIXEL_DTYPES, get_env_choice
+from mirar.processors.split import SplitImage
+from mirar.processors.utils.image_loader import (
+    BadImageError,
+    ImageLoader,
+    InvalidImage,
+    MEFLoader,
+    load_from_dir,
+)
+from mirar.processors.utils.image_selector import ImageSelector
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestImageLoader(BaseTestCase):
+    """Class for testing header-first image loading"""
+
+    def setUp(self):
+        self.input_dir = Path(self.temp_dir.name).joinpath("raw")
+        self.batch = make_synthetic_night(
+            "winter", n_bias=2, n_dark=0, n_flat=0, n_science=2, scale=0.02
+        )
+        write_synthetic_images(self.batch, self.input_dir)
+        self.opened = []
+
+    def open_and_count(self, path):
+        """
+        Open a raw image, recording the path
+
+        :param path: path of image
+        :return: Image
+        """
+        self.opened.append(Path(path).name)
+        return open_raw_image(path)
+
+    def test_deferred_loading(self):
+        """Test that deferred images match eagerly-loaded ones"""
+        eager = load_from_dir(self.input_dir, open_f=open_raw_image, n_threads=2)
+        deferred = load_from_dir(
+            self.input_dir,
+            open_f=self.open_and_count,
+            header_f=open_raw_header,
+            n_threads=2,
+        )
+
+        self.assertEqual(len(deferred), 4)
+        self.assertEqual(self.opened, [])
+        self.assertFalse(any(x.is_loaded() for x in deferred))
+
+        copied = copy.deepcopy(deferred[0])
+        self.assertFalse(copied.is_loaded())
+
+        for image, expected in zip(deferred, eager):
+            self.assertEqual(list(image.keys()), list(expected.keys()))
+            np.testing.assert_array_equal(image.get_data(), expected.get_data())
+            self.assertTrue(image.is_loaded())
+
+        np.testing.assert_array_equal(copied.get_data(), eager[0].get_data())
+
+    def test_selection_before_loading(self):
+        """Test that images rejected by a selector are never read"""
+        batch = load_from_dir(
+            self.input_dir, open_f=self.open_and_count, header_f=open_raw_header
+        )
+        batch = ImageSelector((OBSCLASS_KEY, "science")).apply(batch)
+        for image in batch:
+            image.get_data()
+
+        self.assertEqual(sorted(self.opened), sorted(x[BASE_NAME_KEY] for x in batch))
+        self.assertEqual(len(self.opened), 2)
+
+    def test_deferred_errors(self):
+        """Test that files failing once their data is read are reported"""
+        bad_name = self.batch[0][BASE_NAME_KEY]
+
+        def open_or_reject(path):
+            self.opened.append(Path(path).name)
+            if Path(path).name == bad_name:
+                raise InvalidImage(f"Corrupt data in {path}")
+            return open_raw_image(path)
+
+        batch = load_from_dir(
+            self.input_dir, open_f=open_or_reject, header_f=open_raw_header
+        )
+        self.assertEqual(len(batch), 4)
+
+        bad_image = [x for x in batch if x[BASE_NAME_KEY] == bad_name][0]
+        for _ in range(2):
+            with self.assertRaises(BadImageError):
+                bad_image.get_data()
+        self.assertEqual(self.opened.count(bad_name), 1)
+
+        # The batch with the bad image is reported, the others are processed
+        processor = SplitImage(n_x=2, n_y=1)
+        processor.set_night(self.temp_dir.name)
+        dataset, err_stack = processor.base_apply(
+            Dataset([ImageBatch(x) for x in batch])
+        )
+        self.assertEqual(len(err_stack.reports), 1)
+        names = [Path(x).name for y in dataset for x in y.get_raw_image_names()]
+        self.assertEqual(len(set(names)), 3)
+        self.assertNotIn(bad_name, names)
+
+        # Without a header function, the file is skipped at load time
+        batch = load_from_dir(self.input_dir, open_f=open_or_reject)
+        self.assertEqual(len(batch), 3)
+
+    def write_mef(self) -> Path:
+        """
+        Write a MEF file with one extension per image of the batch
+
+        :return: directory of MEF file
+        """
+        mef_dir = Path(self.temp_dir.name).joinpath("mef")
+        mef_dir.mkdir()
+        primary = fits.PrimaryHDU(header=self.batch[0].get_header())
+        primary.header[BASE_NAME_KEY] = "mef.fits"
+        hdus = [primary] + [
+            fits.ImageHDU(image.get_data(), header=fits.Header({"EXTID": i}))
+            for i, image in enumerate(self.batch)
+        ]
+        fits.HDUList(hdus).writeto(mef_dir.joinpath("mef.fits"))
+        return mef_dir
+
+    def test_mef_headers(self):
+        """Test that MEF files are read once, for all extensions"""
+        mef_dir = self.write_mef()
+
+        opened = []
+
+        def open_mef(path):
+            opened.append(path)
+            return open_mef_image(path)
+
+        batch = load_from_dir(mef_dir, open_f=open_mef, header_f=open_mef_headers)
+        self.assertEqual(
+            [x[BASE_NAME_KEY] for x in batch], [f"mef_{i}.fits" for i in range(4)]
+        )
+        for image, expected in zip(batch, self.batch):
+            np.testing.assert_allclose(image.get_data(), expected.get_data())
+        self.assertEqual(len(opened), 1)
+
+    def test_custom_mef_headers(self):
+        """Test that MEF headers match images from a custom MEF function"""
+        mef_dir = self.write_mef()
+
+        def open_and_tag(path, dtype="float64", lazy=False):
+            primary_header, split_data, split_headers = open_mef_fits(
+                path, dtype=dtype, lazy=lazy
+            )
+            for header in split_headers:
+                header["BOARD_ID"] = int(header["EXTID"]) + 1
+            return primary_header, split_data, split_headers
+
+        open_f = partial(open_mef_image, open_f=open_and_tag, extension_key="BOARD_ID")
+        header_f = partial(
+            open_mef_headers, open_f=open_and_tag, extension_key="BOARD_ID"
+        )
+
+        expected = load_from_dir(mef_dir, open_f=open_f)
+        batch = load_from_dir(mef_dir, open_f=open_f, header_f=header_f)
+        self.assertFalse(any(x.is_loaded() for x in batch))
+        self.assertEqual(
+            [x[BASE_NAME_KEY] for x in batch], [f"mef_{i}.fits" for i in range(1, 5)]
+        )
+        for image, expected_image in zip(batch, expected):
+            self.assertEqual(
+                dict(image.get_header()), dict(expected_image.get_header())
+            )
+
+    def test_lazy_mef(self):
+        """Test that lazy MEF loading reads each extension only when needed"""
+        mef_dir = self.write_mef()
+        self.assertFalse(MEFLoader().lazy)
+        loader = MEFLoader(input_img_dir=mef_dir.parent, input_sub_dir="mef", lazy=True)
+        loader.set_night("")
+        batch = loader.apply(ImageBatch())
+
+        self.assertEqual(len(batch), 4)
+        self.assertFalse(any(x.is_loaded() for x in batch))
+
+        np.testing.assert_allclose(batch[2].get_data(), self.batch[2].get_data())
+        self.assertEqual([x.is_loaded() for x in batch], [False, False, True, False])
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            all_data = list(executor.map(lambda x: x.get_data(), batch))
+        for data, expected in zip(all_data, self.batch):
+            np.testing.assert_allclose(data, expected.get_data())
+
+    def test_pixel_dtype(self):
+        """Test that loaders read images in the pixel dtype of the pipeline"""
+        read_dtypes = []
+
+        def open_with_dtype(path, dtype="float64"):
+            read_dtypes.append(dtype)
+            return open_raw_image(path, dtype=dtype)
+
+        loader = ImageLoader(
+            input_img_dir=self.input_dir.parent,
+            input_sub_dir="raw",
+            load_image=open_with_dtype,
+        )
+        loader.set_night("")
+        loader.set_pipeline_pixel_dtype("float32")
+        batch = loader.apply(ImageBatch())
+        self.assertEqual(read_dtypes, ["float32"] * 4)
+        for image in batch:
+            self.assertEqual(image.get_data().dtype, np.float32)
+
+        # Deferred data, and lazy MEF extensions, are also read as float32
+        loader = ImageLoader(input_img_dir=self.input_dir.parent, input_sub_dir="raw")
+        loader.set_night("")
+        loader.set_pipeline_pixel_dtype("float32")
+        batch = loader.apply(ImageBatch())
+        self.assertFalse(any(x.is_loaded() for x in batch))
+        self.assertEqual(batch[0].get_data().dtype, np.float32)
+
+        mef_dir = self.write_mef()
+        loader = MEFLoader(input_img_dir=mef_dir.parent, input_sub_dir="mef", lazy=True)
+        loader.set_night("")
+        loader.set_pipeline_pixel_dtype("float32")
+        batch = loader.apply(ImageBatch())
+        self.assertEqual(batch[1].get_data().dtype, np.float32)
+
+        # Eagerly-read MEF extensions are read as float32 by open_f
+        for image in open_mef_image(mef_dir.joinpath("mef.fits"), dtype="float32"):
+            self.assertEqual(image.get_data().dtype, np.float32)
+
+    def test_invalid_pixel_dtype(self):
+        """Test that an invalid PIXEL_DTYPE setting is rejected"""
+        with mock.patch.dict(os.environ, {"PIXEL_DTYPE": "Float32"}):
+            self.assertEqual(
+                get_env_choice("PIXEL_DTYPE", "float64", PIXEL_DTYPES), "float32"
+            )
+        with mock.patch.dict(os.environ, {"PIXEL_DTYPE": "float16"}):
+            with self.assertRaises(ValueError):
+                get_env_choice("PIXEL_DTYPE", "float64", PIXEL_DTYPES)
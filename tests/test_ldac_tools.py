@@ -0,0 +1,111 @@
+"""
+Tests for reading and writing LDAC catalogs in
+..module::mirar.utils.ldac_tools
+"""
+
+import logging
+import os
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from astropy.table import MaskedColumn, Table
+
+from mirar.testing import BaseTestCase
+from mirar.utils.ldac_tools import (
+    LDACCache,
+    convert_table_to_ldac,
+    get_table_from_ldac,
+    read_ldac_columns,
+    save_table_as_ldac,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TestLDACTools(BaseTestCase):
+    """Class for testing LDAC catalogs"""
+
+    def setUp(self):
+        self.table = Table(
+            {
+                "X_IMAGE": np.arange(5.0),
+                "NUMBER": np.arange(5),
+                "NAME": np.array(["a", "bb", "c", "", "e"]),
+                "FLUX_APER": np.ones((5, 3)),
+                "MAG_AUTO": np.array([1.0, np.nan, 2.0, 3.0, 4.0]),
+            }
+        )
+        self.table["X_IMAGE"].unit = "pix"
+
+        self.path = Path(self.temp_dir.name).joinpath("test.cat")
+        save_table_as_ldac(self.table, self.path)
+
+        patcher = mock.patch("mirar.utils.ldac_tools.ldac_cache", LDACCache())
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_trip(self):
+        """Test that catalogs read back as when reading the whole file"""
+        hdulist = convert_table_to_ldac(self.table)
+        self.assertEqual(
+            [x.header.get("EXTNAME") for x in hdulist],
+            [None, "LDAC_IMHEAD", "LDAC_OBJECTS"],
+        )
+
+        expected = Table.read(self.path, hdu=2)
+        for tbl in [get_table_from_ldac(self.path), get_table_from_ldac(self.path)]:
+            self.assertEqual(tbl.colnames, expected.colnames)
+            self.assertEqual(tbl.pformat(), expected.pformat())
+            self.assertEqual(dict(tbl.meta), dict(expected.meta))
+            for name in expected.colnames:
+                self.assertIs(type(tbl[name]), type(expected[name]))
+                self.assertEqual(tbl[name].dtype, expected[name].dtype)
+                self.assertEqual(tbl[name].unit, expected[name].unit)
+
+        self.assertIsInstance(tbl["NAME"], MaskedColumn)
+        self.assertEqual((self.cache.n_misses, self.cache.n_hits), (1, 1))
+
+    def test_columns_and_cache(self):
+        """Test reading selected columns and rows, and the cache"""
+        with mock.patch(
+            "mirar.utils.ldac_tools.read_ldac_columns", wraps=read_ldac_columns
+        ) as reader:
+            tbl = get_table_from_ldac(self.path, columns=["MAG_AUTO", "X_IMAGE"])
+            self.assertEqual(tbl.colnames, ["MAG_AUTO", "X_IMAGE"])
+
+            # Returned tables are copies
+            tbl["X_IMAGE"][0] = 100.0
+            tbl.meta["EXTNAME"] = "changed"
+
+            # Only the columns which are not cached yet are read
+            tbl = get_table_from_ldac(
+                self.path, columns=["X_IMAGE", "NUMBER"], rows=[1, 3]
+            )
+            self.assertEqual(
+                [x.kwargs["columns"] for x in reader.call_args_list],
+                [["MAG_AUTO", "X_IMAGE"], ["NUMBER"]],
+            )
+            self.assertEqual((self.cache.n_misses, self.cache.n_hits), (1, 1))
+
+        np.testing.assert_array_equal(tbl["X_IMAGE"], [1.0, 3.0])
+        np.testing.assert_array_equal(tbl["NUMBER"], [1, 3])
+        self.assertEqual(tbl.meta["EXTNAME"], "LDAC_OBJECTS")
+
+        # A changed file is read again
+        self.table["NUMBER"] += 10
+        save_table_as_ldac(self.table, self.path)
+        os.utime(self.path, ns=(0, 0))
+        tbl = get_table_from_ldac(self.path, columns=["NUMBER"])
+        np.testing.assert_array_equal(tbl["NUMBER"], np.arange(5) + 10)
+        self.assertEqual(self.cache.n_misses, 2)
+
+    def test_no_cache(self):
+        """Test reading selected rows without the cache"""
+        self.cache.max_entries = 0
+        tbl = get_table_from_ldac(
+            self.path, columns=["MAG_AUTO"], rows=np.array([0, 1, 0, 0, 1], dtype=bool)
+        )
+        self.assertEqual(len(tbl), 2)
+        self.assertIsInstance(tbl["MAG_AUTO"], MaskedColumn)
+        self.assertEqual(self.cache.n_misses, 0)
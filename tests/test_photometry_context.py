@@ -0,0 +1,145 @@
+"""
+Tests for shared photometry contexts in
+..module::mirar.processors.photometry.context
+"""
+
+import logging
+import os
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+
+from mirar.benchmarks.synthetic import (
+    SYNTHETIC_INSTRUMENTS,
+    make_synthetic_image,
+    write_psf_file,
+)
+from mirar.data import SourceBatch, SourceTable
+from mirar.data.scratch import scratch_files
+from mirar.io import save_fits
+from mirar.paths import (
+    LATEST_SAVE_KEY,
+    NORM_PSFEX_KEY,
+    XPOS_KEY,
+    YPOS_KEY,
+    ZP_KEY,
+    ZP_STD_KEY,
+    get_output_dir,
+)
+from mirar.processors.photometry import AperturePhotometry, PSFPhotometry
+from mirar.processors.photometry.context import PhotometryContextCache
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestPhotometryContext(BaseTestCase):
+    """Class for testing photometry contexts"""
+
+    def setUp(self):
+        self.output_dir = Path(self.temp_dir.name)
+        image = make_synthetic_image("winter", index=0, scale=0.05)
+        self.image_path = self.output_dir.joinpath("science.fits")
+        save_fits(image, self.image_path)
+        psf_path = write_psf_file(
+            self.output_dir.joinpath("science.psf"),
+            SYNTHETIC_INSTRUMENTS["winter"]["fwhm_pix"],
+        )
+
+        ny, nx = image.get_data().shape
+        rng = np.random.default_rng(0)
+        self.sources = pd.DataFrame(
+            {
+                XPOS_KEY: rng.uniform(0, nx - 1, 20),
+                YPOS_KEY: rng.uniform(0, ny - 1, 20),
+            }
+        )
+        self.metadata = dict(image.get_header())
+        self.metadata.update(
+            {
+                LATEST_SAVE_KEY: self.image_path.as_posix(),
+                NORM_PSFEX_KEY: psf_path.as_posix(),
+                ZP_KEY: 25.0,
+                ZP_STD_KEY: 0.05,
+            }
+        )
+
+        patcher = mock.patch(
+            "mirar.processors.photometry.base_photometry.photometry_contexts",
+            PhotometryContextCache(),
+        )
+        self.contexts = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(scratch_files.clear)
+
+    def run_photometry(self, save_cutouts: bool) -> pd.DataFrame:
+        """
+        Run aperture and PSF photometry on the sources
+
+        :param save_cutouts: whether to save cutouts (and temporary images)
+        :return: table of results
+        """
+        batch = SourceBatch(
+            [SourceTable(self.sources.copy(), metadata=dict(self.metadata))]
+        )
+        for processor in [
+            AperturePhotometry(save_cutouts=save_cutouts),
+            PSFPhotometry(save_cutouts=save_cutouts),
+        ]:
+            processor.set_night(self.output_dir.as_posix())
+            get_output_dir(
+                processor.temp_output_sub_dir, processor.night_sub_dir
+            ).mkdir(parents=True, exist_ok=True)
+            batch = processor.apply(batch)
+        return batch[0].get_data()
+
+    def test_shared_context(self):
+        """Test that photometry from contexts matches temporary files"""
+        results = self.run_photometry(save_cutouts=False)
+        self.assertEqual(self.contexts.get_stats()["n_misses"], 1)
+        self.assertEqual(self.contexts.get_stats()["n_hits"], 1)
+
+        expected = self.run_photometry(save_cutouts=True)
+        self.assertEqual(self.contexts.get_stats()["n_misses"], 1)
+        pd.testing.assert_frame_equal(results, expected)
+
+        # A changed image gets a new context
+        context = self.contexts.get(self.image_path)
+        self.assertFalse(context.data.flags.writeable)
+        with fits.open(self.image_path, mode="update") as hdul:
+            hdul[0].data[0, 0] += 1.0
+        os.utime(self.image_path, ns=(0, 0))
+        new_context = self.contexts.get(self.image_path)
+        self.assertIsNot(new_context, context)
+        self.assertEqual(self.contexts.get_stats()["n_contexts"], 1)
+
+        # Contexts over the budget are not kept
+        self.contexts.set_max_bytes(0)
+        self.assertEqual(self.contexts.get_stats()["n_contexts"], 0)
+        self.assertEqual(self.contexts.get_stats()["n_bytes"], 0)
+
+    def test_pending_write(self):
+        """Test that a context waits for an asynchronous write of its image"""
+        new_path = self.output_dir.joinpath("async_science.fits")
+        image = make_synthetic_image("winter", index=0, scale=0.05)
+        save_fits(image, new_path, asynchronous=True)
+        context = self.contexts.get(new_path)
+        np.testing.assert_array_equal(
+            context.data, self.contexts.get(self.image_path).data
+        )
+
+    def test_compressed_image(self):
+        """Test photometry of an image saved with tile compression"""
+        expected = self.run_photometry(save_cutouts=False)
+
+        compressed_path = self.output_dir.joinpath("compressed_science.fits")
+        image = make_synthetic_image("winter", index=0, scale=0.05)
+        save_fits(image, compressed_path, compression="lossless")
+        self.metadata[LATEST_SAVE_KEY] = compressed_path.as_posix()
+
+        for save_cutouts in [False, True]:
+            results = self.run_photometry(save_cutouts=save_cutouts)
+            pd.testing.assert_frame_equal(results, expected)
@@ -0,0 +1,96 @@
+"""
+Tests for the float32 pixel dtype policy, comparing outputs against float64
+"""
+
+import copy
+import logging
+import tempfile
+
+import numpy as np
+
+from mirar.benchmarks.synthetic import make_synthetic_night
+from mirar.data import ImageBatch
+from mirar.processors.base_processor import PixelDtypeError
+from mirar.processors.bias import BiasCalibrator
+from mirar.processors.dark import DarkCalibrator
+from mirar.processors.flat import FlatCalibrator
+from mirar.processors.split import SplitImage
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+def reduce_with_pixel_dtype(
+    batch: ImageBatch, pixel_dtype: str, output_dir: str
+) -> tuple[ImageBatch, list]:
+    """
+    Apply a calibration chain to a copy of a batch, with a given pixel dtype
+
+    :param batch: raw images
+    :param pixel_dtype: pipeline pixel dtype
+    :param output_dir: directory for output files
+    :return: output images, and the processors used
+    """
+    processors = [
+        BiasCalibrator(cache_sub_dir="cal"),
+        DarkCalibrator(cache_sub_dir="cal"),
+        FlatCalibrator(cache_sub_dir="cal"),
+        SplitImage(n_x=2, n_y=1),
+    ]
+    new_batch = copy.deepcopy(batch)
+    for processor in processors:
+        processor.set_night(output_dir)
+        processor.set_pipeline_pixel_dtype(pixel_dtype)
+        new_batch = processor.apply(new_batch)
+    return new_batch, processors
+
+
+class TestPixelDtype(BaseTestCase):
+    """Class for testing the float32 pixel dtype policy"""
+
+    def setUp(self):
+        self.batch = make_synthetic_night(
+            "winter", n_bias=3, n_dark=3, n_flat=3, n_science=2, scale=0.05
+        )
+
+    def reduce(self, pixel_dtype: str) -> ImageBatch:
+        """
+        Reduce the test batch in a new temporary directory
+
+        :param pixel_dtype: pipeline pixel dtype
+        :return: output images
+        """
+        output_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(output_dir.cleanup)
+        batch, _ = reduce_with_pixel_dtype(self.batch, pixel_dtype, output_dir.name)
+        return batch
+
+    def test_float32_matches_float64(self):
+        """Test that float32 outputs match float64 within tolerance"""
+        expected = self.reduce("float64")
+        result = self.reduce("float32")
+
+        self.assertEqual(len(result), len(expected))
+        for image, expected_image in zip(result, expected):
+            self.assertEqual(image.get_data().dtype, np.float32)
+            self.assertEqual(expected_image.get_data().dtype, np.float64)
+            np.testing.assert_allclose(
+                image.get_data(), expected_image.get_data(), rtol=1.0e-5, atol=1.0e-4
+            )
+
+    def test_processor_override(self):
+        """Test that a processor can override the pipeline pixel dtype"""
+        processor = SplitImage(n_x=2, n_y=1)
+        processor.set_night(self.temp_dir.name)
+        processor.set_pipeline_pixel_dtype("float32")
+        processor.set_pixel_dtype("float64")
+        self.assertEqual(processor.get_pixel_dtype(), "float64")
+
+        image = copy.deepcopy(self.batch[-1])
+        image.set_data(image.get_data().astype(np.float32))
+        new_batch = processor.apply(ImageBatch(image))
+        for image in new_batch:
+            self.assertEqual(image.get_data().dtype, np.float64)
+
+        with self.assertRaises(PixelDtypeError):
+            processor.set_pixel_dtype("float16")
@@ -0,0 +1,77 @@
+"""
+Tests for batched PSF photometry in
+..module::mirar.processors.photometry.utils
+"""
+
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+from astropy.io import fits
+
+from mirar.processors.photometry.utils import (
+    get_psf_shifted_array,
+    make_cutout_stacks,
+    psf_photometry,
+    psf_photometry_batch,
+)
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestPSFPhotometry(BaseTestCase):
+    """Class for testing batched PSF photometry"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        y_grid, x_grid = np.mgrid[-12:13, -12:13]
+        self.psf_path = Path(self.temp_dir.name).joinpath("model.psf")
+        fits.writeto(self.psf_path, np.exp(-(x_grid**2 + y_grid**2) / 8.0))
+
+        self.data = rng.normal(0.0, 1.0, size=(100, 120))
+        self.unc = np.abs(rng.normal(1.0, 0.1, size=self.data.shape))
+        self.x_positions = np.concatenate([rng.integers(0, 120, 30), [0, 119, 35]])
+        self.y_positions = np.concatenate([rng.integers(0, 100, 30), [0, 99, 22]])
+
+        y_pix, x_pix = np.mgrid[:100, :120]
+        for x_pos, y_pos in zip(self.x_positions, self.y_positions):
+            x_off, y_off = rng.uniform(-3.0, 3.0, 2)
+            self.data += rng.uniform(10.0, 1000.0) * np.exp(
+                -((x_pix - x_pos - x_off) ** 2 + (y_pix - y_pos - y_off) ** 2) / 8.0
+            )
+        self.data[20:25, 30:40] = np.nan
+        self.unc[50:53, :] = np.nan
+
+    def test_batch_matches_single(self):
+        """Test that batched photometry matches photometry of single cutouts"""
+        image_cutouts, unc_cutouts = make_cutout_stacks(
+            [self.data, self.unc], self.x_positions, self.y_positions, 10
+        )
+        psfmodels = get_psf_shifted_array(self.psf_path, 10)
+        results = psf_photometry_batch(image_cutouts, unc_cutouts, psfmodels)
+
+        for ind, (image_cutout, unc_cutout) in enumerate(
+            zip(image_cutouts, unc_cutouts)
+        ):
+            expected = psf_photometry(image_cutout, unc_cutout, psfmodels)
+            for value, expected_value in zip(results, expected[:5]):
+                np.testing.assert_allclose(value[ind], expected_value, rtol=1e-10)
+
+    def test_psf_cache(self):
+        """Test that shifted PSF models are made once per PSF file"""
+        psfmodels = get_psf_shifted_array(self.psf_path, 10)
+        self.assertEqual(psfmodels.shape, (21, 21, 81))
+        self.assertFalse(psfmodels.flags.writeable)
+        self.assertIs(get_psf_shifted_array(self.psf_path, 10), psfmodels)
+        self.assertEqual(get_psf_shifted_array(self.psf_path, 5).shape, (11, 11, 81))
+
+        # A changed file is read again
+        y_grid, x_grid = np.mgrid[-12:13, -12:13]
+        fits.writeto(
+            self.psf_path, np.exp(-(x_grid**2 + y_grid**2) / 2.0), overwrite=True
+        )
+        os.utime(self.psf_path, ns=(0, 0))
+        new_psfmodels = get_psf_shifted_array(self.psf_path, 10)
+        self.assertGreater(np.max(new_psfmodels), np.max(psfmodels))
@@ -0,0 +1,104 @@
+"""
+Tests for content-addressed scratch files in
+..module::mirar.data.scratch
+"""
+
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from mirar.benchmarks.synthetic import make_synthetic_image
+from mirar.data.scratch import ScratchFiles, scratch_files
+from mirar.io import open_fits
+from mirar.paths import LATEST_SAVE_KEY, PROC_HISTORY_KEY
+from mirar.processors.utils.image_saver import ImageSaver
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestScratchFiles(BaseTestCase):
+    """Class for testing scratch files"""
+
+    def setUp(self):
+        self.scratch_dir = Path(self.temp_dir.name).joinpath("scratch_root")
+        scratch_files.set_scratch_dir(self.scratch_dir)
+        scratch_files.reset()
+        self.addCleanup(scratch_files.set_scratch_dir, None)
+        self.addCleanup(scratch_files.clear)
+
+    def test_reuse(self):
+        """Test that unchanged images are written once, and shared"""
+        processor = ImageSaver(output_dir_name="scratch")
+        image = make_synthetic_image("winter", index=0, scale=0.02)
+
+        path = processor.save_scratch_fits(image)
+        self.assertTrue(path.is_relative_to(self.scratch_dir))
+        self.assertEqual(image[LATEST_SAVE_KEY], path.as_posix())
+        np.testing.assert_array_equal(open_fits(path)[0], image.get_data())
+        mask_path = processor.save_scratch_mask(image, path)
+        self.assertEqual(mask_path.parent, path.parent)
+
+        # Processing history alone does not change the content
+        image[PROC_HISTORY_KEY] += "other,"
+        self.assertEqual(processor.save_scratch_fits(image), path)
+        self.assertEqual(processor.save_scratch_mask(image, path), mask_path)
+        self.assertEqual(scratch_files.get_stats()["n_written"], 2)
+        self.assertEqual(scratch_files.get_stats()["n_reused"], 2)
+
+        # Changed data gives a new file
+        image.set_data(image.get_data() + 1.0)
+        new_path = processor.save_scratch_fits(image)
+        self.assertNotEqual(new_path, path)
+        self.assertEqual(new_path.name, path.name)
+
+        processor.release_scratch_files([path, mask_path, new_path])
+        self.assertTrue(path.exists())
+        processor.release_scratch_files([path, mask_path])
+        self.assertEqual(scratch_files.get_stats()["n_retained"], 3)
+
+        # Unused files are deleted once over budget
+        scratch_files.set_max_retained_bytes(0)
+        self.assertFalse(path.exists())
+        self.assertFalse(new_path.exists())
+        self.assertFalse(path.parent.exists())
+        self.assertEqual(scratch_files.get_stats()["n_files"], 0)
+
+    def test_eviction_and_threads(self):
+        """Test least-recently-used eviction, and concurrent requests"""
+        manager = ScratchFiles(scratch_dir=self.scratch_dir, max_retained_bytes=10)
+        n_writes = []
+
+        def write(text: str, path: Path):
+            n_writes.append(path.name)
+            path.write_text(text, encoding="utf8")
+
+        def get(name: str) -> Path:
+            return manager.acquire("key", name, lambda x: write("12345", x))
+
+        threads = [threading.Thread(target=get, args=("a.txt",)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(n_writes, ["a.txt"])
+
+        path_a = get("a.txt")
+        for _ in range(9):
+            manager.release(path_a)
+        path_b = get("b.txt")
+        manager.release(path_b)
+        self.assertTrue(path_a.exists() & path_b.exists())
+
+        # Reusing a retained file makes it the most recently used
+        manager.release(get("a.txt"))
+        manager.release(get("c.txt"))
+        self.assertFalse(path_b.exists())
+        self.assertTrue(path_a.exists())
+        self.assertEqual(manager.get_stats()["n_evicted"], 1)
+
+        manager.clear_retained()
+        self.assertFalse(path_a.exists())
+        self.assertEqual(manager.get_stats()["retained_bytes"], 0)
@@ -0,0 +1,80 @@
+"""
+Tests for cross-matching source tables with
+..module::mirar.processors.xmatch
+"""
+
+import logging
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from mirar.benchmarks.suite import SyntheticXMatchCatalog
+from mirar.benchmarks.synthetic import make_synthetic_header
+from mirar.data import SourceBatch, SourceTable
+from mirar.processors.xmatch import XMatch
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestXMatch(BaseTestCase):
+    """Class for testing cross-matching"""
+
+    def setUp(self):
+        self.catalog = SyntheticXMatchCatalog(search_radius_arcmin=0.05, num_sources=2)
+        self.tables = [
+            pd.DataFrame({"ra": [10.0, 10.1, 10.2], "dec": [1.0, 1.1, 1.2]}),
+            pd.DataFrame({"ra": [20.0, 20.1], "dec": [-5.0, -5.1]}, index=[5, 7]),
+        ]
+
+    def get_batch(self) -> SourceBatch:
+        """
+        Get a batch of the source tables
+
+        :return: source batch
+        """
+        return SourceBatch(
+            [
+                SourceTable(
+                    x.copy(), metadata=dict(make_synthetic_header("winter", index=i))
+                )
+                for i, x in enumerate(self.tables)
+            ]
+        )
+
+    def test_xmatch(self):
+        """Test that every table of a batch is cross-matched in one query"""
+        processor = XMatch(catalog=self.catalog)
+        with mock.patch.object(
+            self.catalog, "query", wraps=self.catalog.query
+        ) as query:
+            batch = processor.apply(self.get_batch())
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual(len(query.call_args.args[0]), 5)
+
+        # The synthetic catalog gives 0, 1, 2, 0, 1 matches for the five sources
+        first, second = batch[0].get_data().copy(), batch[1].get_data()
+        self.assertEqual(list(first["nmtchsyn"]), [0, 1, 2])
+        self.assertEqual(list(second["nmtchsyn"]), [0, 1])
+        self.assertEqual(list(second.index), [5, 7])
+        self.assertEqual(
+            list(first.columns),
+            ["ra", "dec"]
+            + [f"syn{x}{n}" for x in ["objid", "ra", "dec", "mag"] for n in [1, 2]]
+            + ["nmtchsyn", "distsynnr1", "distsynnr2"],
+        )
+
+        self.assertIsNone(first["synra1"].iloc[0])
+        self.assertIsNone(first["synra2"].iloc[1])
+        self.assertAlmostEqual(first["synra2"].iloc[2], 10.2002)
+        self.assertAlmostEqual(second["synmag1"].loc[7], 15.0)
+
+        expected_dist = np.hypot(1.0e-4 * np.cos(np.deg2rad(1.1)), 1.0e-4) * 3600.0
+        self.assertAlmostEqual(first["distsynnr1"].iloc[1], expected_dist, places=5)
+        self.assertIsNone(first["distsynnr2"].iloc[1])
+
+        # Cross-matching again replaces the existing columns
+        again = processor.apply(batch)[0].get_data()
+        self.assertEqual(list(again.columns), list(first.columns))
+        pd.testing.assert_frame_equal(again, first)
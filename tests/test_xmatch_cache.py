@@ -0,0 +1,169 @@
+"""
+Tests for the local tile cache of cross-match catalogs in
+..module::mirar.catalog.base.xmatch_cache
+"""
+
+import logging
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+from astropy.coordinates import SkyCoord
+
+from mirar.catalog.base.base_xmatch_catalog import BaseXMatchCatalog
+from mirar.catalog.base.errors import CatalogCacheError
+from mirar.catalog.base.tile_cache import SkyTiling
+from mirar.catalog.base.xmatch_cache import prewarm_xmatch_tiles
+from mirar.testing import BaseTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class FakeRemoteCatalog(BaseXMatchCatalog):
+    """
+    Cross-match catalog of random sources, queried by brute force
+    """
+
+    catalog_name = "fake"
+    abbreviation = "fk"
+    projection = {"_id": 1, "ra": 1, "dec": 1, "name": 1}
+    column_names = {"_id": "fkid", "ra": "fkra", "dec": "fkdec", "name": "fkname"}
+    column_dtypes = {"fkid": float, "fkra": float, "fkdec": float, "fkname": str}
+    ra_column_name = "fkra"
+    dec_column_name = "fkdec"
+
+    def __init__(self, *args, rows: list[dict], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = rows
+        self.crds = SkyCoord(
+            [x["ra"] for x in rows], [x["dec"] for x in rows], unit="deg"
+        )
+        self.n_tile_queries = 0
+
+    def get_near(self, ra_deg: float, dec_deg: float, radius_deg: float) -> list:
+        """
+        Get the rows within a radius of a position, nearest first
+
+        :param ra_deg: RA in degrees
+        :param dec_deg: Dec in degrees
+        :param radius_deg: radius in degrees
+        :return: list of rows
+        """
+        seps = SkyCoord(ra_deg, dec_deg, unit="deg").separation(self.crds).deg
+        inds = np.argsort(seps)
+        return [self.rows[x] for x in inds if seps[x] < radius_deg]
+
+    def query_tiles(self, coords: dict, radius_deg: float) -> dict:
+        self.n_tile_queries += 1
+        return {
+            name: self.get_near(ra, dec, radius_deg)
+            for name, (ra, dec) in coords.items()
+        }
+
+    def query(self, coords: dict) -> dict:
+        if self.tile_cache is not None:
+            return self.tile_cache.query(self, coords)
+        return {
+            name: self.get_near(ra, dec, self.search_radius_arcsec / 3600.0)[
+                : self.num_sources
+            ]
+            for name, (ra, dec) in coords.items()
+        }
+
+
+class TestXMatchCache(BaseTestCase):
+    """Class for testing the cross-match tile cache"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Sources around RA=0 (to test wrapping), and around the pole
+        ras = np.concatenate([rng.uniform(-0.3, 0.3, 500) % 360.0, [10.0, 190.0]])
+        decs = np.concatenate([rng.uniform(-0.3, 0.3, 500), [89.99, 89.995]])
+        self.rows = [
+            {"_id": i, "ra": ra, "dec": dec, "name": f"src{i}"}
+            for i, (ra, dec) in enumerate(zip(ras, decs))
+        ]
+        self.query_coords = {
+            f"q{i}": [ra, dec]
+            for i, (ra, dec) in enumerate(
+                zip(
+                    np.concatenate([rng.uniform(-0.2, 0.2, 50) % 360.0, [100.0]]),
+                    np.concatenate([rng.uniform(-0.2, 0.2, 50), [89.99]]),
+                )
+            )
+        }
+        self.cache_dir = Path(self.temp_dir.name).joinpath("xmatch_cache")
+
+    def get_catalog(self, **kwargs) -> FakeRemoteCatalog:
+        """
+        Get a catalog
+
+        :return: catalog
+        """
+        return FakeRemoteCatalog(
+            search_radius_arcmin=1.5, num_sources=3, rows=self.rows, **kwargs
+        )
+
+    def test_tiling(self):
+        """Test that positions lie in the tiles of discs around them"""
+        tiling = SkyTiling(0.5)
+        rng = np.random.default_rng(1)
+        ras = rng.uniform(0.0, 360.0, 200)
+        decs = np.rad2deg(np.arcsin(rng.uniform(-1.0, 1.0, 200)))
+        tiles = tiling.get_tiles(ras, decs)
+        for ra_deg, dec_deg, tile in zip(ras, decs, tiles):
+            self.assertIn(tile, tiling.get_disc_tiles(ra_deg, dec_deg, 0.01))
+            ra_centre, dec_centre, radius = tiling.get_tile_cone(tile)
+            sep = SkyCoord(ra_centre, dec_centre, unit="deg").separation(
+                SkyCoord(ra_deg, dec_deg, unit="deg")
+            )
+            self.assertLess(sep.deg, radius)
+
+    def test_cached_query(self):
+        """Test that the cache gives the same matches as a remote query"""
+        remote = self.get_catalog(tile_cache_dir=None)
+        expected = remote.query(self.query_coords)
+
+        catalog = self.get_catalog(tile_cache_dir=self.cache_dir)
+        results = catalog.query(self.query_coords)
+        self.assertEqual(results, expected)
+        self.assertGreater(sum(len(x) for x in results.values()), 50)
+        self.assertEqual(len(results["q50"]), 2)
+        n_tile_queries = catalog.n_tile_queries
+
+        # Tiles are reused, including by new catalog objects
+        self.assertEqual(catalog.query(self.query_coords), expected)
+        new_catalog = pickle.loads(pickle.dumps(catalog))
+        self.assertEqual(new_catalog.query(self.query_coords), expected)
+        self.assertEqual(catalog.n_tile_queries, n_tile_queries)
+        self.assertEqual(new_catalog.n_tile_queries, n_tile_queries)
+
+        # Expired tiles are fetched again
+        catalog_dir = catalog.tile_cache.get_catalog_dir(catalog)
+        for path in catalog_dir.glob("tile_*.npz"):
+            os.utime(path, (0, 0))
+        self.assertEqual(catalog.query(self.query_coords), expected)
+        self.assertGreater(catalog.n_tile_queries, n_tile_queries)
+
+        catalog.tile_cache.clear(catalog)
+        self.assertEqual(len(list(catalog_dir.glob("tile_*.npz"))), 0)
+
+    def test_prewarm(self):
+        """Test pre-warming tiles for a list of fields"""
+        catalog = self.get_catalog(tile_cache_dir=self.cache_dir)
+        n_fetched = prewarm_xmatch_tiles([catalog], [0.0], [0.0], radius_deg=0.3)
+        self.assertGreater(n_fetched, 0)
+        self.assertEqual(
+            prewarm_xmatch_tiles([catalog], [0.0], [0.0], radius_deg=0.3), 0
+        )
+
+        n_tile_queries = catalog.n_tile_queries
+        coords = {k: v for k, v in self.query_coords.items() if k != "q50"}
+        catalog.query(coords)
+        self.assertEqual(catalog.n_tile_queries, n_tile_queries)
+
+        with self.assertRaises(CatalogCacheError):
+            prewarm_xmatch_tiles(
+                [self.get_catalog(tile_cache_dir=None)], [0.0], [0.0], 0.3
+            )